@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Cancellation - Hủy công việc đang chạy
+Cancel token dùng chung cho cắt video, thêm audio, tải YouTube và upload rclone
+"""
+
+import os
+import sys
+import signal
+import shutil
+import subprocess
+import threading
+import time
+
+
+# Thời gian chờ tiến trình con tự thoát sau SIGTERM trước khi SIGKILL
+TERMINATE_GRACE_SECONDS = 3.0
+# Kích thước mỗi lần đọc khi chỉ giữ phần cuối output (read_tail)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class JobCancelledError(RuntimeError):
+    """Công việc đã bị hủy bởi người dùng"""
+
+
+def process_group_kwargs() -> dict:
+    """
+    Tham số Popen để chạy tiến trình con trong process group riêng
+
+    Nhờ vậy có thể kết thúc cả cây tiến trình (ffmpeg, rclone...) cùng lúc.
+    """
+    if sys.platform == "win32":
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def terminate_process(process, timeout: float = TERMINATE_GRACE_SECONDS):
+    """
+    Kết thúc một tiến trình con cùng process group của nó trong thời gian giới hạn
+
+    Args:
+        process: subprocess.Popen đã chạy với process_group_kwargs()
+        timeout: Số giây chờ sau SIGTERM trước khi SIGKILL
+    """
+    if process.poll() is not None:
+        return
+
+    try:
+        if sys.platform == "win32":
+            process.terminate()
+        else:
+            os.killpg(process.pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+    try:
+        process.wait(timeout=timeout)
+        return
+    except subprocess.TimeoutExpired:
+        pass
+
+    try:
+        if sys.platform == "win32":
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+
+class AccountedPopen(subprocess.Popen):
+    """
+    Popen ghi lại thời gian chạy và tài nguyên (CPU, max RSS, I/O) của tiến trình con
+
+    Trên POSIX, wait() và poll() tự thu hồi tiến trình bằng os.wait4 nên có rusage
+    riêng của nó (kể cả khi nhiều tiến trình chạy song song) rồi gán returncode,
+    để Popen gốc không thu hồi lần nữa. Trên Windows rusage là None.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.started = time.monotonic()
+        self.ended = None
+        self.rusage = None
+        self._reap_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    @property
+    def wall_time(self) -> float:
+        return (self.ended or time.monotonic()) - self.started
+
+    if hasattr(os, 'wait4'):
+        def _reap(self, wait_flags: int):
+            """Thu hồi tiến trình bằng os.wait4 (gọi khi đang giữ _reap_lock)"""
+            if self.returncode is not None:
+                return
+            try:
+                pid, sts, rusage = os.wait4(self.pid, wait_flags)
+            except ChildProcessError:
+                # Không thu hồi được (vd: SIGCHLD bị bỏ qua), như Popen gốc
+                self.returncode = 0
+                return
+            if pid != self.pid:
+                return
+            self.rusage = rusage
+            self.ended = time.monotonic()
+            if os.WIFSIGNALED(sts):
+                self.returncode = -os.WTERMSIG(sts)
+            elif os.WIFEXITED(sts):
+                self.returncode = os.WEXITSTATUS(sts)
+            else:
+                self.returncode = sts
+
+        def poll(self):
+            # Luồng khác đang chờ (wait) thì nó sẽ thu hồi, như Popen gốc
+            if self.returncode is None and self._reap_lock.acquire(False):
+                try:
+                    self._reap(os.WNOHANG)
+                finally:
+                    self._reap_lock.release()
+            return self.returncode
+
+        def wait(self, timeout=None):
+            if timeout is None:
+                with self._reap_lock:
+                    self._reap(0)
+                return self.returncode
+
+            # Có timeout: thăm dò với khoảng nghỉ tăng dần (giống Popen gốc)
+            deadline = time.monotonic() + timeout
+            delay = 0.0005
+            while self.poll() is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(self.args, timeout)
+                delay = min(delay * 2, remaining, 0.05)
+                time.sleep(delay)
+            return self.returncode
+    else:
+        def wait(self, timeout=None):
+            returncode = super().wait(timeout)
+            if self.ended is None:
+                self.ended = time.monotonic()
+            return returncode
+
+
+class CancelToken:
+    """
+    Token hủy công việc, được truyền xuyên suốt các bước xử lý
+
+    Khi cancel():
+        - Các future đang chờ trong hàng đợi bị hủy
+        - Các tiến trình con đang chạy bị kết thúc (SIGTERM → SIGKILL)
+        - Các file/thư mục tạm đã đăng ký bị xóa
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes = set()
+        self._futures = []
+        self._cleanup_paths = []
+        # JobMetrics (metrics.py) nhận tài nguyên của các tiến trình con đã xong
+        self.metrics = None
+
+    @property
+    def cancelled(self) -> bool:
+        """True nếu công việc đã bị hủy"""
+        return self._event.is_set()
+
+    def cancel(self):
+        """
+        Hủy công việc
+
+        Không chặn luồng gọi: việc chờ tiến trình con thoát được thực hiện
+        ở một luồng nền, nên có thể gọi trực tiếp từ luồng GUI.
+        """
+        if self._event.is_set():
+            return
+        self._event.set()
+
+        with self._lock:
+            futures = list(self._futures)
+            processes = list(self._processes)
+
+        for future in futures:
+            future.cancel()
+
+        for process in processes:
+            threading.Thread(target=terminate_process, args=(process,), daemon=True).start()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Chờ cho đến khi bị hủy hoặc hết timeout. Trả về True nếu đã hủy"""
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        """Ném JobCancelledError nếu công việc đã bị hủy"""
+        if self._event.is_set():
+            raise JobCancelledError("Đã hủy xử lý")
+
+    def register_process(self, process):
+        """Theo dõi tiến trình con; kết thúc ngay nếu đã bị hủy trước đó"""
+        with self._lock:
+            self._processes.add(process)
+        if self._event.is_set():
+            terminate_process(process)
+
+    def unregister_process(self, process):
+        """Bỏ theo dõi tiến trình con đã kết thúc (và ghi nhận tài nguyên nó dùng)"""
+        with self._lock:
+            self._processes.discard(process)
+        if self.metrics is not None and isinstance(process, AccountedPopen):
+            self.metrics.record_process(process)
+
+    def add_future(self, future):
+        """Theo dõi future trong ThreadPoolExecutor để hủy khi cancel()"""
+        with self._lock:
+            self._futures.append(future)
+        if self._event.is_set():
+            future.cancel()
+
+    def add_cleanup_path(self, path: str):
+        """Đăng ký file/thư mục tạm cần xóa nếu công việc bị hủy"""
+        with self._lock:
+            self._cleanup_paths.append(path)
+
+    def cleanup(self):
+        """Xóa các file/thư mục tạm đã đăng ký"""
+        with self._lock:
+            paths = list(self._cleanup_paths)
+            self._cleanup_paths.clear()
+
+        for path in paths:
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                elif os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def read_tail(stream, limit: int):
+    """
+    Đọc hết một stream nhưng chỉ giữ lại tối đa limit ký tự/byte cuối cùng
+
+    Bộ nhớ dùng không phụ thuộc vào độ dài output (log ffmpeg của video dài
+    có thể rất lớn, nhưng khi lỗi chỉ phần cuối là có ích).
+    """
+    tail = stream.read(0)
+    while True:
+        chunk = stream.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            return tail
+        tail = (tail + chunk)[-limit:]
+
+
+def drain_tail(stream, limit: int):
+    """
+    Đọc stream (thường là stderr) bằng read_tail trong một luồng riêng
+
+    Dùng khi luồng gọi đang đọc stdout của cùng tiến trình: nếu stderr không được
+    đọc song song, tiến trình ghi đầy pipe stderr sẽ bị chặn và stdout không bao
+    giờ kết thúc.
+
+    Returns:
+        Hàm không tham số chờ đọc xong rồi trả về phần cuối của stream
+    """
+    result = [stream.read(0)]
+
+    def run():
+        try:
+            result[0] = read_tail(stream, limit)
+        except (OSError, ValueError):
+            pass  # Stream bị đóng khi tiến trình bị kết thúc
+
+    thread = threading.Thread(target=run, name="stderr-drain", daemon=True)
+    thread.start()
+
+    def wait():
+        thread.join()
+        return result[0]
+
+    return wait
+
+
+def run_process(cmd, cancel_token: CancelToken = None, stderr_limit: int = None,
+                **kwargs) -> subprocess.CompletedProcess:
+    """
+    Chạy lệnh như subprocess.run nhưng có thể hủy giữa chừng
+
+    Args:
+        cmd: Danh sách tham số lệnh
+        cancel_token: CancelToken (tùy chọn)
+        stderr_limit: Chỉ giữ tối đa bấy nhiêu ký tự/byte cuối của stderr (None =
+            giữ toàn bộ). Khi đặt, stdout mặc định bị bỏ đi (DEVNULL)
+        **kwargs: Tham số thêm cho Popen (vd: text=True)
+
+    Returns:
+        subprocess.CompletedProcess
+
+    Raises:
+        JobCancelledError: Nếu công việc bị hủy trong khi lệnh đang chạy
+    """
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+
+    kwargs.setdefault('stdout', subprocess.DEVNULL if stderr_limit else subprocess.PIPE)
+    kwargs.setdefault('stderr', subprocess.PIPE)
+    kwargs.update(process_group_kwargs())
+
+    process = AccountedPopen(cmd, **kwargs)
+    if cancel_token:
+        cancel_token.register_process(process)
+
+    try:
+        if stderr_limit and process.stderr and not process.stdout:
+            stdout, stderr = None, read_tail(process.stderr, stderr_limit)
+            process.stderr.close()
+            process.wait()
+        else:
+            stdout, stderr = process.communicate()
+    except BaseException:
+        # KeyboardInterrupt: tiến trình con ở session riêng nên không nhận Ctrl+C
+        terminate_process(process)
+        raise
+    finally:
+        if cancel_token:
+            cancel_token.unregister_process(process)
+
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
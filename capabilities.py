@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Capabilities - Kiểm tra ffmpeg/ffprobe/rclone một lần và cache kết quả
+Phiên bản, danh sách encoder và filter của mỗi binary được lưu trên đĩa theo
+đường dẫn + kích thước + mtime của binary, nên chỉ chạy lại `-version`,
+`-encoders`, `-filters` khi binary được cài lại/nâng cấp. Các lần kiểm tra sau
+chỉ tốn một lần stat() thay vì một tiến trình con.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import threading
+from typing import Optional
+
+from media_cache import get_cache_root, read_json, write_json
+
+
+CAPABILITIES_FILE = "capabilities.json"
+
+# Lệnh in phiên bản của từng công cụ
+VERSION_COMMANDS = {
+    'ffmpeg': ['-hide_banner', '-version'],
+    'ffprobe': ['-hide_banner', '-version'],
+    'rclone': ['version'],
+}
+
+# Dòng liệt kê encoder/filter của ffmpeg, vd: " V....D libx264   libx264 H.264 ..."
+_ENCODER_LINE_RE = re.compile(r"^\s*[VAS][\w.]{5}\s+(\S+)")
+_FILTER_LINE_RE = re.compile(r"^\s*[T.][S.][C.]?\s+(\S+)\s+\S+->\S+")
+
+_memory_cache = {}
+_lock = threading.Lock()
+
+
+def _cache_file() -> str:
+    return os.path.join(get_cache_root(), CAPABILITIES_FILE)
+
+
+def _binary_key(path: str) -> str:
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def _run(cmd, timeout: float = 10) -> Optional[str]:
+    """Chạy lệnh và trả về stdout, None nếu lỗi"""
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                text=True, errors='replace', timeout=timeout)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout
+
+
+def _parse_names(output: Optional[str], pattern) -> list:
+    if not output:
+        return []
+    names = []
+    for line in output.splitlines():
+        match = pattern.match(line)
+        if match and match.group(1) != '=':
+            names.append(match.group(1))
+    return sorted(set(names))
+
+
+def _probe(name: str, path: str) -> dict:
+    """Chạy binary để lấy phiên bản (và encoder/filter với ffmpeg)"""
+    output = _run([path] + VERSION_COMMANDS[name])
+    info = {
+        'available': output is not None,
+        'path': path,
+        'version': output.splitlines()[0].strip() if output else None,
+    }
+    if name == 'ffmpeg' and output is not None:
+        info['encoders'] = _parse_names(_run([path, '-hide_banner', '-encoders']), _ENCODER_LINE_RE)
+        info['filters'] = _parse_names(_run([path, '-hide_banner', '-filters']), _FILTER_LINE_RE)
+    return info
+
+
+def get_tool(name: str, refresh: bool = False) -> dict:
+    """
+    Thông tin về một công cụ bên ngoài (ffmpeg, ffprobe, rclone)
+
+    Args:
+        name: Tên công cụ
+        refresh: Bỏ qua cache và kiểm tra lại
+
+    Returns:
+        Dict {"available", "path", "version"} (+ "encoders", "filters" với ffmpeg)
+    """
+    path = shutil.which(name)
+    if path is None:
+        return {'available': False, 'path': None, 'version': None}
+
+    try:
+        key = _binary_key(path)
+    except OSError:
+        return {'available': False, 'path': path, 'version': None}
+
+    with _lock:
+        cached = _memory_cache.get(name)
+        if not refresh and cached and cached['key'] == key:
+            return cached['info']
+
+        disk = read_json(_cache_file()) or {}
+        entry = disk.get(name)
+        if not refresh and entry and entry.get('key') == key:
+            info = entry['info']
+        else:
+            info = _probe(name, path)
+            disk[name] = {'key': key, 'info': info}
+            try:
+                write_json(_cache_file(), disk)
+            except OSError:
+                pass
+
+        _memory_cache[name] = {'key': key, 'info': info}
+        return info
+
+
+def has_tool(name: str) -> bool:
+    """Công cụ có được cài đặt và chạy được không"""
+    return get_tool(name)['available']
+
+
+def has_encoder(encoder: str) -> bool:
+    """ffmpeg có encoder này không (vd: "libx264", "h264_nvenc")"""
+    return encoder in get_tool('ffmpeg').get('encoders', [])
+
+
+def has_filter(filter_name: str) -> bool:
+    """ffmpeg có filter này không (vd: "loudnorm", "silencedetect")"""
+    return filter_name in get_tool('ffmpeg').get('filters', [])
+
+
+def main():
+    """In thông tin các công cụ (kiểm tra lại, bỏ qua cache)"""
+    for name in VERSION_COMMANDS:
+        info = get_tool(name, refresh=True)
+        if not info['available']:
+            print(f"❌ {name}: không tìm thấy")
+            continue
+        print(f"✅ {name}: {info['version']}")
+        print(f"   {info['path']}")
+        if name == 'ffmpeg':
+            print(f"   {len(info['encoders'])} encoder, {len(info['filters'])} filter")
+    print(f"\n💾 Cache: {_cache_file()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,766 @@
+#!/usr/bin/env python3
+"""
+Distributed - Render các đoạn cắt trên nhiều tiến trình/máy worker
+Coordinator chia danh sách đoạn thành các task và phát qua API HTTP cục bộ.
+Worker (cùng máy hoặc máy khác truy cập được video qua đường dẫn dùng chung)
+nhận task, cắt bằng cut_single_segment rồi báo kết quả. Coordinator lo việc
+thử lại khi lỗi, chạy bản sao cho đoạn chậm bất thường (straggler) và ghép
+video cuối cùng.
+
+API (JSON):
+    GET  /status                     → tiến trình của kế hoạch cắt
+    POST /lease                      → nhận một task, body: {"worker": "tên"}
+    POST /leases/<id>/heartbeat      → gia hạn task, trả về {"cancel": true} nếu nên dừng
+    POST /leases/<id>/complete       → báo kết quả, body: {"ok": true, "error": null}
+
+Chạy thử trên một máy:
+    python distributed.py coordinate -i in.mp4 -s "00:10-00:20|01:00-01:30" -o out.mp4 --local-workers 3
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import threading
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+from cancellation import (
+    CancelToken, JobCancelledError, process_group_kwargs, terminate_process
+)
+from frame_index import ExactCut, build_frame_index
+from http_api import request_error
+from media_info import prepare_segments
+from scratch import create_scratch_dir, ensure_free_space, estimate_intermediate_size
+from video_cutter import (
+    check_ffmpeg, concat_files, cut_single_segment, format_duration, parse_segments
+)
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8770
+
+# Trạng thái task
+TASK_PENDING = "pending"
+TASK_RUNNING = "running"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+
+# Worker không gửi heartbeat trong khoảng này bị coi là đã chết, task được phát lại
+LEASE_TIMEOUT = 30.0
+HEARTBEAT_INTERVAL = 5.0
+
+# Một đoạn chạy lâu hơn STRAGGLER_FACTOR lần trung vị (tính theo giây/giây video)
+# sẽ được phát thêm một bản sao cho worker rảnh; bản nào xong trước được dùng
+STRAGGLER_FACTOR = 2.0
+
+
+class Coordinator:
+    """Chia kế hoạch cắt thành task, phát cho worker và theo dõi kết quả"""
+
+    def __init__(self, input_video: str, segments: List[Tuple[float, float]], work_dir: str,
+                 mode: str = "balanced", volume: int = 100, preset: str = "medium", crf: int = 23,
+                 max_attempts: int = 3, lease_timeout: float = LEASE_TIMEOUT,
+                 straggler_factor: float = STRAGGLER_FACTOR, plan: Optional[dict] = None,
+                 exact_cuts: Optional[dict] = None):
+        """
+        Args:
+            input_video: Đường dẫn video đầu vào (worker phải đọc được cùng đường dẫn)
+            segments: List các tuple (start_time, end_time)
+            work_dir: Thư mục dùng chung để worker ghi các đoạn đã cắt
+            mode: Chế độ cắt cho từng đoạn ('fast', 'balanced', 'accurate')
+            volume: Âm lượng (0-200%)
+            preset: x264 preset khi re-encode
+            crf: Constant Rate Factor khi re-encode
+            max_attempts: Số lần thử tối đa cho mỗi đoạn trước khi báo lỗi cả công việc
+            lease_timeout: Số giây không có heartbeat thì coi worker đã chết
+            straggler_factor: Hệ số so với trung vị để phát bản sao cho đoạn chậm (0 = tắt)
+            plan: Cách xử lý từng stream (copy/encode/drop), xem media_info.stream_plan
+            exact_cuts: {(start, end): ExactCut} để worker cắt chính xác từng frame
+                và kiểm tra số frame (accurate, xem frame_index)
+        """
+        self.input_video = os.path.abspath(input_video)
+        self.work_dir = os.path.abspath(work_dir)
+        self.mode = mode
+        self.volume = volume
+        self.preset = preset
+        self.crf = crf
+        self.max_attempts = max_attempts
+        self.lease_timeout = lease_timeout
+        self.straggler_factor = straggler_factor
+        self.plan = plan
+        exact_cuts = exact_cuts or {}
+
+        self.tasks = []
+        for idx, (start, end) in enumerate(segments, 1):
+            self.tasks.append({
+                'index': idx,
+                'start': start,
+                'end': end,
+                'exact': exact_cuts[(start, end)].to_dict() if (start, end) in exact_cuts else None,
+                'status': TASK_PENDING,
+                'attempts': 0,
+                'output': os.path.join(self.work_dir, f"segment_{idx:03d}.mp4"),
+                'worker': None,
+                'elapsed': None,
+                'error': None,
+            })
+
+        self.leases = {}
+        self.error = None
+        self._next_lease = 1
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._cancelled = False
+
+    # ===== API CHO WORKER =====
+
+    def lease(self, worker: str) -> dict:
+        """
+        Phát một task cho worker
+
+        Returns:
+            {"status": "task", "lease": id, "task": {...}} nếu có việc,
+            {"status": "wait"} nếu tạm thời chưa có việc,
+            {"status": "finished"} nếu kế hoạch đã xong (hoặc bị hủy/lỗi)
+        """
+        with self._lock:
+            self._expire_leases()
+
+            if self.finished:
+                return {'status': 'finished'}
+
+            task = next((t for t in self.tasks if t['status'] == TASK_PENDING), None)
+            if task is None:
+                task = self._pick_straggler()
+            if task is None:
+                return {'status': 'wait'}
+
+            lease_id = self._next_lease
+            self._next_lease += 1
+            now = time.time()
+            self.leases[lease_id] = {
+                'task': task,
+                'worker': worker,
+                'started': now,
+                'heartbeat': now,
+                'cancel': False,
+                'output': os.path.join(self.work_dir, f"segment_{task['index']:03d}.lease{lease_id}.mp4"),
+            }
+            task['status'] = TASK_RUNNING
+            if len(self._task_leases(task)) > 1:
+                print(f"🐢 Đoạn {task['index']} chạy chậm, phát thêm bản sao cho {worker}")
+
+            return {
+                'status': 'task',
+                'lease': lease_id,
+                'task': {
+                    'index': task['index'],
+                    'input': self.input_video,
+                    'start': task['start'],
+                    'end': task['end'],
+                    'output': self.leases[lease_id]['output'],
+                    'mode': self.mode,
+                    'volume': self.volume,
+                    'preset': self.preset,
+                    'crf': self.crf,
+                    'plan': self.plan,
+                    'exact': task['exact'],
+                },
+            }
+
+    def heartbeat(self, lease_id: int) -> Optional[dict]:
+        """Gia hạn task; trả về None nếu lease không còn tồn tại"""
+        with self._lock:
+            lease = self.leases.get(lease_id)
+            if lease is None:
+                return None
+            lease['heartbeat'] = time.time()
+            return {'cancel': lease['cancel'] or self._cancelled}
+
+    def complete(self, lease_id: int, ok: bool, error: Optional[str] = None) -> bool:
+        """
+        Ghi nhận kết quả của một task
+
+        Returns:
+            False nếu lease không còn tồn tại (đã hết hạn hoặc đã bị thay thế)
+        """
+        with self._changed:
+            lease = self.leases.pop(lease_id, None)
+            if lease is None:
+                return False
+
+            task = lease['task']
+            output = lease['output']
+
+            if task['status'] == TASK_DONE or self.finished:
+                # Bản sao khác đã xong trước, bỏ kết quả này
+                self._remove(output)
+                return True
+
+            if ok and os.path.exists(output):
+                os.replace(output, task['output'])
+                task['status'] = TASK_DONE
+                task['worker'] = lease['worker']
+                task['elapsed'] = time.time() - lease['started']
+                # Dừng các bản sao còn đang chạy của đoạn này
+                for other in self._task_leases(task):
+                    other['cancel'] = True
+                done = sum(1 for t in self.tasks if t['status'] == TASK_DONE)
+                print(f"✅ [{done}/{len(self.tasks)}] Đoạn {task['index']}: "
+                      f"{format_duration(task['start'])} → {format_duration(task['end'])} "
+                      f"({lease['worker']}, {task['elapsed']:.1f}s)")
+            else:
+                self._remove(output)
+                self._record_failure(task, error or "Worker không tạo được file đầu ra", lease['worker'])
+
+            self._changed.notify_all()
+            return True
+
+    # ===== TRẠNG THÁI =====
+
+    @property
+    def finished(self) -> bool:
+        """Kế hoạch đã kết thúc (xong hết, có đoạn lỗi hẳn, hoặc bị hủy)"""
+        return (self._cancelled or self.error is not None
+                or all(t['status'] == TASK_DONE for t in self.tasks))
+
+    def status(self) -> dict:
+        """Tóm tắt tiến trình để hiển thị/API"""
+        with self._lock:
+            counts = {}
+            for task in self.tasks:
+                counts[task['status']] = counts.get(task['status'], 0) + 1
+            return {
+                'input': self.input_video,
+                'total': len(self.tasks),
+                'counts': counts,
+                'leases': [
+                    {'lease': lease_id, 'segment': lease['task']['index'], 'worker': lease['worker'],
+                     'running': round(time.time() - lease['started'], 1)}
+                    for lease_id, lease in self.leases.items()
+                ],
+                'finished': self.finished,
+                'error': self.error,
+            }
+
+    def wait(self, cancel_token: Optional[CancelToken] = None, poll_interval: float = 1.0):
+        """
+        Chờ tất cả các đoạn xong
+
+        Raises:
+            RuntimeError: Nếu một đoạn lỗi quá max_attempts lần
+            JobCancelledError: Nếu bị hủy
+        """
+        with self._changed:
+            while not self.finished:
+                if cancel_token and cancel_token.cancelled:
+                    self._cancel_locked()
+                    break
+                # Kiểm tra lease hết hạn định kỳ kể cả khi không có worker nào gọi tới
+                self._expire_leases()
+                self._changed.wait(poll_interval)
+
+        if self._cancelled:
+            raise JobCancelledError("Đã hủy render phân tán")
+        if self.error:
+            raise RuntimeError(self.error)
+
+    def cancel(self):
+        """Hủy kế hoạch: worker sẽ nhận lệnh dừng ở heartbeat kế tiếp"""
+        with self._changed:
+            self._cancel_locked()
+
+    def segment_files(self) -> List[str]:
+        """Danh sách file đoạn đã cắt theo đúng thứ tự"""
+        return [task['output'] for task in self.tasks]
+
+    # ===== NỘI BỘ (gọi khi đang giữ lock) =====
+
+    def _cancel_locked(self):
+        self._cancelled = True
+        for lease in self.leases.values():
+            lease['cancel'] = True
+        self._changed.notify_all()
+
+    def _task_leases(self, task) -> list:
+        return [lease for lease in self.leases.values() if lease['task'] is task]
+
+    def _record_failure(self, task, error: str, worker: str):
+        task['attempts'] += 1
+        task['error'] = error
+        print(f"⚠️  Đoạn {task['index']} lỗi trên {worker} "
+              f"(lần {task['attempts']}/{self.max_attempts}): {error}")
+
+        if self._task_leases(task):
+            # Một bản sao khác vẫn đang chạy
+            return
+        if task['attempts'] >= self.max_attempts:
+            task['status'] = TASK_FAILED
+            self.error = f"Lỗi khi cắt đoạn {task['index']} sau {task['attempts']} lần thử: {error}"
+            for lease in self.leases.values():
+                lease['cancel'] = True
+        else:
+            task['status'] = TASK_PENDING
+
+    def _expire_leases(self):
+        now = time.time()
+        expired = [lease_id for lease_id, lease in self.leases.items()
+                   if now - lease['heartbeat'] > self.lease_timeout]
+        for lease_id in expired:
+            lease = self.leases.pop(lease_id)
+            self._remove(lease['output'])
+            if lease['task']['status'] != TASK_DONE:
+                self._record_failure(lease['task'], "Mất kết nối với worker", lease['worker'])
+        if expired:
+            self._changed.notify_all()
+
+    def _pick_straggler(self):
+        """Chọn đoạn chạy chậm bất thường để phát thêm một bản sao"""
+        if not self.straggler_factor:
+            return None
+
+        # Tốc độ chuẩn hóa theo độ dài đoạn (giây xử lý / giây video)
+        rates = [t['elapsed'] / max(t['end'] - t['start'], 0.001)
+                 for t in self.tasks if t['status'] == TASK_DONE and t['elapsed']]
+        if not rates:
+            return None
+        median_rate = statistics.median(rates)
+
+        now = time.time()
+        candidates = []
+        for task in self.tasks:
+            if task['status'] != TASK_RUNNING:
+                continue
+            leases = self._task_leases(task)
+            if len(leases) != 1:
+                continue
+            expected = median_rate * (task['end'] - task['start'])
+            running = now - leases[0]['started']
+            if running > max(self.straggler_factor * expected, HEARTBEAT_INTERVAL):
+                candidates.append((running - expected, task))
+
+        if not candidates:
+            return None
+        return max(candidates, key=lambda item: item[0])[1]
+
+    @staticmethod
+    def _remove(path: str):
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler cho API JSON của coordinator"""
+
+    coordinator = None  # Gán bởi start_server()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def do_GET(self):
+        error = request_error(self)
+        if error:
+            self._send_json(error[0], {'error': error[1]})
+            return
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+
+        if parts == ['status']:
+            self._send_json(200, self.coordinator.status())
+        else:
+            self._send_json(404, {'error': 'Không tìm thấy'})
+
+    def do_POST(self):
+        error = request_error(self)
+        if error:
+            self._send_json(error[0], {'error': error[1]})
+            return
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+
+        try:
+            data = self._read_json()
+            if parts == ['lease']:
+                self._send_json(200, self.coordinator.lease(str(data.get('worker') or self.client_address[0])))
+            elif len(parts) == 3 and parts[0] == 'leases' and parts[2] == 'heartbeat':
+                result = self.coordinator.heartbeat(int(parts[1]))
+                if result is None:
+                    self._send_json(404, {'error': 'Lease không tồn tại'})
+                else:
+                    self._send_json(200, result)
+            elif len(parts) == 3 and parts[0] == 'leases' and parts[2] == 'complete':
+                if self.coordinator.complete(int(parts[1]), bool(data.get('ok')), data.get('error')):
+                    self._send_json(200, {'status': 'ok'})
+                else:
+                    self._send_json(404, {'error': 'Lease không tồn tại'})
+            else:
+                self._send_json(404, {'error': 'Không tìm thấy'})
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+
+
+def start_server(coordinator: Coordinator, host: str = DEFAULT_HOST,
+                 port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """
+    Chạy HTTP server của coordinator trong luồng nền
+
+    Args:
+        coordinator: Coordinator cần phục vụ
+        host: Địa chỉ lắng nghe ("0.0.0.0" để worker ở máy khác kết nối được)
+        port: Cổng (0 = tự chọn cổng trống)
+
+    Returns:
+        Server đang chạy (gọi shutdown() + server_close() để dừng)
+    """
+    handler = type('RequestHandler', (_RequestHandler,), {'coordinator': coordinator})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def spawn_local_workers(url: str, count: int) -> list:
+    """Chạy count tiến trình worker trên máy này, tự thoát khi coordinator xong"""
+    script = os.path.abspath(__file__)
+    processes = []
+    for n in range(1, count + 1):
+        cmd = [sys.executable, script, 'worker', '--coordinator', url,
+               '--name', f"{socket.gethostname()}-local{n}", '--exit-when-idle']
+        processes.append(subprocess.Popen(cmd, **process_group_kwargs()))
+    return processes
+
+
+def render_distributed(input_video: str, segments: List[Tuple[float, float]], output_video: str,
+                       temp_dir: Optional[str] = None, mode: str = "balanced",
+                       volume: int = 100, local_workers: int = 2, host: str = DEFAULT_HOST,
+                       port: int = DEFAULT_PORT, max_attempts: int = 3,
+                       lease_timeout: float = LEASE_TIMEOUT, progress_callback=None,
+                       cancel_token: Optional[CancelToken] = None,
+                       preset: str = "medium", crf: int = 23):
+    """
+    Cắt và ghép video với các đoạn được render trên nhiều worker
+
+    Args:
+        input_video: Đường dẫn video đầu vào (worker ở máy khác phải đọc được cùng đường dẫn)
+        segments: List các tuple (start_time, end_time)
+        output_video: Đường dẫn video đầu ra
+        temp_dir: Thư mục gốc dùng chung để worker ghi các đoạn (mỗi lần chạy có thư mục
+            con riêng). Chỉ khi coordinator lắng nghe trên localhost thì thư mục nhanh
+            như /dev/shm mới được dùng, vì worker ở máy khác không thấy được nó
+        mode: Chế độ cắt cho từng đoạn
+        volume: Âm lượng (0-200%)
+        local_workers: Số tiến trình worker chạy trên máy này (0 = chỉ dùng worker từ xa)
+        host: Địa chỉ lắng nghe của coordinator
+        port: Cổng của coordinator (0 = tự chọn)
+        max_attempts: Số lần thử tối đa cho mỗi đoạn
+        lease_timeout: Số giây không có heartbeat thì coi worker đã chết
+        progress_callback: Hàm callback để báo tiến trình (nhận message string)
+        cancel_token: CancelToken để hủy giữa chừng (tùy chọn)
+        preset: x264 preset khi re-encode
+        crf: Constant Rate Factor khi re-encode
+    """
+    def log(message):
+        """Helper để in log hoặc gọi callback"""
+        print(message)
+        if progress_callback:
+            progress_callback(message)
+
+    if not check_ffmpeg():
+        raise RuntimeError("ffmpeg chưa được cài đặt. Vui lòng cài đặt ffmpeg trước.")
+
+    if not os.path.exists(input_video):
+        raise FileNotFoundError(f"Không tìm thấy file video: {input_video}")
+
+    # Từ chối/cắt gọn các đoạn nằm ngoài video trước khi phát cho worker
+    info, segments, segment_warnings, plan = prepare_segments(input_video, segments, mode, volume)
+    if cancel_token is None:
+        cancel_token = CancelToken()
+
+    # Accurate: chỉ mục frame đọc một lần trên coordinator, mỗi task mang ExactCut của nó
+    exact_cuts = {}
+    if mode == "accurate" and plan and plan['video'] == 'encode':
+        index = build_frame_index(input_video, info, cancel_token, log)
+        if index is None:
+            segment_warnings.append("Không đọc được chỉ mục frame: cắt theo thời gian (có thể lệch 1 frame)")
+        else:
+            exact_cuts = index.exact_cuts(segments, info.sample_rate)
+            if plan['audio'] == 'copy':
+                # Audio copy chỉ cắt được theo gói: encode lại để khớp với video
+                plan = dict(plan, audio='encode')
+    for warning in segment_warnings:
+        log(f"⚠️  {warning}")
+
+    estimate = estimate_intermediate_size(input_video, segments, info)
+    ensure_free_space(os.path.dirname(os.path.abspath(output_video)), estimate)
+    temp_dir = create_scratch_dir(estimate, root=temp_dir,
+                                  prefer_fast=host in (DEFAULT_HOST, 'localhost'))
+
+    coordinator = Coordinator(input_video, segments, temp_dir, mode=mode, volume=volume,
+                              preset=preset, crf=crf, max_attempts=max_attempts,
+                              lease_timeout=lease_timeout, plan=plan, exact_cuts=exact_cuts)
+    try:
+        server = start_server(coordinator, host, port)
+    except OSError:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    bound_host, bound_port = server.server_address[:2]
+    url = f"http://{DEFAULT_HOST if bound_host == '0.0.0.0' else bound_host}:{bound_port}"
+
+    total_duration = sum(end - start for start, end in segments)
+    start_overall = time.time()
+    workers = []
+
+    log(f"\n🛰️  Coordinator đang chạy tại http://{bound_host}:{bound_port}")
+    log(f"📊 Tổng số đoạn cần cắt: {len(segments)} | Worker cục bộ: {local_workers}")
+    if not local_workers:
+        log(f"   Chạy trên các máy render: python distributed.py worker --coordinator http://<máy này>:{bound_port}")
+
+    try:
+        workers = spawn_local_workers(url, local_workers)
+        coordinator.wait(cancel_token)
+
+        cutting_time = time.time() - start_overall
+        log(f"\n✅ Đã cắt xong {len(segments)} đoạn trong {cutting_time:.1f}s")
+        log("🔗 Đang ghép các đoạn lại với nhau...")
+
+        concat_files(coordinator.segment_files(), output_video, temp_dir, cancel_token,
+                     progress_callback=log)
+
+        total_time = time.time() - start_overall
+        log(f"✨ Hoàn thành! Video đã được lưu tại: {output_video}")
+        log(f"   - Tổng thời gian: {total_time:.1f}s")
+        log(f"   - Tốc độ xử lý: {total_duration/total_time:.1f}x realtime\n")
+
+    except (JobCancelledError, KeyboardInterrupt):
+        coordinator.cancel()
+        if os.path.exists(output_video):
+            try:
+                os.remove(output_video)
+            except OSError:
+                pass
+        log("❌ Đã hủy xử lý")
+        raise
+
+    finally:
+        coordinator.cancel()
+        # Cho worker cục bộ thời gian nhận lệnh dừng qua heartbeat rồi mới kết thúc hẳn
+        deadline = time.time() + HEARTBEAT_INTERVAL + 1
+        for process in workers:
+            try:
+                process.wait(max(0.1, deadline - time.time()))
+            except subprocess.TimeoutExpired:
+                terminate_process(process)
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class WorkerClient:
+    """Client của worker để nói chuyện với coordinator"""
+
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, method, path, data=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else None
+        request = urllib.request.Request(self.url + path, data=body, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def status(self) -> dict:
+        return self._request('GET', '/status')
+
+    def lease(self, worker: str) -> dict:
+        return self._request('POST', '/lease', {'worker': worker})
+
+    def heartbeat(self, lease_id: int) -> dict:
+        return self._request('POST', f'/leases/{lease_id}/heartbeat', {})
+
+    def complete(self, lease_id: int, ok: bool, error: Optional[str] = None) -> dict:
+        return self._request('POST', f'/leases/{lease_id}/complete', {'ok': ok, 'error': error})
+
+
+def _map_path(path: str, path_map: Optional[Tuple[str, str]]) -> str:
+    """Đổi tiền tố đường dẫn của coordinator sang đường dẫn mount trên máy worker"""
+    if path_map and path.startswith(path_map[0]):
+        return path_map[1] + path[len(path_map[0]):]
+    return path
+
+
+def run_task(client: WorkerClient, lease_id: int, task: dict,
+             path_map: Optional[Tuple[str, str]] = None) -> bool:
+    """
+    Cắt một đoạn theo task của coordinator, gửi heartbeat trong lúc chạy
+
+    Returns:
+        True nếu cắt thành công
+    """
+    token = CancelToken()
+    stop_heartbeat = threading.Event()
+
+    def heartbeat_loop():
+        while not stop_heartbeat.wait(HEARTBEAT_INTERVAL):
+            try:
+                if client.heartbeat(lease_id).get('cancel'):
+                    token.cancel()
+                    return
+            except urllib.error.HTTPError:
+                # Lease đã bị thu hồi
+                token.cancel()
+                return
+            except OSError:
+                # Coordinator tạm thời không trả lời; lease sẽ tự hết hạn nếu kéo dài
+                pass
+
+    output = _map_path(task['output'], path_map)
+    thread = threading.Thread(target=heartbeat_loop, daemon=True)
+    thread.start()
+    error = None
+    try:
+        # exact: cắt chính xác từng frame, cut_single_segment kiểm tra lại số frame
+        exact = ExactCut.from_dict(task['exact']) if task.get('exact') else None
+        ok = cut_single_segment(_map_path(task['input'], path_map), task['start'], task['end'],
+                                output, task['mode'], task['volume'], token,
+                                task['preset'], task['crf'], task.get('plan'), exact=exact)
+        if not ok:
+            error = "ffmpeg trả về lỗi"
+    except JobCancelledError:
+        ok = False
+        error = "Đã hủy"
+    except Exception as e:
+        ok = False
+        error = str(e)
+    finally:
+        stop_heartbeat.set()
+
+    try:
+        client.complete(lease_id, ok, error)
+    except (OSError, ValueError):
+        pass
+    return ok
+
+
+def run_worker(url: str, name: Optional[str] = None, path_map: Optional[Tuple[str, str]] = None,
+               exit_when_idle: bool = False, poll_interval: float = 1.0):
+    """
+    Vòng lặp worker: nhận task từ coordinator, cắt và báo kết quả
+
+    Args:
+        url: Địa chỉ coordinator
+        name: Tên worker hiển thị trong log của coordinator
+        path_map: (tiền tố trên coordinator, tiền tố trên máy này) nếu ổ dùng chung
+            được mount ở đường dẫn khác
+        exit_when_idle: Thoát khi coordinator xong hoặc không còn kết nối được
+            (dùng cho worker cục bộ); mặc định chờ coordinator tiếp theo
+        poll_interval: Số giây chờ giữa các lần hỏi việc
+    """
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    client = WorkerClient(url)
+    print(f"👷 Worker {name} kết nối tới {url}")
+
+    while True:
+        try:
+            response = client.lease(name)
+        except (OSError, ValueError):
+            if exit_when_idle:
+                return
+            time.sleep(poll_interval * 5)
+            continue
+
+        if response['status'] == 'task':
+            task = response['task']
+            print(f"✂️  [{name}] Đoạn {task['index']}: "
+                  f"{format_duration(task['start'])} → {format_duration(task['end'])}")
+            run_task(client, response['lease'], task, path_map)
+        elif response['status'] == 'finished' and exit_when_idle:
+            return
+        else:
+            time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Render phân tán các đoạn cắt trên nhiều worker')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    coordinate = subparsers.add_parser('coordinate', help='Chạy coordinator (và worker cục bộ)')
+    coordinate.add_argument('-i', '--input', required=True, help='Đường dẫn video đầu vào')
+    coordinate.add_argument('-s', '--segments', required=True, help='Các đoạn cần cắt (format: start-end|start-end|...)')
+    coordinate.add_argument('-o', '--output', required=True, help='Đường dẫn video đầu ra')
+    coordinate.add_argument('-t', '--temp-dir', default=None,
+                            help='Thư mục gốc dùng chung cho các đoạn (mặc định: $VIDEO_CUTTER_SCRATCH '
+                                 'hoặc <tmp>/video_cutter)')
+    coordinate.add_argument('-m', '--mode', default='balanced', choices=['fast', 'balanced', 'accurate'],
+                            help='Chế độ cắt từng đoạn (mặc định: balanced)')
+    coordinate.add_argument('--no-audio', action='store_true', help='Loại bỏ âm thanh')
+    coordinate.add_argument('--local-workers', type=int, default=2,
+                            help='Số worker chạy trên máy này (mặc định: 2, 0 = chỉ dùng máy khác)')
+    coordinate.add_argument('--host', default=DEFAULT_HOST,
+                            help=f'Địa chỉ lắng nghe (mặc định: {DEFAULT_HOST}, dùng 0.0.0.0 cho worker từ xa)')
+    coordinate.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Cổng (mặc định: {DEFAULT_PORT})')
+    coordinate.add_argument('--max-attempts', type=int, default=3, help='Số lần thử tối đa mỗi đoạn')
+
+    worker = subparsers.add_parser('worker', help='Chạy worker nhận task từ coordinator')
+    worker.add_argument('--coordinator', required=True, help='Địa chỉ coordinator (vd: http://render1:8770)')
+    worker.add_argument('--name', default=None, help='Tên worker (mặc định: hostname-pid)')
+    worker.add_argument('--path-map', default=None, metavar='REMOTE=LOCAL',
+                        help='Đổi tiền tố đường dẫn khi ổ dùng chung mount ở chỗ khác (vd: /mnt/share=Z:)')
+    worker.add_argument('--exit-when-idle', action='store_true',
+                        help='Thoát khi coordinator xong thay vì chờ công việc tiếp theo')
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'worker':
+            path_map = tuple(args.path_map.split('=', 1)) if args.path_map else None
+            run_worker(args.coordinator, args.name, path_map, args.exit_when_idle)
+        else:
+            segments = parse_segments(args.segments)
+            if not segments:
+                print("❌ Không có đoạn nào để cắt!")
+                sys.exit(1)
+            render_distributed(
+                args.input,
+                segments,
+                args.output,
+                temp_dir=args.temp_dir,
+                mode=args.mode,
+                volume=0 if args.no_audio else 100,
+                local_workers=args.local_workers,
+                host=args.host,
+                port=args.port,
+                max_attempts=args.max_attempts
+            )
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        print(f"\n❌ Lỗi: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
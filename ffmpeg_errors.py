@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+FFmpeg Errors - Phân loại lỗi ffmpeg và chính sách thử lại
+Mỗi lệnh ffmpeg chỉ giữ phần cuối của stderr (bộ đệm giới hạn). Khi lệnh lỗi,
+phần đó được dùng để phân loại:
+- transient:         lỗi tạm thời (I/O, thiếu bộ nhớ, bị kill) → chạy lại
+- input-corrupt:     dữ liệu đầu vào hỏng → encode lại, bỏ qua gói hỏng
+- codec-unsupported: codec không copy/encode được vào MP4 → encode lại
+- out-of-disk:       hết dung lượng → dừng ngay, không thử lại
+- unknown:           không nhận ra → thử cách khác (nếu có)
+"""
+
+import re
+import time
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from cancellation import CancelToken, run_process
+
+
+TRANSIENT = 'transient'
+INPUT_CORRUPT = 'input-corrupt'
+CODEC_UNSUPPORTED = 'codec-unsupported'
+OUT_OF_DISK = 'out-of-disk'
+UNKNOWN = 'unknown'
+
+# Phần cuối stderr giữ lại cho mỗi tiến trình ffmpeg (ký tự/byte)
+STDERR_TAIL_LIMIT = 64 * 1024
+
+# Số lần chạy lại khi lỗi tạm thời, và thời gian chờ trước lần thử thứ n (nhân n)
+DEFAULT_RETRIES = 2
+RETRY_BACKOFF_SECONDS = 1.0
+
+# Tham số đầu vào để ffmpeg bỏ qua gói/khung hình hỏng thay vì dừng
+TOLERANT_INPUT_ARGS = ['-err_detect', 'ignore_err', '-fflags', '+discardcorrupt']
+
+# Kiểm tra theo thứ tự: hết dung lượng quan trọng nhất (thử lại cũng vô ích)
+_PATTERNS = [
+    (OUT_OF_DISK, re.compile(r'No space left on device|Disk quota exceeded|ENOSPC', re.I)),
+    (CODEC_UNSUPPORTED, re.compile(
+        r'Unknown encoder|Encoder not found|Decoder \(codec .*\) not found|Decoder not found'
+        r'|codec not currently supported in container|Could not find tag for codec'
+        r'|Unsupported codec|not supported by the bitstream filter', re.I)),
+    (INPUT_CORRUPT, re.compile(
+        r'Invalid data found when processing input|moov atom not found|error while decoding'
+        r'|Invalid NAL unit|corrupt (?:input|decoded frame)|Packet corrupt|partial file'
+        r'|Header missing|non monotonically increasing dts', re.I)),
+    (TRANSIENT, re.compile(
+        r'Resource temporarily unavailable|Connection (?:reset|refused|timed out)'
+        r'|Cannot allocate memory|Input/output error|Broken pipe|Device or resource busy'
+        r'|Server returned 5\d\d', re.I)),
+]
+
+
+def _text(stderr) -> str:
+    if isinstance(stderr, bytes):
+        return stderr.decode(errors='replace')
+    return stderr or ""
+
+
+def classify_failure(returncode: int, stderr) -> str:
+    """
+    Phân loại lỗi của một lệnh ffmpeg theo mã thoát và stderr
+
+    Args:
+        returncode: Mã thoát (âm = bị kill bởi tín hiệu, vd: OOM killer)
+        stderr: Phần cuối stderr (str hoặc bytes)
+
+    Returns:
+        Một trong TRANSIENT, INPUT_CORRUPT, CODEC_UNSUPPORTED, OUT_OF_DISK, UNKNOWN
+    """
+    text = _text(stderr)
+    for kind, pattern in _PATTERNS:
+        if pattern.search(text):
+            return kind
+    if returncode < 0:
+        return TRANSIENT
+    return UNKNOWN
+
+
+# Dòng tiến trình của ffmpeg (frame=... size=... time=...), có thể bị cắt mất phần đầu
+_PROGRESS_LINE = re.compile(r'(?:^|\s)(?:frame|fps|size|time|bitrate|speed)=')
+
+
+def last_lines(stderr, count: int = 3) -> str:
+    """Vài dòng cuối có nội dung của stderr (bỏ các dòng tiến trình)"""
+    lines = [line.strip() for line in re.split(r'[\r\n]+', _text(stderr))]
+    lines = [line for line in lines if line and not _PROGRESS_LINE.search(line)]
+    return " | ".join(lines[-count:])
+
+
+class ProcessFailure(RuntimeError):
+    """Lệnh ffmpeg thất bại (kèm loại lỗi và phần cuối stderr)"""
+
+    def __init__(self, cmd, returncode: int, stderr, label: Optional[str] = None):
+        self.cmd = list(cmd)
+        self.returncode = returncode
+        self.stderr = _text(stderr)
+        self.kind = classify_failure(returncode, stderr)
+        self.label = label
+        super().__init__(last_lines(self.stderr) or f"mã thoát {returncode}")
+
+    def __str__(self):
+        prefix = f"{self.label}: " if self.label else ""
+        return f"{prefix}ffmpeg lỗi ({self.kind}): {self.args[0]}"
+
+    def to_dict(self) -> dict:
+        return {
+            'label': self.label,
+            'kind': self.kind,
+            'returncode': self.returncode,
+            'command': " ".join(str(part) for part in self.cmd),
+            'stderr_tail': last_lines(self.stderr, 10),
+        }
+
+
+class JobFailures(RuntimeError):
+    """Nhiều phần của công việc thất bại; liệt kê tất cả thay vì chỉ lỗi đầu tiên"""
+
+    def __init__(self, failures: List[Exception], total: Optional[int] = None):
+        self.failures = list(failures)
+        header = f"{len(self.failures)}"
+        if total:
+            header += f"/{total}"
+        lines = [f"{header} phần thất bại:"]
+        lines.extend(f"  - {failure}" for failure in self.failures)
+        super().__init__("\n".join(lines))
+
+    @property
+    def kinds(self) -> List[str]:
+        return [getattr(failure, 'kind', UNKNOWN) for failure in self.failures]
+
+
+def run_ffmpeg(cmd: List[str], cancel_token: Optional[CancelToken] = None,
+               label: Optional[str] = None, **kwargs):
+    """
+    Chạy ffmpeg chỉ giữ phần cuối stderr; ném ProcessFailure nếu thất bại
+
+    Returns:
+        subprocess.CompletedProcess (stderr là phần cuối đã giữ lại)
+
+    Raises:
+        ProcessFailure: Nếu ffmpeg trả về mã lỗi
+        JobCancelledError: Nếu bị hủy trong khi đang chạy
+    """
+    result = run_process(cmd, cancel_token, stderr_limit=STDERR_TAIL_LIMIT, **kwargs)
+    if result.returncode != 0:
+        stderr = result.stderr
+        if len(stderr) >= STDERR_TAIL_LIMIT:
+            # Dòng đầu của phần giữ lại có thể bị cắt dở
+            newline = '\n' if isinstance(stderr, str) else b'\n'
+            stderr = stderr[stderr.find(newline) + 1:]
+        raise ProcessFailure(cmd, result.returncode, stderr, label)
+    return result
+
+
+# Một cách thực hiện: (tên, hàm chạy, các loại lỗi của cách trước cho phép chuyển sang cách này)
+Strategy = Tuple[str, Callable[[], object], Sequence[str]]
+
+
+def run_with_policy(strategies: List[Strategy], cancel_token: Optional[CancelToken] = None,
+                    retries: int = DEFAULT_RETRIES, backoff: float = RETRY_BACKOFF_SECONDS,
+                    log: Optional[Callable[[str], None]] = None, label: Optional[str] = None):
+    """
+    Chạy theo chính sách thử lại / đổi cách khi lỗi
+
+    - Lỗi tạm thời: chạy lại cùng cách (tối đa retries lần, chờ tăng dần)
+    - Lỗi khác: chuyển sang cách kế tiếp chấp nhận loại lỗi đó
+    - Hết dung lượng, hoặc không còn cách nào: ném lỗi cuối cùng
+
+    Args:
+        strategies: Các cách theo thứ tự ưu tiên (cách đầu luôn được chạy)
+        cancel_token: CancelToken (việc chờ giữa các lần thử dừng ngay khi hủy)
+        retries: Số lần chạy lại khi lỗi tạm thời
+        backoff: Thời gian chờ cơ sở giữa các lần thử (giây)
+        log: Hàm nhận message khi thử lại / đổi cách
+        label: Tên phần việc (cho log và lỗi)
+
+    Returns:
+        Kết quả của cách thành công
+
+    Raises:
+        ProcessFailure: Lỗi cuối cùng nếu mọi cách đều thất bại
+        JobCancelledError: Nếu bị hủy
+    """
+    prefix = f"{label}: " if label else ""
+    position = 0
+    while True:
+        name, run, _ = strategies[position]
+        attempt = 0
+        while True:
+            try:
+                return run()
+            except ProcessFailure as failure:
+                if failure.label is None:
+                    failure.label = label
+                error = failure
+            if error.kind != TRANSIENT or attempt >= retries:
+                break
+            attempt += 1
+            delay = backoff * attempt
+            if log:
+                log(f"🔁 {prefix}lỗi tạm thời, thử lại lần {attempt}/{retries} sau {delay:.0f}s")
+            if cancel_token:
+                cancel_token.wait(delay)
+                cancel_token.raise_if_cancelled()
+            else:
+                time.sleep(delay)
+
+        if error.kind == OUT_OF_DISK:
+            raise error
+        position = next((i for i in range(position + 1, len(strategies))
+                         if error.kind in strategies[i][2]), None)
+        if position is None:
+            raise error
+        if log:
+            log(f"↪️  {prefix}lỗi {error.kind} với cách '{name}', chuyển sang '{strategies[position][0]}'")
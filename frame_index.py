@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Frame Index - Chỉ mục frame/keyframe của stream video để cắt chính xác từng frame
+Thời điểm (pts, theo timebase của stream) của mọi frame và các keyframe:
+- MP4/MOV: đọc thẳng sample table trong moov (mp4_index), không cần tiến trình con
+- Định dạng khác: đọc một lần bằng ffprobe (chỉ đọc gói, không giải mã), cache
+  cạnh thông tin media khác của file đầu vào
+
+Chế độ accurate dùng chỉ mục để cắt theo hai bước:
+1. Seek nhanh phía input tới keyframe ngay trước frame đầu của đoạn
+2. Cắt chính xác phía output bằng filter trim theo pts nguyên (không làm tròn
+   giây kiểu float), và giới hạn đúng số frame của đoạn
+
+Mỗi đoạn độc lập với nhau nên chạy song song được; số frame của file kết quả
+được kiểm tra lại với chỉ mục.
+"""
+
+import os
+import bisect
+import subprocess
+from fractions import Fraction
+from typing import List, Optional, Tuple
+
+from cancellation import AccountedPopen, CancelToken, process_group_kwargs, run_process, terminate_process
+from capabilities import has_tool
+from media_cache import input_cache_dir, read_json, write_json
+from media_info import MediaInfo
+from mp4_index import read_mp4_index
+
+
+# Phiên bản định dạng chỉ mục trong cache
+INDEX_VERSION = 1
+# Đọc thêm bấy nhiêu giây sau cuối đoạn ở phía input (trim cắt chính xác, phần thừa bị bỏ)
+READ_MARGIN_SECONDS = 1.0
+
+
+class FrameCountError(RuntimeError):
+    """File kết quả không có đúng số frame theo chỉ mục"""
+
+
+class ExactCut:
+    """Cách cắt chính xác một đoạn: seek tới keyframe rồi trim theo pts"""
+
+    def __init__(self, seek: Fraction, start_pts: int, end_pts: Optional[int], frames: int,
+                 time_base: Fraction, origin: Fraction, sample_rate: int = 0):
+        """
+        Args:
+            seek: Thời điểm keyframe để seek phía input (giây, tính từ đầu file)
+            start_pts: pts của frame đầu đoạn (theo timebase của stream)
+            end_pts: pts của frame ngay sau đoạn (None = đoạn chạy tới hết video)
+            frames: Số frame của đoạn
+            time_base: Timebase của stream video
+            origin: Thời điểm bắt đầu của file (start_time, giây)
+            sample_rate: Sample rate của stream audio (0 = không biết)
+        """
+        self.seek = seek
+        self.start_pts = start_pts
+        self.end_pts = end_pts
+        self.frames = frames
+        self.time_base = time_base
+        self.origin = origin
+        self.sample_rate = sample_rate
+
+    @property
+    def start(self) -> Fraction:
+        """Thời điểm frame đầu đoạn (giây, tính từ đầu file)"""
+        return self.start_pts * self.time_base - self.origin
+
+    @property
+    def end(self) -> Optional[Fraction]:
+        return None if self.end_pts is None else self.end_pts * self.time_base - self.origin
+
+    def input_args(self) -> List[str]:
+        """Tham số đặt trước -i: seek tới keyframe, chỉ đọc tới hết đoạn (+ một chút)"""
+        args = ['-ss', f"{float(self.seek):.6f}"]
+        if self.end is not None:
+            args.extend(['-t', f"{float(self.end - self.seek) + READ_MARGIN_SECONDS:.6f}"])
+        return args
+
+    def video_filter(self) -> str:
+        """trim theo pts nguyên (input giữ nguyên timestamp nhờ -copyts)"""
+        bounds = f"start_pts={self.start_pts}"
+        if self.end_pts is not None:
+            bounds += f":end_pts={self.end_pts}"
+        return f"trim={bounds},setpts=PTS-STARTPTS"
+
+    def audio_filter(self) -> str:
+        """atrim cùng khoảng thời gian, theo đơn vị mẫu (timebase 1/sample_rate) nếu biết"""
+        start_time = self.start_pts * self.time_base
+        end_time = None if self.end_pts is None else self.end_pts * self.time_base
+        if self.sample_rate:
+            bounds = f"start_pts={round(start_time * self.sample_rate)}"
+            if end_time is not None:
+                bounds += f":end_pts={round(end_time * self.sample_rate)}"
+        else:
+            bounds = f"start={float(start_time):.6f}"
+            if end_time is not None:
+                bounds += f":end={float(end_time):.6f}"
+        return f"atrim={bounds},asetpts=PTS-STARTPTS"
+
+    def to_dict(self) -> dict:
+        """Dạng JSON (vd: gửi cho worker ở máy khác, xem distributed.py)"""
+        return {'seek': str(self.seek), 'start_pts': self.start_pts, 'end_pts': self.end_pts,
+                'frames': self.frames, 'time_base': str(self.time_base), 'origin': str(self.origin),
+                'sample_rate': self.sample_rate}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ExactCut':
+        return cls(Fraction(data['seek']), data['start_pts'], data['end_pts'], data['frames'],
+                   Fraction(data['time_base']), Fraction(data['origin']), data.get('sample_rate', 0))
+
+
+class FrameIndex:
+    """pts (tăng dần) của mọi frame và của các keyframe trong stream video"""
+
+    def __init__(self, pts: List[int], keyframes: List[int], time_base: Fraction,
+                 origin: Fraction = Fraction(0)):
+        self.pts = list(pts)
+        self.keyframes = list(keyframes)
+        self.time_base = time_base
+        self.origin = origin
+
+    def frame_at(self, seconds: float) -> int:
+        """Chỉ số frame đầu tiên hiện từ thời điểm seconds trở đi (len(pts) nếu quá cuối)"""
+        target = (Fraction(str(seconds)) + self.origin) / self.time_base
+        return bisect.bisect_left(self.pts, target)
+
+    def exact_cut(self, start_time: float, end_time: float, sample_rate: int = 0) -> Optional[ExactCut]:
+        """
+        Cách cắt chính xác đoạn [start_time, end_time)
+
+        Returns:
+            ExactCut, hoặc None nếu đoạn không chứa frame nào
+        """
+        first = self.frame_at(start_time)
+        last = self.frame_at(end_time)
+        if last <= first:
+            return None
+        start_pts = self.pts[first]
+        # Keyframe cuối cùng không sau frame đầu đoạn (luôn có nếu video bắt đầu bằng keyframe)
+        position = bisect.bisect_right(self.keyframes, start_pts) - 1
+        keyframe = self.keyframes[position] if position >= 0 else self.pts[0]
+        end_pts = self.pts[last] if last < len(self.pts) else None
+        return ExactCut(keyframe * self.time_base - self.origin, start_pts, end_pts,
+                        last - first, self.time_base, self.origin, sample_rate)
+
+    def exact_cuts(self, segments: List[Tuple[float, float]], sample_rate: int = 0) -> dict:
+        """{(start, end): ExactCut} cho các đoạn có frame"""
+        cuts = {}
+        for segment in segments:
+            cut = self.exact_cut(*segment, sample_rate)
+            if cut is not None:
+                cuts[segment] = cut
+        return cuts
+
+    def to_dict(self) -> dict:
+        return {'version': INDEX_VERSION, 'time_base': str(self.time_base), 'origin': str(self.origin),
+                'pts': self.pts, 'keyframes': self.keyframes}
+
+
+def _index_path(input_video: str) -> str:
+    return os.path.join(input_cache_dir(input_video, "mediainfo"), "frames.json")
+
+
+def load_frame_index(input_video: str) -> Optional[FrameIndex]:
+    """Chỉ mục frame đã có trong cache, None nếu chưa đọc"""
+    data = read_json(_index_path(input_video))
+    if not data or data.get('version') != INDEX_VERSION:
+        return None
+    return FrameIndex(data['pts'], data['keyframes'], Fraction(data['time_base']), Fraction(data['origin']))
+
+
+def container_frame_index(input_video: str, info: Optional[MediaInfo] = None) -> Optional[FrameIndex]:
+    """Chỉ mục frame đọc thẳng từ sample table của MP4/MOV, None nếu không đọc được"""
+    container = read_mp4_index(input_video)
+    video = container.video if container else None
+    if video is None or not video.sample_count:
+        return None
+    keyframes = video.keyframe_pts()
+    if not len(keyframes):
+        return None
+    origin = Fraction(str(info.format.get('start_time') or 0)) if info else Fraction(0)
+    return FrameIndex(sorted(set(video.pts())), keyframes, video.time_base, origin)
+
+
+def build_frame_index(input_video: str, info: Optional[MediaInfo],
+                      cancel_token: Optional[CancelToken] = None,
+                      progress_callback=None) -> Optional[FrameIndex]:
+    """
+    Chỉ mục frame của stream video (đọc một lần, sau đó lấy từ cache)
+
+    Args:
+        input_video: Đường dẫn video
+        info: MediaInfo của video (cần timebase của stream video)
+        cancel_token: CancelToken để hủy giữa chừng
+        progress_callback: Hàm callback để báo tiến trình (nhận message string)
+
+    Returns:
+        FrameIndex, hoặc None nếu không đọc được (thiếu ffprobe, không có video,
+        container không có pts cho từng gói...)
+
+    Raises:
+        JobCancelledError: Nếu bị hủy
+    """
+    index = container_frame_index(input_video, info) or load_frame_index(input_video)
+    if index is not None:
+        return index
+    if info is None or info.time_base is None or not has_tool('ffprobe'):
+        return None
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+           '-show_entries', 'packet=pts,flags', '-of', 'csv=p=0', input_video]
+    process = AccountedPopen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             text=True, errors='replace', **process_group_kwargs())
+    if cancel_token:
+        cancel_token.register_process(process)
+
+    pts = []
+    keyframes = []
+    missing = 0
+    last_report = 0.0
+    time_base = info.time_base
+    try:
+        # Mỗi gói một dòng "PTS,FLAGS" (FLAGS có "K" nếu là keyframe), theo thứ tự giải mã
+        for line in process.stdout:
+            value, _, flags = line.strip().partition(',')
+            try:
+                packet_pts = int(value)
+            except ValueError:
+                missing += 1
+                continue
+            pts.append(packet_pts)
+            if 'K' in flags:
+                keyframes.append(packet_pts)
+            if progress_callback and info.duration:
+                seconds = float(packet_pts * time_base)
+                if seconds - last_report >= 600:
+                    last_report = seconds
+                    progress_callback(f"🎯 Đang đọc chỉ mục frame... {min(100, seconds / info.duration * 100):.0f}%")
+        process.wait()
+    except BaseException:
+        terminate_process(process)
+        raise
+    finally:
+        if cancel_token:
+            cancel_token.unregister_process(process)
+
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+    if process.returncode != 0 or missing or not pts or not keyframes:
+        return None
+
+    origin = Fraction(str(info.format.get('start_time') or 0))
+    index = FrameIndex(sorted(set(pts)), sorted(set(keyframes)), time_base, origin)
+    write_json(_index_path(input_video), index.to_dict())
+    return index
+
+
+def count_video_frames(path: str, cancel_token: Optional[CancelToken] = None) -> Optional[int]:
+    """Số frame video của một file (đếm gói, không giải mã); None nếu không đếm được"""
+    if not has_tool('ffprobe'):
+        return None
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-count_packets',
+           '-show_entries', 'stream=nb_read_packets', '-of', 'csv=p=0', path]
+    result = run_process(cmd, cancel_token, text=True, errors='replace')
+    try:
+        return int(result.stdout.strip().split(',')[0])
+    except ValueError:
+        return None
+
+
+def verify_frame_count(path: str, expected: int, cancel_token: Optional[CancelToken] = None):
+    """
+    Kiểm tra file kết quả có đúng số frame theo chỉ mục
+
+    Raises:
+        FrameCountError: Nếu số frame khác (bỏ qua nếu không đếm được)
+    """
+    frames = count_video_frames(path, cancel_token)
+    if frames is not None and frames != expected:
+        raise FrameCountError(f"{os.path.basename(path)}: có {frames} frame, cần đúng {expected} frame")
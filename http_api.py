@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+HTTP API - Kiểm tra yêu cầu chung cho các API JSON cục bộ (job_service, distributed)
+Trình duyệt cho phép mọi trang web gửi POST "đơn giản" (text/plain, form) tới
+127.0.0.1 mà không cần hỏi CORS, và DNS rebinding cho phép trang web đọc cả
+phản hồi qua một tên miền trỏ về 127.0.0.1. Vì vậy API chỉ nhận:
+- POST có Content-Type application/json (trình duyệt phải hỏi CORS trước khi gửi)
+- Header Host là địa chỉ IP, localhost hoặc tên của máy này (không phải tên miền lạ)
+"""
+
+import socket
+import ipaddress
+from typing import Optional
+
+
+JSON_CONTENT_TYPE = "application/json"
+LOCAL_HOST_NAMES = {"localhost", "localhost.localdomain"}
+
+
+def _host_name(host_header: str) -> str:
+    """Phần tên của header Host (bỏ cổng và ngoặc vuông của IPv6)"""
+    host = host_header.strip().lower()
+    if host.startswith('['):
+        return host[1:host.find(']')] if ']' in host else host[1:]
+    if host.count(':') == 1:
+        host = host.split(':', 1)[0]
+    return host.rstrip('.')
+
+
+def allowed_host(host_header: Optional[str], bound_host: Optional[str] = None) -> bool:
+    """
+    Header Host có được chấp nhận không
+
+    Chấp nhận địa chỉ IP (DNS rebinding cần một tên miền), localhost, tên máy
+    (hostname/FQDN) và địa chỉ server đang lắng nghe.
+
+    Args:
+        host_header: Giá trị header Host (None = client HTTP/1.0 không gửi Host)
+        bound_host: Địa chỉ server đang lắng nghe
+    """
+    if host_header is None:
+        return True
+    host = _host_name(host_header)
+    if not host:
+        return False
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        pass
+    names = set(LOCAL_HOST_NAMES)
+    names.update(name.lower() for name in (socket.gethostname(), socket.getfqdn(), bound_host) if name)
+    return host in names
+
+
+def request_error(handler) -> Optional[tuple]:
+    """
+    Lỗi của yêu cầu (None nếu hợp lệ) cho một BaseHTTPRequestHandler
+
+    Returns:
+        (mã HTTP, thông báo) nếu Host không hợp lệ (403) hoặc POST không phải JSON (415)
+    """
+    if not allowed_host(handler.headers.get('Host'), handler.server.server_address[0]):
+        return 403, f"Host không được phép: {handler.headers.get('Host')}"
+    if handler.command == 'POST' and handler.headers.get_content_type() != JSON_CONTENT_TYPE:
+        return 415, f"Content-Type phải là {JSON_CONTENT_TYPE}"
+    return None
@@ -127,6 +127,33 @@ echo "📥 Downloading tool files..."
 # List of files to download
 FILES=(
     "video_cutter.py"
+    "cancellation.py"
+    "capabilities.py"
+    "job_queue.py"
+    "media_cache.py"
+    "media_info.py"
+    "scratch.py"
+    "journal.py"
+    "renditions.py"
+    "silence.py"
+    "scenes.py"
+    "loudness.py"
+    "segment_sources.py"
+    "segment_plan.py"
+    "montage.py"
+    "streaming.py"
+    "metrics.py"
+    "tracing.py"
+    "ffmpeg_errors.py"
+    "frame_index.py"
+    "mp4_index.py"
+    "thumbnails.py"
+    "proxy.py"
+    "http_api.py"
+    "job_service.py"
+    "video_cutter_async.py"
+    "watch_folder.py"
+    "distributed.py"
     "youtube_downloader.py"
     "rclone_uploader.py"
     "video_cutter_interactive.py"
@@ -152,7 +179,6 @@ done
 
 # Create directories
 mkdir -p downloads
-mkdir -p temp_segments
 
 echo ""
 print_green "Installation complete!"
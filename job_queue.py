@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Job Queue - Hàng đợi nhiều công việc chạy nền
+Các công việc (cắt, ghép audio, upload...) được chia thành nhiều bước (stage).
+Mỗi bước chạy trên một nhóm tài nguyên dùng chung:
+    - 'encode': bước nặng CPU (cắt, ghép audio), giới hạn bởi CPU budget
+    - 'network': bước mạng (tải xuống, upload)
+Nhờ vậy các bước của nhiều công việc chạy chồng lên nhau, ví dụ công việc 1
+đang upload trong khi công việc 2 đang encode.
+"""
+
+import os
+import itertools
+import threading
+import time
+from typing import Callable, List, Optional
+
+from cancellation import CancelToken, JobCancelledError
+from metrics import JobMetrics
+
+
+# Trạng thái công việc
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)
+
+# Nhóm tài nguyên
+RESOURCE_ENCODE = "encode"
+RESOURCE_NETWORK = "network"
+
+
+class JobStage:
+    """Một bước của công việc"""
+
+    def __init__(self, name: str, resource: str, func: Callable):
+        """
+        Args:
+            name: Tên bước (vd: "cut", "mix", "upload")
+            resource: Nhóm tài nguyên ('encode' hoặc 'network')
+            func: Hàm func(job) thực hiện bước này. Có thể đọc/ghi job.context
+                để truyền kết quả cho bước sau và gọi job.report(message)
+        """
+        self.name = name
+        self.resource = resource
+        self.func = func
+
+
+class Job:
+    """Một công việc trong hàng đợi"""
+
+    def __init__(self, name: str, stages: List[JobStage], priority: int = 0, context: Optional[dict] = None):
+        """
+        Args:
+            name: Tên hiển thị
+            stages: Danh sách các bước, chạy tuần tự
+            priority: Độ ưu tiên (số lớn hơn chạy trước)
+            context: Dữ liệu dùng chung giữa các bước
+        """
+        self.id = None
+        self.name = name
+        self.stages = stages
+        self.priority = priority
+        self.context = context or {}
+        self.position = 0
+        self.stage_index = 0
+        self.status = STATUS_QUEUED
+        self.progress = ""
+        self.error = None
+        self.cpu_share = 1
+        self.cancel_token = CancelToken()
+        # Số liệu từng bước (thời gian chờ, CPU/RSS của ffmpeg...), ghi ra báo cáo khi xong
+        self.metrics = JobMetrics(name).attach(self.cancel_token)
+        self.created_at = time.time()
+        self.finished_at = None
+        self.enqueued_at = None
+        self._queue = None
+
+    @property
+    def current_stage(self) -> Optional[JobStage]:
+        """Bước đang chờ/đang chạy (None nếu đã xong)"""
+        if self.stage_index < len(self.stages):
+            return self.stages[self.stage_index]
+        return None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def report(self, message: str):
+        """Cập nhật tiến trình của công việc"""
+        self.progress = message
+        if self._queue:
+            self._queue._notify(self)
+
+
+class JobQueue:
+    """
+    Hàng đợi công việc với worker và CPU budget dùng chung
+
+    Mỗi nhóm tài nguyên có số slot cố định. Khi một slot rảnh, bước đang chờ
+    có độ ưu tiên cao nhất (rồi đến vị trí trong hàng đợi) được chạy.
+    """
+
+    def __init__(self, encode_slots: int = 2, network_slots: int = 2,
+                 cpu_budget: Optional[int] = None, listener: Optional[Callable] = None,
+                 tracer=None):
+        """
+        Args:
+            encode_slots: Số bước 'encode' chạy đồng thời
+            network_slots: Số bước 'network' chạy đồng thời
+            cpu_budget: Tổng số luồng CPU cho các bước encode (None = số CPU). Chia đều
+                cho các slot encode; mỗi công việc giới hạn số ffmpeg song song
+                và số luồng encoder của chúng theo phần của mình (cpu_share)
+            listener: Hàm listener(job) được gọi mỗi khi công việc thay đổi
+                (gọi từ luồng worker)
+            tracer: Tracer (tracing.py) ghi timeline các bước của mọi công việc
+        """
+        self.cpu_budget = cpu_budget or os.cpu_count() or 4
+        self.slots = {RESOURCE_ENCODE: encode_slots, RESOURCE_NETWORK: network_slots}
+        self.listener = listener
+        self.tracer = tracer
+        self.jobs = []
+        self._ids = itertools.count(1)
+        self._positions = itertools.count()
+        self._ready = {resource: [] for resource in self.slots}
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._threads = []
+
+        for resource, count in self.slots.items():
+            for slot in range(count):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(resource,),
+                    name=f"job-{resource}-{slot + 1}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    @property
+    def cpu_share(self) -> int:
+        """Số luồng CPU dành cho mỗi bước encode (số ffmpeg × số luồng encoder)"""
+        return max(1, self.cpu_budget // self.slots[RESOURCE_ENCODE])
+
+    def submit(self, job: Job) -> int:
+        """Thêm công việc vào hàng đợi, trả về ID công việc (giữ ID nếu đã được gán trước)"""
+        with self._condition:
+            if job.id is None:
+                job.id = next(self._ids)
+            job.position = next(self._positions)
+            job.cpu_share = self.cpu_share
+            job._queue = self
+            if self.tracer:
+                job.metrics.tracer = self.tracer
+            self.jobs.append(job)
+            self._enqueue_stage(job)
+        self._notify(job)
+        return job.id
+
+    def get(self, job_id: int) -> Optional[Job]:
+        """Tìm công việc theo ID"""
+        with self._condition:
+            for job in self.jobs:
+                if job.id == job_id:
+                    return job
+        return None
+
+    def active_jobs(self) -> List[Job]:
+        """Các công việc chưa kết thúc"""
+        with self._condition:
+            return [job for job in self.jobs if not job.finished]
+
+    def cancel(self, job_id: int):
+        """Hủy một công việc (đang chờ hoặc đang chạy)"""
+        job = self.get(job_id)
+        if not job or job.finished:
+            return
+
+        job.cancel_token.cancel()
+        with self._condition:
+            waiting = self._remove_ready(job)
+            if waiting:
+                # Không có bước nào đang chạy: kết thúc ngay
+                job.cancel_token.cleanup()
+                self._finish(job, STATUS_CANCELLED)
+        if waiting:
+            self._write_metrics(job)
+        self._notify(job)
+
+    def cancel_all(self):
+        """Hủy tất cả công việc chưa kết thúc"""
+        for job in self.active_jobs():
+            self.cancel(job.id)
+
+    def set_priority(self, job_id: int, priority: int):
+        """Đổi độ ưu tiên của công việc"""
+        job = self.get(job_id)
+        if job:
+            with self._condition:
+                job.priority = priority
+            self._notify(job)
+
+    def move(self, job_id: int, offset: int):
+        """
+        Đổi vị trí công việc trong hàng đợi
+
+        Args:
+            job_id: ID công việc
+            offset: -1 = lên trước, 1 = xuống sau
+        """
+        with self._condition:
+            pending = sorted((job for job in self.jobs if not job.finished), key=lambda j: j.position)
+            index = next((i for i, job in enumerate(pending) if job.id == job_id), None)
+            if index is None:
+                return
+            other = index + offset
+            if not 0 <= other < len(pending):
+                return
+            job, neighbour = pending[index], pending[other]
+            job.position, neighbour.position = neighbour.position, job.position
+        self._notify(job)
+
+    def clear_finished(self):
+        """Xóa các công việc đã kết thúc khỏi danh sách"""
+        with self._condition:
+            self.jobs = [job for job in self.jobs if not job.finished]
+        self._notify(None)
+
+    def shutdown(self):
+        """Hủy mọi công việc và dừng các worker"""
+        self.cancel_all()
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    # ===== INTERNAL =====
+
+    def _notify(self, job):
+        if self.listener:
+            try:
+                self.listener(job)
+            except Exception as e:
+                print(f"⚠️  Job listener error: {e}")
+
+    def _enqueue_stage(self, job: Job):
+        """Đưa bước hiện tại của công việc vào hàng chờ của nhóm tài nguyên (cần giữ lock)"""
+        stage = job.current_stage
+        job.enqueued_at = time.monotonic()
+        self._ready[stage.resource].append(job)
+        self._condition.notify_all()
+
+    def _remove_ready(self, job: Job) -> bool:
+        """Bỏ công việc khỏi hàng chờ (cần giữ lock). Trả về True nếu đang chờ"""
+        for ready in self._ready.values():
+            if job in ready:
+                ready.remove(job)
+                return True
+        return False
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None):
+        """Đánh dấu công việc kết thúc (cần giữ lock)"""
+        job.status = status
+        job.error = error
+        job.finished_at = time.time()
+        job.metrics.finish(status)
+
+    def _write_metrics(self, job: Job):
+        """Ghi báo cáo số liệu của công việc đã kết thúc (không cần giữ lock)"""
+        try:
+            job.metrics.write_reports()
+        except Exception as e:
+            print(f"⚠️  Không thể ghi báo cáo số liệu: {e}")
+
+    def _next_ready(self, resource: str) -> Optional[Job]:
+        """Lấy công việc có độ ưu tiên cao nhất cho nhóm tài nguyên (cần giữ lock)"""
+        ready = self._ready[resource]
+        if not ready:
+            return None
+        job = min(ready, key=lambda j: (-j.priority, j.position))
+        ready.remove(job)
+        return job
+
+    def _worker(self, resource: str):
+        while True:
+            with self._condition:
+                job = self._next_ready(resource)
+                while job is None and not self._stopped:
+                    self._condition.wait()
+                    job = self._next_ready(resource)
+                if self._stopped:
+                    return
+                job.status = STATUS_RUNNING
+
+            stage = job.current_stage
+            queue_wait = time.monotonic() - job.enqueued_at
+            job.report(f"▶️ {stage.name}...")
+
+            status = None
+            error = None
+            try:
+                job.cancel_token.raise_if_cancelled()
+                with job.metrics.stage(stage.name, queue_wait):
+                    stage.func(job)
+                job.cancel_token.raise_if_cancelled()
+            except JobCancelledError:
+                status = STATUS_CANCELLED
+            except Exception as e:
+                status = STATUS_FAILED
+                error = str(e)
+
+            with self._condition:
+                if status is None:
+                    job.stage_index += 1
+                    if job.current_stage is None:
+                        self._finish(job, STATUS_DONE)
+                    else:
+                        job.status = STATUS_QUEUED
+                        self._enqueue_stage(job)
+                else:
+                    if status == STATUS_CANCELLED:
+                        job.cancel_token.cleanup()
+                    self._finish(job, status, error)
+
+            if job.finished:
+                self._write_metrics(job)
+            self._notify(job)
@@ -0,0 +1,513 @@
+#!/usr/bin/env python3
+"""
+Job Service - Dịch vụ xử lý video chạy nền với API HTTP cục bộ
+Nhận các công việc cắt, ghép audio, tải YouTube và upload qua HTTP, lưu hàng
+đợi ra đĩa (tiếp tục sau khi khởi động lại) và chạy chúng trên một JobQueue
+dùng chung có giới hạn tài nguyên. GUI/CLI có thể gửi công việc vào đây thay
+vì tự chạy engine riêng.
+
+API (JSON):
+    GET  /health                → {"status": "ok", ...}
+    GET  /jobs                  → danh sách công việc
+    POST /jobs                  → tạo công việc, body: {"type": ..., "params": {...}, "priority": 0}
+    GET  /jobs/<id>             → trạng thái và tiến trình của một công việc
+    POST /jobs/<id>/cancel      → hủy công việc
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from http_api import request_error
+from job_queue import (
+    Job, JobQueue, JobStage, RESOURCE_ENCODE, RESOURCE_NETWORK,
+    STATUS_QUEUED, STATUS_RUNNING, FINISHED_STATUSES
+)
+from media_cache import read_json, write_json
+from media_info import check_segments, probe_media
+from video_cutter import parse_segments, cut_video_segments, add_audio_to_video
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_STATE_FILE = "job_service_state.json"
+
+JOB_TYPES = ('cut', 'mix', 'download', 'upload')
+
+
+class JobService:
+    """Quản lý công việc của dịch vụ: tạo, lưu trạng thái, khôi phục sau khi khởi động lại"""
+
+    def __init__(self, state_file: str = DEFAULT_STATE_FILE, encode_slots: int = 2,
+                 network_slots: int = 2, cpu_budget: Optional[int] = None,
+                 rclone_config: Optional[str] = None, temp_root: Optional[str] = None):
+        """
+        Args:
+            state_file: File JSON lưu hàng đợi
+            encode_slots: Số bước encode chạy đồng thời
+            network_slots: Số bước tải/upload chạy đồng thời
+            cpu_budget: Tổng số luồng CPU cho các bước encode (None = số CPU)
+            rclone_config: Đường dẫn rclone.conf cho công việc upload
+            temp_root: Thư mục gốc chứa thư mục tạm của từng công việc
+                (None = $VIDEO_CUTTER_SCRATCH hoặc <tmp>/video_cutter)
+        """
+        self.state_file = state_file
+        self.rclone_config = rclone_config
+        self.temp_root = temp_root
+        self.records = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._next_id = 1
+        self._saved_status = {}
+        self._stopping = False
+        self.queue = JobQueue(encode_slots=encode_slots, network_slots=network_slots,
+                              cpu_budget=cpu_budget, listener=self._on_job_changed)
+        self._restore()
+
+    # ===== PUBLIC API =====
+
+    def submit(self, job_type: str, params: dict, priority: int = 0) -> dict:
+        """
+        Tạo công việc mới
+
+        Args:
+            job_type: 'cut', 'mix', 'download' hoặc 'upload'
+            params: Tham số của công việc (xem _build_stages)
+            priority: Độ ưu tiên (số lớn hơn chạy trước)
+
+        Returns:
+            Bản ghi công việc
+
+        Raises:
+            ValueError: Nếu loại công việc hoặc tham số không hợp lệ
+        """
+        if job_type not in JOB_TYPES:
+            raise ValueError(f"Loại công việc không hợp lệ: {job_type}")
+        if not isinstance(params, dict):
+            raise ValueError("Tham số (params) phải là một object JSON")
+
+        # Kiểm tra tham số ngay để báo lỗi cho client thay vì lỗi khi chạy
+        stages = self._build_stages(job_type, params)
+
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+            record = {
+                'id': job_id,
+                'type': job_type,
+                'params': params,
+                'priority': priority,
+                'status': STATUS_QUEUED,
+                'created_at': time.time(),
+            }
+            self.records[job_id] = record
+
+        self._enqueue(record, stages)
+        self._save()
+        return self.describe(job_id)
+
+    def describe(self, job_id: int) -> Optional[dict]:
+        """Trạng thái hiện tại của công việc (None nếu không tồn tại)"""
+        with self._lock:
+            record = self.records.get(job_id)
+            if record is None:
+                return None
+            record = dict(record)
+
+        job = self.queue.get(job_id)
+        if job:
+            stage = job.current_stage
+            record.update({
+                'status': job.status,
+                'priority': job.priority,
+                'stage': stage.name if stage else None,
+                'stage_index': job.stage_index,
+                'stage_count': len(job.stages),
+                'progress': job.progress,
+                'error': job.error,
+                'result': job.context.get('result'),
+                'finished_at': job.finished_at,
+            })
+        return record
+
+    def list_jobs(self) -> list:
+        """Danh sách tất cả công việc theo thứ tự tạo"""
+        with self._lock:
+            job_ids = sorted(self.records)
+        return [self.describe(job_id) for job_id in job_ids]
+
+    def cancel(self, job_id: int) -> bool:
+        """Hủy công việc, trả về False nếu không tồn tại"""
+        if job_id not in self.records:
+            return False
+        self.queue.cancel(job_id)
+        return True
+
+    def shutdown(self):
+        """Dừng dịch vụ; công việc đang chạy sẽ được chạy lại ở lần khởi động sau"""
+        self._save()
+        # Không ghi trạng thái 'cancelled' do shutdown gây ra
+        self._stopping = True
+        self.queue.shutdown()
+
+    # ===== JOB BUILDING =====
+
+    def _build_stages(self, job_type: str, params: dict) -> list:
+        """
+        Tạo danh sách bước cho công việc
+
+        Tham số:
+            cut:      input, segments, output, [mode, volume, audio, audio_volume,
+                      remote, remote_path]  (audio → thêm bước mix, remote → thêm bước upload)
+            mix:      video, audio, output, [audio_volume]
+            download: url, [directory, filename]
+            upload:   file, [remote, remote_path]
+        """
+        def require(*keys):
+            missing = [key for key in keys if not params.get(key)]
+            if missing:
+                raise ValueError(f"Thiếu tham số: {', '.join(missing)}")
+
+        if job_type == 'cut':
+            require('input', 'segments', 'output')
+            # Từ chối ngay các đoạn nằm ngoài video (nếu dịch vụ đọc được file)
+            check_segments(parse_segments(params['segments']), probe_media(params['input']))
+            stages = [JobStage("✂️ Cắt video", RESOURCE_ENCODE, self._stage_cut)]
+            if params.get('audio'):
+                stages.append(JobStage("🎵 Thêm audio", RESOURCE_ENCODE, self._stage_mix))
+            if params.get('remote'):
+                stages.append(JobStage("📤 Upload", RESOURCE_NETWORK, self._stage_upload))
+            return stages
+
+        if job_type == 'mix':
+            require('video', 'audio', 'output')
+            return [JobStage("🎵 Thêm audio", RESOURCE_ENCODE, self._stage_mix)]
+
+        if job_type == 'download':
+            require('url')
+            return [JobStage("📥 Tải xuống", RESOURCE_NETWORK, self._stage_download)]
+
+        require('file')
+        return [JobStage("📤 Upload", RESOURCE_NETWORK, self._stage_upload)]
+
+    def _enqueue(self, record: dict, stages: list):
+        job = Job(f"{record['type']} #{record['id']}", stages, priority=record['priority'],
+                  context={'params': record['params'], 'type': record['type']})
+        job.id = record['id']
+        self.queue.submit(job)
+
+    def _stage_cut(self, job):
+        params = job.context['params']
+        output = params['output']
+
+        # Có bước mix phía sau: cắt ra file tạm trước
+        if params.get('audio'):
+            root, ext = os.path.splitext(output)
+            cut_output = f"{root}_temp{ext}"
+            job.cancel_token.add_cleanup_path(cut_output)
+        else:
+            cut_output = output
+
+        cut_video_segments(
+            input_video=params['input'],
+            segments=parse_segments(params['segments']),
+            output_video=cut_output,
+            temp_dir=self.temp_root,
+            mode=params.get('mode', 'balanced'),
+            cpu_threads=job.cpu_share,
+            volume=int(params.get('volume', 100)),
+            progress_callback=job.report,
+            cancel_token=job.cancel_token
+        )
+        job.context['cut_output'] = cut_output
+        job.context['result'] = output
+
+    def _stage_mix(self, job):
+        params = job.context['params']
+        if job.context['type'] == 'mix':
+            video, output = params['video'], params['output']
+        else:
+            video, output = job.context['cut_output'], params['output']
+
+        job.report("🎵 Đang thêm audio vào video...")
+        add_audio_to_video(video, params['audio'], int(params.get('audio_volume', 100)), output,
+                           job.cancel_token)
+        if video != params.get('video') and os.path.exists(video):
+            os.remove(video)
+        job.context['result'] = output
+
+    def _stage_download(self, job):
+        from youtube_downloader import YouTubeDownloader
+
+        params = job.context['params']
+        downloader = YouTubeDownloader(output_path=params.get('directory', 'downloads'))
+        success, file_path = downloader.download_video(
+            params['url'], params.get('filename'),
+            progress_callback=job.report, cancel_token=job.cancel_token
+        )
+        if not success:
+            raise RuntimeError("Tải xuống thất bại")
+        job.context['result'] = file_path
+
+    def _stage_upload(self, job):
+        from rclone_uploader import RcloneUploader
+
+        if not self.rclone_config:
+            raise RuntimeError("Dịch vụ chưa được cấu hình rclone (--rclone-config)")
+
+        params = job.context['params']
+        file_path = params.get('file') or job.context.get('result')
+        with open(self.rclone_config, 'r') as f:
+            uploader = RcloneUploader(f.read())
+
+        try:
+            remote = params.get('remote')
+            if not remote or remote is True:
+                remotes = uploader.list_remotes()
+                if not remotes:
+                    raise RuntimeError("Không tìm thấy remote trong config")
+                remote = remotes[0]
+
+            success = uploader.upload_file(file_path, remote, params.get('remote_path', ''),
+                                           progress_callback=job.report,
+                                           cancel_token=job.cancel_token)
+            if not success:
+                raise RuntimeError("Upload thất bại")
+        finally:
+            uploader.cleanup()
+        job.context['result'] = file_path
+
+    # ===== PERSISTENCE =====
+
+    def _on_job_changed(self, job):
+        """Chỉ lưu ra đĩa khi trạng thái/bước thay đổi (không lưu mỗi dòng tiến trình)"""
+        if job is None or self._stopping:
+            return
+        key = (job.status, job.stage_index, job.priority)
+        if self._saved_status.get(job.id) != key:
+            self._saved_status[job.id] = key
+            self._save()
+
+    def _save(self):
+        with self._lock:
+            records = [dict(record) for record in self.records.values()]
+            next_id = self._next_id
+
+        for record in records:
+            job = self.queue.get(record['id'])
+            if job:
+                record.update({
+                    'status': job.status,
+                    'priority': job.priority,
+                    'error': job.error,
+                    'result': job.context.get('result'),
+                    'finished_at': job.finished_at,
+                })
+
+        with self._save_lock:
+            write_json(self.state_file, {'next_id': next_id, 'jobs': records})
+
+    def _restore(self):
+        """Nạp hàng đợi đã lưu; công việc chưa xong được chạy lại từ đầu"""
+        state = read_json(self.state_file)
+        if not state:
+            return
+
+        self._next_id = state.get('next_id', 1)
+        for record in state.get('jobs', []):
+            self.records[record['id']] = record
+            if record.get('status') in FINISHED_STATUSES:
+                continue
+            try:
+                stages = self._build_stages(record['type'], record['params'])
+            except ValueError as e:
+                record['status'] = 'failed'
+                record['error'] = str(e)
+                continue
+            record['status'] = STATUS_QUEUED
+            self._enqueue(record, stages)
+            print(f"🔁 Khôi phục công việc #{record['id']} ({record['type']})")
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler cho API JSON của dịch vụ"""
+
+    service = None  # Gán bởi serve()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode('utf-8'))
+
+    def _job_id(self, part):
+        try:
+            return int(part)
+        except ValueError:
+            return None
+
+    def do_GET(self):
+        error = request_error(self)
+        if error:
+            self._send_json(error[0], {'error': error[1]})
+            return
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+
+        if parts == ['health']:
+            active = self.service.queue.active_jobs()
+            self._send_json(200, {
+                'status': 'ok',
+                'active_jobs': len(active),
+                'running_jobs': sum(1 for job in active if job.status == STATUS_RUNNING),
+                'cpu_budget': self.service.queue.cpu_budget,
+                'slots': self.service.queue.slots,
+            })
+        elif parts == ['jobs']:
+            self._send_json(200, {'jobs': self.service.list_jobs()})
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            record = self.service.describe(self._job_id(parts[1]))
+            if record is None:
+                self._send_json(404, {'error': 'Không tìm thấy công việc'})
+            else:
+                self._send_json(200, record)
+        else:
+            self._send_json(404, {'error': 'Không tìm thấy'})
+
+    def do_POST(self):
+        error = request_error(self)
+        if error:
+            self._send_json(error[0], {'error': error[1]})
+            return
+        parts = [part for part in self.path.split('?')[0].split('/') if part]
+
+        try:
+            if parts == ['jobs']:
+                data = self._read_json()
+                if not isinstance(data, dict):
+                    raise ValueError("Nội dung yêu cầu phải là một object JSON")
+                record = self.service.submit(data.get('type'), data.get('params') or {},
+                                             int(data.get('priority', 0)))
+                self._send_json(201, record)
+            elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+                if self.service.cancel(self._job_id(parts[1])):
+                    self._send_json(200, self.service.describe(self._job_id(parts[1])))
+                else:
+                    self._send_json(404, {'error': 'Không tìm thấy công việc'})
+            else:
+                self._send_json(404, {'error': 'Không tìm thấy'})
+        except ValueError as e:
+            self._send_json(400, {'error': str(e)})
+        except (TypeError, AttributeError, KeyError) as e:
+            # Tham số sai kiểu (vd: segments không phải chuỗi): lỗi của client, không làm rớt kết nối
+            self._send_json(400, {'error': f"Tham số không hợp lệ: {e}"})
+
+
+def serve(service: JobService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """Chạy HTTP server cho đến khi bị dừng (Ctrl+C)"""
+    handler = type('RequestHandler', (_RequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"🛰️  Job service đang chạy tại http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Đang dừng job service...")
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+class ServiceClient:
+    """Client gửi công việc tới job service"""
+
+    def __init__(self, url: str = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout: float = 10):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def _request(self, method, path, data=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else None
+        request = urllib.request.Request(self.url + path, data=body, method=method,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read().decode('utf-8')).get('error', str(e))
+            except ValueError:
+                message = str(e)
+            raise RuntimeError(f"Job service: {message}") from None
+
+    def health(self) -> dict:
+        return self._request('GET', '/health')
+
+    def submit(self, job_type: str, params: dict, priority: int = 0) -> dict:
+        return self._request('POST', '/jobs', {'type': job_type, 'params': params, 'priority': priority})
+
+    def get(self, job_id: int) -> dict:
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def list_jobs(self) -> list:
+        return self._request('GET', '/jobs')['jobs']
+
+    def cancel(self, job_id: int) -> dict:
+        return self._request('POST', f'/jobs/{job_id}/cancel')
+
+    def wait(self, job_id: int, progress_callback=None, poll_interval: float = 1.0) -> dict:
+        """Chờ công việc kết thúc, gọi progress_callback khi tiến trình thay đổi"""
+        last_progress = None
+        while True:
+            record = self.get(job_id)
+            progress = record.get('progress')
+            if progress_callback and progress and progress != last_progress:
+                progress_callback(progress)
+                last_progress = progress
+            if record['status'] in FINISHED_STATUSES:
+                return record
+            time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Job service - dịch vụ xử lý video chạy nền')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'Địa chỉ lắng nghe (mặc định: {DEFAULT_HOST})')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Cổng (mặc định: {DEFAULT_PORT})')
+    parser.add_argument('--state', default=DEFAULT_STATE_FILE,
+                        help=f'File lưu hàng đợi (mặc định: {DEFAULT_STATE_FILE})')
+    parser.add_argument('--encode-slots', type=int, default=2, help='Số bước encode chạy đồng thời')
+    parser.add_argument('--network-slots', type=int, default=2, help='Số bước tải/upload chạy đồng thời')
+    parser.add_argument('--cpu-budget', type=int, default=None, help='Tổng số luồng CPU cho các bước encode, chia cho các slot encode (mặc định: số CPU)')
+    parser.add_argument('--rclone-config', default=None, help='Đường dẫn rclone.conf cho công việc upload')
+    parser.add_argument('--scratch', default=None,
+                        help='Thư mục gốc cho file tạm (mặc định: $VIDEO_CUTTER_SCRATCH hoặc <tmp>/video_cutter)')
+
+    args = parser.parse_args()
+
+    service = JobService(
+        state_file=args.state,
+        encode_slots=args.encode_slots,
+        network_slots=args.network_slots,
+        cpu_budget=args.cpu_budget,
+        rclone_config=args.rclone_config,
+        temp_root=args.scratch
+    )
+    serve(service, args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Journal - Nhật ký công việc để tiếp tục (resume) sau khi lỗi hoặc bị dừng
+Ghi lại từng đoạn đã cắt xong, file ghép, file đã thêm audio và lần upload cùng
+checksum của chúng. Khi chạy lại với resume, các bước còn nguyên vẹn (checksum
+khớp) được bỏ qua và công việc tiếp tục từ bước tốt cuối cùng.
+
+Nhật ký nằm trong cache (thư mục "journals"), khóa theo tham số công việc:
+cùng video đầu vào (đường dẫn + kích thước + mtime), cùng đoạn cắt, chế độ,
+âm lượng... và cùng file đầu ra thì dùng chung một nhật ký.
+"""
+
+import os
+import glob
+import json
+import time
+import shutil
+import hashlib
+import threading
+from typing import Optional
+
+from media_cache import get_cache_root, input_cache_key, read_json, write_json
+
+
+# Nhật ký không được cập nhật lâu hơn thời gian này bị xóa (kèm file tạm của nó)
+JOURNAL_MAX_AGE = 7 * 24 * 3600
+
+CHECKSUM_CHUNK = 1024 * 1024
+
+
+def file_checksum(path: str) -> str:
+    """Checksum BLAKE2b (128 bit) của toàn bộ file"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _journals_dir() -> str:
+    return os.path.join(get_cache_root(), "journals")
+
+
+def journal_key(params: dict) -> str:
+    """
+    Khóa nhật ký từ tham số công việc
+
+    Args:
+        params: Tham số xác định công việc; "input" (nếu có) được thay bằng khóa
+            cache của file để video bị sửa thì không dùng lại kết quả cũ
+    """
+    params = dict(params)
+    if params.get('input') and os.path.exists(params['input']):
+        params['input'] = input_cache_key(params['input'])
+    raw = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+class JobJournal:
+    """Nhật ký checkpoint của một công việc"""
+
+    def __init__(self, path: str, key: str, data: Optional[dict] = None):
+        self.path = path
+        self.key = key
+        self.data = data or {'key': key, 'created': time.time(), 'scratch_dir': None,
+                             'segments': {}, 'stages': {}}
+        self._lock = threading.Lock()
+
+    # ===== MỞ / TÌM =====
+
+    @classmethod
+    def open(cls, params: dict, resume: bool = False) -> 'JobJournal':
+        """
+        Mở nhật ký cho công việc
+
+        Args:
+            params: Tham số xác định công việc (xem journal_key)
+            resume: True = tiếp tục từ nhật ký cũ nếu có; False = bỏ nhật ký cũ
+                (và file tạm của nó) rồi bắt đầu lại
+
+        Returns:
+            JobJournal
+        """
+        prune_journals()
+        key = journal_key(params)
+        path = os.path.join(_journals_dir(), f"{key}.json")
+        data = read_json(path)
+
+        if data and resume:
+            return cls(path, key, data)
+
+        if data:
+            cls(path, key, data).discard()
+        journal = cls(path, key)
+        journal.data['params'] = params
+        journal.save()
+        return journal
+
+    @classmethod
+    def find(cls, params: dict) -> Optional['JobJournal']:
+        """Nhật ký dở dang của công việc (nếu có tiến trình để tiếp tục)"""
+        key = journal_key(params)
+        path = os.path.join(_journals_dir(), f"{key}.json")
+        data = read_json(path)
+        if not data:
+            return None
+        journal = cls(path, key, data)
+        return journal if journal.has_progress else None
+
+    # ===== TRẠNG THÁI =====
+
+    @property
+    def has_progress(self) -> bool:
+        """Đã có bước nào hoàn thành chưa"""
+        return bool(self.data['segments'] or self.data['stages'])
+
+    @property
+    def scratch_dir(self) -> Optional[str]:
+        """Thư mục tạm của lần chạy trước (nếu vẫn còn)"""
+        directory = self.data.get('scratch_dir')
+        return directory if directory and os.path.isdir(directory) else None
+
+    def set_scratch_dir(self, directory: Optional[str]):
+        with self._lock:
+            self.data['scratch_dir'] = directory
+            self._save_locked()
+
+    def segment_done(self, index: int, path: str) -> bool:
+        """Đoạn index đã cắt xong và file vẫn nguyên vẹn"""
+        entry = self.data['segments'].get(str(index))
+        return bool(entry) and entry['path'] == path and _verify(entry)
+
+    def record_segment(self, index: int, path: str):
+        """Ghi nhận đoạn index đã cắt xong"""
+        entry = _describe(path)
+        with self._lock:
+            self.data['segments'][str(index)] = entry
+            self._save_locked()
+
+    def stage_done(self, name: str, path: Optional[str] = None, **expected) -> Optional[dict]:
+        """
+        Bước name đã hoàn thành (và file kết quả vẫn nguyên vẹn)
+
+        Args:
+            name: Tên bước ("concat", "mix", "upload"...)
+            path: File kết quả phải trùng với lần trước (None = không kiểm tra file)
+            expected: Các giá trị khác phải trùng (vd: destination của upload)
+
+        Returns:
+            Bản ghi của bước, hoặc None nếu phải chạy lại
+        """
+        entry = self.data['stages'].get(name)
+        if not entry:
+            return None
+        if path is not None and (entry.get('path') != path or not _verify(entry)):
+            return None
+        if any(entry.get(key) != value for key, value in expected.items()):
+            return None
+        return entry
+
+    def record_stage(self, name: str, path: Optional[str] = None, **extra):
+        """Ghi nhận bước name đã hoàn thành (kèm checksum của file kết quả)"""
+        entry = _describe(path) if path else {}
+        entry.update(extra)
+        entry['finished'] = time.time()
+        with self._lock:
+            self.data['stages'][name] = entry
+            self._save_locked()
+
+    # ===== LƯU / XÓA =====
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        self.data['updated'] = time.time()
+        write_json(self.path, self.data)
+
+    def finish(self):
+        """Công việc đã xong hẳn: xóa nhật ký (file kết quả được giữ lại)"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def discard(self, intermediate_paths=()):
+        """
+        Bỏ nhật ký: xóa thư mục tạm, các file trung gian đã đăng ký và nhật ký
+
+        Args:
+            intermediate_paths: File trung gian khác cần xóa (vd: file ghép trước khi thêm audio)
+        """
+        if self.data.get('scratch_dir'):
+            shutil.rmtree(self.data['scratch_dir'], ignore_errors=True)
+        for path in list(intermediate_paths) + self.data.get('intermediates', []):
+            if path and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self.finish()
+
+    def add_intermediate(self, path: str):
+        """Đăng ký file trung gian (xóa khi bỏ nhật ký)"""
+        with self._lock:
+            intermediates = self.data.setdefault('intermediates', [])
+            if path not in intermediates:
+                intermediates.append(path)
+                self._save_locked()
+
+
+def _describe(path: str) -> dict:
+    return {'path': path, 'size': os.path.getsize(path), 'checksum': file_checksum(path)}
+
+
+def _verify(entry: dict) -> bool:
+    path = entry.get('path')
+    try:
+        if os.path.getsize(path) != entry['size']:
+            return False
+        return file_checksum(path) == entry['checksum']
+    except (OSError, KeyError, TypeError):
+        return False
+
+
+def prune_journals(max_age: float = JOURNAL_MAX_AGE):
+    """Xóa nhật ký cũ (và file tạm của chúng)"""
+    now = time.time()
+    for path in glob.glob(os.path.join(_journals_dir(), "*.json")):
+        data = read_json(path)
+        if data is None:
+            continue
+        if now - data.get('updated', data.get('created', 0)) > max_age:
+            JobJournal(path, data.get('key', ''), data).discard()
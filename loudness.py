@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Loudness - Chuẩn hóa âm lượng theo EBU R128 (2 bước)
+Bước đo chỉ chạy trên các đoạn được chọn (song song, chỉ giải mã audio) bằng
+filter loudnorm của ffmpeg; kết quả đo được cache theo file đầu vào và khoảng
+thời gian, nên chỉnh lại đoạn cắt chỉ phải đo các đoạn mới. Bước encode áp dụng
+một mức gain tuyến tính duy nhất cho mọi đoạn, tính từ các kết quả đo.
+"""
+
+import os
+import re
+import json
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import metrics
+from cancellation import CancelToken, run_process
+from media_cache import input_cache_dir, read_json, write_json
+
+
+# Mức âm lượng mục tiêu (LUFS): -23 theo EBU R128, -16/-14 thường dùng cho web
+DEFAULT_TARGET_LUFS = -23.0
+# True peak tối đa sau khi áp gain (dBTP)
+DEFAULT_MAX_TRUE_PEAK = -1.0
+# Giới hạn gain để không khuếch đại tạp âm của đoạn gần như im lặng
+MAX_GAIN_DB = 30.0
+
+MEASUREMENTS_FILE = "measurements.json"
+
+_JSON_BLOCK_RE = re.compile(r"\{[^{}]*\"input_i\"[^{}]*\}", re.S)
+_cache_lock = threading.Lock()
+
+
+def _range_key(start: float, end: float) -> str:
+    return f"{start:.3f}-{end:.3f}"
+
+
+def _to_db(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('-inf')
+
+
+def measure_segment(input_video: str, start: float, end: float,
+                    cancel_token: Optional[CancelToken] = None) -> dict:
+    """
+    Đo loudness của một đoạn (bước 1 của loudnorm, chỉ giải mã audio)
+
+    Returns:
+        {"i": LUFS, "tp": dBTP, "lra": LU} (-inf nếu đoạn im lặng)
+
+    Raises:
+        RuntimeError: Nếu ffmpeg lỗi
+        JobCancelledError: Nếu bị hủy
+    """
+    cmd = [
+        'ffmpeg', '-nostdin', '-hide_banner', '-nostats',
+        '-ss', str(start),
+        '-i', input_video,
+        '-t', str(end - start),
+        '-map', '0:a:0', '-vn', '-sn', '-dn',
+        '-af', 'loudnorm=print_format=json',
+        '-f', 'null', '-'
+    ]
+    result = run_process(cmd, cancel_token, text=True, errors='replace')
+    blocks = _JSON_BLOCK_RE.findall(result.stderr or '')
+    if result.returncode != 0 or not blocks:
+        raise RuntimeError(f"Lỗi khi đo âm lượng đoạn {_range_key(start, end)}: "
+                           f"{(result.stderr or '')[-500:]}")
+    data = json.loads(blocks[-1])
+    return {
+        'i': _to_db(data.get('input_i')),
+        'tp': _to_db(data.get('input_tp')),
+        'lra': _to_db(data.get('input_lra')),
+    }
+
+
+def measure_segments(input_video: str, segments: List[Tuple[float, float]],
+                     max_workers: Optional[int] = None,
+                     cancel_token: Optional[CancelToken] = None,
+                     progress_callback=None) -> List[dict]:
+    """
+    Đo loudness các đoạn (song song, dùng lại kết quả đã cache)
+
+    Args:
+        input_video: Đường dẫn video
+        segments: List các tuple (start_time, end_time)
+        max_workers: Số đoạn đo song song (None = auto)
+        cancel_token: CancelToken để hủy giữa chừng
+        progress_callback: Hàm callback để báo tiến trình
+
+    Returns:
+        Kết quả đo của từng đoạn (cùng thứ tự segments)
+    """
+    cache_file = os.path.join(input_cache_dir(input_video, "loudness"), MEASUREMENTS_FILE)
+    with _cache_lock:
+        cache = read_json(cache_file) or {}
+
+    missing = [(start, end) for start, end in segments if _range_key(start, end) not in cache]
+    if missing:
+        if progress_callback:
+            progress_callback(f"📏 Đang đo âm lượng {len(missing)}/{len(segments)} đoạn...")
+        if max_workers is None:
+            max_workers = min(4, len(missing))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for start, end in missing:
+                future = executor.submit(metrics.bind(cancel_token, measure_segment),
+                                         input_video, start, end, cancel_token)
+                if cancel_token:
+                    cancel_token.add_future(future)
+                futures[_range_key(start, end)] = future
+            measured = {key: future.result() for key, future in futures.items()}
+
+        with _cache_lock:
+            cache = read_json(cache_file) or {}
+            cache.update(measured)
+            write_json(cache_file, cache)
+
+    return [cache[_range_key(start, end)] for start, end in segments]
+
+
+def combine_measurements(segments: List[Tuple[float, float]], measurements: List[dict]) -> dict:
+    """
+    Gộp kết quả đo các đoạn thành loudness của video đầu ra
+
+    Loudness tích hợp được cộng theo năng lượng, có trọng số là độ dài đoạn
+    (xấp xỉ phép gating của R128 trên toàn bộ video ghép); true peak lấy lớn nhất.
+
+    Returns:
+        {"i": LUFS, "tp": dBTP}
+    """
+    energy = 0.0
+    total = 0.0
+    peak = float('-inf')
+    for (start, end), measurement in zip(segments, measurements):
+        duration = end - start
+        total += duration
+        if measurement['i'] != float('-inf'):
+            energy += duration * 10 ** (measurement['i'] / 10)
+        peak = max(peak, measurement['tp'])
+    loudness = 10 * math.log10(energy / total) if energy > 0 and total > 0 else float('-inf')
+    return {'i': loudness, 'tp': peak}
+
+
+def compute_gain(measurement: dict, target: float = DEFAULT_TARGET_LUFS,
+                 max_true_peak: float = DEFAULT_MAX_TRUE_PEAK) -> float:
+    """
+    Gain (dB) đưa loudness về target mà không vượt quá max_true_peak
+
+    Returns:
+        Gain dB (0 nếu không đo được, vd: toàn bộ im lặng)
+    """
+    if measurement['i'] == float('-inf'):
+        return 0.0
+    gain = target - measurement['i']
+    if measurement['tp'] != float('-inf'):
+        gain = min(gain, max_true_peak - measurement['tp'])
+    return max(-MAX_GAIN_DB, min(MAX_GAIN_DB, gain))
+
+
+def normalization_gain(input_video: str, segments: List[Tuple[float, float]],
+                       target: float = DEFAULT_TARGET_LUFS,
+                       max_true_peak: float = DEFAULT_MAX_TRUE_PEAK,
+                       max_workers: Optional[int] = None,
+                       cancel_token: Optional[CancelToken] = None,
+                       progress_callback=None) -> Tuple[float, dict]:
+    """
+    Đo các đoạn và tính gain chuẩn hóa cho video đầu ra
+
+    Returns:
+        (gain dB, loudness đo được {"i", "tp"})
+    """
+    measurements = measure_segments(input_video, segments, max_workers, cancel_token, progress_callback)
+    combined = combine_measurements(segments, measurements)
+    return compute_gain(combined, target, max_true_peak), combined
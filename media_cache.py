@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Media Cache - Thư mục cache trên đĩa cho dữ liệu phân tích từ video
+(thumbnail, proxy, metadata...). Cache được gắn với từng file đầu vào theo
+đường dẫn, kích thước và thời gian sửa đổi, nên tự mất hiệu lực khi file thay đổi.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import tempfile
+
+
+# Biến môi trường để đổi thư mục cache
+CACHE_ENV = "VIDEO_CUTTER_CACHE"
+
+
+def get_cache_root() -> str:
+    """
+    Thư mục gốc của cache
+
+    Thứ tự ưu tiên: $VIDEO_CUTTER_CACHE → %LOCALAPPDATA% (Windows)
+    → $XDG_CACHE_HOME → ~/.cache, rồi thêm "video_cutter"
+    """
+    root = os.environ.get(CACHE_ENV)
+    if root:
+        return root
+
+    if sys.platform == "win32" and os.environ.get("LOCALAPPDATA"):
+        base = os.environ["LOCALAPPDATA"]
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "video_cutter")
+
+
+def input_cache_key(input_path: str) -> str:
+    """
+    Khóa cache cho một file đầu vào (đường dẫn tuyệt đối + kích thước + mtime)
+
+    Args:
+        input_path: Đường dẫn file
+
+    Returns:
+        Chuỗi hex 16 ký tự
+    """
+    st = os.stat(input_path)
+    raw = f"{os.path.abspath(input_path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def input_cache_dir(input_path: str, kind: str) -> str:
+    """
+    Thư mục cache của một loại dữ liệu cho một file đầu vào (tự tạo nếu chưa có)
+
+    Args:
+        input_path: Đường dẫn file đầu vào
+        kind: Loại dữ liệu (vd: "thumbnails", "proxy")
+
+    Returns:
+        Đường dẫn thư mục cache
+    """
+    path = os.path.join(get_cache_root(), kind, input_cache_key(input_path))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def read_json(path: str):
+    """Đọc file JSON trong cache, trả về None nếu không có hoặc hỏng"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path: str, data):
+    """Ghi file JSON nguyên tử (ghi file tạm rồi rename) để không để lại file dở dang"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
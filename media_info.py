@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Media Info - Thông tin video đầu vào (thời lượng, stream, codec, fps, timebase)
+Đọc bằng ffprobe một lần cho mỗi file đầu vào và cache trên đĩa theo đường dẫn,
+kích thước và mtime. Dùng để kiểm tra/cắt gọn các đoạn ngay khi nhập (trước khi
+chạy ffmpeg) và chọn copy hay encode lại cho từng stream.
+"""
+
+import os
+import json
+import subprocess
+import threading
+from fractions import Fraction
+from typing import List, Optional, Tuple
+
+from capabilities import has_tool
+from media_cache import input_cache_dir, read_json, write_json
+
+
+# Độ dài tối thiểu của một đoạn sau khi cắt gọn (giây)
+MIN_SEGMENT_DURATION = 0.05
+
+# Codec có thể copy thẳng vào MP4 mà không cần encode lại
+MP4_VIDEO_CODECS = {'h264', 'hevc', 'mpeg4', 'av1', 'vp9'}
+MP4_AUDIO_CODECS = {'aac', 'mp3', 'ac3', 'eac3', 'opus', 'alac', 'flac'}
+
+_memory_cache = {}
+_lock = threading.Lock()
+
+
+class MediaInfo:
+    """Kết quả ffprobe của một file video"""
+
+    def __init__(self, path: str, probe: dict):
+        """
+        Args:
+            path: Đường dẫn file
+            probe: Kết quả JSON của `ffprobe -show_format -show_streams`
+        """
+        self.path = path
+        self.format = probe.get('format', {})
+        self.streams = probe.get('streams', [])
+
+        self.duration = _to_float(self.format.get('duration'))
+        if not self.duration:
+            self.duration = max((_to_float(s.get('duration')) for s in self.streams), default=0.0)
+
+        self.video = next((s for s in self.streams if s.get('codec_type') == 'video'
+                           and not s.get('disposition', {}).get('attached_pic')), None)
+        self.audio = next((s for s in self.streams if s.get('codec_type') == 'audio'), None)
+
+    @property
+    def has_video(self) -> bool:
+        return self.video is not None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio is not None
+
+    @property
+    def video_codec(self) -> Optional[str]:
+        return self.video.get('codec_name') if self.video else None
+
+    @property
+    def audio_codec(self) -> Optional[str]:
+        return self.audio.get('codec_name') if self.audio else None
+
+    @property
+    def width(self) -> int:
+        return int(self.video.get('width') or 0) if self.video else 0
+
+    @property
+    def height(self) -> int:
+        return int(self.video.get('height') or 0) if self.video else 0
+
+    @property
+    def fps(self) -> float:
+        """Frame rate (ưu tiên avg_frame_rate), 0 nếu không xác định"""
+        if not self.video:
+            return 0.0
+        for key in ('avg_frame_rate', 'r_frame_rate'):
+            rate = _to_fraction(self.video.get(key))
+            if rate:
+                return float(rate)
+        return 0.0
+
+    @property
+    def time_base(self) -> Optional[Fraction]:
+        """Timebase của stream video (vd: 1/15360)"""
+        return _to_fraction(self.video.get('time_base')) if self.video else None
+
+    @property
+    def pix_fmt(self) -> Optional[str]:
+        return self.video.get('pix_fmt') if self.video else None
+
+    @property
+    def video_profile(self) -> Optional[str]:
+        """Profile của codec video theo ffprobe (vd: "High", "Main")"""
+        return self.video.get('profile') if self.video else None
+
+    @property
+    def video_level(self) -> int:
+        """Level của codec video × 10 (vd: 40 = 4.0), 0 nếu không xác định"""
+        level = int(self.video.get('level') or 0) if self.video else 0
+        return max(level, 0)
+
+    @property
+    def video_extradata(self) -> Optional[str]:
+        """
+        Hash extradata của stream video (với H.264 là SPS/PPS trong avcC), None nếu
+        không có (vd: cache probe cũ). Hai nguồn cùng hash mới ghép copy chung được
+        """
+        return self.video.get('extradata_hash') if self.video else None
+
+    @property
+    def sample_rate(self) -> int:
+        """Sample rate của stream audio (Hz), 0 nếu không có"""
+        return int(self.audio.get('sample_rate') or 0) if self.audio else 0
+
+    @property
+    def channels(self) -> int:
+        return int(self.audio.get('channels') or 0) if self.audio else 0
+
+    def summary(self) -> str:
+        """Mô tả ngắn gọn, vd: "1920x1080 h264 29.97fps, aac, 00:10:00.000" """
+        from video_cutter import format_duration
+
+        parts = []
+        if self.has_video:
+            parts.append(f"{self.width}x{self.height} {self.video_codec} {self.fps:.2f}fps")
+        if self.has_audio:
+            parts.append(self.audio_codec)
+        parts.append(format_duration(self.duration))
+        return ", ".join(parts)
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _to_fraction(value) -> Optional[Fraction]:
+    try:
+        fraction = Fraction(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return fraction or None
+
+
+def probe_media(input_video: str) -> Optional[MediaInfo]:
+    """
+    Đọc thông tin video (có cache)
+
+    Args:
+        input_video: Đường dẫn video
+
+    Returns:
+        MediaInfo, hoặc None nếu không có ffprobe hoặc file không đọc được
+    """
+    if not os.path.exists(input_video) or not has_tool('ffprobe'):
+        return None
+
+    cache_file = os.path.join(input_cache_dir(input_video, "mediainfo"), "probe.json")
+    with _lock:
+        cached = _memory_cache.get(cache_file)
+    if cached is not None:
+        return cached
+
+    probe = read_json(cache_file)
+    if probe is None:
+        cmd = [
+            'ffprobe', '-v', 'error',
+            '-print_format', 'json',
+            '-show_format', '-show_streams', '-show_data_hash', 'SHA256',
+            input_video
+        ]
+        try:
+            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                    errors='replace')
+            probe = json.loads(result.stdout) if result.returncode == 0 else None
+        except (OSError, ValueError):
+            probe = None
+        if not probe or not probe.get('streams'):
+            return None
+        write_json(cache_file, probe)
+
+    info = MediaInfo(input_video, probe)
+    with _lock:
+        _memory_cache[cache_file] = info
+    return info
+
+
+def check_segments(segments: List[Tuple[float, float]], info: Optional[MediaInfo],
+                   clamp: bool = True) -> Tuple[List[Tuple[float, float]], List[str]]:
+    """
+    Kiểm tra các đoạn với thời lượng thật của video
+
+    Đoạn bắt đầu sau khi video kết thúc bị từ chối. Đoạn vượt quá cuối video được
+    cắt gọn về cuối video (clamp=True) hoặc bị từ chối (clamp=False).
+
+    Args:
+        segments: List các tuple (start_time, end_time)
+        info: MediaInfo của video (None = không kiểm tra được, trả về nguyên trạng)
+        clamp: Cắt gọn đoạn vượt quá cuối video thay vì từ chối
+
+    Returns:
+        (danh sách đoạn đã kiểm tra, danh sách cảnh báo)
+
+    Raises:
+        ValueError: Nếu có đoạn nằm ngoài video (liệt kê tất cả các đoạn lỗi)
+    """
+    if info is None or not info.duration:
+        return list(segments), []
+
+    from video_cutter import format_duration
+
+    duration = info.duration
+    checked = []
+    warnings = []
+    errors = []
+
+    for idx, (start, end) in enumerate(segments, 1):
+        label = f"Đoạn {idx} ({format_duration(start)} → {format_duration(end)})"
+        if start >= duration - MIN_SEGMENT_DURATION:
+            errors.append(f"{label} bắt đầu sau khi video kết thúc ({format_duration(duration)})")
+            continue
+        if end > duration:
+            if not clamp:
+                errors.append(f"{label} vượt quá thời lượng video ({format_duration(duration)})")
+                continue
+            warnings.append(f"{label} vượt quá cuối video, cắt gọn tới {format_duration(duration)}")
+            end = duration
+        checked.append((start, end))
+
+    if errors:
+        raise ValueError("\n".join(errors))
+    return checked, warnings
+
+
+def stream_plan(info: Optional[MediaInfo], mode: str, volume: int = 100) -> Optional[dict]:
+    """
+    Chọn copy hay encode lại cho từng stream khi cắt sang MP4
+
+    - fast: copy nếu codec vào được MP4, ngược lại encode lại stream đó
+    - balanced/accurate: video luôn encode lại (để cắt chính xác từng frame);
+      audio được copy nếu giữ nguyên âm lượng và codec đã là AAC
+    - Stream không tồn tại thì bỏ (tránh lỗi map/filter khi video không có tiếng)
+
+    Args:
+        info: MediaInfo của video (None = không biết, dùng cách mặc định)
+        mode: Chế độ cắt
+        volume: Âm lượng (0-200%)
+
+    Returns:
+        {"video": "copy"|"encode"|"drop", "audio": "copy"|"encode"|"drop"} hoặc None
+    """
+    if info is None:
+        return None
+
+    if not info.has_video:
+        video = 'drop'
+    elif mode == 'fast' and info.video_codec in MP4_VIDEO_CODECS:
+        video = 'copy'
+    else:
+        video = 'encode'
+
+    if not info.has_audio or volume == 0:
+        audio = 'drop'
+    elif volume != 100:
+        audio = 'encode'
+    elif mode == 'fast' and info.audio_codec in MP4_AUDIO_CODECS:
+        audio = 'copy'
+    elif info.audio_codec == 'aac':
+        audio = 'copy'
+    else:
+        audio = 'encode'
+
+    return {'video': video, 'audio': audio}
+
+
+def prepare_segments(input_video: str, segments: List[Tuple[float, float]], mode: str = "balanced",
+                     volume: int = 100, clamp: bool = True):
+    """
+    Probe video, kiểm tra các đoạn và chọn cách xử lý stream
+
+    Returns:
+        (MediaInfo hoặc None, các đoạn đã kiểm tra, cảnh báo, stream plan hoặc None)
+
+    Raises:
+        ValueError: Nếu có đoạn nằm ngoài video
+    """
+    info = probe_media(input_video)
+    checked, warnings = check_segments(segments, info, clamp)
+    return info, checked, warnings, stream_plan(info, mode, volume)
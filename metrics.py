@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Metrics - Số liệu hiệu năng theo từng bước và từng đoạn của một công việc
+Ghi lại cho mỗi bước (tải xuống, cắt, ghép, thêm audio, upload...) và mỗi đoạn:
+thời gian thực, thời gian chờ trong hàng đợi, CPU user/system và max RSS của các
+tiến trình con (ffmpeg, rclone... qua os.wait4), I/O đĩa của chúng và số byte
+đọc/ghi do bước đó báo. Báo cáo được ghi ra JSON (mỗi công việc một file) và
+tùy chọn ra file textfile Prometheus (node_exporter textfile collector) để tìm
+nút thắt và chọn cấu hình máy render theo số liệu thật.
+
+JobMetrics được gắn vào CancelToken của công việc: mọi tiến trình con chạy qua
+run_process (hoặc AccountedPopen + register/unregister_process) được tự động
+tính vào bước/đoạn đang chạy.
+
+Bước đang chạy được theo dõi riêng cho từng luồng. Luồng mới (worker, luồng
+theo dõi...) không tự kế thừa bước của luồng tạo ra nó: bọc hàm chạy trong
+luồng đó bằng bind() để tính vào bước cha.
+"""
+
+import os
+import re
+import sys
+import glob
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from media_cache import get_cache_root, write_json
+
+
+# Biến môi trường đổi thư mục báo cáo JSON (mặc định <cache>/metrics)
+METRICS_DIR_ENV = "VIDEO_CUTTER_METRICS_DIR"
+# Biến môi trường bật ghi file textfile Prometheus (đường dẫn file .prom)
+PROMETHEUS_ENV = "VIDEO_CUTTER_PROMETHEUS_TEXTFILE"
+
+# Báo cáo cũ hơn thời gian này bị xóa khi ghi báo cáo mới
+REPORT_MAX_AGE = 30 * 24 * 3600
+
+# rusage đếm I/O theo block 512 byte; ru_maxrss tính bằng KB (macOS: byte)
+RUSAGE_BLOCK_SIZE = 512
+MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+PROMETHEUS_PREFIX = "video_cutter"
+
+
+def get_metrics_dir() -> str:
+    """Thư mục báo cáo: $VIDEO_CUTTER_METRICS_DIR hoặc <cache>/metrics"""
+    return os.environ.get(METRICS_DIR_ENV) or os.path.join(get_cache_root(), "metrics")
+
+
+def _new_usage() -> dict:
+    return {
+        'wall_seconds': 0.0,
+        'queue_wait_seconds': 0.0,
+        'processes': 0,
+        'process_seconds': 0.0,
+        'cpu_user_seconds': 0.0,
+        'cpu_system_seconds': 0.0,
+        'max_rss_bytes': 0,
+        'disk_read_bytes': 0,
+        'disk_write_bytes': 0,
+        'bytes_read': 0,
+        'bytes_written': 0,
+    }
+
+
+def _add_process(usage: dict, process):
+    usage['processes'] += 1
+    usage['process_seconds'] += process.wall_time
+    rusage = process.rusage
+    if rusage is None:
+        return
+    usage['cpu_user_seconds'] += rusage.ru_utime
+    usage['cpu_system_seconds'] += rusage.ru_stime
+    usage['max_rss_bytes'] = max(usage['max_rss_bytes'], rusage.ru_maxrss * MAXRSS_UNIT)
+    usage['disk_read_bytes'] += rusage.ru_inblock * RUSAGE_BLOCK_SIZE
+    usage['disk_write_bytes'] += rusage.ru_oublock * RUSAGE_BLOCK_SIZE
+
+
+def _rounded(usage: dict) -> dict:
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in usage.items()}
+
+
+class JobMetrics:
+    """Số liệu của một công việc"""
+
+    def __init__(self, job: str, tracer=None, **labels):
+        """
+        Args:
+            job: Tên công việc (vd: tên file đầu ra)
+            tracer: Tracer (tracing.py) để ghi mỗi bước/đoạn/tiến trình con thành
+                span trên timeline (None = không ghi)
+            labels: Thông tin thêm ghi vào báo cáo (vd: mode="balanced")
+        """
+        self.job = job
+        self.tracer = tracer
+        self.labels = labels
+        self.info = {}
+        self.status = "running"
+        self.started = time.time()
+        self.finished = None
+        self.totals = _new_usage()
+        self.stages = {}    # tên bước → usage
+        self.segments = {}  # nhãn đoạn → usage (kèm 'stage')
+        self._local = threading.local()  # stack (các bước đang chạy), segment
+        self._lock = threading.Lock()
+
+    def attach(self, cancel_token) -> 'JobMetrics':
+        """Gắn vào CancelToken để ghi nhận các tiến trình con của công việc"""
+        cancel_token.metrics = self
+        return self
+
+    @property
+    def _stack(self) -> list:
+        """Các bước đang chạy trong luồng hiện tại (ngoài cùng trước)"""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @property
+    def current_stage(self) -> str:
+        return self._stack[-1] if self._stack else "other"
+
+    def bind(self, func: Callable) -> Callable:
+        """
+        Bọc func để khi chạy ở luồng khác vẫn tính vào bước hiện tại của luồng gọi bind()
+
+        Args:
+            func: Hàm sẽ chạy trong luồng khác (vd: truyền cho executor.submit)
+
+        Returns:
+            Hàm bọc cùng tham số
+        """
+        parent = list(self._stack)
+
+        def bound(*args, **kwargs):
+            previous = getattr(self._local, 'stack', None)
+            self._local.stack = list(parent)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._local.stack = previous
+
+        return bound
+
+    def _stage_usage(self, name: str) -> dict:
+        if name not in self.stages:
+            self.stages[name] = _new_usage()
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name: str, queue_wait: float = 0.0):
+        """
+        Đo một bước. Bước lồng nhau được đặt tên "cha/con" (vd: "cut/concat");
+        thời gian của bước cha gồm cả bước con, tiến trình con chỉ tính cho bước
+        trong cùng.
+
+        Args:
+            name: Tên bước
+            queue_wait: Thời gian bước đã chờ trong hàng đợi trước khi chạy (giây)
+        """
+        stack = self._stack
+        full_name = f"{stack[-1]}/{name}" if stack else name
+        with self._lock:
+            usage = self._stage_usage(full_name)
+            usage['queue_wait_seconds'] += queue_wait
+            self.totals['queue_wait_seconds'] += queue_wait
+        stack.append(full_name)
+        start = time.monotonic()
+        try:
+            yield usage
+        finally:
+            end = time.monotonic()
+            with self._lock:
+                usage['wall_seconds'] += end - start
+            if full_name in stack:
+                stack.remove(full_name)
+            if self.tracer:
+                self.tracer.span(full_name, "stage", start, end,
+                                 {'job': self.job, 'queue_wait_seconds': round(queue_wait, 3)})
+
+    @contextmanager
+    def segment(self, label: str, queued_at: Optional[float] = None):
+        """
+        Đo một đoạn (chạy trong luồng worker của nó)
+
+        Args:
+            label: Nhãn đoạn (vd: "segment_003")
+            queued_at: time.monotonic() lúc đoạn được đưa vào hàng đợi (None = không chờ)
+        """
+        start = time.monotonic()
+        stage = self.current_stage
+        with self._lock:
+            usage = self.segments.setdefault(label, dict(_new_usage(), stage=stage))
+            if queued_at is not None:
+                usage['queue_wait_seconds'] += max(0.0, start - queued_at)
+        self._local.segment = usage
+        try:
+            yield usage
+        finally:
+            self._local.segment = None
+            end = time.monotonic()
+            with self._lock:
+                usage['wall_seconds'] += end - start
+            if self.tracer:
+                self.tracer.span(label, "segment", start, end,
+                                 {'job': self.job, 'stage': usage['stage'],
+                                  'queue_wait_seconds': round(usage['queue_wait_seconds'], 3)})
+
+    def record_process(self, process):
+        """Cộng tài nguyên của một tiến trình con (AccountedPopen) đã kết thúc"""
+        segment = getattr(self._local, 'segment', None)
+        stage = self.current_stage
+        with self._lock:
+            _add_process(self.totals, process)
+            _add_process(self._stage_usage(stage), process)
+            if segment is not None:
+                _add_process(segment, process)
+        if self.tracer:
+            self.tracer.trace_process(process, stage)
+
+    def add_bytes(self, read: int = 0, written: int = 0):
+        """Ghi nhận số byte đọc/ghi (vd: kích thước file tải về/upload) cho bước và đoạn hiện tại"""
+        segment = getattr(self._local, 'segment', None)
+        stage = self.current_stage
+        with self._lock:
+            for usage in (self.totals, self._stage_usage(stage), segment):
+                if usage is not None:
+                    usage['bytes_read'] += read
+                    usage['bytes_written'] += written
+
+    def add_file(self, path: str, written: bool = True):
+        """Ghi nhận kích thước một file vừa ghi (hoặc vừa đọc, written=False)"""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        if written:
+            self.add_bytes(written=size)
+        else:
+            self.add_bytes(read=size)
+
+    def finish(self, status: str = "done"):
+        self.status = status
+        self.finished = time.time()
+        self.totals['wall_seconds'] = self.finished - self.started
+        if self.tracer:
+            self.tracer.instant(f"{self.job}: {status}", "job")
+
+    # ===== BÁO CÁO =====
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            totals = dict(self.totals)
+            if self.finished is None:
+                totals['wall_seconds'] = time.time() - self.started
+            return {
+                'job': self.job,
+                'labels': dict(self.labels),
+                'info': dict(self.info),
+                'status': self.status,
+                'started': self.started,
+                'finished': self.finished,
+                'totals': _rounded(totals),
+                'stages': {name: _rounded(usage) for name, usage in self.stages.items()},
+                'segments': {label: _rounded(usage) for label, usage in self.segments.items()},
+            }
+
+    def summary(self) -> str:
+        """Mô tả ngắn gọn các bước tốn thời gian nhất"""
+        parts = [f"{name} {usage['wall_seconds']:.1f}s" for name, usage in
+                 sorted(self.stages.items(), key=lambda item: -item[1]['wall_seconds'])[:4]
+                 if usage['wall_seconds'] > 0]
+        totals = self.totals
+        cpu = totals['cpu_user_seconds'] + totals['cpu_system_seconds']
+        return (f"{', '.join(parts) or 'không có bước nào'}; CPU tiến trình con {cpu:.1f}s, "
+                f"max RSS {totals['max_rss_bytes'] / (1024 * 1024):.0f} MB")
+
+    def write_json(self, path: Optional[str] = None) -> str:
+        """
+        Ghi báo cáo JSON
+
+        Args:
+            path: File báo cáo (None = <metrics dir>/<thời gian>_<tên công việc>.json)
+
+        Returns:
+            Đường dẫn file đã ghi
+        """
+        if path is None:
+            name = re.sub(r'[^\w.-]+', '_', self.job)[:60] or "job"
+            stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))
+            path = os.path.join(get_metrics_dir(), f"{stamp}_{name}_{os.getpid()}.json")
+            prune_reports()
+        write_json(path, self.to_dict())
+        return path
+
+    def write_prometheus(self, path: str):
+        """Ghi file textfile Prometheus (ghi đè nguyên tử, giá trị của công việc gần nhất)"""
+        write_prometheus_textfile(path, [self])
+
+    def write_reports(self, json_path: Optional[str] = None,
+                      prometheus_path: Optional[str] = None) -> str:
+        """Ghi báo cáo JSON và (nếu có đường dẫn hoặc $VIDEO_CUTTER_PROMETHEUS_TEXTFILE) Prometheus"""
+        path = self.write_json(json_path)
+        prometheus_path = prometheus_path or os.environ.get(PROMETHEUS_ENV)
+        if prometheus_path:
+            self.write_prometheus(prometheus_path)
+        return path
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(jobs) -> str:
+    """Nội dung định dạng text exposition của Prometheus cho các công việc"""
+    gauges = [
+        ('wall_seconds', 'Thời gian thực của bước (giây)'),
+        ('queue_wait_seconds', 'Thời gian chờ trong hàng đợi (giây)'),
+        ('processes', 'Số tiến trình con đã chạy'),
+        ('cpu_user_seconds', 'CPU user của các tiến trình con (giây)'),
+        ('cpu_system_seconds', 'CPU system của các tiến trình con (giây)'),
+        ('max_rss_bytes', 'Max RSS lớn nhất của một tiến trình con (byte)'),
+        ('disk_read_bytes', 'Byte đọc từ đĩa của các tiến trình con'),
+        ('disk_write_bytes', 'Byte ghi xuống đĩa của các tiến trình con'),
+        ('bytes_read', 'Byte đọc do bước báo (vd: file upload)'),
+        ('bytes_written', 'Byte ghi do bước báo (vd: file đầu ra)'),
+    ]
+    reports = [job.to_dict() for job in jobs]
+    lines = []
+    for key, help_text in gauges:
+        metric = f"{PROMETHEUS_PREFIX}_stage_{key}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        for report in reports:
+            rows = list(report['stages'].items()) + [("total", report['totals'])]
+            for stage, usage in rows:
+                lines.append(f'{metric}{{job="{_escape_label(report["job"])}",'
+                             f'stage="{_escape_label(stage)}"}} {usage[key]}')
+
+    metric = f"{PROMETHEUS_PREFIX}_job_success"
+    lines.append(f"# HELP {metric} 1 nếu công việc hoàn thành, 0 nếu lỗi/bị hủy")
+    lines.append(f"# TYPE {metric} gauge")
+    for report in reports:
+        lines.append(f'{metric}{{job="{_escape_label(report["job"])}"}} '
+                     f'{1 if report["status"] == "done" else 0}')
+
+    metric = f"{PROMETHEUS_PREFIX}_job_finished_timestamp_seconds"
+    lines.append(f"# HELP {metric} Thời điểm công việc kết thúc (Unix time)")
+    lines.append(f"# TYPE {metric} gauge")
+    for report in reports:
+        lines.append(f'{metric}{{job="{_escape_label(report["job"])}"}} '
+                     f'{report["finished"] or time.time():.3f}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(path: str, jobs):
+    """Ghi file .prom nguyên tử (textfile collector không đọc phải file dở dang)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text(jobs))
+    os.replace(tmp_path, path)
+
+
+def prune_reports(max_age: float = REPORT_MAX_AGE):
+    """Xóa báo cáo JSON cũ"""
+    now = time.time()
+    for path in glob.glob(os.path.join(get_metrics_dir(), "*.json")):
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+@contextmanager
+def stage(cancel_token, name: str, queue_wait: float = 0.0):
+    """Đo bước name nếu công việc có JobMetrics (không làm gì nếu không có)"""
+    metrics = getattr(cancel_token, 'metrics', None)
+    if metrics is None:
+        yield None
+        return
+    with metrics.stage(name, queue_wait) as usage:
+        yield usage
+
+
+@contextmanager
+def segment(cancel_token, label: str, queued_at: Optional[float] = None):
+    """Đo một đoạn nếu công việc có JobMetrics"""
+    metrics = getattr(cancel_token, 'metrics', None)
+    if metrics is None:
+        yield None
+        return
+    with metrics.segment(label, queued_at) as usage:
+        yield usage
+
+
+def bind(cancel_token, func: Callable) -> Callable:
+    """Bọc func để tính vào bước hiện tại khi chạy ở luồng khác (func nếu công việc không có JobMetrics)"""
+    metrics = getattr(cancel_token, 'metrics', None)
+    if metrics is None:
+        return func
+    return metrics.bind(func)
+
+
+def record_file(cancel_token, path: str, written: bool = True):
+    """Ghi nhận kích thước file cho bước/đoạn hiện tại nếu công việc có JobMetrics"""
+    metrics = getattr(cancel_token, 'metrics', None)
+    if metrics is not None:
+        metrics.add_file(path, written)
@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+"""
+Montage - Ghép các đoạn từ nhiều video nguồn thành một video
+Mỗi đoạn mang theo file nguồn của nó. Mỗi nguồn chỉ probe một lần (có cache).
+Đoạn có codec (kể cả profile/level H.264), độ phân giải, frame rate, timebase
+và audio đã khớp với profile đầu ra được copy thẳng; chỉ các đoạn không khớp
+mới bị encode lại (scale/pad, fps, định dạng audio, cùng profile/level) cho khớp
+profile, rồi tất cả được ghép bằng concat copy.
+
+MP4 chỉ có một avcC (SPS/PPS) cho cả track: khi các đoạn không cùng SPS/PPS
+(nhiều nguồn copy khác nhau, hoặc đoạn copy lẫn đoạn encode lại), mỗi đoạn được
+ghi ra MPEG-TS (Annex-B, SPS/PPS nằm trong stream trước mỗi keyframe) rồi mới
+ghép vào MP4, để decoder đọc đúng tham số của từng đoạn.
+"""
+
+import os
+import re
+import csv
+import sys
+import json
+import shutil
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from fractions import Fraction
+from typing import List, Optional, Tuple
+
+from cancellation import CancelToken, JobCancelledError
+from ffmpeg_errors import (CODEC_UNSUPPORTED, INPUT_CORRUPT, OUT_OF_DISK, TOLERANT_INPUT_ARGS, UNKNOWN,
+                           JobFailures, ProcessFailure, run_ffmpeg, run_with_policy)
+from frame_index import ExactCut, build_frame_index
+from media_info import MediaInfo, check_segments, probe_media
+from scratch import create_scratch_dir, ensure_free_space, estimate_intermediate_size, format_bytes
+from video_cutter import (check_ffmpeg, concat_files, format_duration, parse_segments,
+                          parse_time_to_seconds)
+
+
+# Timebase MP4 mặc định cho video encode lại khi nguồn không cho biết
+DEFAULT_TIMESCALE = 15360
+DEFAULT_SAMPLE_RATE = 48000
+DEFAULT_CHANNELS = 2
+
+# Profile H.264 (theo ffprobe) → giá trị -profile:v của libx264
+X264_PROFILES = {
+    'Constrained Baseline': 'baseline',
+    'Baseline': 'baseline',
+    'Main': 'main',
+    'High': 'high',
+}
+
+_PROFILE_RE = re.compile(r"^(\d+)x(\d+)(?:@([\d.]+))?$")
+
+# Một đoạn của montage: (file nguồn, start_time, end_time)
+Clip = Tuple[str, float, float]
+
+
+class OutputProfile:
+    """Định dạng đầu ra chung của montage (H.264 + AAC)"""
+
+    def __init__(self, width: int, height: int, fps: float, time_base: Optional[Fraction] = None,
+                 has_audio: bool = True, sample_rate: int = DEFAULT_SAMPLE_RATE,
+                 channels: int = DEFAULT_CHANNELS, h264_profile: Optional[str] = None,
+                 level: int = 0):
+        """
+        Args:
+            h264_profile: Profile H.264 (tên theo ffprobe, vd: "High"); None = để
+                libx264 tự chọn và không so profile khi quyết định copy
+            level: Level H.264 × 10 (vd: 40); 0 = không giới hạn
+        """
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.time_base = time_base or Fraction(1, DEFAULT_TIMESCALE)
+        self.has_audio = has_audio
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.h264_profile = h264_profile if h264_profile in X264_PROFILES else None
+        self.level = level
+
+    @classmethod
+    def from_info(cls, info: MediaInfo, has_audio: Optional[bool] = None) -> 'OutputProfile':
+        """Profile lấy theo một video nguồn (thường là nguồn đầu tiên)"""
+        h264 = info.video_codec == 'h264'
+        return cls(info.width, info.height, round(info.fps, 3) or 30.0, info.time_base,
+                   info.has_audio if has_audio is None else has_audio,
+                   info.sample_rate or DEFAULT_SAMPLE_RATE, info.channels or DEFAULT_CHANNELS,
+                   info.video_profile if h264 else None, info.video_level if h264 else 0)
+
+    @classmethod
+    def parse(cls, spec: str, base: Optional['OutputProfile'] = None) -> 'OutputProfile':
+        """
+        Đọc profile từ chuỗi "WIDTHxHEIGHT[@FPS]" (vd: "1920x1080@30")
+
+        Raises:
+            ValueError: Nếu spec không hợp lệ
+        """
+        match = _PROFILE_RE.match(spec.strip())
+        if not match:
+            raise ValueError(f"Profile không hợp lệ (dạng 1920x1080@30): {spec}")
+        width, height, fps = int(match.group(1)), int(match.group(2)), match.group(3)
+        fps = float(fps) if fps else (base.fps if base else 30.0)
+        profile = cls(width, height, fps)
+        if base:
+            profile.has_audio = base.has_audio
+            profile.sample_rate = base.sample_rate
+            profile.channels = base.channels
+            profile.h264_profile = base.h264_profile
+            profile.level = base.level
+        return profile
+
+    def mismatches(self, info: MediaInfo) -> List[str]:
+        """Những điểm nguồn không khớp profile (rỗng = copy được)"""
+        reasons = []
+        if info.video_codec != 'h264':
+            reasons.append(f"codec {info.video_codec}")
+        elif self.h264_profile and info.video_profile != self.h264_profile:
+            reasons.append(f"profile {info.video_profile}")
+        elif self.level and info.video_level > self.level:
+            reasons.append(f"level {info.video_level / 10:.1f}")
+        if (info.width, info.height) != (self.width, self.height):
+            reasons.append(f"{info.width}x{info.height}")
+        if abs(info.fps - self.fps) > 0.01:
+            reasons.append(f"{info.fps:.3f}fps")
+        if info.time_base != self.time_base:
+            reasons.append(f"timebase {info.time_base}")
+        if info.pix_fmt not in (None, 'yuv420p'):
+            reasons.append(info.pix_fmt)
+        if self.has_audio:
+            if not info.has_audio:
+                reasons.append("không có audio")
+            elif (info.audio_codec, info.sample_rate, info.channels) != ('aac', self.sample_rate, self.channels):
+                reasons.append(f"audio {info.audio_codec} {info.sample_rate}Hz {info.channels}ch")
+        return reasons
+
+    def encoder_args(self) -> List[str]:
+        """Tham số libx264 để đoạn encode lại cùng profile/level với các nguồn copy"""
+        args = []
+        if self.h264_profile:
+            args.extend(['-profile:v', X264_PROFILES[self.h264_profile]])
+        if self.level:
+            args.extend(['-level', f"{self.level / 10:.1f}"])
+        return args
+
+    def describe(self) -> str:
+        audio = f"aac {self.sample_rate}Hz {self.channels}ch" if self.has_audio else "không audio"
+        codec = f"h264 {self.h264_profile}" if self.h264_profile else "h264"
+        if self.level:
+            codec += f"@{self.level / 10:.1f}"
+        return f"{self.width}x{self.height} {codec} {self.fps:g}fps (timebase {self.time_base}), {audio}"
+
+
+def parse_clips(spec: str) -> List[Clip]:
+    """
+    Đọc các đoạn của một nguồn từ chuỗi "SOURCE@start-end|start-end"
+
+    Ví dụ: "intro.mp4@00:00-00:05", "talk.mov@01:00-01:30|05:10-05:20"
+    """
+    source, sep, segments = spec.rpartition('@')
+    if not sep or not source:
+        raise ValueError(f"Đoạn montage không hợp lệ (dạng FILE@start-end|...): {spec}")
+    return [(source, start, end) for start, end in parse_segments(segments)]
+
+
+def load_clips(path: str) -> List[Clip]:
+    """
+    Đọc danh sách đoạn montage từ file
+
+    - .json: [{"source": "a.mp4", "start": "00:10", "end": "00:20"}, ...]
+    - .csv:  cột source,start,end (có dòng tiêu đề)
+    """
+    def seconds(value):
+        if isinstance(value, (int, float)):
+            return float(value)
+        text = str(value).strip()
+        return parse_time_to_seconds(text) if ':' in text else float(text)
+
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        if path.lower().endswith('.json'):
+            rows = json.load(f)
+            if isinstance(rows, dict):
+                rows = rows.get('clips', [])
+        else:
+            rows = list(csv.DictReader(f))
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    clips = []
+    for idx, row in enumerate(rows, 1):
+        try:
+            source = row.get('source') or row['input']
+            start, end = seconds(row['start']), seconds(row['end'])
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Đoạn {idx} trong {os.path.basename(path)} không hợp lệ: {e}")
+        if end <= start:
+            raise ValueError(f"Đoạn {idx}: thời gian kết thúc phải lớn hơn thời gian bắt đầu")
+        # Đường dẫn tương đối tính theo thư mục của file danh sách
+        clips.append((os.path.join(base_dir, source), start, end))
+    return clips
+
+
+def build_copy_command(source: str, start: float, end: float, output_file: str,
+                       has_audio: bool, annexb: bool = False) -> List[str]:
+    """
+    Lệnh cắt copy một đoạn đã khớp profile
+
+    annexb: Ghi ra MPEG-TS với SPS/PPS trong stream (xem đầu module)
+    """
+    cmd = ['ffmpeg', '-ss', str(start), '-i', source, '-t', str(end - start),
+           '-map', '0:v:0']
+    if has_audio:
+        cmd.extend(['-map', '0:a:0'])
+    cmd.extend(['-c', 'copy'])
+    if annexb:
+        cmd.extend(['-bsf:v', 'h264_mp4toannexb', '-f', 'mpegts'])
+    cmd.extend(['-avoid_negative_ts', '1', '-y', output_file])
+    return cmd
+
+
+def build_conform_command(source: str, start: float, end: float, output_file: str,
+                          info: MediaInfo, profile: OutputProfile,
+                          preset: str = "medium", crf: int = 23,
+                          exact: Optional[ExactCut] = None, annexb: bool = False,
+                          tolerant: bool = False) -> List[str]:
+    """
+    Lệnh cắt và encode lại một đoạn cho khớp profile
+
+    Video được scale giữ tỉ lệ rồi pad viền đen, đổi fps và timebase; audio được
+    đổi sample rate/số kênh, hoặc thêm audio im lặng nếu nguồn không có tiếng.
+    Với exact (frame_index.ExactCut), đoạn được cắt chính xác từng frame của
+    nguồn: seek tới keyframe rồi trim theo pts trước khi scale/đổi fps.
+    Với annexb, đoạn được ghi ra MPEG-TS (xem đầu module). tolerant: bỏ qua
+    gói/khung hình hỏng của nguồn (ffmpeg_errors.TOLERANT_INPUT_ARGS).
+    """
+    w, h = profile.width, profile.height
+    video_filter = (f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+                    f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={profile.fps:g},format=yuv420p")
+    duration = end - start
+    input_args = TOLERANT_INPUT_ARGS if tolerant else []
+
+    if exact:
+        video_filter = f"{exact.video_filter()},{video_filter}"
+        cmd = ['ffmpeg', '-copyts', *exact.input_args(), *input_args, '-i', source]
+    else:
+        cmd = ['ffmpeg', '-ss', str(start), *input_args, '-i', source, '-t', str(duration)]
+    silent = profile.has_audio and not info.has_audio
+    if silent:
+        layout = 'stereo' if profile.channels == 2 else 'mono'
+        cmd.extend(['-f', 'lavfi', '-t', str(duration),
+                    '-i', f"anullsrc=r={profile.sample_rate}:cl={layout}"])
+
+    cmd.extend(['-map', '0:v:0', '-vf', video_filter,
+                '-c:v', 'libx264', '-preset', preset, '-crf', str(crf), *profile.encoder_args()])
+    if not annexb:
+        cmd.extend(['-video_track_timescale', str(profile.time_base.denominator)])
+    if profile.has_audio:
+        cmd.extend(['-map', '1:a:0' if silent else '0:a:0',
+                    '-c:a', 'aac', '-b:a', '128k',
+                    '-ar', str(profile.sample_rate), '-ac', str(profile.channels)])
+        if exact and not silent:
+            cmd.extend(['-af', exact.audio_filter()])
+    if annexb:
+        cmd.extend(['-f', 'mpegts'])
+    cmd.extend(['-strict', 'experimental', '-y', output_file])
+    return cmd
+
+
+def render_montage(clips: List[Clip], output_video: str, profile: Optional[OutputProfile] = None,
+                   temp_dir: Optional[str] = None, mode: str = "balanced",
+                   max_workers: Optional[int] = None, preset: str = "medium", crf: int = 23,
+                   progress_callback=None, cancel_token: Optional[CancelToken] = None,
+                   fast_scratch: bool = True) -> dict:
+    """
+    Render montage từ các đoạn của nhiều video nguồn
+
+    Args:
+        clips: List các tuple (file nguồn, start_time, end_time) theo thứ tự ghép
+        output_video: File đầu ra
+        profile: Profile đầu ra (None = theo nguồn đầu tiên)
+        temp_dir: Thư mục gốc cho file tạm (xem cut_video_segments)
+        mode: 'accurate' = encode lại mọi đoạn, cắt chính xác từng frame theo chỉ mục
+            frame của từng nguồn (như cut_video_segments);
+            còn lại = copy các đoạn đã khớp profile (điểm cắt theo keyframe như fast mode)
+        max_workers: Số đoạn xử lý song song (None = auto, mọi chế độ đều song song)
+        preset: x264 preset khi encode lại
+        crf: Constant Rate Factor khi encode lại
+        progress_callback: Hàm callback để báo tiến trình (nhận message string)
+        cancel_token: CancelToken để hủy giữa chừng
+        fast_scratch: Đặt file tạm trên /dev/shm nếu vừa
+
+    Returns:
+        {"copied": số đoạn copy, "encoded": số đoạn encode lại, "output": output_video}
+
+    Raises:
+        ValueError: Nếu không đọc được nguồn hoặc có đoạn nằm ngoài video
+        JobFailures: Nếu có đoạn vẫn lỗi sau khi thử lại/đổi cách (liệt kê mọi đoạn lỗi)
+    """
+    def log(message):
+        """Helper để in log hoặc gọi callback"""
+        print(message)
+        if progress_callback:
+            progress_callback(message)
+
+    if not clips:
+        raise ValueError("Không có đoạn nào để ghép")
+    if not check_ffmpeg():
+        raise RuntimeError("ffmpeg chưa được cài đặt. Vui lòng cài đặt ffmpeg trước.")
+    if cancel_token is None:
+        cancel_token = CancelToken()
+
+    # Probe mỗi nguồn một lần và kiểm tra các đoạn của nó
+    clips = [(os.path.abspath(source), start, end) for source, start, end in clips]
+    infos = {}
+    for source in dict.fromkeys(source for source, _, _ in clips):
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"Không tìm thấy file video: {source}")
+        info = probe_media(source)
+        if info is None or not info.has_video:
+            raise ValueError(f"Không đọc được video nguồn (cần ffprobe): {source}")
+        infos[source] = info
+
+    checked = []
+    for number, (source, start, end) in enumerate(clips, 1):
+        try:
+            segments, warnings = check_segments([(start, end)], infos[source])
+        except ValueError as e:
+            raise ValueError(f"{os.path.basename(source)}: {e}".replace("Đoạn 1", f"Đoạn {number}"))
+        for warning in warnings:
+            log(f"⚠️  {os.path.basename(source)}: {warning.replace('Đoạn 1', f'Đoạn {number}')}")
+        checked.append((source,) + segments[0])
+    clips = checked
+
+    if profile is None:
+        first = infos[clips[0][0]]
+        profile = OutputProfile.from_info(first, has_audio=any(info.has_audio for info in infos.values()))
+
+    copy_sources = {}
+    for source, info in infos.items():
+        reasons = profile.mismatches(info)
+        copy_sources[source] = mode != "accurate" and not reasons
+        status = "copy" if copy_sources[source] else f"encode lại ({', '.join(reasons) or 'accurate'})"
+        log(f"🎞️  {os.path.basename(source)}: {info.summary()} → {status}")
+
+    # Accurate: chỉ mục frame của từng nguồn (đọc một lần, có cache) → seek keyframe + trim theo pts
+    exact_cuts = {}
+    if mode == "accurate":
+        for source, info in infos.items():
+            index = build_frame_index(source, info, cancel_token, log)
+            if index is None:
+                log(f"⚠️  {os.path.basename(source)}: không đọc được chỉ mục frame, "
+                    f"cắt theo thời gian (có thể lệch 1 frame)")
+                continue
+            for clip in clips:
+                if clip[0] == source:
+                    cut = index.exact_cut(clip[1], clip[2], info.sample_rate)
+                    if cut is not None:
+                        exact_cuts[clip] = cut
+
+    estimate = sum(estimate_intermediate_size(source, [(start, end)], infos[source])
+                   for source, start, end in clips)
+    ensure_free_space(os.path.dirname(os.path.abspath(output_video)), estimate)
+    temp_dir = create_scratch_dir(estimate, root=temp_dir, prefer_fast=fast_scratch,
+                                  prefix="montage_")
+
+    log(f"\n🎬 Montage {len(clips)} đoạn từ {len(infos)} nguồn")
+    log(f"📐 Profile đầu ra: {profile.describe()}")
+    log(f"💽 File tạm (~{format_bytes(estimate)}): {temp_dir}\n")
+
+    # Các đoạn không cùng SPS/PPS (nguồn copy khác extradata, hoặc lẫn đoạn encode lại)
+    # không ghép chung được một avcC: đi qua MPEG-TS (Annex-B) rồi mới ghép vào MP4
+    parameter_sets = {(infos[source].video_extradata or source) if copy_sources[source] else None
+                      for source, _, _ in clips}
+    annexb = len(parameter_sets) > 1
+    if annexb:
+        log("🧩 Các đoạn khác SPS/PPS: ghép qua MPEG-TS (Annex-B)")
+    extension = "ts" if annexb else "mp4"
+    clip_files = [os.path.join(temp_dir, f"clip_{idx:04d}.{extension}") for idx in range(1, len(clips) + 1)]
+    start_overall = time.time()
+    # Chỉ xóa file đầu ra khi hủy nếu đã bắt đầu ghép vào nó (không xóa file có sẵn)
+    writing_output = False
+
+    def render(idx):
+        clip = clips[idx - 1]
+        source, start, end = clip
+        output_file = clip_files[idx - 1]
+
+        def conform(tolerant):
+            cmd = build_conform_command(source, start, end, output_file, infos[source], profile,
+                                        preset, crf, exact_cuts.get(clip), annexb, tolerant)
+            return lambda: run_ffmpeg(cmd, cancel_token)
+
+        # Lỗi tạm thời được chạy lại; copy lỗi → encode lại; dữ liệu hỏng → bỏ qua gói hỏng.
+        # Đoạn copy chỉ được encode lại khi đã ghép qua MPEG-TS (SPS/PPS nằm trong stream)
+        if copy_sources[source]:
+            copy_cmd = build_copy_command(source, start, end, output_file, profile.has_audio, annexb)
+            strategies = [("copy", lambda: run_ffmpeg(copy_cmd, cancel_token), ())]
+            if annexb:
+                strategies.append(("encode lại", conform(False), (CODEC_UNSUPPORTED, INPUT_CORRUPT, UNKNOWN)))
+                strategies.append(("bỏ qua dữ liệu hỏng", conform(True), (INPUT_CORRUPT,)))
+        else:
+            strategies = [("encode", conform(False), ()),
+                          ("bỏ qua dữ liệu hỏng", conform(True), (INPUT_CORRUPT,))]
+        run_with_policy(strategies, cancel_token, log=log,
+                        label=f"Đoạn {idx} ({os.path.basename(source)})")
+
+    # Đoạn lỗi không dừng cả công việc: các đoạn còn lại vẫn được cắt, cuối cùng báo mọi lỗi
+    failures = []
+
+    def record_failure(idx, error):
+        if not isinstance(error, ProcessFailure):
+            error = RuntimeError(f"Đoạn {idx}: {error}")
+        failures.append(error)
+        log(f"❌ {error}")
+        return getattr(error, 'kind', None) == OUT_OF_DISK
+
+    try:
+        if max_workers is None:
+            max_workers = min(4, len(clips))
+        completed = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_idx = {}
+            for idx in range(1, len(clips) + 1):
+                future = executor.submit(render, idx)
+                cancel_token.add_future(future)
+                future_to_idx[future] = idx
+            try:
+                for future in as_completed(future_to_idx):
+                    idx = future_to_idx[future]
+                    cancel_token.raise_if_cancelled()
+                    if future.cancelled():
+                        continue
+                    completed += 1
+                    try:
+                        future.result()
+                    except JobCancelledError:
+                        raise
+                    except Exception as e:
+                        if record_failure(idx, e):
+                            # Hết dung lượng: không bắt đầu thêm đoạn nào nữa
+                            for pending in future_to_idx:
+                                pending.cancel()
+                        continue
+                    source, start, end = clips[idx - 1]
+                    action = "copy" if copy_sources[source] else "encode"
+                    log(f"✅ [{completed}/{len(clips)}] Đoạn {idx} ({action}): {os.path.basename(source)} "
+                        f"{format_duration(start)} → {format_duration(end)}")
+            except (JobCancelledError, KeyboardInterrupt):
+                # Dừng các đoạn còn lại trước khi executor chờ các luồng kết thúc
+                cancel_token.cancel()
+                raise
+
+        if failures:
+            if cancel_token.metrics is not None:
+                cancel_token.metrics.info['failures'] = [
+                    failure.to_dict() if isinstance(failure, ProcessFailure) else {'error': str(failure)}
+                    for failure in failures]
+            raise JobFailures(failures, len(clips))
+
+        log("\n🔗 Đang ghép các đoạn lại với nhau...")
+        writing_output = True
+        concat_files(clip_files, output_video, temp_dir, cancel_token, progress_callback=log)
+
+        copied = sum(1 for source, _, _ in clips if copy_sources[source])
+        total_duration = sum(end - start for _, start, end in clips)
+        log(f"✨ Hoàn thành! Video đã được lưu tại: {output_video}")
+        log(f"📊 {copied} đoạn copy, {len(clips) - copied} đoạn encode lại, "
+            f"thời lượng {format_duration(total_duration)}, {time.time() - start_overall:.1f}s\n")
+        return {'copied': copied, 'encoded': len(clips) - copied, 'output': output_video}
+
+    except (JobCancelledError, KeyboardInterrupt):
+        cancel_token.cancel()
+        if writing_output and os.path.exists(output_video):
+            try:
+                os.remove(output_video)
+            except OSError:
+                pass
+        log("❌ Đã hủy xử lý")
+        raise
+
+    finally:
+        try:
+            shutil.rmtree(temp_dir)
+            print("🧹 Đã xóa các file tạm")
+        except Exception as e:
+            print(f"⚠️  Không thể xóa thư mục tạm: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Ghép các đoạn từ nhiều video nguồn (montage)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ví dụ:
+  %(prog)s -o montage.mp4 --clip "intro.mp4@00:00-00:05" --clip "talk.mov@01:00-01:30|05:10-05:20"
+  %(prog)s -o montage.mp4 --list clips.csv --profile 1920x1080@30
+        """
+    )
+    parser.add_argument('-o', '--output', required=True, help='Đường dẫn video đầu ra')
+    parser.add_argument('--clip', action='append', default=[], metavar='FILE@SEGMENTS',
+                        help='Các đoạn của một nguồn, lặp lại cho mỗi nguồn (theo thứ tự ghép)')
+    parser.add_argument('--list', default=None, metavar='FILE',
+                        help='Đọc danh sách đoạn từ file .json/.csv (cột source,start,end)')
+    parser.add_argument('--profile', default=None, metavar='WxH[@FPS]',
+                        help='Profile đầu ra (mặc định: theo nguồn đầu tiên)')
+    parser.add_argument('-m', '--mode', default='balanced', choices=['fast', 'balanced', 'accurate'],
+                        help='accurate = encode lại mọi đoạn, chính xác từng frame; còn lại copy đoạn đã khớp profile')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Số đoạn xử lý song song (mặc định: auto)')
+    parser.add_argument('-t', '--temp-dir', default=None, help='Thư mục gốc cho file tạm')
+    args = parser.parse_args()
+
+    try:
+        clips = load_clips(args.list) if args.list else []
+        for spec in args.clip:
+            clips.extend(parse_clips(spec))
+        if not clips:
+            parser.error("cần ít nhất một --clip hoặc --list")
+
+        profile = None
+        if args.profile:
+            first = probe_media(clips[0][0])
+            base = OutputProfile.from_info(first) if first else None
+            profile = OutputProfile.parse(args.profile, base)
+
+        render_montage(clips, args.output, profile, temp_dir=args.temp_dir, mode=args.mode,
+                       max_workers=args.workers)
+    except JobCancelledError:
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Lỗi: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+MP4 Index - Đọc chỉ mục mẫu (sample table) của file MP4/MOV bằng Python thuần
+File được memory-map và chỉ các box trong `moov` được đọc (stts, ctts, stss,
+stsz, stsc, stco/co64, elst), không chạy ffprobe và không đọc phần dữ liệu
+media. Với file vài chục GB, việc đọc chỉ tốn vài mili giây tới vài chục mili
+giây (tỉ lệ với số mẫu, không phải kích thước file).
+
+Kết quả là các mảng gọn (array) theo đơn vị timescale của từng track:
+thời điểm hiển thị (pts) của mọi mẫu, các keyframe và vị trí byte của chúng.
+"""
+
+import os
+import sys
+import mmap
+import time
+import bisect
+import struct
+import operator
+import argparse
+from array import array
+from fractions import Fraction
+from typing import Iterator, List, Optional, Tuple
+
+
+# Các phần mở rộng được đọc bằng bộ đọc này (file khác dùng ffprobe)
+MP4_EXTENSIONS = ('.mp4', '.m4v', '.mov', '.m4a', '.3gp')
+
+class Mp4IndexError(ValueError):
+    """File không đọc được như MP4/MOV (hỏng, phân mảnh, thiếu moov...)"""
+
+
+def _boxes(buf, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Các box trong khoảng [start, end): (loại, vị trí nội dung, vị trí kết thúc)"""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', buf, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise Mp4IndexError(f"Box {kind!r} hỏng tại byte {pos}")
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _find(buf, start: int, end: int, kind: bytes) -> Optional[Tuple[int, int]]:
+    for box_kind, body, box_end in _boxes(buf, start, end):
+        if box_kind == kind:
+            return body, box_end
+    return None
+
+
+def _table(buf, offset: int, count: int, typecode: str) -> array:
+    """Bảng số nguyên big-endian trong file → array (một lần copy, đảo byte bằng C)"""
+    table = array(typecode)
+    table.frombytes(buf[offset:offset + count * table.itemsize])
+    if sys.byteorder == 'little':
+        table.byteswap()
+    return table
+
+
+class TrackIndex:
+    """Sample table của một track (thời gian theo đơn vị timescale của track)"""
+
+    def __init__(self, buf, stbl: Tuple[int, int], timescale: int, handler: str,
+                 media_time: int = 0, empty_duration: int = 0):
+        """
+        Args:
+            buf: Nội dung file (mmap)
+            stbl: (vị trí nội dung, vị trí kết thúc) của box stbl
+            timescale: Số đơn vị thời gian mỗi giây (mdhd)
+            handler: Loại track ('vide', 'soun', ...)
+            media_time: Thời điểm bắt đầu của edit đầu tiên (elst, đơn vị timescale)
+            empty_duration: Độ trễ của edit rỗng ở đầu (elst, đã đổi sang timescale)
+        """
+        self.timescale = timescale
+        self.handler = handler
+        self.codec = None
+        self._shift = empty_duration - media_time
+
+        tables = {kind: (body, end) for kind, body, end in _boxes(buf, *stbl)}
+        if b'stts' not in tables or (b'stsz' not in tables and b'stz2' not in tables):
+            raise Mp4IndexError("Thiếu sample table (stts/stsz)")
+        if b'stz2' in tables and b'stsz' not in tables:
+            raise Mp4IndexError("Chưa hỗ trợ stz2")
+
+        if b'stsd' in tables:
+            body = tables[b'stsd'][0]
+            if struct.unpack_from('>I', buf, body + 4)[0]:
+                self.codec = bytes(buf[body + 12:body + 16]).decode('latin-1')
+
+        # stsz: kích thước chung hoặc bảng kích thước từng mẫu
+        body = tables[b'stsz'][0]
+        sample_size, self.sample_count = struct.unpack_from('>II', buf, body + 4)
+        self._sizes = _table(buf, body + 12, self.sample_count, 'I') if sample_size == 0 else None
+        self._sample_size = sample_size
+
+        # stts: (số mẫu, thời lượng mỗi mẫu) → dts
+        body = tables[b'stts'][0]
+        count = struct.unpack_from('>I', buf, body + 4)[0]
+        self._stts = _table(buf, body + 8, count * 2, 'I')
+
+        # ctts: (số mẫu, độ lệch pts - dts); version 1 có thể âm
+        self._ctts = None
+        if b'ctts' in tables:
+            body = tables[b'ctts'][0]
+            version = buf[body]
+            count = struct.unpack_from('>I', buf, body + 4)[0]
+            self._ctts = _table(buf, body + 8, count * 2, 'i' if version else 'I')
+
+        # stss: số thứ tự (từ 1) các mẫu keyframe; không có = mọi mẫu là keyframe
+        self._stss = None
+        if b'stss' in tables:
+            body = tables[b'stss'][0]
+            count = struct.unpack_from('>I', buf, body + 4)[0]
+            self._stss = _table(buf, body + 8, count, 'I')
+
+        # stsc + stco/co64: mẫu nằm trong chunk nào, chunk ở byte nào
+        self._stsc = None
+        self._chunks = None
+        if b'stsc' in tables:
+            body = tables[b'stsc'][0]
+            count = struct.unpack_from('>I', buf, body + 4)[0]
+            self._stsc = _table(buf, body + 8, count * 3, 'I')
+        if b'stco' in tables:
+            body = tables[b'stco'][0]
+            self._chunks = _table(buf, body + 8, struct.unpack_from('>I', buf, body + 4)[0], 'I')
+        elif b'co64' in tables:
+            body = tables[b'co64'][0]
+            self._chunks = _table(buf, body + 8, struct.unpack_from('>I', buf, body + 4)[0], 'Q')
+
+        self._pts = None
+        self._keyframe_pts = None
+        self._run_starts = None
+        self._stts_runs = None
+        self._ctts_runs = None
+
+    # ===== THỜI GIAN =====
+
+    def pts(self) -> array:
+        """pts của từng mẫu theo thứ tự giải mã (đơn vị timescale, đã áp dụng edit list)"""
+        if self._pts is not None:
+            return self._pts
+
+        # dts đã cộng sẵn độ lệch của edit list
+        dts = array('q')
+        now = self._shift
+        stts = self._stts
+        for i in range(0, len(stts), 2):
+            count, delta = stts[i], stts[i + 1]
+            if delta:
+                dts.extend(range(now, now + count * delta, delta))
+            else:
+                dts.extend([now] * count)
+            now += count * delta
+        del dts[self.sample_count:]
+
+        ctts = self._ctts
+        if ctts is not None and len(ctts):
+            counts = ctts[0::2]
+            if counts.count(1) == len(counts):
+                offsets = ctts[1::2]
+            else:
+                offsets = array('q')
+                for i in range(0, len(ctts), 2):
+                    offsets.extend([ctts[i + 1]] * ctts[i])
+            self._pts = array('q', map(operator.add, dts, offsets))
+        else:
+            self._pts = dts
+        return self._pts
+
+    @staticmethod
+    def _runs(table: array) -> Tuple[List[int], List[int]]:
+        """Bảng (số mẫu, giá trị): chỉ số mẫu đầu tiên và tổng giá trị dồn tới đầu mỗi dải"""
+        starts, totals = [], []
+        sample = total = 0
+        for i in range(0, len(table), 2):
+            starts.append(sample)
+            totals.append(total)
+            sample += table[i]
+            total += table[i] * table[i + 1]
+        return starts, totals
+
+    def sample_pts(self, sample: int) -> int:
+        """pts của một mẫu (chỉ số từ 0) mà không cần dựng pts của cả track"""
+        if self._pts is not None:
+            return self._pts[sample]
+        if self._stts_runs is None:
+            self._stts_runs = self._runs(self._stts)
+        starts, totals = self._stts_runs
+        run = bisect.bisect_right(starts, sample) - 1
+        value = totals[run] + (sample - starts[run]) * self._stts[run * 2 + 1] + self._shift
+
+        ctts = self._ctts
+        if ctts is not None and len(ctts):
+            if self._ctts_runs is None:
+                counts = ctts[0::2]
+                # Thường mỗi mẫu một dòng: tra thẳng, không cần dựng các dải
+                self._ctts_runs = [] if counts.count(1) == len(counts) else self._runs(ctts)[0]
+            if self._ctts_runs:
+                run = bisect.bisect_right(self._ctts_runs, sample) - 1
+            else:
+                run = sample
+            value += ctts[run * 2 + 1]
+        return value
+
+    @property
+    def duration(self) -> float:
+        """Thời lượng của track (giây)"""
+        stts = self._stts
+        total = sum(stts[i] * stts[i + 1] for i in range(0, len(stts), 2))
+        return total / self.timescale if self.timescale else 0.0
+
+    @property
+    def time_base(self) -> Fraction:
+        return Fraction(1, self.timescale)
+
+    # ===== KEYFRAME =====
+
+    def keyframes(self) -> array:
+        """Chỉ số (từ 0, theo thứ tự giải mã) của các mẫu keyframe"""
+        if self._stss is None:
+            return array('I', range(self.sample_count))
+        keys = array('I', self._stss)
+        for i, sample in enumerate(keys):
+            keys[i] = sample - 1
+        return keys
+
+    def keyframe_pts(self) -> array:
+        """pts của các keyframe, tăng dần"""
+        if self._keyframe_pts is None:
+            self._keyframe_pts = array('q', sorted(self.sample_pts(i) for i in self.keyframes()
+                                                   if i < self.sample_count))
+        return self._keyframe_pts
+
+    def keyframe_times(self) -> List[float]:
+        """Thời điểm (giây) của các keyframe, tăng dần"""
+        return [value / self.timescale for value in self.keyframe_pts()]
+
+    def keyframe_before(self, seconds: float) -> Optional[float]:
+        """Keyframe cuối cùng không sau thời điểm seconds (giây), None nếu không có"""
+        keys = self.keyframe_pts()
+        position = bisect.bisect_right(keys, seconds * self.timescale) - 1
+        return keys[position] / self.timescale if position >= 0 else None
+
+    # ===== VỊ TRÍ BYTE =====
+
+    def sample_size(self, sample: int) -> int:
+        return self._sizes[sample] if self._sizes is not None else self._sample_size
+
+    def sample_offset(self, sample: int) -> int:
+        """
+        Vị trí byte của một mẫu (chỉ số từ 0) trong file
+
+        Raises:
+            Mp4IndexError: Nếu track không có stsc/stco
+        """
+        if self._stsc is None or self._chunks is None:
+            raise Mp4IndexError("Thiếu bảng chunk (stsc/stco)")
+        if self._run_starts is None:
+            # Mẫu đầu tiên của mỗi dải chunk trong stsc
+            starts = []
+            first_sample = 0
+            stsc = self._stsc
+            for i in range(0, len(stsc), 3):
+                starts.append(first_sample)
+                next_chunk = stsc[i + 3] if i + 3 < len(stsc) else len(self._chunks) + 1
+                first_sample += (next_chunk - stsc[i]) * stsc[i + 1]
+            self._run_starts = starts
+
+        run = bisect.bisect_right(self._run_starts, sample) - 1
+        first_chunk, per_chunk = self._stsc[run * 3], self._stsc[run * 3 + 1]
+        chunk, position = divmod(sample - self._run_starts[run], per_chunk)
+        offset = self._chunks[first_chunk - 1 + chunk]
+        if self._sizes is None:
+            return offset + position * self._sample_size
+        first = sample - position
+        return offset + sum(self._sizes[first:sample])
+
+    def keyframe_offsets(self) -> array:
+        """Vị trí byte của các keyframe (cùng thứ tự với keyframes())"""
+        return array('Q', (self.sample_offset(i) for i in self.keyframes() if i < self.sample_count))
+
+
+class Mp4Index:
+    """Chỉ mục của một file MP4/MOV: các track và thời lượng"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Đường dẫn file
+
+        Raises:
+            Mp4IndexError: Nếu không tìm thấy/đọc được moov
+            OSError: Nếu không mở được file
+        """
+        self.path = path
+        self.tracks = []
+        self.duration = 0.0
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < 8:
+                raise Mp4IndexError("File quá nhỏ")
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read(buf, size)
+        finally:
+            buf.close()
+
+    def _read(self, buf, size: int):
+        moov = _find(buf, 0, size, b'moov')
+        if moov is None:
+            raise Mp4IndexError("Không tìm thấy box moov")
+
+        movie_timescale = 0
+        mvhd = _find(buf, *moov, b'mvhd')
+        if mvhd:
+            body = mvhd[0]
+            if buf[body] == 1:
+                movie_timescale, duration = struct.unpack_from('>IQ', buf, body + 20)
+            else:
+                movie_timescale, duration = struct.unpack_from('>II', buf, body + 12)
+            if movie_timescale:
+                self.duration = duration / movie_timescale
+
+        for kind, body, end in _boxes(buf, *moov):
+            if kind == b'trak':
+                track = self._read_track(buf, body, end, movie_timescale)
+                if track is not None:
+                    self.tracks.append(track)
+        if not self.duration:
+            self.duration = max((track.duration for track in self.tracks), default=0.0)
+
+    @staticmethod
+    def _read_track(buf, start: int, end: int, movie_timescale: int) -> Optional[TrackIndex]:
+        mdia = _find(buf, start, end, b'mdia')
+        if mdia is None:
+            return None
+        mdhd = _find(buf, *mdia, b'mdhd')
+        hdlr = _find(buf, *mdia, b'hdlr')
+        minf = _find(buf, *mdia, b'minf')
+        stbl = _find(buf, *minf, b'stbl') if minf else None
+        if mdhd is None or stbl is None:
+            return None
+
+        body = mdhd[0]
+        timescale = struct.unpack_from('>I', buf, body + (20 if buf[body] == 1 else 12))[0]
+        handler = bytes(buf[hdlr[0] + 8:hdlr[0] + 12]).decode('latin-1') if hdlr else ''
+
+        # Edit list: edit rỗng ở đầu (trễ) rồi edit đầu tiên bắt đầu từ media_time
+        media_time = 0
+        empty_duration = 0
+        edts = _find(buf, start, end, b'edts')
+        elst = _find(buf, *edts, b'elst') if edts else None
+        if elst:
+            body = elst[0]
+            version = buf[body]
+            count = struct.unpack_from('>I', buf, body + 4)[0]
+            entry_format, entry_size = ('>Qq', 20) if version == 1 else ('>Ii', 12)
+            for i in range(count):
+                segment_duration, entry_time = struct.unpack_from(entry_format, buf, body + 8 + i * entry_size)
+                if entry_time == -1:
+                    if movie_timescale:
+                        empty_duration += segment_duration * timescale // movie_timescale
+                    continue
+                media_time = entry_time
+                break
+
+        if not timescale:
+            return None
+        return TrackIndex(buf, stbl, timescale, handler, media_time, empty_duration)
+
+    @property
+    def video(self) -> Optional[TrackIndex]:
+        return next((track for track in self.tracks if track.handler == 'vide'), None)
+
+    @property
+    def audio(self) -> Optional[TrackIndex]:
+        return next((track for track in self.tracks if track.handler == 'soun'), None)
+
+
+def read_mp4_index(path: str) -> Optional[Mp4Index]:
+    """
+    Chỉ mục của file MP4/MOV, None nếu không phải MP4/MOV hoặc không đọc được
+    (vd: MP4 phân mảnh không có sample table trong moov)
+    """
+    if not path.lower().endswith(MP4_EXTENSIONS):
+        return None
+    try:
+        index = Mp4Index(path)
+    except (OSError, ValueError, struct.error):
+        return None
+    return index if index.tracks else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Đọc chỉ mục keyframe của file MP4/MOV (không cần ffprobe)')
+    parser.add_argument('-i', '--input', required=True, help='File MP4/MOV')
+    parser.add_argument('--at', type=float, default=None, metavar='SECONDS',
+                        help='In keyframe ngay trước thời điểm này')
+    parser.add_argument('--list', action='store_true', help='In mọi keyframe (thời điểm, byte)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = read_mp4_index(args.input)
+    if index is None or index.video is None:
+        print(f"❌ Không đọc được chỉ mục MP4/MOV: {args.input}", file=sys.stderr)
+        sys.exit(1)
+    video = index.video
+    keys = video.keyframe_pts()
+    elapsed = (time.perf_counter() - started) * 1000
+
+    print(f"🎞️  {video.codec or '?'}: {video.sample_count} mẫu, {len(keys)} keyframe, "
+          f"timescale {video.timescale}, {index.duration:.3f}s ({elapsed:.1f} ms)")
+    for track in index.tracks:
+        if track is not video:
+            print(f"   track {track.handler} {track.codec or '?'}: {track.sample_count} mẫu")
+    if args.at is not None:
+        keyframe = video.keyframe_before(args.at)
+        print(f"⏮️  Keyframe trước {args.at:.3f}s: {'không có' if keyframe is None else f'{keyframe:.3f}s'}")
+    if args.list:
+        for sample, offset in zip(video.keyframes(), video.keyframe_offsets()):
+            print(f"{video.pts()[sample] / video.timescale:.6f}\t{offset}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Proxy - Bản sao độ phân giải thấp để xem trước (draft render)
+Proxy là bản encode nhỏ, GOP rất ngắn (gần như toàn keyframe) nên seek và giải
+mã rất nhanh. Draft render áp dụng các đoạn cắt và âm lượng lên proxy trong vài
+giây; bản render cuối cùng vẫn đọc từ video gốc. Proxy được cache trên đĩa và
+dùng lại giữa các lần chạy.
+"""
+
+import os
+import glob
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from cancellation import CancelToken, JobCancelledError, run_process
+from media_cache import input_cache_dir
+from video_cutter import cut_video_segments
+
+
+# Cấu hình proxy mặc định
+PROXY_HEIGHT = 360
+PROXY_GOP = 12  # Keyframe mỗi 12 frame → seek/cắt copy gần như chính xác
+
+# Số bản draft giữ lại trong cache
+MAX_DRAFTS = 3
+
+# Khóa theo từng proxy để không build trùng khi chọn cùng một video nhiều lần
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+
+def _log(message, progress_callback=None):
+    """In log và gọi callback (nếu có)"""
+    print(message)
+    if progress_callback:
+        progress_callback(message)
+
+
+def proxy_path_for(input_video: str, height: int = PROXY_HEIGHT) -> str:
+    """Đường dẫn file proxy trong cache của video đầu vào"""
+    return os.path.join(input_cache_dir(input_video, "proxy"), f"proxy_{height}p.mp4")
+
+
+def get_proxy(input_video: str, height: int = PROXY_HEIGHT) -> Optional[str]:
+    """Trả về đường dẫn proxy nếu đã được tạo, ngược lại None"""
+    path = proxy_path_for(input_video, height)
+    return path if os.path.exists(path) else None
+
+
+def build_proxy(input_video: str, height: int = PROXY_HEIGHT,
+                progress_callback=None, cancel_token: Optional[CancelToken] = None) -> str:
+    """
+    Tạo proxy cho video (bỏ qua nếu đã có trong cache)
+
+    Args:
+        input_video: Đường dẫn video gốc
+        height: Chiều cao proxy (pixel)
+        progress_callback: Hàm callback để báo tiến trình (nhận message string)
+        cancel_token: CancelToken để hủy giữa chừng
+
+    Returns:
+        Đường dẫn file proxy
+
+    Raises:
+        RuntimeError: Nếu ffmpeg lỗi
+        JobCancelledError: Nếu bị hủy
+    """
+    path = proxy_path_for(input_video, height)
+
+    with _build_locks_guard:
+        lock = _build_locks.setdefault(path, threading.Lock())
+
+    with lock:
+        if os.path.exists(path):
+            return path
+
+        _log(f"🎞️ Đang tạo proxy {height}p: {os.path.basename(input_video)}", progress_callback)
+
+        # Ghi ra file tạm rồi rename để không bao giờ dùng phải proxy dở dang
+        tmp_path = path + ".part.mp4"
+        cmd = [
+            'ffmpeg', '-nostdin',
+            '-i', input_video,
+            '-vf', f'scale=-2:{height}',
+            '-c:v', 'libx264',
+            '-preset', 'veryfast',
+            '-crf', '28',
+            '-tune', 'fastdecode',
+            '-g', str(PROXY_GOP),
+            '-keyint_min', '1',
+            '-sc_threshold', '0',
+            '-c:a', 'aac', '-b:a', '96k',
+            '-movflags', '+faststart',
+            '-y', tmp_path
+        ]
+
+        try:
+            result = run_process(cmd, cancel_token)
+        except JobCancelledError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        if result.returncode != 0:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise RuntimeError(f"Lỗi khi tạo proxy: {result.stderr.decode(errors='replace')[-500:]}")
+
+        os.replace(tmp_path, path)
+
+        _log(f"✅ Proxy sẵn sàng: {os.path.basename(input_video)}", progress_callback)
+        return path
+
+
+def draft_render(input_video: str, segments: List[Tuple[float, float]], volume: int = 100,
+                 output_video: Optional[str] = None, max_workers: Optional[int] = None,
+                 progress_callback=None, cancel_token: Optional[CancelToken] = None,
+                 cpu_threads: Optional[int] = None) -> str:
+    """
+    Render nháp các đoạn cắt từ proxy (tự tạo proxy nếu chưa có)
+
+    Args:
+        input_video: Đường dẫn video gốc
+        segments: List các tuple (start_time, end_time)
+        volume: Âm lượng (0-200%)
+        output_video: File đầu ra (None = lưu trong cache)
+        max_workers: Số luồng song song
+        progress_callback: Hàm callback để báo tiến trình
+        cancel_token: CancelToken để hủy giữa chừng
+        cpu_threads: Tổng số luồng CPU khi encode (xem cut_video_segments)
+
+    Returns:
+        Đường dẫn file draft
+    """
+    proxy = build_proxy(input_video, progress_callback=progress_callback, cancel_token=cancel_token)
+
+    drafts_dir = os.path.dirname(proxy)
+    if output_video is None:
+        output_video = os.path.join(drafts_dir, f"draft_{int(time.time() * 1000)}.mp4")
+        _prune_drafts(drafts_dir)
+
+    cut_video_segments(
+        proxy,
+        segments,
+        output_video,
+        mode="balanced",
+        max_workers=max_workers,
+        cpu_threads=cpu_threads,
+        volume=volume,
+        progress_callback=progress_callback,
+        cancel_token=cancel_token,
+        preset="ultrafast",
+        crf=30
+    )
+    return output_video
+
+
+def _prune_drafts(drafts_dir: str):
+    """Chỉ giữ lại MAX_DRAFTS bản draft mới nhất"""
+    drafts = sorted(glob.glob(os.path.join(drafts_dir, "draft_*.mp4")), key=os.path.getmtime)
+    for path in drafts[:-(MAX_DRAFTS - 1) or None]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
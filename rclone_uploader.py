@@ -10,6 +10,10 @@ import subprocess
 import tempfile
 from pathlib import Path
 
+from cancellation import AccountedPopen, JobCancelledError, process_group_kwargs
+from metrics import record_file
+from capabilities import has_tool
+
 
 class RcloneUploader:
     """Upload files using rclone"""
@@ -39,17 +43,8 @@ class RcloneUploader:
         print(f"✅ Rclone config created: {self.config_file.name}")
 
     def check_rclone_installed(self):
-        """Check if rclone is installed"""
-        try:
-            result = subprocess.run(
-                ['rclone', 'version'],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            return result.returncode == 0
-        except (subprocess.SubprocessError, FileNotFoundError):
-            return False
+        """Check if rclone is installed (cached per rclone binary mtime)"""
+        return has_tool('rclone')
 
     def list_remotes(self):
         """List available remotes in config"""
@@ -71,7 +66,21 @@ class RcloneUploader:
             print(f"❌ Error: {e}")
             return []
 
-    def upload_file(self, file_path, remote_name='gdrive', remote_path='', progress_callback=None):
+    def build_copy_command(self, file_path, destination):
+        """Build the rclone copy command with one-line progress stats"""
+        return [
+            'rclone',
+            'copy',
+            file_path,
+            destination,
+            '--config', self.config_file.name,
+            '--progress',
+            '--stats', '1s',
+            '--stats-one-line'
+        ]
+
+    def upload_file(self, file_path, remote_name='gdrive', remote_path='', progress_callback=None,
+                    cancel_token=None):
         """
         Upload a file using rclone
 
@@ -80,10 +89,17 @@ class RcloneUploader:
             remote_name: Name of the remote (default: gdrive)
             remote_path: Path on remote (default: root)
             progress_callback: Callback function for progress updates
+            cancel_token: CancelToken to stop the upload (optional)
 
         Returns:
             True if successful, False otherwise
+
+        Raises:
+            JobCancelledError: If cancel_token is cancelled during the upload
         """
+        if cancel_token:
+            cancel_token.raise_if_cancelled()
+
         if not os.path.exists(file_path):
             print(f"❌ File not found: {file_path}")
             return False
@@ -100,26 +116,20 @@ class RcloneUploader:
         # Build rclone copy command
         destination = f"{remote_name}:{remote_path}"
 
-        cmd = [
-            'rclone',
-            'copy',
-            file_path,
-            destination,
-            '--config', self.config_file.name,
-            '--progress',
-            '--stats', '1s',
-            '--stats-one-line'
-        ]
+        cmd = self.build_copy_command(file_path, destination)
 
         try:
             # Run rclone with real-time progress
-            process = subprocess.Popen(
+            process = AccountedPopen(
                 cmd,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
                 text=True,
-                bufsize=1
+                bufsize=1,
+                **process_group_kwargs()
             )
+            if cancel_token:
+                cancel_token.register_process(process)
 
             # Read output line by line
             for line in process.stdout:
@@ -134,13 +144,22 @@ class RcloneUploader:
             process.wait()
             print()  # New line after progress
 
+            if cancel_token:
+                cancel_token.unregister_process(process)
+                if cancel_token.cancelled:
+                    print("❌ Upload cancelled")
+                    raise JobCancelledError("Upload cancelled")
+
             if process.returncode == 0:
                 print(f"✅ Upload complete!")
+                record_file(cancel_token, file_path, written=False)
                 return True
             else:
                 print(f"❌ Upload failed with return code: {process.returncode}")
                 return False
 
+        except JobCancelledError:
+            raise
         except Exception as e:
             print(f"\n❌ Upload error: {e}")
             return False
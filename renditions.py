@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Renditions - Xuất nhiều phiên bản (1080p, 720p, dọc 9:16...) từ một lần giải mã
+Mỗi đoạn được giải mã một lần, filter `split` chia khung hình cho từng phiên bản
+(scale/crop riêng) và mỗi phiên bản có encoder riêng (CRF, preset riêng) trong
+cùng một tiến trình ffmpeg. Sau khi cắt xong, mỗi phiên bản được ghép riêng và
+có thể upload ngay khi ghép xong.
+"""
+
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cancellation import CancelToken, JobCancelledError
+from ffmpeg_errors import (CODEC_UNSUPPORTED, INPUT_CORRUPT, OUT_OF_DISK, TOLERANT_INPUT_ARGS, UNKNOWN,
+                           JobFailures, ProcessFailure, run_ffmpeg, run_with_policy)
+from frame_index import ExactCut, build_frame_index, verify_frame_count
+from media_info import prepare_segments
+from scratch import create_scratch_dir, ensure_free_space, estimate_intermediate_size, format_bytes
+from streaming import DEFAULT_HLS_SEGMENT_SECONDS, remove_output
+from video_cutter import check_ffmpeg, concat_files, format_duration
+
+
+# Các phiên bản dựng sẵn, dùng làm tên trong spec (vd: "720p", "vertical:height=1280")
+RENDITION_PRESETS = {
+    '1080p': {'height': 1080},
+    '720p': {'height': 720},
+    '480p': {'height': 480},
+    'vertical': {'crop': '9:16'},
+    'square': {'crop': '1:1'},
+}
+
+# Số encoder chạy đồng thời tối đa (mỗi tiến trình ffmpeg chạy một encoder cho mỗi phiên bản)
+MAX_PARALLEL_ENCODERS = 4
+
+
+class Rendition:
+    """Một phiên bản đầu ra: kích thước, khung crop, CRF, preset"""
+
+    def __init__(self, name: str, height: Optional[int] = None, width: Optional[int] = None,
+                 crop: Optional[str] = None, crf: int = 23, preset: str = "medium",
+                 output: Optional[str] = None):
+        """
+        Args:
+            name: Tên phiên bản (dùng làm hậu tố tên file, vd: video_720p.mp4)
+            height: Chiều cao đầu ra (None = giữ nguyên, hoặc theo width)
+            width: Chiều rộng đầu ra (None = giữ nguyên, hoặc theo height)
+            crop: Tỉ lệ khung crop giữa khung hình "W:H" (vd: "9:16"), None = không crop
+            crf: Constant Rate Factor của phiên bản
+            preset: x264 preset của phiên bản
+            output: File đầu ra (None = tự đặt theo file đầu ra chung)
+        """
+        self.name = name
+        self.height = height
+        self.width = width
+        self.crop = _parse_aspect(crop) if crop else None
+        self.crf = crf
+        self.preset = preset
+        self.output = output
+
+    @classmethod
+    def parse(cls, spec: str) -> 'Rendition':
+        """
+        Đọc phiên bản từ chuỗi "NAME[:key=value,...]"
+
+        NAME là tên dựng sẵn (1080p, 720p, 480p, vertical, square) hoặc tên tùy ý.
+        Khóa hợp lệ: height, width, crop, crf, preset, output.
+        Ví dụ: "720p:crf=26", "vertical:height=1280,preset=fast", "tiktok:crop=9:16,height=1920"
+
+        Raises:
+            ValueError: Nếu spec không hợp lệ
+        """
+        name, _, options = spec.partition(':')
+        name = name.strip()
+        if not name:
+            raise ValueError(f"Thiếu tên phiên bản: {spec}")
+
+        kwargs = dict(RENDITION_PRESETS.get(name, {}))
+        for option in filter(None, (part.strip() for part in options.split(','))):
+            key, sep, value = option.partition('=')
+            if not sep or key not in ('height', 'width', 'crop', 'crf', 'preset', 'output'):
+                raise ValueError(f"Tùy chọn phiên bản không hợp lệ: {option}")
+            if key in ('height', 'width', 'crf'):
+                try:
+                    kwargs[key] = int(value)
+                except ValueError:
+                    raise ValueError(f"{key} phải là số nguyên: {option}")
+            else:
+                kwargs[key] = value
+
+        if name not in RENDITION_PRESETS and not options:
+            raise ValueError(f"Không có phiên bản dựng sẵn '{name}' "
+                             f"(có: {', '.join(RENDITION_PRESETS)})")
+        return cls(name, **kwargs)
+
+    def filter_chain(self) -> str:
+        """Chuỗi filter video của phiên bản (crop rồi scale), "null" nếu giữ nguyên"""
+        filters = []
+        if self.crop:
+            # Crop lớn nhất có tỉ lệ W:H ở giữa khung hình, kích thước chẵn cho x264
+            w, h = self.crop
+            filters.append(f"crop=trunc(min(iw\\,ih*{w}/{h})/2)*2:trunc(min(ih\\,iw*{h}/{w})/2)*2")
+        if self.width and self.height:
+            filters.append(f"scale={self.width}:{self.height}")
+        elif self.height:
+            filters.append(f"scale=-2:{self.height}")
+        elif self.width:
+            filters.append(f"scale={self.width}:-2")
+        return ",".join(filters) or "null"
+
+    def output_path(self, output_video: str) -> str:
+        """File đầu ra của phiên bản (mặc định: <tên>_<phiên bản><đuôi> cạnh output_video)"""
+        if self.output:
+            return self.output
+        path = Path(output_video)
+        return str(path.parent / f"{path.stem}_{self.name}{path.suffix or '.mp4'}")
+
+
+def _parse_aspect(value: str) -> Tuple[int, int]:
+    w, sep, h = str(value).partition(':')
+    try:
+        aspect = (int(w), int(h))
+    except ValueError:
+        aspect = (0, 0)
+    if not sep or aspect[0] <= 0 or aspect[1] <= 0:
+        raise ValueError(f"Tỉ lệ crop không hợp lệ (dạng W:H, vd: 9:16): {value}")
+    return aspect
+
+
+def build_rendition_command(input_video: str, start_time: float, end_time: float,
+                            renditions: List[Rendition], output_files: List[str],
+                            volume: int = 100, plan: Optional[dict] = None,
+                            exact: Optional[ExactCut] = None, tolerant: bool = False) -> List[str]:
+    """
+    Tạo lệnh ffmpeg cắt một đoạn ra tất cả phiên bản cùng lúc
+
+    Video được giải mã một lần rồi chia bằng `split` cho từng chuỗi crop/scale;
+    mỗi phiên bản có encoder libx264 riêng. Audio xử lý theo plan như
+    build_segment_command (copy/encode/drop).
+
+    Args:
+        input_video: Đường dẫn video đầu vào
+        start_time: Thời gian bắt đầu (giây)
+        end_time: Thời gian kết thúc (giây)
+        renditions: Các phiên bản
+        output_files: File đầu ra của từng phiên bản (cùng thứ tự)
+        volume: Âm lượng (0-200%)
+        plan: Cách xử lý stream (xem media_info.stream_plan); chỉ dùng phần audio
+        exact: Cắt chính xác từng frame (frame_index.ExactCut): seek tới keyframe
+            rồi trim theo pts trước khi chia cho các phiên bản; audio được encode lại
+        tolerant: Bỏ qua gói/khung hình hỏng của đầu vào (ffmpeg_errors.TOLERANT_INPUT_ARGS)
+
+    Returns:
+        Danh sách tham số lệnh ffmpeg
+    """
+    count = len(renditions)
+    trim = f"{exact.video_filter()}," if exact else ""
+    if count == 1:
+        graph = f"[0:v]{trim}{renditions[0].filter_chain()}[v0]"
+    else:
+        labels = "".join(f"[s{i}]" for i in range(count))
+        chains = [f"[s{i}]{rendition.filter_chain()}[v{i}]" for i, rendition in enumerate(renditions)]
+        graph = ";".join([f"[0:v]{trim}split={count}{labels}"] + chains)
+
+    audio = (plan or {}).get('audio', 'drop' if volume == 0 else 'encode')
+    audio_filter = [f'volume={volume / 100.0}'] if volume != 100 else []
+    input_args = TOLERANT_INPUT_ARGS if tolerant else []
+    if exact:
+        # Audio copy chỉ cắt được theo gói: encode lại để khớp với video
+        audio = 'encode' if audio == 'copy' else audio
+        audio_filter.insert(0, exact.audio_filter())
+        cmd = ['ffmpeg', '-copyts', *exact.input_args(), *input_args, '-i', input_video]
+    else:
+        cmd = [
+            'ffmpeg',
+            '-ss', str(start_time),
+            # -t phía input: giới hạn chung cho mọi đầu ra (đặt sau -i thì chỉ áp cho đầu ra đầu tiên)
+            '-t', str(end_time - start_time),
+            *input_args,
+            '-i', input_video,
+        ]
+    cmd.extend(['-filter_complex', graph])
+
+    for i, (rendition, output_file) in enumerate(zip(renditions, output_files)):
+        cmd.extend([
+            '-map', f'[v{i}]',
+            '-c:v', 'libx264',
+            '-preset', rendition.preset,
+            '-crf', str(rendition.crf),
+        ])
+        if exact:
+            cmd.extend(['-frames:v', str(exact.frames)])
+        if audio == 'copy':
+            cmd.extend(['-map', '0:a?', '-c:a', 'copy'])
+        elif audio == 'encode':
+            cmd.extend(['-map', '0:a?', '-c:a', 'aac', '-b:a', '128k'])
+            if audio_filter:
+                cmd.extend(['-af', ','.join(audio_filter)])
+        cmd.extend(['-strict', 'experimental', '-y', output_file])
+
+    return cmd
+
+
+def cut_segment_renditions(input_video: str, start_time: float, end_time: float,
+                           renditions: List[Rendition], output_files: List[str],
+                           volume: int = 100, cancel_token: Optional[CancelToken] = None,
+                           plan: Optional[dict] = None, exact: Optional[ExactCut] = None,
+                           tolerant: bool = False) -> bool:
+    """
+    Cắt một đoạn ra tất cả phiên bản (một tiến trình ffmpeg)
+
+    Returns:
+        True khi thành công
+
+    Raises:
+        ProcessFailure: Nếu ffmpeg lỗi (kèm loại lỗi, xem ffmpeg_errors)
+        JobCancelledError: Nếu bị hủy trong khi đang cắt
+        FrameCountError: Nếu một phiên bản không đúng số frame (khi dùng exact)
+    """
+    cmd = build_rendition_command(input_video, start_time, end_time, renditions, output_files,
+                                  volume, plan, exact, tolerant)
+    run_ffmpeg(cmd, cancel_token)
+    if exact is not None:
+        for output_file in output_files:
+            verify_frame_count(output_file, exact.frames, cancel_token)
+    return True
+
+
+def cut_renditions(input_video: str, segments: List[Tuple[float, float]],
+                   renditions: List[Rendition], output_video: str,
+                   temp_dir: Optional[str] = None, mode: str = "balanced",
+                   max_workers: Optional[int] = None, volume: int = 100,
+                   progress_callback=None, cancel_token: Optional[CancelToken] = None,
+                   fast_scratch: bool = True,
+                   on_output: Optional[Callable[[Rendition, str], None]] = None,
+                   output_format: str = "mp4", hls_time: float = DEFAULT_HLS_SEGMENT_SECONDS,
+                   on_fragment: Optional[Callable[[str], None]] = None) -> Dict[str, str]:
+    """
+    Cắt và ghép các đoạn video ra nhiều phiên bản cùng lúc
+
+    Args:
+        input_video: Đường dẫn video đầu vào
+        segments: List các tuple (start_time, end_time)
+        renditions: Các phiên bản đầu ra
+        output_video: File đầu ra chung, dùng để đặt tên file của từng phiên bản
+        temp_dir: Thư mục gốc cho file tạm (xem cut_video_segments)
+        mode: 'accurate' = cắt chính xác từng frame theo chỉ mục frame (như
+            cut_video_segments). Video luôn được encode lại vì mỗi phiên bản có
+            kích thước/CRF riêng; các đoạn luôn được cắt song song
+        max_workers: Số đoạn cắt song song (None = auto theo số phiên bản)
+        volume: Âm lượng (0-200%, 0=tắt)
+        progress_callback: Hàm callback để báo tiến trình (nhận message string)
+        cancel_token: CancelToken để hủy giữa chừng
+        fast_scratch: Đặt file tạm trên /dev/shm nếu vừa
+        on_output: Gọi với (rendition, đường dẫn) ngay khi một phiên bản ghép xong
+            (vd: để upload phiên bản đó trong khi ghép phiên bản tiếp theo)
+        output_format: 'mp4', 'fmp4' hoặc 'hls' (xem cut_video_segments); với 'hls'
+            mỗi phiên bản là một playlist riêng
+        hls_time: Độ dài mục tiêu mỗi segment HLS (giây)
+        on_fragment: Với 'hls', gọi với từng file segment ngay khi nó ghi xong
+
+    Returns:
+        Dict tên phiên bản → đường dẫn file đầu ra
+
+    Raises:
+        ValueError: Nếu không có phiên bản nào, tên trùng hoặc đoạn nằm ngoài video
+        ScratchSpaceError: Nếu không đủ dung lượng
+        JobFailures: Nếu có đoạn vẫn lỗi sau khi thử lại/đổi cách (liệt kê mọi đoạn lỗi)
+    """
+    def log(message):
+        """Helper để in log hoặc gọi callback"""
+        print(message)
+        if progress_callback:
+            progress_callback(message)
+
+    if not renditions:
+        raise ValueError("Cần ít nhất một phiên bản đầu ra")
+    names = [rendition.name for rendition in renditions]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Tên phiên bản bị trùng: {', '.join(names)}")
+
+    if not check_ffmpeg():
+        raise RuntimeError("ffmpeg chưa được cài đặt. Vui lòng cài đặt ffmpeg trước.")
+    if not os.path.exists(input_video):
+        raise FileNotFoundError(f"Không tìm thấy file video: {input_video}")
+
+    info, segments, segment_warnings, plan = prepare_segments(input_video, segments, mode, volume)
+    if plan and plan['video'] == 'drop':
+        raise ValueError("Video đầu vào không có hình, không thể xuất các phiên bản")
+
+    if cancel_token is None:
+        cancel_token = CancelToken()
+
+    # Accurate: seek keyframe + trim theo pts từ chỉ mục frame (đọc một lần, có cache)
+    exact_cuts = {}
+    if mode == "accurate":
+        index = build_frame_index(input_video, info, cancel_token, log)
+        if index is None:
+            segment_warnings.append("Không đọc được chỉ mục frame: cắt theo thời gian (có thể lệch 1 frame)")
+        else:
+            exact_cuts = index.exact_cuts(segments, info.sample_rate if info else 0)
+
+    outputs = [rendition.output_path(output_video) for rendition in renditions]
+
+    # Ước tính thô: mỗi phiên bản tối đa bằng kích thước đoạn gốc
+    estimate = estimate_intermediate_size(input_video, segments, info) * len(renditions)
+    for directory in sorted({os.path.dirname(os.path.abspath(path)) for path in outputs}):
+        ensure_free_space(directory, estimate)
+    temp_dir = create_scratch_dir(estimate, root=temp_dir, prefer_fast=fast_scratch)
+
+    log(f"\n🎬 Bắt đầu cắt video từ: {input_video}")
+    log(f"📊 Tổng số đoạn cần cắt: {len(segments)}")
+    log(f"🖼️  {len(renditions)} phiên bản từ một lần giải mã:")
+    for rendition, output in zip(renditions, outputs):
+        log(f"   - {rendition.name}: {rendition.filter_chain()} "
+            f"(crf {rendition.crf}, {rendition.preset}) → {output}")
+    if info:
+        log(f"🎞️  Video gốc: {info.summary()}")
+    for warning in segment_warnings:
+        log(f"⚠️  {warning}")
+    log(f"💽 File tạm (~{format_bytes(estimate)}): {temp_dir}\n")
+
+    # segment_files[r][i]: đoạn i của phiên bản r
+    segment_files = [[os.path.join(temp_dir, f"{rendition.name}_{idx:03d}.mp4")
+                      for idx in range(1, len(segments) + 1)] for rendition in renditions]
+    total_duration = sum(end - start for start, end in segments)
+    start_overall = time.time()
+    # Các file đầu ra công việc này đã bắt đầu ghi
+    written = []
+
+    # Cách cắt mỗi đoạn khi lỗi (như cut_video_segments): lỗi tạm thời được chạy lại;
+    # audio copy lỗi → encode lại; dữ liệu hỏng → bỏ qua gói hỏng
+    encode_plan = dict(plan, audio='encode') if plan and plan.get('audio') == 'copy' else plan
+    strategies = [("encode", plan, False, ())]
+    if encode_plan != plan:
+        strategies.append(("encode lại audio", encode_plan, False, (CODEC_UNSUPPORTED, INPUT_CORRUPT, UNKNOWN)))
+    strategies.append(("bỏ qua dữ liệu hỏng", encode_plan, True, (INPUT_CORRUPT,)))
+
+    def cut(idx, start, end):
+        files = [files_of[idx - 1] for files_of in segment_files]
+        exact = exact_cuts.get((start, end))
+
+        def attempt(attempt_plan, tolerant):
+            return lambda: cut_segment_renditions(input_video, start, end, renditions, files, volume,
+                                                  cancel_token, attempt_plan, exact, tolerant)
+
+        run_with_policy([(name, attempt(attempt_plan, tolerant), kinds)
+                         for name, attempt_plan, tolerant, kinds in strategies],
+                        cancel_token, log=log, label=f"Đoạn {idx}")
+
+    # Đoạn lỗi không dừng cả công việc: các đoạn còn lại vẫn được cắt, cuối cùng báo mọi lỗi
+    failures = []
+
+    def record_failure(idx, error):
+        if not isinstance(error, ProcessFailure):
+            error = RuntimeError(f"Đoạn {idx}: {error}")
+        failures.append(error)
+        log(f"❌ {error}")
+        return getattr(error, 'kind', None) == OUT_OF_DISK
+
+    try:
+        if max_workers is None:
+            max_workers = max(1, min(len(segments), MAX_PARALLEL_ENCODERS // len(renditions)))
+        log(f"🔄 Đang cắt {len(segments)} đoạn song song với {max_workers} luồng...\n")
+
+        completed = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            future_to_task = {}
+            for idx, (start, end) in enumerate(segments, 1):
+                future = executor.submit(cut, idx, start, end)
+                cancel_token.add_future(future)
+                future_to_task[future] = (idx, start, end)
+
+            try:
+                for future in as_completed(future_to_task):
+                    idx, start, end = future_to_task[future]
+                    cancel_token.raise_if_cancelled()
+                    if future.cancelled():
+                        continue
+                    completed += 1
+                    try:
+                        future.result()
+                    except JobCancelledError:
+                        raise
+                    except Exception as e:
+                        if record_failure(idx, e):
+                            # Hết dung lượng: không bắt đầu thêm đoạn nào nữa
+                            for pending in future_to_task:
+                                pending.cancel()
+                        continue
+                    log(f"✅ [{completed}/{len(segments)}] Đoạn {idx}: "
+                        f"{format_duration(start)} → {format_duration(end)}")
+            except (JobCancelledError, KeyboardInterrupt):
+                # Dừng các đoạn còn lại trước khi executor chờ các luồng kết thúc
+                cancel_token.cancel()
+                raise
+
+        if failures:
+            if cancel_token.metrics is not None:
+                cancel_token.metrics.info['failures'] = [
+                    failure.to_dict() if isinstance(failure, ProcessFailure) else {'error': str(failure)}
+                    for failure in failures]
+            raise JobFailures(failures, len(segments))
+
+        cutting_time = time.time() - start_overall
+        log(f"\n✅ Đã cắt xong {len(segments)} đoạn × {len(renditions)} phiên bản "
+            f"({cutting_time:.1f}s)")
+
+        # Ghép (và upload) từng phiên bản
+        results = {}
+        for rendition, files, output in zip(renditions, segment_files, outputs):
+            log(f"🔗 Đang ghép phiên bản {rendition.name}...")
+            written.append(output)
+            concat_files(files, output, temp_dir, cancel_token, progress_callback=log,
+                         output_format=output_format, hls_time=hls_time, on_fragment=on_fragment)
+            results[rendition.name] = output
+            log(f"✨ {rendition.name}: {output}")
+            if on_output:
+                on_output(rendition, output)
+
+        total_time = time.time() - start_overall
+        log(f"\n📊 Tổng thời lượng mỗi phiên bản: {format_duration(total_duration)}, "
+            f"tổng thời gian: {total_time:.1f}s\n")
+        return results
+
+    except (JobCancelledError, KeyboardInterrupt):
+        cancel_token.cancel()
+        # Chỉ xóa các phiên bản đã bắt đầu ghi (không xóa file có sẵn từ trước)
+        for output in written:
+            remove_output(output, output_format)
+        log("❌ Đã hủy xử lý")
+        raise
+
+    finally:
+        try:
+            shutil.rmtree(temp_dir)
+            print("🧹 Đã xóa các file tạm")
+        except Exception as e:
+            print(f"⚠️  Không thể xóa thư mục tạm: {e}")
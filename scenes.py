@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Scenes - Chỉ mục chuyển cảnh (scene change) của video
+Video được giải mã một lần ở độ phân giải thấp, filter `scene` của ffmpeg chấm
+điểm mức thay đổi giữa hai frame liên tiếp và kết quả được đọc dần từ stdout.
+Chỉ mục (thời điểm + điểm của các frame có khả năng là chuyển cảnh) được cache
+cạnh thông tin media khác của file đầu vào, dùng để:
+- kéo điểm đầu/cuối đoạn cắt về chuyển cảnh gần nhất (tránh frame nháy)
+- chia video thành các cảnh (gợi ý highlight) mà không phải phân tích lại
+"""
+
+import os
+import sys
+import bisect
+import argparse
+import subprocess
+from typing import List, Optional, Tuple
+
+from cancellation import (AccountedPopen, CancelToken, JobCancelledError, drain_tail,
+                          process_group_kwargs, terminate_process)
+from ffmpeg_errors import STDERR_TAIL_LIMIT
+from media_cache import input_cache_dir, read_json, write_json
+from media_info import probe_media
+from video_cutter import check_ffmpeg, format_duration, format_segments, parse_segments
+
+
+# Chiều rộng khi phân tích (đủ để nhận ra chuyển cảnh, giải mã/scale rất nhẹ)
+ANALYSIS_WIDTH = 160
+# Chỉ lưu các frame có điểm từ mức này trở lên (để đổi ngưỡng mà không phân tích lại)
+INDEX_MIN_SCORE = 0.08
+# Phiên bản định dạng chỉ mục trong cache
+INDEX_VERSION = 1
+
+DEFAULT_THRESHOLD = 0.3       # Điểm tối thiểu để coi là chuyển cảnh
+DEFAULT_SNAP_TOLERANCE = 0.25  # Chỉ kéo về chuyển cảnh cách tối đa bấy nhiêu giây
+
+
+class SceneIndex:
+    """Các frame có khả năng là chuyển cảnh: thời điểm (giây) và điểm (0-1)"""
+
+    def __init__(self, times: List[float], scores: List[float], duration: float = 0.0):
+        self.times = list(times)
+        self.scores = list(scores)
+        self.duration = duration
+
+    def cuts(self, threshold: float = DEFAULT_THRESHOLD) -> List[float]:
+        """Thời điểm các chuyển cảnh có điểm >= threshold (tăng dần)"""
+        return [t for t, score in zip(self.times, self.scores) if score >= threshold]
+
+    def nearest(self, time_point: float, tolerance: float = DEFAULT_SNAP_TOLERANCE,
+                threshold: float = DEFAULT_THRESHOLD) -> Optional[float]:
+        """Chuyển cảnh gần time_point nhất trong phạm vi tolerance, None nếu không có"""
+        cuts = self.cuts(threshold)
+        pos = bisect.bisect_left(cuts, time_point)
+        candidates = [cuts[i] for i in (pos - 1, pos) if 0 <= i < len(cuts)]
+        best = min(candidates, key=lambda t: abs(t - time_point), default=None)
+        if best is None or abs(best - time_point) > tolerance:
+            return None
+        return best
+
+    def snap_segments(self, segments: List[Tuple[float, float]],
+                      tolerance: float = DEFAULT_SNAP_TOLERANCE,
+                      threshold: float = DEFAULT_THRESHOLD) -> Tuple[List[Tuple[float, float]], int]:
+        """
+        Kéo điểm đầu/cuối của từng đoạn về chuyển cảnh gần nhất
+
+        Frame tại thời điểm chuyển cảnh là frame đầu của cảnh mới, nên đoạn bắt
+        đầu đúng tại đó và kết thúc ngay trước đó (không còn frame nháy).
+
+        Returns:
+            (các đoạn sau khi kéo, số điểm đã được kéo)
+        """
+        snapped = []
+        moved = 0
+        for start, end in segments:
+            new_start = self.nearest(start, tolerance, threshold)
+            new_end = self.nearest(end, tolerance, threshold)
+            new_start = start if new_start is None else new_start
+            new_end = end if new_end is None else new_end
+            if new_end <= new_start:
+                # Hai đầu cùng rơi vào một chuyển cảnh: giữ nguyên đoạn
+                new_start, new_end = start, end
+            moved += (new_start != start) + (new_end != end)
+            snapped.append((new_start, new_end))
+        return snapped, moved
+
+    def scenes(self, threshold: float = DEFAULT_THRESHOLD,
+               min_length: float = 1.0) -> List[Tuple[float, float]]:
+        """
+        Chia video thành các cảnh (giữa hai chuyển cảnh liên tiếp)
+
+        Args:
+            threshold: Điểm tối thiểu để coi là chuyển cảnh
+            min_length: Cảnh ngắn hơn mức này được gộp vào cảnh trước (giây)
+
+        Returns:
+            List các tuple (start_time, end_time)
+        """
+        bounds = [0.0]
+        for cut in self.cuts(threshold):
+            if cut - bounds[-1] >= min_length:
+                bounds.append(cut)
+        end = self.duration or (self.times[-1] if self.times else 0.0)
+        if end - bounds[-1] < min_length and len(bounds) > 1:
+            bounds.pop()
+        bounds.append(end)
+        return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if stop > start]
+
+    def to_dict(self) -> dict:
+        return {'version': INDEX_VERSION, 'duration': self.duration,
+                'times': self.times, 'scores': self.scores}
+
+
+def _index_path(input_video: str) -> str:
+    return os.path.join(input_cache_dir(input_video, "mediainfo"), "scenes.json")
+
+
+def load_scene_index(input_video: str) -> Optional[SceneIndex]:
+    """Chỉ mục chuyển cảnh đã có trong cache, None nếu chưa phân tích"""
+    data = read_json(_index_path(input_video))
+    if not data or data.get('version') != INDEX_VERSION:
+        return None
+    return SceneIndex(data['times'], data['scores'], data.get('duration', 0.0))
+
+
+def build_scene_index(input_video: str, cancel_token: Optional[CancelToken] = None,
+                      progress_callback=None) -> SceneIndex:
+    """
+    Chỉ mục chuyển cảnh của video (phân tích một lần, sau đó đọc từ cache)
+
+    Args:
+        input_video: Đường dẫn video
+        cancel_token: CancelToken để hủy giữa chừng
+        progress_callback: Hàm callback để báo tiến trình (nhận message string)
+
+    Returns:
+        SceneIndex
+
+    Raises:
+        RuntimeError: Nếu thiếu ffmpeg hoặc ffmpeg lỗi
+        JobCancelledError: Nếu bị hủy
+    """
+    index = load_scene_index(input_video)
+    if index is not None:
+        return index
+
+    if not check_ffmpeg():
+        raise RuntimeError("ffmpeg chưa được cài đặt. Vui lòng cài đặt ffmpeg trước.")
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+
+    info = probe_media(input_video)
+    duration = info.duration if info else 0.0
+
+    cmd = [
+        'ffmpeg', '-nostdin', '-v', 'error', '-nostats',
+        '-i', input_video,
+        '-map', '0:v:0', '-an', '-sn', '-dn',
+        '-vf', f"scale={ANALYSIS_WIDTH}:-2,select='gte(scene\\,0)',"
+               f"metadata=print:key=lavfi.scene_score:file=-",
+        '-f', 'null', '-'
+    ]
+
+    process = AccountedPopen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             text=True, errors='replace', bufsize=1, **process_group_kwargs())
+    if cancel_token:
+        cancel_token.register_process(process)
+    # stderr được đọc song song: log lỗi giải mã dài (file hỏng) không làm ffmpeg bị chặn
+    read_stderr = drain_tail(process.stderr, STDERR_TAIL_LIMIT)
+
+    times = []
+    scores = []
+    frame_time = 0.0
+    last_report = 0.0
+    try:
+        # Mỗi frame có 2 dòng: "frame:N pts:P pts_time:T" rồi "lavfi.scene_score=S"
+        for line in process.stdout:
+            if line.startswith('frame:'):
+                _, _, value = line.rpartition('pts_time:')
+                try:
+                    frame_time = float(value)
+                except ValueError:
+                    continue
+                if progress_callback and duration and frame_time - last_report >= 60:
+                    last_report = frame_time
+                    progress_callback(f"🎬 Đang tìm chuyển cảnh... {min(100, frame_time / duration * 100):.0f}%")
+            elif line.startswith('lavfi.scene_score='):
+                try:
+                    score = float(line.split('=', 1)[1])
+                except ValueError:
+                    continue
+                if score >= INDEX_MIN_SCORE and frame_time > 0:
+                    times.append(round(frame_time, 6))
+                    scores.append(round(score, 4))
+
+        process.wait()
+        stderr = read_stderr()
+    except BaseException:
+        terminate_process(process)
+        raise
+    finally:
+        if cancel_token:
+            cancel_token.unregister_process(process)
+
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+    if process.returncode != 0:
+        raise RuntimeError(f"Lỗi khi phân tích chuyển cảnh: {stderr[-500:]}")
+
+    index = SceneIndex(times, scores, duration or frame_time)
+    write_json(_index_path(input_video), index.to_dict())
+    return index
+
+
+def snap_to_scenes(input_video: str, segments: List[Tuple[float, float]],
+                   tolerance: float = DEFAULT_SNAP_TOLERANCE, threshold: float = DEFAULT_THRESHOLD,
+                   cancel_token: Optional[CancelToken] = None,
+                   progress_callback=None) -> Tuple[List[Tuple[float, float]], int]:
+    """
+    Kéo các đoạn về chuyển cảnh gần nhất (tự phân tích video nếu chưa có chỉ mục)
+
+    Returns:
+        (các đoạn sau khi kéo, số điểm đã được kéo)
+    """
+    index = build_scene_index(input_video, cancel_token, progress_callback)
+    return index.snap_segments(segments, tolerance, threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Chỉ mục chuyển cảnh của video',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ví dụ:
+  %(prog)s -i video.mp4                          # Liệt kê các cảnh
+  %(prog)s -i video.mp4 --snap "03:05-03:10|40:05-40:10"
+        """
+    )
+    parser.add_argument('-i', '--input', required=True, help='Đường dẫn video đầu vào')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'Điểm tối thiểu để coi là chuyển cảnh, 0-1 (mặc định: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--min-length', type=float, default=1.0,
+                        help='Gộp các cảnh ngắn hơn mức này, giây (mặc định: 1.0)')
+    parser.add_argument('--snap', default=None, metavar='SEGMENTS',
+                        help='Kéo các đoạn này về chuyển cảnh gần nhất rồi in ra')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_SNAP_TOLERANCE,
+                        help=f'Khoảng cách tối đa khi kéo, giây (mặc định: {DEFAULT_SNAP_TOLERANCE})')
+    args = parser.parse_args()
+
+    try:
+        index = build_scene_index(args.input,
+                                  progress_callback=lambda message: print(message, file=sys.stderr))
+        if args.snap:
+            segments, moved = index.snap_segments(parse_segments(args.snap), args.tolerance,
+                                                  args.threshold)
+            print(f"🧲 Đã kéo {moved} điểm về chuyển cảnh", file=sys.stderr)
+            print(format_segments(segments))
+            return
+
+        scenes = index.scenes(args.threshold, args.min_length)
+        print(f"🎬 {len(scenes)} cảnh:")
+        for idx, (start, end) in enumerate(scenes, 1):
+            print(f"  {idx:3d}. {format_duration(start)} → {format_duration(end)} "
+                  f"({format_duration(end - start)})")
+    except JobCancelledError:
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Lỗi: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Scratch - Thư mục tạm riêng cho từng công việc
+Mỗi công việc cắt có thư mục tạm riêng (tạo bằng mkdtemp) dưới một thư mục gốc
+cấu hình được, nên các công việc chạy song song không xóa file của nhau. Dung
+lượng trống được kiểm tra trước khi bắt đầu theo ước tính kích thước các file
+trung gian, và file trung gian được đặt trên /dev/shm (hoặc ổ nhanh khác) nếu vừa.
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+from typing import List, Optional, Tuple
+
+from media_info import MediaInfo
+
+
+# Biến môi trường đổi thư mục gốc cho file tạm
+SCRATCH_ENV = "VIDEO_CUTTER_SCRATCH"
+# Danh sách thư mục nhanh (ngăn cách bằng os.pathsep), mặc định /dev/shm trên Linux
+FAST_SCRATCH_ENV = "VIDEO_CUTTER_FAST_SCRATCH"
+
+# Chừa lại dung lượng này trên ổ đĩa thường sau khi trừ phần ước tính
+DISK_RESERVE_BYTES = 512 * 1024 * 1024
+# Chỉ dùng tối đa phần này dung lượng trống của thư mục nhanh (tmpfs chiếm RAM)
+FAST_SCRATCH_MAX_FRACTION = 0.5
+# Hệ số an toàn cho ước tính (encode lại có thể lớn hơn bitrate gốc một chút)
+ESTIMATE_SAFETY_FACTOR = 1.25
+
+
+class ScratchSpaceError(RuntimeError):
+    """Không đủ dung lượng trống cho file tạm hoặc file đầu ra"""
+
+
+def get_scratch_root() -> str:
+    """Thư mục gốc cho file tạm: $VIDEO_CUTTER_SCRATCH hoặc <tmp>/video_cutter"""
+    return os.environ.get(SCRATCH_ENV) or os.path.join(tempfile.gettempdir(), "video_cutter")
+
+
+def fast_scratch_roots() -> List[str]:
+    """Các thư mục nhanh (RAM/SSD) có thể dùng cho file tạm"""
+    value = os.environ.get(FAST_SCRATCH_ENV)
+    if value is not None:
+        roots = [root for root in value.split(os.pathsep) if root]
+    elif sys.platform.startswith("linux"):
+        roots = ["/dev/shm"]
+    else:
+        roots = []
+    return [root for root in roots if os.path.isdir(root) and os.access(root, os.W_OK)]
+
+
+def free_bytes(path: str) -> int:
+    """Dung lượng trống của ổ chứa path (đi ngược lên thư mục cha nếu path chưa tồn tại)"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return shutil.disk_usage(path).free
+
+
+def format_bytes(size: float) -> str:
+    """Định dạng dung lượng dễ đọc, vd: 1.5 GB"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def estimate_intermediate_size(input_video: str, segments: List[Tuple[float, float]],
+                               info: Optional[MediaInfo] = None) -> int:
+    """
+    Ước tính tổng kích thước các đoạn trung gian (byte)
+
+    Dựa trên bitrate trung bình của video gốc × tổng thời lượng các đoạn.
+    Không có thông tin thời lượng thì lấy kích thước file gốc làm cận trên.
+    """
+    size = os.path.getsize(input_video)
+    total = sum(end - start for start, end in segments)
+    if info and info.duration:
+        size = size / info.duration * min(total, info.duration)
+    return int(size * ESTIMATE_SAFETY_FACTOR)
+
+
+def ensure_free_space(path: str, needed: int, what: str = "file đầu ra"):
+    """
+    Kiểm tra ổ chứa path còn đủ chỗ cho needed byte
+
+    Raises:
+        ScratchSpaceError: Nếu không đủ dung lượng
+    """
+    free = free_bytes(path)
+    if free < needed + DISK_RESERVE_BYTES:
+        raise ScratchSpaceError(
+            f"Không đủ dung lượng cho {what} tại {os.path.abspath(path)}: "
+            f"cần khoảng {format_bytes(needed)}, còn trống {format_bytes(free)}"
+        )
+
+
+def create_scratch_dir(estimate: int, root: Optional[str] = None, prefer_fast: bool = True,
+                       prefix: str = "job_") -> str:
+    """
+    Tạo thư mục tạm riêng cho một công việc
+
+    Args:
+        estimate: Ước tính kích thước file trung gian (byte)
+        root: Thư mục gốc trên ổ thường (None = get_scratch_root())
+        prefer_fast: Ưu tiên thư mục nhanh (/dev/shm...) nếu file trung gian vừa
+        prefix: Tiền tố tên thư mục
+
+    Returns:
+        Đường dẫn thư mục vừa tạo (người gọi chịu trách nhiệm xóa)
+
+    Raises:
+        ScratchSpaceError: Nếu không chỗ nào đủ dung lượng
+    """
+    if prefer_fast:
+        for fast_root in fast_scratch_roots():
+            if estimate <= free_bytes(fast_root) * FAST_SCRATCH_MAX_FRACTION:
+                directory = os.path.join(fast_root, "video_cutter")
+                os.makedirs(directory, exist_ok=True)
+                return tempfile.mkdtemp(prefix=prefix, dir=directory)
+
+    root = root or get_scratch_root()
+    ensure_free_space(root, estimate, "file tạm")
+    os.makedirs(root, exist_ok=True)
+    return tempfile.mkdtemp(prefix=prefix, dir=root)
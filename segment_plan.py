@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Segment Plan - Tối ưu danh sách đoạn trước khi render
+Nằm giữa parse_segments và cut_video_segments:
+- gộp các đoạn liên tiếp chồng lên nhau, nối tiếp nhau hoặc cách nhau ít hơn
+  một ngưỡng thành một lần render
+- đoạn trùng lặp (vd: intro lặp lại) chỉ render một lần, được ghép nhiều lần
+Thứ tự các đoạn trong video đầu ra giữ nguyên như yêu cầu.
+"""
+
+from typing import List, Tuple
+
+from video_cutter import format_duration
+
+
+class SegmentPlan:
+    """Kết quả tối ưu: các đoạn cần render và thứ tự ghép"""
+
+    def __init__(self, requested: List[Tuple[float, float]], segments: List[Tuple[float, float]],
+                 order: List[int], coalesced: int = 0):
+        """
+        Args:
+            requested: Danh sách đoạn ban đầu
+            segments: Các đoạn cần render (không trùng lặp)
+            order: Thứ tự ghép, chỉ số trong segments (có thể lặp lại)
+            coalesced: Số đoạn đã được gộp vào đoạn liền trước
+        """
+        self.requested = list(requested)
+        self.segments = segments
+        self.order = order
+        self.coalesced = coalesced
+
+    @property
+    def requested_seconds(self) -> float:
+        return sum(end - start for start, end in self.requested)
+
+    @property
+    def render_seconds(self) -> float:
+        return sum(end - start for start, end in self.segments)
+
+    @property
+    def saved_seconds(self) -> float:
+        """Số giây video không phải encode nữa (âm nếu gộp khoảng hở làm dài thêm)"""
+        return self.requested_seconds - self.render_seconds
+
+    @property
+    def duplicates(self) -> int:
+        """Số lần ghép dùng lại một đoạn đã render"""
+        return len(self.order) - len(self.segments)
+
+    def expanded(self) -> List[Tuple[float, float]]:
+        """Các đoạn theo thứ tự ghép (đoạn trùng lặp xuất hiện nhiều lần)"""
+        return [self.segments[idx] for idx in self.order]
+
+    def summary(self) -> str:
+        """Mô tả ngắn gọn kết quả tối ưu"""
+        return (f"{len(self.requested)} đoạn → {len(self.segments)} lần render "
+                f"(gộp {self.coalesced}, dùng lại {self.duplicates}), "
+                f"tiết kiệm {format_duration(max(self.saved_seconds, 0.0))} encode")
+
+
+def optimize_segments(segments: List[Tuple[float, float]], merge_gap: float = 0.0,
+                      coalesce: bool = True, dedupe: bool = True) -> SegmentPlan:
+    """
+    Tối ưu danh sách đoạn
+
+    Chỉ gộp một đoạn vào đoạn liền trước nó trong danh sách, và chỉ khi đoạn đó
+    bắt đầu trong khoảng [đầu đoạn trước, cuối đoạn trước + merge_gap], nên
+    nội dung vẫn xuất hiện theo đúng thứ tự yêu cầu. Phần chồng lấn chỉ xuất
+    hiện một lần; khoảng hở nhỏ hơn merge_gap được giữ lại trong video.
+
+    Args:
+        segments: List các tuple (start_time, end_time) theo thứ tự ghép
+        merge_gap: Gộp cả các đoạn cách nhau ít hơn mức này (giây), 0 = chỉ
+            gộp đoạn chồng lấn hoặc nối tiếp
+        coalesce: Gộp đoạn chồng lấn/nối tiếp/gần nhau
+        dedupe: Render đoạn trùng lặp một lần
+
+    Returns:
+        SegmentPlan
+    """
+    merged = []
+    coalesced = 0
+    for start, end in segments:
+        if coalesce and merged:
+            last_start, last_end = merged[-1]
+            if last_start <= start <= last_end + merge_gap:
+                merged[-1] = (last_start, max(last_end, end))
+                coalesced += 1
+                continue
+        merged.append((start, end))
+
+    unique = []
+    order = []
+    index = {}
+    for start, end in merged:
+        key = (round(start, 3), round(end, 3))
+        if dedupe and key in index:
+            order.append(index[key])
+            continue
+        index[key] = len(unique)
+        order.append(len(unique))
+        unique.append((start, end))
+
+    return SegmentPlan(segments, unique, order, coalesced)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Segment Sources - Đọc danh sách đoạn cắt từ file (JSON, CSV, EDL, TXT)
+Dùng cho các danh sách dài được sinh tự động (vd: hàng nghìn đoạn từ phụ đề),
+không tiện viết vào một chuỗi `-s "start-end|start-end"`.
+
+Định dạng:
+- .json: [[start, end], ...], [{"start": ..., "end": ...}, ...] hoặc {"segments": [...]}
+- .csv:  hai cột start,end (có hoặc không có dòng tiêu đề; cột "start"/"end" nếu có tiêu đề)
+- .edl:  CMX 3600, lấy source in/out của từng event (timecode HH:MM:SS:FF)
+- khác:  mỗi dòng một đoạn "start-end" (hoặc ngăn cách bằng |), dòng "#" là chú thích
+
+Thời gian có thể là số giây (12.5) hoặc dạng MM:SS / HH:MM:SS như -s.
+"""
+
+import os
+import re
+import csv
+import json
+from typing import List, Optional, Tuple
+
+from video_cutter import parse_segments, parse_time_to_seconds
+
+
+# Frame rate mặc định để đổi timecode EDL khi không biết fps của video
+DEFAULT_EDL_FPS = 25.0
+
+_TIMECODE = r"(\d{1,2}:\d{2}:\d{2}[:;.]\d{2})"
+_EDL_EVENT_RE = re.compile(r"^\s*\d+\s+\S+\s+\S+\s+\S+(?:\s+\d+)?\s+"
+                           + r"\s+".join([_TIMECODE] * 4))
+
+
+def _to_seconds(value) -> float:
+    """Số giây từ số hoặc chuỗi ("12.5", "03:05", "1:03:05.5")"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    return parse_time_to_seconds(text) if ':' in text else float(text)
+
+
+def _checked(start: float, end: float, where: str) -> Tuple[float, float]:
+    if end <= start:
+        raise ValueError(f"{where}: thời gian kết thúc phải lớn hơn thời gian bắt đầu")
+    return start, end
+
+
+def timecode_to_seconds(timecode: str, fps: float) -> float:
+    """Đổi timecode HH:MM:SS:FF sang giây"""
+    hours, minutes, seconds, frames = (int(part) for part in re.split(r"[:;.]", timecode))
+    return hours * 3600 + minutes * 60 + seconds + frames / fps
+
+
+def parse_json_segments(text: str) -> List[Tuple[float, float]]:
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get('segments', [])
+    segments = []
+    for idx, item in enumerate(data, 1):
+        if isinstance(item, dict):
+            start = item.get('start', item.get('in'))
+            end = item.get('end', item.get('out'))
+        else:
+            start, end = item[0], item[1]
+        segments.append(_checked(_to_seconds(start), _to_seconds(end), f"Đoạn {idx}"))
+    return segments
+
+
+def parse_csv_segments(text: str) -> List[Tuple[float, float]]:
+    rows = [row for row in csv.reader(text.splitlines())
+            if row and row[0].strip() and not row[0].lstrip().startswith('#')]
+    start_col, end_col = 0, 1
+    if rows:
+        header = [cell.strip().lower() for cell in rows[0]]
+        if 'start' in header and 'end' in header:
+            start_col, end_col = header.index('start'), header.index('end')
+            rows = rows[1:]
+        else:
+            try:
+                _to_seconds(rows[0][0])
+            except ValueError:
+                rows = rows[1:]  # Dòng tiêu đề với tên cột khác
+
+    return [_checked(_to_seconds(row[start_col]), _to_seconds(row[end_col]), f"Dòng {idx}")
+            for idx, row in enumerate(rows, 1)]
+
+
+def parse_edl_segments(text: str, fps: float = DEFAULT_EDL_FPS) -> List[Tuple[float, float]]:
+    segments = []
+    for line_no, line in enumerate(text.splitlines(), 1):
+        match = _EDL_EVENT_RE.match(line)
+        if not match:
+            continue
+        source_in, source_out = match.group(1), match.group(2)
+        segments.append(_checked(timecode_to_seconds(source_in, fps),
+                                 timecode_to_seconds(source_out, fps), f"Dòng {line_no}"))
+    return segments
+
+
+def parse_text_segments(text: str) -> List[Tuple[float, float]]:
+    lines = [line.split('#', 1)[0].strip() for line in text.splitlines()]
+    return parse_segments('|'.join(line for line in lines if line))
+
+
+def load_segments(path: str, fps: Optional[float] = None) -> List[Tuple[float, float]]:
+    """
+    Đọc danh sách đoạn cắt từ file (định dạng theo đuôi file, xem đầu module)
+
+    Args:
+        path: Đường dẫn file
+        fps: Frame rate để đổi timecode EDL (None = DEFAULT_EDL_FPS)
+
+    Returns:
+        List các tuple (start_time, end_time)
+
+    Raises:
+        ValueError: Nếu nội dung không hợp lệ
+    """
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        text = f.read()
+
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext == '.json':
+            return parse_json_segments(text)
+        if ext == '.csv':
+            return parse_csv_segments(text)
+        if ext == '.edl':
+            return parse_edl_segments(text, fps or DEFAULT_EDL_FPS)
+        return parse_text_segments(text)
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        raise ValueError(f"File đoạn cắt không hợp lệ ({os.path.basename(path)}): {e}")
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Silence - Tự tạo danh sách đoạn cắt bỏ khoảng lặng ("jump cut")
+ffmpeg giải mã audio thành PCM mono tần số thấp và đẩy ra stdout; mức âm lượng
+(RMS, dBFS) của từng cửa sổ ngắn được tính theo từng khối bằng NumPy nên bộ nhớ
+không phụ thuộc độ dài video. Mức âm lượng được cache theo file đầu vào, nên đổi
+ngưỡng/padding chỉ tính lại trên mảng mức âm lượng chứ không giải mã lại.
+
+Cần numpy (pip install numpy).
+"""
+
+import os
+import sys
+import argparse
+import importlib.util
+import subprocess
+from typing import List, Optional, Tuple
+
+from cancellation import (AccountedPopen, CancelToken, JobCancelledError, drain_tail,
+                          process_group_kwargs, terminate_process)
+from ffmpeg_errors import STDERR_TAIL_LIMIT
+from media_cache import input_cache_dir
+from media_info import probe_media
+from video_cutter import check_ffmpeg, format_duration, format_segments
+
+
+NUMPY_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+# PCM dùng để phân tích: mono 8 kHz, 16 bit
+SAMPLE_RATE = 8000
+# Độ dài một cửa sổ RMS (giây)
+WINDOW_SECONDS = 0.05
+# Số giây PCM đọc mỗi lần (30s × 8000 × 2 byte = 480 KB)
+CHUNK_SECONDS = 30
+
+# Giá trị mặc định
+DEFAULT_THRESHOLD_DB = -35.0   # Dưới mức này coi là im lặng
+DEFAULT_PADDING = 0.15         # Giữ thêm trước/sau mỗi đoạn có tiếng (giây)
+DEFAULT_MIN_SILENCE = 0.5      # Khoảng lặng ngắn hơn mức này được giữ lại (giây)
+DEFAULT_MIN_SPEECH = 0.2       # Đoạn có tiếng ngắn hơn mức này bị bỏ (tiếng click, thở...)
+
+
+def _import_numpy():
+    """Import numpy khi cần dùng"""
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("Chức năng cắt khoảng lặng cần numpy. Cài đặt: pip install numpy")
+    import numpy
+    return numpy
+
+
+def _levels_cache_path(input_video: str) -> str:
+    window_ms = int(WINDOW_SECONDS * 1000)
+    return os.path.join(input_cache_dir(input_video, "silence"),
+                        f"levels_{SAMPLE_RATE}hz_{window_ms}ms.npy")
+
+
+def measure_levels(input_video: str, cancel_token: Optional[CancelToken] = None,
+                   progress_callback=None):
+    """
+    Mức âm lượng (dBFS) của từng cửa sổ WINDOW_SECONDS (có cache)
+
+    PCM được đọc theo từng khối CHUNK_SECONDS; phần mẫu lẻ cuối khối được ghép
+    vào khối sau, nên mỗi cửa sổ được tính đúng một lần.
+
+    Args:
+        input_video: Đường dẫn video
+        cancel_token: CancelToken để hủy giữa chừng
+        progress_callback: Hàm callback để báo tiến trình (nhận message string)
+
+    Returns:
+        numpy.ndarray float32, phần tử i là mức âm lượng của cửa sổ i
+
+    Raises:
+        RuntimeError: Nếu thiếu numpy/ffmpeg hoặc ffmpeg lỗi
+        JobCancelledError: Nếu bị hủy
+    """
+    np = _import_numpy()
+
+    cache_path = _levels_cache_path(input_video)
+    if os.path.exists(cache_path):
+        try:
+            return np.load(cache_path)
+        except (OSError, ValueError):
+            pass
+
+    if not check_ffmpeg():
+        raise RuntimeError("ffmpeg chưa được cài đặt. Vui lòng cài đặt ffmpeg trước.")
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+
+    info = probe_media(input_video)
+    duration = info.duration if info else 0.0
+
+    window = int(SAMPLE_RATE * WINDOW_SECONDS)
+    chunk_bytes = SAMPLE_RATE * CHUNK_SECONDS * 2
+    cmd = [
+        'ffmpeg', '-nostdin', '-v', 'error',
+        '-i', input_video,
+        '-map', '0:a:0', '-vn',
+        '-ac', '1', '-ar', str(SAMPLE_RATE),
+        '-f', 's16le', '-acodec', 'pcm_s16le',
+        '-'
+    ]
+
+    process = AccountedPopen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             **process_group_kwargs())
+    if cancel_token:
+        cancel_token.register_process(process)
+    # stderr được đọc song song: log lỗi giải mã dài (file hỏng) không làm ffmpeg bị chặn
+    read_stderr = drain_tail(process.stderr, STDERR_TAIL_LIMIT)
+
+    levels = []
+    leftover = np.zeros(0, dtype=np.float32)
+    done_seconds = 0
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            samples = np.frombuffer(data[:len(data) - len(data) % 2], dtype='<i2').astype(np.float32)
+            samples = np.concatenate((leftover, samples))
+            usable = len(samples) - len(samples) % window
+            leftover = samples[usable:]
+
+            frames = samples[:usable].reshape(-1, window) / 32768.0
+            rms = np.sqrt(np.mean(frames * frames, axis=1))
+            levels.append((20.0 * np.log10(np.maximum(rms, 1e-6))).astype(np.float32))
+
+            done_seconds += CHUNK_SECONDS
+            if progress_callback and duration:
+                percent = min(100, done_seconds / duration * 100)
+                progress_callback(f"🔉 Đang phân tích âm thanh... {percent:.0f}%")
+
+        process.wait()
+        stderr = read_stderr()
+    except BaseException:
+        terminate_process(process)
+        raise
+    finally:
+        if cancel_token:
+            cancel_token.unregister_process(process)
+
+    if cancel_token:
+        cancel_token.raise_if_cancelled()
+    if process.returncode != 0:
+        raise RuntimeError(f"Lỗi khi đọc âm thanh: {stderr.decode(errors='replace')[-500:]}")
+
+    if len(leftover):
+        rms = np.sqrt(np.mean((leftover / 32768.0) ** 2))
+        levels.append(np.array([20.0 * np.log10(max(rms, 1e-6))], dtype=np.float32))
+
+    result = np.concatenate(levels) if levels else np.zeros(0, dtype=np.float32)
+    tmp_path = cache_path + ".part.npy"
+    np.save(tmp_path, result)
+    os.replace(tmp_path, cache_path)
+    return result
+
+
+def speech_segments_from_levels(levels, threshold_db: float = DEFAULT_THRESHOLD_DB,
+                                padding: float = DEFAULT_PADDING,
+                                min_silence: float = DEFAULT_MIN_SILENCE,
+                                min_speech: float = DEFAULT_MIN_SPEECH,
+                                duration: Optional[float] = None) -> List[Tuple[float, float]]:
+    """
+    Tìm các đoạn có tiếng từ mảng mức âm lượng
+
+    Args:
+        levels: Mức âm lượng từng cửa sổ (xem measure_levels)
+        threshold_db: Ngưỡng im lặng (dBFS)
+        padding: Giữ thêm trước/sau mỗi đoạn có tiếng (giây)
+        min_silence: Khoảng lặng ngắn hơn mức này không bị cắt (giây)
+        min_speech: Bỏ đoạn có tiếng ngắn hơn mức này (giây)
+        duration: Thời lượng video để giới hạn padding (None = theo số cửa sổ)
+
+    Returns:
+        List các tuple (start_time, end_time), tương thích parse_segments
+    """
+    np = _import_numpy()
+
+    voiced = np.asarray(levels) > threshold_db
+    if not voiced.any():
+        return []
+
+    # Biên các đoạn có tiếng: chỗ voiced đổi trạng thái
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], voiced, [False])).astype(np.int8)))
+    starts = edges[0::2] * WINDOW_SECONDS
+    ends = edges[1::2] * WINDOW_SECONDS
+
+    # Gộp các đoạn cách nhau bởi khoảng lặng ngắn
+    new_run = np.concatenate(([True], starts[1:] - ends[:-1] >= min_silence))
+    first = np.flatnonzero(new_run)
+    last = np.concatenate((first[1:], [len(starts)])) - 1
+    starts, ends = starts[first], ends[last]
+
+    # Bỏ đoạn quá ngắn, thêm padding rồi gộp các đoạn chồng lên nhau
+    long_enough = ends - starts >= min_speech
+    starts = starts[long_enough]
+    ends = ends[long_enough]
+
+    limit = duration if duration else len(voiced) * WINDOW_SECONDS
+    segments = []
+    for start, end in zip(np.maximum(starts - padding, 0.0), np.minimum(ends + padding, limit)):
+        start, end = round(float(start), 3), round(float(end), 3)
+        if segments and start <= segments[-1][1]:
+            segments[-1] = (segments[-1][0], max(segments[-1][1], end))
+        else:
+            segments.append((start, end))
+    return segments
+
+
+def detect_speech_segments(input_video: str, threshold_db: float = DEFAULT_THRESHOLD_DB,
+                           padding: float = DEFAULT_PADDING,
+                           min_silence: float = DEFAULT_MIN_SILENCE,
+                           min_speech: float = DEFAULT_MIN_SPEECH,
+                           cancel_token: Optional[CancelToken] = None,
+                           progress_callback=None) -> List[Tuple[float, float]]:
+    """
+    Danh sách đoạn cần giữ (có tiếng) của video, dùng thẳng cho cut_video_segments
+
+    Args:
+        input_video: Đường dẫn video
+        threshold_db, padding, min_silence, min_speech: Xem speech_segments_from_levels
+        cancel_token: CancelToken để hủy giữa chừng
+        progress_callback: Hàm callback để báo tiến trình
+
+    Returns:
+        List các tuple (start_time, end_time)
+    """
+    levels = measure_levels(input_video, cancel_token, progress_callback)
+    info = probe_media(input_video)
+    return speech_segments_from_levels(levels, threshold_db, padding, min_silence, min_speech,
+                                       duration=info.duration if info else None)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Tạo danh sách đoạn cắt bỏ khoảng lặng (jump cut)',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ví dụ:
+  %(prog)s -i talk.mp4                       # In danh sách đoạn cho video_cutter.py -s
+  %(prog)s -i talk.mp4 --threshold -40 -o talk_cut.mp4
+        """
+    )
+    parser.add_argument('-i', '--input', required=True, help='Đường dẫn video đầu vào')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Cắt luôn ra file này (mặc định: chỉ in danh sách đoạn)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD_DB,
+                        help=f'Ngưỡng im lặng dBFS (mặc định: {DEFAULT_THRESHOLD_DB})')
+    parser.add_argument('--padding', type=float, default=DEFAULT_PADDING,
+                        help=f'Giữ thêm trước/sau mỗi đoạn có tiếng, giây (mặc định: {DEFAULT_PADDING})')
+    parser.add_argument('--min-silence', type=float, default=DEFAULT_MIN_SILENCE,
+                        help=f'Chỉ cắt khoảng lặng dài hơn mức này, giây (mặc định: {DEFAULT_MIN_SILENCE})')
+    parser.add_argument('--min-speech', type=float, default=DEFAULT_MIN_SPEECH,
+                        help=f'Bỏ đoạn có tiếng ngắn hơn mức này, giây (mặc định: {DEFAULT_MIN_SPEECH})')
+    parser.add_argument('-m', '--mode', default='balanced', choices=['fast', 'balanced', 'accurate'],
+                        help='Chế độ cắt khi dùng -o (mặc định: balanced)')
+    args = parser.parse_args()
+
+    try:
+        segments = detect_speech_segments(args.input, args.threshold, args.padding,
+                                          args.min_silence, args.min_speech,
+                                          progress_callback=lambda message: print(message, file=sys.stderr))
+        if not segments:
+            print("❌ Không tìm thấy đoạn nào có tiếng (thử giảm --threshold)", file=sys.stderr)
+            sys.exit(1)
+
+        kept = sum(end - start for start, end in segments)
+        print(f"🗣️  {len(segments)} đoạn có tiếng, tổng {format_duration(kept)}", file=sys.stderr)
+
+        if args.output:
+            from video_cutter import cut_video_segments
+            cut_video_segments(args.input, segments, args.output, mode=args.mode)
+        else:
+            print(format_segments(segments))
+    except JobCancelledError:
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Lỗi: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Streaming - Ghi video đầu ra dạng fragmented MP4 hoặc HLS ngay ở bước ghép
+Thay vì ghi MP4 thường rồi phải đọc/ghi lại toàn bộ (+faststart, đóng gói HLS),
+bước ghép cuối cùng ghi thẳng:
+- fmp4: MP4 phân mảnh (moov rỗng ở đầu file, mỗi keyframe một fragment), phát
+  được khi file còn đang ghi
+- hls:  playlist .m3u8 + các segment fMP4 (.m4s); segment nào đã có trong
+  playlist là đã ghi xong, có thể upload/phát ngay trước khi công việc kết thúc
+"""
+
+import os
+import re
+import glob
+import threading
+from typing import Callable, List, Optional
+
+
+OUTPUT_FORMATS = ('mp4', 'fmp4', 'hls')
+
+# Độ dài mục tiêu của mỗi segment HLS (giây, cắt tại keyframe gần nhất)
+DEFAULT_HLS_SEGMENT_SECONDS = 6.0
+
+# Chu kỳ đọc lại playlist khi theo dõi segment mới
+WATCH_INTERVAL = 0.5
+
+
+def _stem(output_video: str) -> str:
+    return os.path.splitext(os.path.basename(output_video))[0]
+
+
+def hls_segment_pattern(output_video: str) -> str:
+    """Mẫu tên segment của playlist (cùng thư mục với playlist)"""
+    return os.path.join(os.path.dirname(os.path.abspath(output_video)), f"{_stem(output_video)}_%05d.m4s")
+
+
+def hls_init_file(output_video: str) -> str:
+    """File khởi tạo (init segment) của playlist"""
+    return os.path.join(os.path.dirname(os.path.abspath(output_video)), f"{_stem(output_video)}_init.mp4")
+
+
+def hls_args(output_video: str, hls_time: float = DEFAULT_HLS_SEGMENT_SECONDS) -> List[str]:
+    """
+    Tham số ffmpeg ghi playlist HLS với segment fMP4
+
+    Playlist kiểu "event" được ghi lại sau mỗi segment (và có #EXT-X-ENDLIST khi
+    xong); temp_file để segment chỉ xuất hiện dưới tên thật khi đã ghi xong.
+    """
+    return [
+        '-f', 'hls',
+        '-hls_time', f"{hls_time:g}",
+        '-hls_playlist_type', 'event',
+        '-hls_segment_type', 'fmp4',
+        '-hls_fmp4_init_filename', os.path.basename(hls_init_file(output_video)),
+        '-hls_segment_filename', hls_segment_pattern(output_video),
+        '-hls_flags', 'independent_segments+temp_file',
+    ]
+
+
+def output_args(output_video: str, output_format: str = "mp4",
+                hls_time: float = DEFAULT_HLS_SEGMENT_SECONDS) -> List[str]:
+    """
+    Tham số ffmpeg chọn định dạng đầu ra (đặt trước -y OUTPUT, rỗng với MP4 thường)
+
+    Raises:
+        ValueError: Nếu định dạng không hỗ trợ
+    """
+    if output_format == 'mp4':
+        return []
+    if output_format == 'fmp4':
+        return ['-movflags', '+frag_keyframe+empty_moov+default_base_moof', '-f', 'mp4']
+    if output_format == 'hls':
+        return hls_args(output_video, hls_time)
+    raise ValueError(f"Định dạng đầu ra không hỗ trợ: {output_format} (chọn: {', '.join(OUTPUT_FORMATS)})")
+
+
+def output_files(output_video: str, output_format: str = "mp4") -> List[str]:
+    """Mọi file thuộc đầu ra (playlist, init và các segment với HLS)"""
+    files = [output_video]
+    if output_format == 'hls':
+        files.append(hls_init_file(output_video))
+        files.extend(sorted(glob.glob(glob.escape(hls_segment_pattern(output_video)).replace('%05d', '[0-9]' * 5))))
+    return [path for path in files if os.path.exists(path)]
+
+
+def remove_output(output_video: str, output_format: str = "mp4"):
+    """Xóa đầu ra dở dang (kể cả segment HLS)"""
+    for path in output_files(output_video, output_format):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def finished_fragments(playlist: str) -> List[str]:
+    """
+    Các file đã ghi xong theo playlist: init segment rồi các segment theo thứ tự
+
+    Playlist có thể đang được ghi dở; chỉ lấy các file đã tồn tại.
+    """
+    try:
+        with open(playlist, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except OSError:
+        return []
+
+    base_dir = os.path.dirname(os.path.abspath(playlist))
+    names = re.findall(r'#EXT-X-MAP:URI="([^"]+)"', text)
+    names.extend(line.strip() for line in text.splitlines()
+                 if line.strip() and not line.startswith('#'))
+    files = []
+    for name in names:
+        path = os.path.join(base_dir, name)
+        if path not in files and os.path.isfile(path):
+            files.append(path)
+    return files
+
+
+class FragmentWatcher:
+    """
+    Theo dõi playlist HLS đang được ghi và báo từng segment đã xong
+
+    Callback được gọi tuần tự trong luồng theo dõi, mỗi file một lần, theo thứ
+    tự phát. stop() quét lần cuối rồi chờ mọi callback xong.
+    """
+
+    def __init__(self, playlist: str, on_fragment: Callable[[str], None],
+                 interval: float = WATCH_INTERVAL):
+        self.playlist = playlist
+        self.on_fragment = on_fragment
+        self.interval = interval
+        self.error = None
+        self._seen = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> 'FragmentWatcher':
+        self._thread.start()
+        return self
+
+    def _scan(self):
+        for path in finished_fragments(self.playlist):
+            if path not in self._seen:
+                self._seen.add(path)
+                self.on_fragment(path)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                self._scan()
+            self._scan()
+        except Exception as e:
+            self.error = e
+
+    def stop(self, raise_errors: bool = True):
+        """
+        Dừng theo dõi
+
+        Raises:
+            Exception: Lỗi đầu tiên của callback (nếu raise_errors)
+        """
+        self._stop.set()
+        self._thread.join()
+        if raise_errors and self.error:
+            raise self.error
+
+    @property
+    def fragments(self) -> int:
+        return len(self._seen)
+
+
+def watch_fragments(output_video: str, output_format: str,
+                    on_fragment: Optional[Callable[[str], None]]) -> Optional[FragmentWatcher]:
+    """Bắt đầu theo dõi segment HLS nếu cần (None với MP4/fMP4 hoặc không có callback)"""
+    if output_format != 'hls' or on_fragment is None:
+        return None
+    return FragmentWatcher(output_video, on_fragment).start()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Thumbnails - Dải thumbnail theo keyframe để chọn đoạn cắt
+Chỉ giải mã keyframe (-skip_frame nokey) ở độ phân giải thấp nên tạo dải
+thumbnail cho video 2 giờ chỉ mất vài giây. Kết quả được cache trên đĩa theo
+từng file đầu vào.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+from typing import Callable, List, Optional, Tuple
+
+from cancellation import CancelToken, JobCancelledError, process_group_kwargs, terminate_process
+from media_cache import input_cache_dir, read_json, write_json
+from media_info import probe_media
+
+
+PTS_TIME_RE = re.compile(r"pts_time:\s*([-\d.]+)")
+
+
+def probe_duration(input_video: str) -> float:
+    """Lấy thời lượng video (giây) từ MediaInfo đã cache, trả về 0 nếu không đọc được"""
+    info = probe_media(input_video)
+    return info.duration if info else 0.0
+
+
+class ThumbnailStrip:
+    """Dải thumbnail keyframe của một video, có cache trên đĩa"""
+
+    def __init__(self, input_video: str, width: int = 112, max_thumbnails: int = 240,
+                 min_interval: float = 2.0):
+        """
+        Args:
+            input_video: Đường dẫn video
+            width: Chiều rộng mỗi thumbnail (pixel)
+            max_thumbnails: Số thumbnail tối đa cho cả video
+            min_interval: Khoảng cách tối thiểu giữa 2 thumbnail (giây)
+        """
+        self.input_video = input_video
+        self.width = width
+        self.max_thumbnails = max_thumbnails
+        self.min_interval = min_interval
+        self.cache_dir = os.path.join(input_cache_dir(input_video, "thumbnails"), f"w{width}")
+        self.index_file = os.path.join(self.cache_dir, "index.json")
+
+    def load_cached(self) -> Optional[List[Tuple[float, str]]]:
+        """
+        Đọc dải thumbnail từ cache
+
+        Returns:
+            List (time, path) hoặc None nếu chưa có cache hoàn chỉnh
+        """
+        index = read_json(self.index_file)
+        if not index or not index.get('complete'):
+            return None
+
+        thumbnails = []
+        for time_sec, filename in index['thumbnails']:
+            path = os.path.join(self.cache_dir, filename)
+            if not os.path.exists(path):
+                return None
+            thumbnails.append((time_sec, path))
+        return thumbnails
+
+    def generate(self, callback: Optional[Callable] = None,
+                 cancel_token: Optional[CancelToken] = None) -> List[Tuple[float, str]]:
+        """
+        Tạo dải thumbnail (hoặc đọc từ cache nếu đã có)
+
+        Args:
+            callback: Hàm callback(index, time, path) gọi ngay khi mỗi thumbnail
+                được ghi xong, để hiển thị dần dần
+            cancel_token: CancelToken để dừng giữa chừng
+
+        Returns:
+            List (time, path) theo thứ tự thời gian
+        """
+        cached = self.load_cached()
+        if cached is not None:
+            if callback:
+                for idx, (time_sec, path) in enumerate(cached):
+                    callback(idx, time_sec, path)
+            return cached
+
+        # Xóa kết quả dở dang của lần trước
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        duration = probe_duration(self.input_video)
+        interval = max(self.min_interval, duration / self.max_thumbnails) if duration else self.min_interval
+
+        # Chỉ giải mã keyframe, lấy tối đa 1 keyframe mỗi interval giây
+        video_filter = (
+            f"select='isnan(prev_selected_t)+gte(t-prev_selected_t,{interval:.3f})',"
+            f"scale={self.width}:-2,showinfo"
+        )
+        cmd = [
+            'ffmpeg', '-hide_banner', '-nostdin',
+            '-skip_frame', 'nokey',
+            '-i', self.input_video,
+            '-an', '-sn', '-dn',
+            '-vf', video_filter,
+            '-vsync', 'vfr',
+            '-f', 'image2',
+            '-y', os.path.join(self.cache_dir, 'thumb_%05d.png')
+        ]
+
+        thumbnails = []
+
+        def emit(idx):
+            # ffmpeg đánh số file từ 1
+            path = os.path.join(self.cache_dir, f"thumb_{idx + 1:05d}.png")
+            thumbnails.append((times[idx], path))
+            if callback:
+                callback(idx, times[idx], path)
+
+        times = []
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            errors='replace',
+            **process_group_kwargs()
+        )
+        if cancel_token:
+            cancel_token.register_process(process)
+
+        try:
+            for line in process.stderr:
+                match = PTS_TIME_RE.search(line)
+                if not match or 'showinfo' not in line:
+                    continue
+                # Thumbnail trước đó đã được ghi xong khi frame tiếp theo đi qua filter
+                if times:
+                    emit(len(times) - 1)
+                times.append(float(match.group(1)))
+            process.wait()
+        except BaseException:
+            terminate_process(process)
+            raise
+        finally:
+            if cancel_token:
+                cancel_token.unregister_process(process)
+
+        if cancel_token and cancel_token.cancelled:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            raise JobCancelledError("Đã hủy tạo thumbnail")
+
+        if process.returncode != 0:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            raise RuntimeError("Lỗi khi tạo thumbnail")
+
+        if times:
+            emit(len(times) - 1)
+
+        write_json(self.index_file, {
+            'complete': True,
+            'interval': interval,
+            'thumbnails': [[time_sec, os.path.basename(path)] for time_sec, path in thumbnails],
+        })
+        return thumbnails
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Tracing - Ghi timeline thực thi dạng Chrome trace-event (mở bằng Perfetto / chrome://tracing)
+Mỗi bước (probe, cắt đoạn, ghép, thêm audio, tải xuống, upload...) là một span
+trên luồng đã chạy nó; mỗi tiến trình con (ffmpeg, rclone) là một span lồng
+bên trong, kèm CPU/RSS. Các luồng worker hiện thành các hàng riêng nên dễ thấy
+worker nào rảnh, các đoạn có bị chạy tuần tự hay quá tải hay không.
+
+Tracer được gắn vào JobMetrics (metrics.py): mọi stage/segment/tiến trình con
+mà JobMetrics ghi nhận đều được ghi thành span. Tùy chọn ghi thêm cProfile của
+phía Python (file .prof, và các hàm tốn thời gian nhất trong metadata của trace).
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+from typing import Optional
+
+from metrics import MAXRSS_UNIT
+
+
+# Số hàm (theo cumulative time) của cProfile đưa vào metadata của trace
+PROFILE_TOP_FUNCTIONS = 40
+# Độ dài tối đa của lệnh ghi trong args của span tiến trình con
+COMMAND_ARG_LIMIT = 400
+
+
+class Tracer:
+    """Bộ ghi span dạng Chrome trace-event, dùng chung được cho nhiều công việc"""
+
+    def __init__(self, profile_python: bool = False):
+        """
+        Args:
+            profile_python: Chạy cProfile cho luồng gọi start_profile() (thường là
+                luồng chính) và mọi luồng được tạo sau đó (worker) để thấy
+                overhead phía Python
+        """
+        self.pid = os.getpid()
+        self.events = []
+        self.metadata = {}
+        self._origin = time.monotonic()
+        self._wall_origin = time.time()
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._profiler = cProfile.Profile() if profile_python else None
+        self._thread_profilers = []  # cProfile của từng luồng worker
+        self._profiling = False
+
+    def _timestamp(self, monotonic_time: float) -> float:
+        """Micro giây kể từ lúc tạo tracer"""
+        return round((monotonic_time - self._origin) * 1e6, 1)
+
+    def _tid(self) -> int:
+        """ID hàng của luồng hiện tại (đánh số nhỏ, kèm tên luồng)"""
+        thread = threading.current_thread()
+        with self._lock:
+            tid = self._threads.get(thread.ident)
+            if tid is None:
+                tid = self._threads[thread.ident] = len(self._threads) + 1
+                self.events.append({'ph': 'M', 'name': 'thread_name', 'pid': self.pid, 'tid': tid,
+                                    'args': {'name': thread.name}})
+        return tid
+
+    def span(self, name: str, category: str, start: float, end: float, args: Optional[dict] = None):
+        """
+        Ghi một span đã xong trên luồng hiện tại
+
+        Args:
+            name: Tên span
+            category: Nhóm (stage, segment, process...)
+            start, end: Thời điểm time.monotonic()
+            args: Thông tin thêm hiện trong Perfetto
+        """
+        event = {
+            'name': name, 'cat': category, 'ph': 'X', 'pid': self.pid, 'tid': self._tid(),
+            'ts': self._timestamp(start), 'dur': round(max(0.0, end - start) * 1e6, 1),
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            self.events.append(event)
+
+    def instant(self, name: str, category: str = "event", args: Optional[dict] = None):
+        """Ghi một sự kiện tức thời (vd: công việc bị hủy)"""
+        event = {'name': name, 'cat': category, 'ph': 'i', 's': 't', 'pid': self.pid,
+                 'tid': self._tid(), 'ts': self._timestamp(time.monotonic())}
+        if args:
+            event['args'] = args
+        with self._lock:
+            self.events.append(event)
+
+    def trace_process(self, process, stage: Optional[str] = None):
+        """Ghi span cho một tiến trình con đã kết thúc (AccountedPopen)"""
+        cmd = process.args if isinstance(process.args, (list, tuple)) else [str(process.args)]
+        args = {'command': " ".join(str(part) for part in cmd)[:COMMAND_ARG_LIMIT],
+                'returncode': process.returncode}
+        if stage:
+            args['stage'] = stage
+        if process.rusage is not None:
+            args['cpu_user_seconds'] = round(process.rusage.ru_utime, 3)
+            args['cpu_system_seconds'] = round(process.rusage.ru_stime, 3)
+            args['max_rss_mb'] = round(process.rusage.ru_maxrss * MAXRSS_UNIT / (1024 * 1024), 1)
+        self.span(os.path.basename(str(cmd[0])), "process", process.started,
+                  process.ended or time.monotonic(), args)
+
+    # ===== cProfile =====
+
+    def start_profile(self):
+        """
+        Bắt đầu cProfile cho luồng hiện tại và mọi luồng được tạo sau đó (nếu bật
+        profile_python). cProfile chỉ theo dõi luồng đã bật nó, nên mỗi luồng mới
+        có một profiler riêng; kết quả được gộp lại khi ghi
+        """
+        if self._profiler and not self._profiling:
+            threading.setprofile(self._start_thread_profile)
+            self._profiler.enable()
+            self._profiling = True
+
+    def _start_thread_profile(self, frame, event, arg):
+        """Hook threading.setprofile: chạy một lần khi luồng mới bắt đầu"""
+        profiler = cProfile.Profile()
+        with self._lock:
+            if not self._profiling:
+                sys.setprofile(None)
+                return
+            self._thread_profilers.append(profiler)
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: cProfile dùng sys.monitoring cho cả tiến trình, chỉ một
+            # profiler được bật và profiler của luồng chính đã thấy luồng này
+            sys.setprofile(None)
+            with self._lock:
+                self._thread_profilers.remove(profiler)
+
+    def stop_profile(self):
+        """
+        Dừng cProfile (số liệu chỉ được ghi vào trace sau khi dừng). Luồng mới
+        không còn được theo dõi; profiler của luồng worker còn chạy dừng khi kết
+        quả được đọc
+        """
+        if self._profiler and self._profiling:
+            threading.setprofile(None)
+            self._profiler.disable()
+            with self._lock:
+                self._profiling = False
+
+    def _profile_stats(self) -> Optional[pstats.Stats]:
+        """Kết quả cProfile gộp của mọi luồng (None khi chưa dừng)"""
+        if not self._profiler or self._profiling:
+            return None
+        stats = pstats.Stats(self._profiler, stream=io.StringIO())
+        with self._lock:
+            profilers = list(self._thread_profilers)
+        for profiler in profilers:
+            stats.add(profiler)
+        return stats
+
+    def profile_summary(self, limit: int = PROFILE_TOP_FUNCTIONS) -> list:
+        """Các hàm Python tốn thời gian nhất (cumulative) của cProfile (rỗng khi đang chạy)"""
+        stats = self._profile_stats()
+        if stats is None:
+            return []
+        rows = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({
+                'function': f"{function} ({os.path.basename(filename)}:{line})",
+                'calls': calls,
+                'self_seconds': round(total, 4),
+                'cumulative_seconds': round(cumulative, 4),
+            })
+        rows.sort(key=lambda row: -row['cumulative_seconds'])
+        return rows[:limit]
+
+    # ===== GHI FILE =====
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            events = list(self.events)
+        events.append({'ph': 'M', 'name': 'process_name', 'pid': self.pid, 'tid': 0,
+                       'args': {'name': 'video_cutter'}})
+        other = dict(self.metadata, started=self._wall_origin)
+        summary = self.profile_summary()
+        if summary:
+            other['python_profile'] = summary
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': other}
+
+    def write(self, path: str) -> str:
+        """
+        Ghi file trace JSON (và file .prof cạnh nó nếu bật cProfile)
+
+        Returns:
+            Đường dẫn file trace
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with self._write_lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp_path, path)
+            stats = self._profile_stats()
+            if stats is not None:
+                stats.dump_stats(os.path.splitext(path)[0] + ".prof")
+        return path
@@ -6,13 +6,36 @@ Cho phép cắt nhiều đoạn từ video dài và ghép chúng lại với nha
 
 import os
 import sys
-import subprocess
+import shutil
 import argparse
-from typing import List, Tuple, Optional
+from typing import Callable, List, Tuple, Optional
 import re
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 
+from cancellation import CancelToken, JobCancelledError
+from capabilities import has_tool
+from ffmpeg_errors import (CODEC_UNSUPPORTED, INPUT_CORRUPT, OUT_OF_DISK, TOLERANT_INPUT_ARGS, UNKNOWN,
+                           JobFailures, ProcessFailure, run_ffmpeg, run_with_policy)
+from frame_index import ExactCut, build_frame_index, verify_frame_count
+from media_info import check_segments, prepare_segments, probe_media
+from mp4_index import read_mp4_index
+from journal import JobJournal
+import metrics
+from scratch import create_scratch_dir, ensure_free_space, estimate_intermediate_size, format_bytes
+from streaming import (DEFAULT_HLS_SEGMENT_SECONDS, OUTPUT_FORMATS, output_args, output_files,
+                       remove_output, watch_fragments)
+
+
+# Job có nhiều đoạn hơn mức này được cắt theo nhóm, mỗi nhóm một tiến trình ffmpeg
+BATCH_THRESHOLD = 64
+# Số đoạn trong một nhóm (= số input của một tiến trình ffmpeg khi encode lại)
+BATCH_SIZE = 16
+# Số file tối đa trong một lần ghép; nhiều hơn thì ghép theo nhiều tầng
+CONCAT_FAN_IN = 128
+# Fast mode: cảnh báo khi đầu đoạn có thể lệch (về keyframe trước) từ mức này (giây)
+FAST_DRIFT_WARNING = 0.5
+
 
 def parse_time_to_seconds(time_str: str) -> float:
     """
@@ -36,12 +59,15 @@ def parse_time_to_seconds(time_str: str) -> float:
         raise ValueError(f"Định dạng thời gian không hợp lệ: {time_str}")
 
 
-def parse_segments(segments_str: str) -> List[Tuple[float, float]]:
+def parse_segments(segments_str: str, scene_index=None,
+                   snap_tolerance: float = 0.25) -> List[Tuple[float, float]]:
     """
     Phân tích chuỗi các đoạn cần cắt
 
     Args:
         segments_str: Chuỗi định dạng "03:05-03:10|40:05-40:10|1:03:05-1:04:05"
+        scene_index: scenes.SceneIndex để kéo điểm đầu/cuối về chuyển cảnh gần nhất (tùy chọn)
+        snap_tolerance: Chỉ kéo về chuyển cảnh cách tối đa bấy nhiêu giây
 
     Returns:
         List các tuple (start_time, end_time) tính bằng giây
@@ -69,9 +95,17 @@ def parse_segments(segments_str: str) -> List[Tuple[float, float]]:
 
         segments.append((start_time, end_time))
 
+    if scene_index is not None:
+        segments, _ = scene_index.snap_segments(segments, snap_tolerance)
+
     return segments
 
 
+def format_segments(segments: List[Tuple[float, float]]) -> str:
+    """Chuyển danh sách đoạn về chuỗi dạng "start-end|start-end" (đọc lại được bằng parse_segments)"""
+    return "|".join(f"{format_duration(start)}-{format_duration(end)}" for start, end in segments)
+
+
 def format_duration(seconds: float) -> str:
     """Chuyển đổi giây sang định dạng dễ đọc HH:MM:SS"""
     hours = int(seconds // 3600)
@@ -85,20 +119,375 @@ def format_duration(seconds: float) -> str:
 
 
 def check_ffmpeg():
-    """Kiểm tra xem ffmpeg đã được cài đặt chưa"""
+    """Kiểm tra xem ffmpeg đã được cài đặt chưa (kết quả được cache theo mtime của binary)"""
+    return has_tool('ffmpeg')
+
+
+def build_segment_command(input_video: str, start_time: float, end_time: float,
+                          output_file: str, mode: str = "accurate", volume: int = 100,
+                          preset: str = "medium", crf: int = 23,
+                          plan: Optional[dict] = None, gain_db: float = 0.0,
+                          tolerant: bool = False, exact: Optional[ExactCut] = None,
+                          threads: Optional[int] = None) -> List[str]:
+    """
+    Tạo lệnh ffmpeg để cắt một đoạn video (dùng chung cho bản sync và async)
+
+    Args:
+        input_video: Đường dẫn video đầu vào
+        start_time: Thời gian bắt đầu (giây)
+        end_time: Thời gian kết thúc (giây)
+        output_file: File đầu ra
+        mode: Chế độ cắt ('fast', 'balanced', 'accurate')
+        volume: Âm lượng (0-200%, 0=tắt, 100=giữ nguyên, >100=tăng)
+        preset: x264 preset khi re-encode
+        crf: Constant Rate Factor khi re-encode
+        plan: Cách xử lý từng stream {"video": ..., "audio": ...} với giá trị
+            "copy", "encode" hoặc "drop" (xem media_info.stream_plan).
+            None = mặc định theo mode (fast copy, còn lại encode lại)
+        gain_db: Gain thêm cho audio (dB), vd: từ chuẩn hóa loudness. Audio
+            được encode lại nếu khác 0
+        tolerant: Bỏ qua gói/khung hình hỏng của đầu vào thay vì dừng (dùng khi
+            thử lại một đoạn bị lỗi input-corrupt)
+        exact: Cắt chính xác từng frame theo chỉ mục (frame_index.ExactCut):
+            seek tới keyframe trước đoạn rồi trim theo pts. Chỉ dùng khi video
+            được encode lại; audio khi đó cũng được encode lại
+        threads: Số luồng của encoder video (None = ffmpeg tự chọn, thường là mọi core)
+
+    Returns:
+        Danh sách tham số lệnh ffmpeg
+    """
+    plan = resolve_plan(mode, volume, plan, gain_db)
+
+    if exact is not None and plan['video'] == 'encode':
+        if plan['audio'] == 'copy':
+            plan = dict(plan, audio='encode')
+        cmd = ['ffmpeg', '-copyts', *exact.input_args()]
+        if tolerant:
+            cmd.extend(TOLERANT_INPUT_ARGS)
+        cmd.extend(['-i', input_video, '-vf', exact.video_filter(), '-frames:v', str(exact.frames)])
+        cmd.extend(codec_args(plan, preset, crf, [exact.audio_filter()] + audio_filters(volume, gain_db),
+                              threads))
+        cmd.extend(['-y', output_file])
+        return cmd
+
+    cmd = ['ffmpeg', '-ss', str(start_time)]
+    if tolerant:
+        cmd.extend(TOLERANT_INPUT_ARGS)
+    cmd.extend([
+        '-i', input_video,
+        '-t', str(end_time - start_time),
+    ])
+    cmd.extend(codec_args(plan, preset, crf, audio_filters(volume, gain_db), threads))
+    cmd.extend(['-y', output_file])
+    return cmd
+
+
+def resolve_plan(mode: str, volume: int = 100, plan: Optional[dict] = None,
+                 gain_db: float = 0.0) -> dict:
+    """Cách xử lý từng stream; plan None = mặc định theo mode (xem build_segment_command)"""
+    if plan is None:
+        if mode == "fast":
+            # Fast mode: Copy codec (nhanh nhất, có thể không chính xác 1-2 giây)
+            # Note: Fast mode cannot adjust volume (requires re-encoding)
+            plan = {'video': 'copy', 'audio': 'copy'}
+        else:
+            # Accurate/Balanced mode: Re-encode (chính xác tuyệt đối)
+            plan = {'video': 'encode', 'audio': 'encode'}
+        if volume == 0:
+            plan['audio'] = 'drop'
+    if gain_db and plan['audio'] == 'copy':
+        plan = dict(plan, audio='encode')
+    return plan
+
+
+def audio_filters(volume: int = 100, gain_db: float = 0.0) -> List[str]:
+    """Filter âm lượng: volume (0-200%) và gain chuẩn hóa (dB)"""
+    filters = []
+    if volume != 100:
+        volume_multiplier = volume / 100.0
+        filters.append(f'volume={volume_multiplier}')
+    if gain_db:
+        filters.append(f'volume={gain_db:.2f}dB')
+    return filters
+
+
+def codec_args(plan: dict, preset: str = "medium", crf: int = 23,
+               audio_filter: Optional[List[str]] = None, threads: Optional[int] = None) -> List[str]:
+    """
+    Tham số codec đầu ra theo plan
+
+    Args:
+        plan: {"video": ..., "audio": ...} với giá trị copy/encode/drop
+        preset: x264 preset khi re-encode
+        crf: Constant Rate Factor khi re-encode
+        audio_filter: Filter audio (-af) khi encode audio (None = không dùng)
+        threads: Số luồng của encoder video (None = ffmpeg tự chọn)
+    """
+    args = []
+    if plan['video'] == 'copy':
+        args.extend(['-c:v', 'copy'])  # Copy codec - rất nhanh
+    elif plan['video'] == 'encode':
+        args.extend([
+            '-c:v', 'libx264',
+            '-preset', preset,  # Mặc định medium: cân bằng giữa tốc độ và chất lượng
+            '-crf', str(crf),  # Constant Rate Factor (mặc định 23: chất lượng tốt)
+        ])
+        if threads:
+            args.extend(['-threads', str(threads)])
+    else:
+        args.extend(['-vn'])
+
+    if plan['audio'] == 'copy':
+        args.extend(['-c:a', 'copy'])
+    elif plan['audio'] == 'encode':
+        args.extend(['-c:a', 'aac', '-b:a', '128k'])
+        if audio_filter:
+            args.extend(['-af', ','.join(audio_filter)])
+    else:
+        args.extend(['-an'])  # Remove audio
+
+    if plan['video'] == 'copy':
+        args.extend(['-avoid_negative_ts', '1'])  # Tránh timestamp âm
+    if 'encode' in plan.values():
+        args.extend(['-strict', 'experimental'])
+    return args
+
+
+def plan_batches(segments: List[Tuple[float, float]], order: Optional[List[int]] = None,
+                 batch_size: int = BATCH_SIZE) -> Tuple[List[List[Tuple[float, float]]], List[int]]:
+    """
+    Chia các đoạn thành nhóm, mỗi nhóm được render bởi một tiến trình ffmpeg
+
+    Job nhỏ (không quá BATCH_THRESHOLD đoạn) giữ mỗi đoạn một nhóm như cũ.
+    Đoạn được dùng nhiều lần trong order luôn là một nhóm riêng (render một
+    lần, ghép nhiều lần); các đoạn liên tiếp chỉ dùng một lần được gom nhóm.
+
+    Args:
+        segments: Các đoạn cần render
+        order: Thứ tự ghép (chỉ số trong segments, có thể lặp lại); None = lần lượt
+        batch_size: Số đoạn tối đa mỗi nhóm
+
+    Returns:
+        (các nhóm, mỗi nhóm là list đoạn; thứ tự ghép theo chỉ số nhóm)
+    """
+    if order is None:
+        order = list(range(len(segments)))
+    if len(order) <= BATCH_THRESHOLD:
+        return [[segment] for segment in segments], list(order)
+
+    counts = {}
+    for idx in order:
+        counts[idx] = counts.get(idx, 0) + 1
+
+    units = []
+    sequence = []
+    shared = {}
+    batch = []
+
+    def flush():
+        if batch:
+            units.append(list(batch))
+            sequence.append(len(units) - 1)
+            batch.clear()
+
+    for idx in order:
+        if counts[idx] > 1:
+            flush()
+            if idx not in shared:
+                units.append([segments[idx]])
+                shared[idx] = len(units) - 1
+            sequence.append(shared[idx])
+        else:
+            batch.append(segments[idx])
+            if len(batch) >= batch_size:
+                flush()
+    flush()
+    return units, sequence
+
+
+def build_batch_command(input_video: str, segments: List[Tuple[float, float]], output_file: str,
+                        mode: str = "accurate", volume: int = 100,
+                        preset: str = "medium", crf: int = 23,
+                        plan: Optional[dict] = None, gain_db: float = 0.0,
+                        list_file: Optional[str] = None, tolerant: bool = False,
+                        exact: Optional[List[ExactCut]] = None,
+                        threads: Optional[int] = None) -> List[str]:
+    """
+    Tạo lệnh ffmpeg cắt và ghép một nhóm đoạn trong một tiến trình
+
+    - Video được copy (fast): concat demuxer với inpoint/outpoint cho từng đoạn
+      (danh sách ghi vào list_file), giống cắt copy từng đoạn rồi ghép
+    - Encode lại: mỗi đoạn là một input (-ss/-t, seek nhanh) và filter concat
+      ghép chúng trước khi encode một lần
+
+    Số input và độ dài lệnh tỉ lệ với số đoạn trong nhóm (xem BATCH_SIZE).
+
+    Args:
+        segments: Các đoạn của nhóm (theo thứ tự xuất hiện trong video đầu ra)
+        list_file: File danh sách cho concat demuxer (bắt buộc khi video được copy)
+        exact: ExactCut của từng đoạn (cùng thứ tự với segments) để cắt chính
+            xác từng frame khi encode lại (xem build_segment_command)
+        Còn lại: như build_segment_command
+
+    Returns:
+        Danh sách tham số lệnh ffmpeg
+    """
+    plan = resolve_plan(mode, volume, plan, gain_db)
+    filters = audio_filters(volume, gain_db)
+    input_args = TOLERANT_INPUT_ARGS if tolerant else []
+
+    if plan['video'] == 'copy':
+        if list_file is None:
+            raise ValueError("Cần list_file để ghép các đoạn copy")
+        abs_input = os.path.abspath(input_video)
+        with open(list_file, 'w') as f:
+            for start_time, end_time in segments:
+                f.write(f"file '{abs_input}'\ninpoint {start_time}\noutpoint {end_time}\n")
+        cmd = ['ffmpeg', *input_args, '-f', 'concat', '-safe', '0', '-i', list_file]
+        cmd.extend(codec_args(plan, preset, crf, filters))
+        cmd.extend(['-y', output_file])
+        return cmd
+
+    if plan['video'] != 'encode':
+        exact = None
+    cmd = ['ffmpeg']
+    if exact:
+        cmd.append('-copyts')
+    for i, (start_time, end_time) in enumerate(segments):
+        seek = exact[i].input_args() if exact else ['-ss', str(start_time), '-t', str(end_time - start_time)]
+        cmd.extend([*seek, *input_args, '-i', input_video])
+
+    has_video = plan['video'] != 'drop'
+    has_audio = plan['audio'] != 'drop'
+    chains = []
+    inputs = ""
+    for i in range(len(segments)):
+        if has_video:
+            if exact:
+                chains.append(f"[{i}:v:0]{exact[i].video_filter()}[v{i}]")
+            inputs += f"[v{i}]" if exact else f"[{i}:v:0]"
+        if has_audio:
+            if exact:
+                chains.append(f"[{i}:a:0]{exact[i].audio_filter()}[a{i}]")
+            inputs += f"[a{i}]" if exact else f"[{i}:a:0]"
+    outputs = ("[v]" if has_video else "") + ("[a]" if has_audio else "")
+    chains.append(f"{inputs}concat=n={len(segments)}:v={int(has_video)}:a={int(has_audio)}{outputs}")
+    graph = ";".join(chains)
+    if has_audio and filters:
+        # -af không dùng được với stream ra từ filter_complex: đưa vào graph
+        graph = graph[:-len("[a]")] + "[ac];[ac]" + ",".join(filters) + "[a]"
+
+    cmd.extend(['-filter_complex', graph])
+    if has_video:
+        cmd.extend(['-map', '[v]'])
+        if exact:
+            cmd.extend(['-frames:v', str(sum(cut.frames for cut in exact))])
+    if has_audio:
+        cmd.extend(['-map', '[a]'])
+    # Audio đã qua filter concat nên luôn phải encode lại
+    batch_plan = dict(plan, audio='encode' if has_audio else 'drop')
+    cmd.extend(codec_args(batch_plan, preset, crf, threads=threads))
+    cmd.extend(['-y', output_file])
+    return cmd
+
+
+def write_concat_list(segment_files: List[str], concat_file: str):
+    """Ghi file danh sách các đoạn cho concat demuxer (đường dẫn tuyệt đối)"""
+    with open(concat_file, 'w') as f:
+        for segment_file in segment_files:
+            abs_path = os.path.abspath(segment_file)
+            f.write(f"file '{abs_path}'\n")
+
+
+def build_concat_command(concat_file: str, output_video: str, output_format: str = "mp4",
+                         hls_time: float = DEFAULT_HLS_SEGMENT_SECONDS) -> List[str]:
+    """
+    Tạo lệnh ffmpeg ghép các đoạn bằng concat demuxer (copy, không re-encode)
+
+    output_format: 'mp4', 'fmp4' (MP4 phân mảnh) hoặc 'hls' (output_video là
+    playlist .m3u8, xem streaming)
+    """
+    return [
+        'ffmpeg',
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', concat_file,
+        '-c', 'copy',
+        *output_args(output_video, output_format, hls_time),
+        '-y',
+        output_video
+    ]
+
+
+def concat_files(files: List[str], output_video: str, work_dir: str,
+                 cancel_token: Optional[CancelToken] = None, fan_in: int = CONCAT_FAN_IN,
+                 progress_callback=None, output_format: str = "mp4",
+                 hls_time: float = DEFAULT_HLS_SEGMENT_SECONDS,
+                 on_fragment: Optional[Callable[[str], None]] = None):
+    """
+    Ghép các file bằng concat demuxer, theo nhiều tầng nếu có quá nhiều file
+
+    Mỗi lần ghép chỉ nhận tối đa fan_in file; các file ghép trung gian của một
+    tầng bị xóa ngay khi tầng sau ghép xong.
+
+    Args:
+        files: Các file cần ghép (theo thứ tự)
+        output_video: File đầu ra
+        work_dir: Thư mục cho danh sách và file ghép trung gian
+        cancel_token: CancelToken để hủy giữa chừng
+        fan_in: Số file tối đa mỗi lần ghép
+        progress_callback: Hàm callback để báo tiến trình
+        output_format: Định dạng của lần ghép cuối ('mp4', 'fmp4', 'hls'); các
+            file ghép trung gian luôn là MP4 thường
+        hls_time: Độ dài mục tiêu mỗi segment HLS (giây)
+        on_fragment: Với 'hls', gọi với đường dẫn từng file (init, segment) ngay
+            khi nó ghi xong, trong lúc ffmpeg vẫn đang ghi các segment sau
+
+    Raises:
+        ProcessFailure: Nếu ffmpeg lỗi (lỗi tạm thời được chạy lại trước)
+    """
+    def concat_once(group, target, list_name, output_format="mp4"):
+        concat_file = os.path.join(work_dir, list_name)
+        write_concat_list(group, concat_file)
+        cmd = build_concat_command(concat_file, target, output_format, hls_time)
+        run_with_policy([("concat", lambda: run_ffmpeg(cmd, cancel_token), ())], cancel_token,
+                        log=progress_callback, label="Ghép video")
+
+    level = 0
+    intermediates = []
+    while len(files) > fan_in:
+        level += 1
+        groups = [files[i:i + fan_in] for i in range(0, len(files), fan_in)]
+        if progress_callback:
+            progress_callback(f"🔗 Ghép tầng {level}: {len(files)} file → {len(groups)} file")
+        next_files = []
+        for idx, group in enumerate(groups, 1):
+            target = os.path.join(work_dir, f"concat_L{level}_{idx:04d}.mp4")
+            concat_once(group, target, f"concat_L{level}_{idx:04d}.txt")
+            next_files.append(target)
+        for path in intermediates:
+            os.remove(path)
+        intermediates = files = next_files
+
+    watcher = watch_fragments(output_video, output_format, on_fragment)
     try:
-        subprocess.run(['ffmpeg', '-version'],
-                      stdout=subprocess.PIPE,
-                      stderr=subprocess.PIPE,
-                      check=True)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        return False
+        concat_once(files, output_video, "concat_list.txt", output_format)
+    except BaseException:
+        if watcher:
+            watcher.stop(raise_errors=False)
+        raise
+    if watcher:
+        watcher.stop()  # Chờ các segment cuối được xử lý xong
+    for path in intermediates:
+        os.remove(path)
 
 
 def cut_single_segment(input_video: str, start_time: float, end_time: float,
                       output_file: str, mode: str = "accurate",
-                      volume: int = 100) -> bool:
+                      volume: int = 100, cancel_token: Optional[CancelToken] = None,
+                      preset: str = "medium", crf: int = 23, plan: Optional[dict] = None,
+                      gain_db: float = 0.0, tolerant: bool = False,
+                      exact: Optional[ExactCut] = None, threads: Optional[int] = None) -> bool:
     """
     Cắt một đoạn video đơn lẻ
 
@@ -109,56 +498,72 @@ def cut_single_segment(input_video: str, start_time: float, end_time: float,
         output_file: File đầu ra
         mode: Chế độ cắt ('fast', 'balanced', 'accurate')
         volume: Âm lượng (0-200%, 0=tắt, 100=giữ nguyên, >100=tăng)
+        cancel_token: CancelToken để hủy giữa chừng (tùy chọn)
+        preset: x264 preset khi re-encode (mặc định: medium)
+        crf: Constant Rate Factor khi re-encode (mặc định: 23)
+        plan: Cách xử lý từng stream (copy/encode/drop), xem build_segment_command
+        gain_db: Gain thêm cho audio (dB)
+        tolerant: Bỏ qua dữ liệu hỏng của đầu vào (xem build_segment_command)
+        exact: Cắt chính xác từng frame (xem build_segment_command); số frame của
+            file kết quả được kiểm tra lại
+        threads: Số luồng của encoder video (None = ffmpeg tự chọn)
 
     Returns:
-        True nếu thành công, False nếu thất bại
+        True khi thành công
+
+    Raises:
+        ProcessFailure: Nếu ffmpeg lỗi (kèm loại lỗi, xem ffmpeg_errors)
+        FrameCountError: Nếu file kết quả không đúng số frame (khi dùng exact)
+        JobCancelledError: Nếu bị hủy trong khi đang cắt
+    """
+    cmd = build_segment_command(input_video, start_time, end_time, output_file,
+                                mode, volume, preset, crf, plan, gain_db, tolerant, exact, threads)
+    run_ffmpeg(cmd, cancel_token)
+    if exact is not None and '-frames:v' in cmd:
+        verify_frame_count(output_file, exact.frames, cancel_token)
+    return True
+
+
+def cut_batch(input_video: str, segments: List[Tuple[float, float]], output_file: str,
+              mode: str = "accurate", volume: int = 100,
+              cancel_token: Optional[CancelToken] = None,
+              preset: str = "medium", crf: int = 23, plan: Optional[dict] = None,
+              gain_db: float = 0.0, tolerant: bool = False,
+              exact: Optional[List[ExactCut]] = None, threads: Optional[int] = None) -> bool:
     """
-    duration = end_time - start_time
+    Cắt và ghép một nhóm đoạn bằng một tiến trình ffmpeg (xem build_batch_command)
 
-    # Xây dựng lệnh ffmpeg dựa trên mode
-    if mode == "fast":
-        # Fast mode: Copy codec (nhanh nhất, có thể không chính xác 1-2 giây)
-        cmd = [
-            'ffmpeg',
-            '-ss', str(start_time),
-            '-i', input_video,
-            '-t', str(duration),
-            '-c', 'copy',  # Copy codec - rất nhanh
-            '-avoid_negative_ts', '1',  # Tránh timestamp âm
-        ]
-        if volume == 0:
-            cmd.extend(['-an'])  # Remove audio
-        # Note: Fast mode cannot adjust volume (requires re-encoding)
-        cmd.extend(['-y', output_file])
-    else:
-        # Accurate/Balanced mode: Re-encode (chính xác tuyệt đối)
-        cmd = [
-            'ffmpeg',
-            '-ss', str(start_time),
-            '-i', input_video,
-            '-t', str(duration),
-            '-c:v', 'libx264',
-            '-preset', 'medium',  # Cân bằng giữa tốc độ và chất lượng
-            '-crf', '23',  # Constant Rate Factor (chất lượng tốt)
-        ]
-        if volume == 0:
-            cmd.extend(['-an'])  # Remove audio
-        else:
-            cmd.extend(['-c:a', 'aac', '-b:a', '128k'])
-            # Apply volume filter if not 100%
-            if volume != 100:
-                volume_multiplier = volume / 100.0
-                cmd.extend(['-af', f'volume={volume_multiplier}'])
-        cmd.extend(['-strict', 'experimental', '-y', output_file])
+    Returns:
+        True khi thành công
 
-    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    return result.returncode == 0
+    Raises:
+        ProcessFailure: Nếu ffmpeg lỗi (kèm loại lỗi, xem ffmpeg_errors)
+        FrameCountError: Nếu file kết quả không đúng số frame (khi dùng exact)
+        JobCancelledError: Nếu bị hủy trong khi đang cắt
+    """
+    list_file = os.path.splitext(output_file)[0] + ".txt"
+    cmd = build_batch_command(input_video, segments, output_file, mode, volume, preset, crf,
+                              plan, gain_db, list_file, tolerant, exact, threads)
+    run_ffmpeg(cmd, cancel_token)
+    if exact and '-frames:v' in cmd:
+        verify_frame_count(output_file, sum(cut.frames for cut in exact), cancel_token)
+    return True
 
 
 def cut_video_segments(input_video: str, segments: List[Tuple[float, float]],
-                       output_video: str, temp_dir: str = "temp_segments",
+                       output_video: str, temp_dir: Optional[str] = None,
                        mode: str = "balanced", max_workers: Optional[int] = None,
-                       volume: int = 100, progress_callback=None):
+                       volume: int = 100, progress_callback=None,
+                       cancel_token: Optional[CancelToken] = None,
+                       preset: str = "medium", crf: int = 23, fast_scratch: bool = True,
+                       journal: Optional[JobJournal] = None,
+                       snap_tolerance: Optional[float] = None,
+                       loudness_target: Optional[float] = None,
+                       order: Optional[List[int]] = None,
+                       output_format: str = "mp4",
+                       hls_time: float = DEFAULT_HLS_SEGMENT_SECONDS,
+                       on_fragment: Optional[Callable[[str], None]] = None,
+                       cpu_threads: Optional[int] = None):
     """
     Cắt và ghép các đoạn video với nhiều chế độ tốc độ
 
@@ -166,14 +571,48 @@ def cut_video_segments(input_video: str, segments: List[Tuple[float, float]],
         input_video: Đường dẫn video đầu vào
         segments: List các tuple (start_time, end_time)
         output_video: Đường dẫn video đầu ra
-        temp_dir: Thư mục tạm để lưu các đoạn video
+        temp_dir: Thư mục gốc cho file tạm (None = scratch.get_scratch_root()).
+            Mỗi lần gọi tạo một thư mục con riêng và chỉ xóa thư mục đó, nên
+            nhiều công việc có thể dùng chung một thư mục gốc
         mode: Chế độ xử lý
             - 'fast': Rất nhanh (copy codec) - có thể không chính xác 1-2 giây
             - 'balanced': Cân bằng (song song + re-encode) - nhanh và chính xác
-            - 'accurate': Chính xác tuyệt đối (tuần tự + re-encode) - chậm nhất
-        max_workers: Số luồng xử lý song song (None = auto, chỉ dùng cho balanced mode)
+            - 'accurate': Chính xác từng frame (song song + re-encode): seek tới
+              keyframe theo chỉ mục frame rồi trim theo pts, kiểm tra số frame
+        max_workers: Số luồng xử lý song song (None = auto, dùng cho balanced/accurate)
         volume: Âm lượng (0-200%, 0=tắt, 100=giữ nguyên, >100=tăng)
         progress_callback: Hàm callback để báo tiến trình (nhận message string)
+        cancel_token: CancelToken để hủy giữa chừng (tùy chọn). Khi hủy, các đoạn
+            đang chờ bị bỏ, ffmpeg đang chạy bị kết thúc, file tạm và file đầu ra
+            dở dang (nếu đã bắt đầu ghép) bị xóa, rồi ném JobCancelledError. File
+            có sẵn ở output_video trước khi bước ghép bắt đầu được giữ nguyên
+        preset: x264 preset khi re-encode (balanced/accurate)
+        crf: Constant Rate Factor khi re-encode (balanced/accurate)
+        fast_scratch: Đặt file tạm trên /dev/shm (hoặc $VIDEO_CUTTER_FAST_SCRATCH) nếu vừa
+        journal: JobJournal để ghi checkpoint (tùy chọn). Các đoạn và file ghép đã
+            xong ở lần chạy trước (checksum khớp) được bỏ qua; khi lỗi hoặc bị hủy,
+            thư mục tạm được giữ lại để tiếp tục lần sau
+        snap_tolerance: Kéo điểm đầu/cuối về chuyển cảnh gần nhất trong phạm vi này
+            (giây, chỉ mục chuyển cảnh được tạo một lần và cache). None = không kéo
+        loudness_target: Chuẩn hóa âm lượng về mức này (LUFS, vd: -23 theo EBU R128).
+            Chỉ đo các đoạn được chọn (có cache) rồi áp một mức gain cho mọi đoạn.
+            None = không chuẩn hóa
+        order: Thứ tự ghép, là chỉ số các đoạn trong segments; một đoạn có thể
+            xuất hiện nhiều lần và chỉ được render một lần (xem segment_plan).
+            None = mỗi đoạn một lần theo thứ tự
+        output_format: 'mp4' (mặc định), 'fmp4' (MP4 phân mảnh, phát được khi đang
+            ghi) hoặc 'hls' (output_video là playlist .m3u8 + các segment .m4s)
+        hls_time: Độ dài mục tiêu mỗi segment HLS (giây)
+        on_fragment: Với 'hls', gọi với từng file segment ngay khi nó ghi xong
+            (vd: để upload trong khi các segment sau vẫn đang được ghép)
+        cpu_threads: Tổng số luồng CPU công việc được dùng khi encode (None = không
+            giới hạn). Số ffmpeg chạy song song bị giới hạn bởi giá trị này và mỗi
+            ffmpeg nhận -threads để số ffmpeg × số luồng không vượt quá nó
+
+    Raises:
+        ScratchSpaceError: Nếu không đủ dung lượng cho file tạm hoặc file đầu ra
+        JobFailures: Nếu có đoạn vẫn lỗi sau khi thử lại/đổi cách (liệt kê mọi đoạn lỗi)
+        ProcessFailure: Nếu bước ghép lỗi
     """
     def log(message):
         """Helper để in log hoặc gọi callback"""
@@ -189,111 +628,271 @@ def cut_video_segments(input_video: str, segments: List[Tuple[float, float]],
     if not os.path.exists(input_video):
         raise FileNotFoundError(f"Không tìm thấy file video: {input_video}")
 
-    # Tạo thư mục tạm
-    os.makedirs(temp_dir, exist_ok=True)
+    # Đọc thông tin video (có cache): từ chối/cắt gọn các đoạn nằm ngoài video
+    # trước khi chạy ffmpeg, và chọn copy hay encode lại cho từng stream
+    # Luôn có token để Ctrl+C cũng dừng được ffmpeg đang chạy
+    if cancel_token is None:
+        cancel_token = CancelToken()
+
+    with metrics.stage(cancel_token, "probe"):
+        info, segments, segment_warnings, plan = prepare_segments(input_video, segments, mode, volume)
+
+    if snap_tolerance:
+        from scenes import snap_to_scenes
+        with metrics.stage(cancel_token, "scenes"):
+            segments, moved = snap_to_scenes(input_video, segments, snap_tolerance,
+                                             cancel_token=cancel_token, progress_callback=log)
+        if moved:
+            segment_warnings.append(f"Đã kéo {moved} điểm đầu/cuối về chuyển cảnh gần nhất")
+
+    # Chuẩn hóa âm lượng: đo các đoạn (song song, có cache) → một mức gain chung
+    gain_db = 0.0
+    if loudness_target is not None and volume != 0 and (info is None or info.has_audio):
+        from loudness import normalization_gain
+        with metrics.stage(cancel_token, "loudness"):
+            gain_db, loudness = normalization_gain(input_video, segments, loudness_target,
+                                                   cancel_token=cancel_token, progress_callback=log)
+        segment_warnings.append(f"Chuẩn hóa âm lượng: {loudness['i']:.1f} LUFS → "
+                                f"{loudness_target:.1f} LUFS (gain {gain_db:+.1f} dB)")
+        if gain_db and plan and plan['audio'] == 'copy':
+            plan = dict(plan, audio='encode')
+
+    # Lần chạy trước đã ghép xong (resume): không cần cắt lại
+    if journal and journal.stage_done('concat', os.path.abspath(output_video)):
+        log(f"⏭️  Đã cắt và ghép xong ở lần chạy trước: {output_video}")
+        return
+
+    # Fast: copy bắt đầu từ keyframe trước điểm cắt; báo trước độ lệch nếu đọc được
+    # chỉ mục keyframe của MP4/MOV (không cần chạy tiến trình con)
+    if mode == "fast" and plan and plan['video'] == 'copy':
+        container = read_mp4_index(input_video)
+        video_track = container.video if container else None
+        if video_track is not None and video_track.sample_count:
+            drift = max(start - (video_track.keyframe_before(start) or 0.0) for start, _ in segments)
+            if drift >= FAST_DRIFT_WARNING:
+                segment_warnings.append(f"Fast mode cắt theo keyframe: đầu đoạn có thể sớm hơn tới "
+                                        f"{drift:.1f}s (dùng balanced/accurate nếu cần chính xác)")
+
+    # Accurate: chỉ mục frame (đọc một lần, có cache) → seek keyframe + trim theo pts cho từng đoạn
+    exact_cuts = {}
+    if mode == "accurate" and plan and plan['video'] == 'encode':
+        with metrics.stage(cancel_token, "frame_index"):
+            index = build_frame_index(input_video, info, cancel_token, log)
+        if index is None:
+            segment_warnings.append("Không đọc được chỉ mục frame: cắt theo thời gian (có thể lệch 1 frame)")
+        else:
+            exact_cuts = index.exact_cuts(segments, info.sample_rate)
+            if plan['audio'] == 'copy':
+                # Audio copy chỉ cắt được theo gói: encode lại để khớp với video
+                plan = dict(plan, audio='encode')
+            segment_warnings.append(f"Cắt chính xác từng frame: {len(index.pts)} frame, "
+                                    f"{len(index.keyframes)} keyframe trong chỉ mục")
+
+    # Kiểm tra dung lượng trống rồi tạo thư mục tạm riêng cho công việc này
+    # (hoặc dùng lại thư mục tạm của lần chạy trước khi tiếp tục)
+    estimate = estimate_intermediate_size(input_video, segments, info)
+    ensure_free_space(os.path.dirname(os.path.abspath(output_video)), estimate)
+    if journal and journal.scratch_dir:
+        temp_dir = journal.scratch_dir
+    else:
+        temp_dir = create_scratch_dir(estimate, root=temp_dir, prefer_fast=fast_scratch)
+        if journal:
+            journal.set_scratch_dir(temp_dir)
 
     # Thông tin mode
     mode_info = {
         'fast': '🚀 FAST MODE (Rất nhanh - có thể sai lệch 1-2s)',
         'balanced': '⚡ BALANCED MODE (Nhanh + Chính xác)',
-        'accurate': '🎯 ACCURATE MODE (Chính xác tuyệt đối)'
+        'accurate': '🎯 ACCURATE MODE (Chính xác từng frame)'
     }
 
     log(f"\n🎬 Bắt đầu cắt video từ: {input_video}")
     log(f"📊 Tổng số đoạn cần cắt: {len(segments)}")
     log(f"⚙️  Chế độ: {mode_info.get(mode, mode)}")
-    log(f"🔊 Âm lượng: {volume}% {'(Tắt)' if volume == 0 else ''}\n")
-
-    segment_files = []
-    total_duration = sum(end - start for start, end in segments)
+    log(f"🔊 Âm lượng: {volume}% {'(Tắt)' if volume == 0 else ''}")
+    if info:
+        log(f"🎞️  Video gốc: {info.summary()}")
+        log(f"📦 Xử lý stream: video {plan['video']}, audio {plan['audio']}")
+    for warning in segment_warnings:
+        log(f"⚠️  {warning}")
+    log(f"💽 File tạm (~{format_bytes(estimate)}): {temp_dir}")
+    log("")
+
+    # Job lớn: mỗi nhóm đoạn được cắt bởi một tiến trình ffmpeg (xem plan_batches),
+    # job nhỏ: mỗi đoạn một tiến trình như cũ
+    units, sequence = plan_batches(segments, order)
+    batched = any(len(unit) > 1 for unit in units)
+    unit_label = "Nhóm" if batched else "Đoạn"
+    if batched:
+        log(f"📦 {len(segments)} đoạn → {len(units)} nhóm (tối đa {BATCH_SIZE} đoạn/nhóm)\n")
+
+    segment_files = [os.path.join(temp_dir, f"batch_{idx:04d}.mp4" if batched else f"segment_{idx:03d}.mp4")
+                     for idx in range(1, len(units) + 1)]
+    total_duration = sum(end - start for unit_idx in sequence for start, end in units[unit_idx])
     start_overall = time.time()
+    finished = False
+    cancelled = False
+    # File đầu ra chỉ bị xóa khi hủy nếu công việc này đã bắt đầu ghi nó
+    # (không xóa file có sẵn từ trước ở cùng đường dẫn)
+    writing_output = False
+
+    # Các đoạn (nhóm) đã cắt xong ở lần chạy trước
+    done = set()
+    if journal:
+        done = {idx for idx, path in enumerate(segment_files, 1)
+                if journal.segment_done(idx, os.path.abspath(path))}
+        if done:
+            log(f"⏭️  Tiếp tục: {len(done)}/{len(units)} {unit_label.lower()} đã cắt xong ở lần chạy trước\n")
+
+    def mark_done(idx):
+        if journal:
+            journal.record_segment(idx, os.path.abspath(segment_files[idx - 1]))
+
+    # Cách cắt mỗi đoạn khi lỗi (xem ffmpeg_errors.run_with_policy): lỗi tạm thời
+    # được chạy lại; copy lỗi → encode lại; dữ liệu hỏng → encode bỏ qua gói hỏng
+    unit_plan = resolve_plan(mode, volume, plan, gain_db)
+    encode_plan = {stream: 'encode' if how == 'copy' else how for stream, how in unit_plan.items()}
+    strategies = [(f"video {unit_plan['video']}, audio {unit_plan['audio']}", unit_plan, False, ())]
+    if encode_plan != unit_plan:
+        strategies.append(("encode lại", encode_plan, False, (CODEC_UNSUPPORTED, INPUT_CORRUPT, UNKNOWN)))
+    strategies.append(("bỏ qua dữ liệu hỏng", encode_plan, True, (INPUT_CORRUPT,)))
+    # Số luồng encoder của mỗi ffmpeg (chia lại khi cắt song song, xem bên dưới)
+    threads = cpu_threads
+
+    def cut_unit(idx, queued_at=None):
+        unit = units[idx - 1]
+        output_file = segment_files[idx - 1]
+
+        exact = [exact_cuts.get(segment) for segment in unit]
+        if None in exact:
+            exact = None
+
+        def attempt(attempt_plan, tolerant):
+            if len(unit) > 1:
+                return lambda: cut_batch(input_video, unit, output_file, mode, volume, cancel_token,
+                                         preset, crf, attempt_plan, gain_db, tolerant, exact, threads)
+            start_time, end_time = unit[0]
+            return lambda: cut_single_segment(input_video, start_time, end_time, output_file, mode, volume,
+                                              cancel_token, preset, crf, attempt_plan, gain_db, tolerant,
+                                              exact[0] if exact else None, threads)
+
+        with metrics.segment(cancel_token, os.path.splitext(os.path.basename(output_file))[0], queued_at):
+            run_with_policy([(name, attempt(attempt_plan, tolerant), kinds)
+                             for name, attempt_plan, tolerant, kinds in strategies],
+                            cancel_token, log=log, label=f"{unit_label} {idx}")
+            metrics.record_file(cancel_token, output_file)
+
+    # Đoạn lỗi không dừng cả công việc: các đoạn còn lại vẫn được cắt (và ghi vào
+    # journal), cuối cùng báo mọi lỗi cùng lúc
+    failures = []
+
+    def record_failure(idx, error):
+        if not isinstance(error, ProcessFailure):
+            error = RuntimeError(f"{unit_label} {idx}: {error}")
+        failures.append(error)
+        log(f"❌ {error}")
+        return getattr(error, 'kind', None) == OUT_OF_DISK
+
+    def describe(idx):
+        unit = units[idx - 1]
+        start, end = unit[0][0], unit[-1][1]
+        duration = sum(e - s for s, e in unit)
+        count = f" ({len(unit)} đoạn)" if len(unit) > 1 else ""
+        return (f"{format_duration(start)} → {format_duration(end)}{count} "
+                f"(Độ dài: {format_duration(duration)})")
 
     try:
-        if mode == "balanced":
-            # BALANCED MODE: Xử lý song song
-            if max_workers is None:
-                max_workers = min(4, len(segments))  # Tối đa 4 luồng song song
-
-            log(f"🔄 Đang cắt {len(segments)} đoạn song song với {max_workers} luồng...\n")
-
-            # Chuẩn bị danh sách tasks
-            tasks = []
-            for idx, (start_time, end_time) in enumerate(segments, 1):
-                segment_file = os.path.join(temp_dir, f"segment_{idx:03d}.mp4")
-                segment_files.append(segment_file)
-                tasks.append((idx, start_time, end_time, segment_file))
-
-            # Xử lý song song
-            completed = 0
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                future_to_task = {
-                    executor.submit(cut_single_segment, input_video, start, end, out, mode, volume): (idx, start, end)
-                    for idx, start, end, out in tasks
-                }
-
-                for future in as_completed(future_to_task):
-                    idx, start, end = future_to_task[future]
-                    completed += 1
-                    try:
-                        success = future.result()
-                        if success:
-                            duration = end - start
-                            log(f"✅ [{completed}/{len(segments)}] Đoạn {idx}: "
-                                f"{format_duration(start)} → {format_duration(end)} "
-                                f"(Độ dài: {format_duration(duration)})")
-                        else:
-                            raise RuntimeError(f"Lỗi khi cắt đoạn {idx}")
-                    except Exception as e:
-                        raise RuntimeError(f"Lỗi khi cắt đoạn {idx}: {str(e)}")
-
-        else:
-            # FAST/ACCURATE MODE: Xử lý tuần tự
-            for idx, (start_time, end_time) in enumerate(segments, 1):
-                duration = end_time - start_time
-                segment_file = os.path.join(temp_dir, f"segment_{idx:03d}.mp4")
-                segment_files.append(segment_file)
-
-                log(f"✂️  Đoạn {idx}/{len(segments)}: "
-                    f"{format_duration(start_time)} → {format_duration(end_time)} "
-                    f"(Độ dài: {format_duration(duration)})")
+        with metrics.stage(cancel_token, "segments"):
+            if mode in ("balanced", "accurate"):
+                # BALANCED/ACCURATE MODE: Xử lý song song
+                if max_workers is None:
+                    max_workers = min(4, len(units))  # Tối đa 4 luồng song song
+                if cpu_threads:
+                    # Số ffmpeg × số luồng encoder mỗi ffmpeg không vượt quá cpu_threads
+                    max_workers = max(1, min(max_workers, cpu_threads))
+                    threads = max(1, cpu_threads // max_workers)
+
+                log(f"🔄 Đang cắt {len(units)} {unit_label.lower()} song song với {max_workers} luồng...\n")
+
+                # Xử lý song song
+                completed = len(done)
+                with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="segment-worker") as executor:
+                    future_to_idx = {}
+                    for idx in range(1, len(units) + 1):
+                        if idx in done:
+                            continue
+                        future = executor.submit(metrics.bind(cancel_token, cut_unit), idx, time.monotonic())
+                        cancel_token.add_future(future)
+                        future_to_idx[future] = idx
 
-                success = cut_single_segment(input_video, start_time, end_time, segment_file, mode, volume)
+                    try:
+                        for future in as_completed(future_to_idx):
+                            idx = future_to_idx[future]
+                            cancel_token.raise_if_cancelled()
+                            if future.cancelled():
+                                continue
+                            completed += 1
+                            try:
+                                future.result()
+                            except JobCancelledError:
+                                raise
+                            except Exception as e:
+                                if record_failure(idx, e):
+                                    # Hết dung lượng: không bắt đầu thêm đoạn nào nữa
+                                    for pending in future_to_idx:
+                                        pending.cancel()
+                                continue
+                            mark_done(idx)
+                            log(f"✅ [{completed}/{len(units)}] {unit_label} {idx}: {describe(idx)}")
+                    except (JobCancelledError, KeyboardInterrupt):
+                        # Dừng các đoạn còn lại trước khi executor chờ các luồng kết thúc
+                        cancel_token.cancel()
+                        raise
+
+            else:
+                # FAST MODE: Xử lý tuần tự
+                for idx in range(1, len(units) + 1):
+                    if idx in done:
+                        continue
+
+                    log(f"✂️  {unit_label} {idx}/{len(units)}: {describe(idx)}")
 
-                if not success:
-                    raise RuntimeError(f"Lỗi khi cắt đoạn {idx}")
+                    try:
+                        cut_unit(idx)
+                    except JobCancelledError:
+                        raise
+                    except Exception as e:
+                        if record_failure(idx, e):
+                            break
+                        continue
+                    mark_done(idx)
+
+            if failures:
+                if cancel_token.metrics is not None:
+                    cancel_token.metrics.info['failures'] = [
+                        failure.to_dict() if isinstance(failure, ProcessFailure) else {'error': str(failure)}
+                        for failure in failures]
+                raise JobFailures(failures, len(units))
 
         cutting_time = time.time() - start_overall
         log(f"\n✅ Đã cắt xong {len(segments)} đoạn")
         log(f"⏱️  Tổng thời lượng video mới: {format_duration(total_duration)}")
         log(f"⚡ Thời gian cắt: {cutting_time:.1f}s\n")
 
-        # Tạo file danh sách các đoạn để concatenate
+        # Ghép các đoạn lại (nhiều tầng nếu có quá nhiều file)
         log("🔗 Đang ghép các đoạn lại với nhau...")
-        concat_file = os.path.join(temp_dir, "concat_list.txt")
-        with open(concat_file, 'w') as f:
-            for segment_file in segment_files:
-                # Sử dụng đường dẫn tuyệt đối
-                abs_path = os.path.abspath(segment_file)
-                f.write(f"file '{abs_path}'\n")
-
-        # Ghép các đoạn lại
         concat_start = time.time()
-        concat_cmd = [
-            'ffmpeg',
-            '-f', 'concat',
-            '-safe', '0',
-            '-i', concat_file,
-            '-c', 'copy',
-            '-y',
-            output_video
-        ]
-
-        result = subprocess.run(concat_cmd,
-                               stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE)
-
-        if result.returncode != 0:
-            raise RuntimeError(f"Lỗi khi ghép video: {result.stderr.decode()}")
+        with metrics.stage(cancel_token, "concat"):
+            writing_output = True
+            concat_files([segment_files[unit_idx] for unit_idx in sequence], output_video, temp_dir,
+                         cancel_token, progress_callback=log, output_format=output_format,
+                         hls_time=hls_time, on_fragment=on_fragment)
+            for path in output_files(output_video, output_format):
+                metrics.record_file(cancel_token, path)
+
+        finished = True
+        if journal:
+            journal.record_stage('concat', os.path.abspath(output_video))
 
         concat_time = time.time() - concat_start
         total_time = time.time() - start_overall
@@ -304,16 +903,117 @@ def cut_video_segments(input_video: str, segments: List[Tuple[float, float]],
         log(f"   - Thời gian ghép: {concat_time:.1f}s")
         log(f"   - Tổng thời gian: {total_time:.1f}s")
         log(f"   - Tốc độ xử lý: {total_duration/total_time:.1f}x realtime\n")
+        if cancel_token.metrics is not None:
+            cancel_token.metrics.info.update({
+                'input': os.path.abspath(input_video),
+                'mode': mode,
+                'segments': len(segments),
+                'units': len(units),
+                'output_duration': round(total_duration, 3),
+                'realtime_factor': round(total_duration / total_time, 3),
+            })
+
+    except (JobCancelledError, KeyboardInterrupt):
+        # Bị hủy (hoặc Ctrl+C): dừng ffmpeg còn chạy và xóa file đầu ra dở dang
+        cancelled = True
+        cancel_token.cancel()
+        if writing_output:
+            remove_output(output_video, output_format)
+        log("❌ Đã hủy xử lý")
+        raise
 
     finally:
-        # Dọn dẹp các file tạm (tùy chọn)
-        if os.path.exists(temp_dir):
-            import shutil
+        if journal and cancelled:
+            # Hủy là chủ ý: không giữ các đoạn đã cắt (có thể nằm trên /dev/shm, tức RAM)
+            journal.discard()
+            print("🧹 Đã xóa các file tạm")
+        elif journal and not finished:
+            # Lỗi: giữ các đoạn đã cắt để lần sau tiếp tục
+            log(f"💾 Đã lưu tiến trình để tiếp tục lần sau: {temp_dir}")
+        elif os.path.exists(temp_dir):
+            # Dọn dẹp các file tạm
             try:
                 shutil.rmtree(temp_dir)
                 print("🧹 Đã xóa các file tạm")
             except Exception as e:
                 print(f"⚠️  Không thể xóa thư mục tạm: {e}")
+            if journal:
+                journal.set_scratch_dir(None)
+
+
+def add_audio_to_video(video_path: str, audio_path: str, audio_volume: int, output_path: str,
+                       cancel_token: Optional[CancelToken] = None):
+    """
+    Thêm audio vào video với điều chỉnh âm lượng
+
+    Args:
+        video_path: Video đầu vào
+        audio_path: File audio cần thêm
+        audio_volume: Âm lượng audio (0-200%)
+        output_path: Video đầu ra
+        cancel_token: CancelToken để hủy giữa chừng (tùy chọn)
+    """
+    try:
+        # Calculate audio volume filter
+        # volume=1.0 = 100%, volume=0.5 = 50%, volume=2.0 = 200%
+        volume_filter = audio_volume / 100.0
+
+        # Build ffmpeg command
+        # -i video_path: input video
+        # -i audio_path: input audio
+        # -filter_complex: mix audio from video (if any) with new audio
+        # -c:v copy: copy video codec (no re-encoding)
+        # -shortest: match shortest stream duration
+        cmd = [
+            'ffmpeg',
+            '-i', video_path,
+            '-i', audio_path,
+            '-filter_complex',
+            f'[1:a]volume={volume_filter}[a1];[0:a][a1]amix=inputs=2:duration=first[aout]',
+            '-map', '0:v',
+            '-map', '[aout]',
+            '-c:v', 'copy',
+            '-c:a', 'aac',
+            '-b:a', '192k',
+            '-shortest',
+            '-y',  # Overwrite output
+            output_path
+        ]
+
+        # Run command
+        try:
+            run_ffmpeg(cmd, cancel_token, text=True)
+        except ProcessFailure as e:
+            if e.kind == OUT_OF_DISK:
+                raise
+            # If video has no audio, use simpler command
+            cmd_no_video_audio = [
+                'ffmpeg',
+                '-i', video_path,
+                '-i', audio_path,
+                '-filter:a', f'volume={volume_filter}',
+                '-map', '0:v',
+                '-map', '1:a',
+                '-c:v', 'copy',
+                '-c:a', 'aac',
+                '-b:a', '192k',
+                '-shortest',
+                '-y',
+                output_path
+            ]
+
+            run_with_policy([("amix", lambda: run_ffmpeg(cmd_no_video_audio, cancel_token, text=True), ())],
+                            cancel_token)
+
+        metrics.record_file(cancel_token, output_path)
+
+    except JobCancelledError:
+        # Xóa file đầu ra dở dang
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    except Exception as e:
+        raise Exception(f"Không thể thêm audio: {str(e)}")
 
 
 def main():
@@ -325,6 +1025,10 @@ Ví dụ sử dụng:
   %(prog)s -i video.mp4 -s "03:05-03:10|40:05-40:10|1:03:05-1:04:05" -o output.mp4
   %(prog)s -i video.mp4 -s "segments" -o output.mp4 --mode fast
   %(prog)s -i video.mp4 -s "segments" -o output.mp4 --mode balanced --workers 4
+  %(prog)s -i video.mp4 -s "segments" -o out.mp4 --rendition 1080p --rendition 720p --rendition vertical
+  %(prog)s -i talk.mp4 --jump-cut -o talk_cut.mp4
+  %(prog)s -i video.mp4 --segments-file hits.csv -o highlights.mp4
+  %(prog)s -i video.mp4 -s "segments" -o stream/index.m3u8 --format hls --upload gdrive:Stream
 
 Định dạng thời gian:
   MM:SS       - Ví dụ: 03:05 (3 phút 5 giây)
@@ -337,50 +1041,323 @@ Ví dụ sử dụng:
 Chế độ xử lý (--mode):
   fast      - 🚀 Rất nhanh (copy codec) - có thể sai lệch 1-2 giây
   balanced  - ⚡ Cân bằng (song song + re-encode) - nhanh và chính xác (MẶC ĐỊNH)
-  accurate  - 🎯 Chính xác tuyệt đối (tuần tự + re-encode) - chậm nhất
+  accurate  - 🎯 Chính xác từng frame (song song + re-encode, kiểm tra số frame)
         """
     )
 
     parser.add_argument('-i', '--input', required=True,
                        help='Đường dẫn video đầu vào')
-    parser.add_argument('-s', '--segments', required=True,
+    parser.add_argument('-s', '--segments', default=None,
                        help='Các đoạn cần cắt (format: start-end|start-end|...)')
+    parser.add_argument('--segments-file', action='append', default=None, metavar='FILE',
+                       help='Đọc các đoạn từ file .json/.csv/.edl/.txt (lặp lại để nối nhiều file)')
     parser.add_argument('-o', '--output', required=True,
                        help='Đường dẫn video đầu ra')
-    parser.add_argument('-t', '--temp-dir', default='temp_segments',
-                       help='Thư mục tạm (mặc định: temp_segments)')
+    parser.add_argument('-t', '--temp-dir', default=None,
+                       help='Thư mục gốc cho file tạm, mỗi công việc có thư mục con riêng '
+                            '(mặc định: $VIDEO_CUTTER_SCRATCH hoặc <tmp>/video_cutter)')
+    parser.add_argument('--no-tmpfs', action='store_true',
+                       help='Không đặt file tạm trên /dev/shm kể cả khi vừa')
+    parser.add_argument('--resume', action='store_true',
+                       help='Tiếp tục công việc bị lỗi/dừng trước đó (cùng đầu vào, đoạn cắt, đầu ra) '
+                            'từ bước đã xong cuối cùng')
     parser.add_argument('-m', '--mode', default='balanced',
                        choices=['fast', 'balanced', 'accurate'],
                        help='Chế độ xử lý (mặc định: balanced)')
     parser.add_argument('-w', '--workers', type=int, default=None,
-                       help='Số luồng song song cho balanced mode (mặc định: auto)')
+                       help='Số luồng song song cho balanced/accurate mode (mặc định: auto)')
     parser.add_argument('--no-audio', action='store_true',
                        help='Loại bỏ âm thanh khỏi video (tạo video silent)')
+    parser.add_argument('--submit', metavar='URL', default=None,
+                       help='Gửi công việc tới job service (vd: http://127.0.0.1:8765) thay vì xử lý tại máy này')
+    parser.add_argument('--draft', action='store_true',
+                       help='Render nháp nhanh từ bản proxy độ phân giải thấp (proxy được cache)')
+    parser.add_argument('--distributed', action='store_true',
+                       help='Render các đoạn trên nhiều tiến trình worker (--workers = số worker cục bộ, '
+                            'máy khác tham gia bằng distributed.py worker)')
+    parser.add_argument('--listen', default=None, metavar='HOST:PORT',
+                       help='Địa chỉ coordinator khi dùng --distributed (vd: 0.0.0.0:8770)')
+    parser.add_argument('--jump-cut', action='store_true',
+                       help='Tự tạo danh sách đoạn bằng cách bỏ các khoảng lặng (thay cho -s, cần numpy)')
+    parser.add_argument('--silence-threshold', type=float, default=None, metavar='DB',
+                       help='Ngưỡng im lặng cho --jump-cut, dBFS (mặc định: -35)')
+    parser.add_argument('--snap', nargs='?', type=float, const=0.25, default=None, metavar='SECONDS',
+                       help='Kéo điểm đầu/cuối mỗi đoạn về chuyển cảnh gần nhất trong phạm vi SECONDS '
+                            '(mặc định 0.25s) để tránh frame nháy')
+    parser.add_argument('--optimize', nargs='?', type=float, const=0.0, default=None, metavar='GAP',
+                       help='Gộp các đoạn liên tiếp chồng lấn/nối tiếp (hoặc cách nhau dưới GAP giây) '
+                            'và render đoạn trùng lặp một lần')
+    parser.add_argument('--normalize', nargs='?', type=float, const=-23.0, default=None, metavar='LUFS',
+                       help='Chuẩn hóa âm lượng theo EBU R128 về mức LUFS (mặc định -23; -16 cho web)')
+    parser.add_argument('--rendition', action='append', default=None, metavar='SPEC',
+                       help='Xuất thêm phiên bản từ cùng một lần giải mã, lặp lại cho mỗi phiên bản '
+                            '(vd: --rendition 1080p --rendition 720p:crf=26 --rendition vertical)')
+    parser.add_argument('--upload', default=None, metavar='REMOTE:PATH',
+                       help='Upload file đầu ra (từng phiên bản ngay khi xong) bằng rclone, vd: gdrive:Videos')
+    parser.add_argument('--format', dest='output_format', default='mp4', choices=OUTPUT_FORMATS,
+                       help='Định dạng đầu ra: mp4, fmp4 (MP4 phân mảnh) hoặc hls (-o là playlist .m3u8)')
+    parser.add_argument('--hls-time', type=float, default=DEFAULT_HLS_SEGMENT_SECONDS, metavar='SECONDS',
+                       help=f'Độ dài mục tiêu mỗi segment HLS (mặc định: {DEFAULT_HLS_SEGMENT_SECONDS:g})')
+    parser.add_argument('--rclone-config', default=None, metavar='FILE',
+                       help='File rclone.conf dùng cho --upload (mặc định: config của rclone)')
+    parser.add_argument('--metrics', default=None, metavar='FILE',
+                       help='Ghi báo cáo hiệu năng JSON (thời gian, CPU, RSS, I/O từng bước/đoạn) vào FILE '
+                            '(mặc định: thư mục metrics trong cache)')
+    parser.add_argument('--prometheus', default=None, metavar='FILE',
+                       help='Ghi thêm số liệu ra file textfile Prometheus (.prom)')
+    parser.add_argument('--trace', default=None, metavar='FILE',
+                       help='Ghi timeline (probe, từng đoạn theo luồng worker, ghép, upload...) dạng '
+                            'Chrome trace-event vào FILE, mở bằng Perfetto')
+    parser.add_argument('--trace-python', action='store_true',
+                       help='Ghi thêm cProfile phía Python của luồng chính và mọi luồng worker '
+                            '(FILE.prof và các hàm tốn thời gian nhất trong trace)')
 
     args = parser.parse_args()
 
+    if bool(args.segments or args.segments_file) == args.jump_cut:
+        parser.error("cần -s/--segments (hoặc --segments-file) hoặc --jump-cut")
+    if args.rendition and (args.submit or args.draft or args.distributed):
+        parser.error("--rendition không dùng được cùng --submit, --draft hoặc --distributed")
+    if args.rendition and (args.resume or args.normalize is not None):
+        parser.error("--rendition không dùng được cùng --resume hoặc --normalize")
+    if args.upload and ':' not in args.upload:
+        parser.error("--upload phải có dạng REMOTE:PATH (vd: gdrive:Videos)")
+    if args.upload and (args.submit or args.draft or args.distributed):
+        parser.error("--upload không dùng được cùng --submit, --draft hoặc --distributed")
+    if args.output_format == 'hls' and not args.output.lower().endswith('.m3u8'):
+        parser.error("--format hls cần -o là file playlist .m3u8")
+    if args.output_format != 'mp4' and (args.submit or args.draft or args.distributed):
+        parser.error("--format không dùng được cùng --submit, --draft hoặc --distributed")
+    if (args.resume or args.normalize is not None) and (args.submit or args.draft or args.distributed):
+        parser.error("--resume và --normalize không dùng được cùng --submit, --draft hoặc --distributed")
+    if args.trace_python and not args.trace:
+        parser.error("--trace-python cần --trace")
+
+    # Số liệu hiệu năng của công việc (các tiến trình con chạy với cancel_token được tự động tính)
+    cancel_token = CancelToken()
+    tracer = None
+    if args.trace:
+        from tracing import Tracer
+        tracer = Tracer(profile_python=args.trace_python)
+        tracer.metadata.update({'command': sys.argv, 'mode': args.mode})
+        tracer.start_profile()
+    job_metrics = metrics.JobMetrics(os.path.basename(args.output), tracer=tracer,
+                                     mode=args.mode).attach(cancel_token)
+    status = "failed"
+    journal = None
+
+    def upload(path):
+        """Upload một file đầu ra tới --upload (bỏ qua file đã upload ở lần chạy trước)"""
+        from rclone_uploader import RcloneUploader
+        path = os.path.abspath(path)
+        stage_name = f"upload:{path}"
+        if journal and journal.stage_done(stage_name, path, destination=args.upload):
+            print(f"⏭️  Đã upload ở lần chạy trước: {os.path.basename(path)}")
+            return
+        config_path = args.rclone_config or os.path.expanduser("~/.config/rclone/rclone.conf")
+        with open(config_path, 'r') as f:
+            uploader = RcloneUploader(f.read())
+        remote, _, remote_path = args.upload.partition(':')
+        try:
+            with metrics.stage(cancel_token, "upload"):
+                if not uploader.upload_file(path, remote, remote_path, cancel_token=cancel_token):
+                    raise RuntimeError(f"Upload thất bại: {path}")
+        finally:
+            uploader.cleanup()
+        if journal:
+            journal.record_stage(stage_name, path, destination=args.upload)
+
     try:
-        # Parse các đoạn cần cắt
-        segments = parse_segments(args.segments)
+        if args.jump_cut:
+            # Giữ các đoạn có tiếng, bỏ khoảng lặng
+            from silence import DEFAULT_THRESHOLD_DB, detect_speech_segments
+            threshold = args.silence_threshold if args.silence_threshold is not None else DEFAULT_THRESHOLD_DB
+            with job_metrics.stage("silence"):
+                segments = detect_speech_segments(args.input, threshold, progress_callback=print,
+                                                  cancel_token=cancel_token)
+            args.segments = format_segments(segments)
+            print(f"🗣️  {len(segments)} đoạn có tiếng (ngưỡng {threshold} dBFS)")
+        else:
+            # Parse các đoạn cần cắt
+            segments = parse_segments(args.segments) if args.segments else []
+            if args.segments_file:
+                from segment_sources import load_segments
+                info = probe_media(args.input)
+                for path in args.segments_file:
+                    segments.extend(load_segments(path, fps=info.fps if info else None))
+                args.segments = format_segments(segments)
 
         if not segments:
             print("❌ Không có đoạn nào để cắt!")
             sys.exit(1)
 
+        # Kiểm tra với thời lượng thật của video ngay (trước khi gửi/chạy ffmpeg)
+        segments, warnings = check_segments(segments, probe_media(args.input))
+        for warning in warnings:
+            print(f"⚠️  {warning}")
+
+        if args.snap:
+            # Phân tích chuyển cảnh một lần (cache) rồi kéo các điểm cắt về đó
+            from scenes import snap_to_scenes
+            with job_metrics.stage("scenes"):
+                segments, moved = snap_to_scenes(args.input, segments, args.snap, progress_callback=print,
+                                                 cancel_token=cancel_token)
+            args.segments = format_segments(segments)
+            print(f"🧲 Đã kéo {moved} điểm đầu/cuối về chuyển cảnh gần nhất")
+
+        # Gộp đoạn chồng lấn/nối tiếp, render đoạn trùng lặp một lần
+        render_segments, order = segments, None
+        if args.optimize is not None:
+            from segment_plan import optimize_segments
+            segment_plan = optimize_segments(segments, merge_gap=args.optimize)
+            print(f"🧮 {segment_plan.summary()}")
+            render_segments, order = segment_plan.segments, segment_plan.order
+            segments = segment_plan.expanded()
+            args.segments = format_segments(segments)
+
+        if args.submit:
+            # Gửi tới job service và theo dõi tiến trình
+            from job_service import ServiceClient
+            client = ServiceClient(args.submit)
+            record = client.submit('cut', {
+                'input': os.path.abspath(args.input),
+                'segments': args.segments,
+                'output': os.path.abspath(args.output),
+                'mode': args.mode,
+                'volume': 0 if args.no_audio else 100,
+            })
+            print(f"📨 Đã gửi công việc #{record['id']} tới {args.submit}")
+            record = client.wait(record['id'], progress_callback=print)
+            if record['status'] != 'done':
+                raise RuntimeError(record.get('error') or f"Công việc kết thúc với trạng thái: {record['status']}")
+            print(f"✨ Hoàn thành! Video đã được lưu tại: {record['result']}")
+            return
+
+        if args.draft:
+            # Import tại đây vì proxy dùng lại cut_video_segments của module này
+            from proxy import draft_render
+            draft_render(args.input, segments, volume=0 if args.no_audio else 100,
+                         output_video=args.output, max_workers=args.workers)
+            return
+
+        if args.distributed:
+            from distributed import DEFAULT_HOST, DEFAULT_PORT, render_distributed
+            host, _, port = (args.listen or '').partition(':')
+            render_distributed(
+                args.input,
+                segments,
+                args.output,
+                temp_dir=args.temp_dir,
+                mode=args.mode,
+                volume=0 if args.no_audio else 100,
+                local_workers=args.workers if args.workers is not None else 2,
+                host=host or DEFAULT_HOST,
+                port=int(port) if port else DEFAULT_PORT
+            )
+            return
+
+        volume = 0 if args.no_audio else 100
+
+        # HLS: upload từng segment ngay khi ghi xong, playlist được upload cuối cùng
+        uploaded = set()
+
+        def upload_fragment(path):
+            upload(path)
+            uploaded.add(os.path.abspath(path))
+
+        # Callback chạy trong luồng theo dõi segment: gắn với bước của luồng này
+        # (tức "upload" ở ngoài cùng, không phải con của bước ghép)
+        on_fragment = (metrics.bind(cancel_token, upload_fragment)
+                       if args.upload and args.output_format == 'hls' else None)
+
+        if args.rendition:
+            from renditions import Rendition, cut_renditions
+            cut_renditions(
+                args.input,
+                segments,
+                [Rendition.parse(spec) for spec in args.rendition],
+                args.output,
+                temp_dir=args.temp_dir,
+                mode=args.mode,
+                max_workers=args.workers,
+                volume=volume,
+                fast_scratch=not args.no_tmpfs,
+                cancel_token=cancel_token,
+                on_output=(lambda rendition, path: upload(path)) if args.upload else None,
+                output_format=args.output_format,
+                hls_time=args.hls_time,
+                on_fragment=on_fragment
+            )
+            status = "done"
+            return
+
+        # Nhật ký checkpoint: luôn ghi để lần sau có thể --resume
+        journal = JobJournal.open({
+            'input': os.path.abspath(args.input),
+            'segments': render_segments,
+            'order': order,
+            'output': os.path.abspath(args.output),
+            'mode': args.mode,
+            'volume': volume,
+            'normalize': args.normalize,
+            'format': args.output_format,
+            'hls_time': args.hls_time if args.output_format == 'hls' else None,
+        }, resume=args.resume)
+
         # Thực hiện cắt video
         cut_video_segments(
             args.input,
-            segments,
+            render_segments,
             args.output,
             temp_dir=args.temp_dir,
             mode=args.mode,
             max_workers=args.workers,
-            volume=0 if args.no_audio else 100
+            volume=volume,
+            cancel_token=cancel_token,
+            fast_scratch=not args.no_tmpfs,
+            journal=journal,
+            loudness_target=args.normalize,
+            order=order,
+            output_format=args.output_format,
+            hls_time=args.hls_time,
+            on_fragment=on_fragment
         )
 
+        if args.upload:
+            # Segment chưa upload (vd: đã ghép xong ở lần chạy trước) rồi tới playlist/file đầu ra.
+            # Nhật ký chỉ xóa sau khi upload xong: upload lỗi thì --resume không phải render lại
+            for path in output_files(args.output, args.output_format)[1:]:
+                if os.path.abspath(path) not in uploaded:
+                    upload(path)
+            upload(args.output)
+        journal.finish()
+        status = "done"
+
+    except JobCancelledError:
+        status = "cancelled"
+        sys.exit(1)
+    except KeyboardInterrupt:
+        status = "cancelled"
+        raise
     except Exception as e:
         print(f"\n❌ Lỗi: {e}")
         sys.exit(1)
+    finally:
+        # Chỉ ghi báo cáo khi công việc chạy tại máy này (không ghi cho --submit/--draft...)
+        if job_metrics.stages:
+            job_metrics.finish(status)
+            try:
+                report = job_metrics.write_reports(args.metrics, args.prometheus)
+                print(f"📈 Số liệu: {job_metrics.summary()}")
+                print(f"📈 Báo cáo hiệu năng: {report}")
+            except Exception as e:
+                print(f"⚠️  Không thể ghi báo cáo số liệu: {e}")
+        if tracer:
+            tracer.stop_profile()
+            try:
+                print(f"🧭 Trace: {tracer.write(args.trace)} (mở bằng https://ui.perfetto.dev)")
+            except Exception as e:
+                print(f"⚠️  Không thể ghi file trace: {e}")
 
 
 if __name__ == '__main__':
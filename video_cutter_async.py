@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Video Cutter Async - Engine cắt video dựa trên asyncio
+Chạy ffmpeg bằng asyncio.create_subprocess_exec thay vì subprocess.run trong
+ThreadPoolExecutor, nên không tốn một luồng OS cho mỗi ffmpeg đang chạy. Một
+event loop có thể quản lý hàng trăm công việc (encode, tải xuống, upload) cùng
+lúc. Hỗ trợ đọc tiến trình từ stderr theo luồng, timeout và hủy (task.cancel()).
+
+Ví dụ:
+    import asyncio
+    from video_cutter_async import cut_video_segments_async
+
+    asyncio.run(cut_video_segments_async("in.mp4", [(10, 20), (60, 75)], "out.mp4"))
+"""
+
+import os
+import re
+import sys
+import signal
+import shutil
+import asyncio
+import time
+from typing import Callable, List, Optional, Tuple
+
+from cancellation import CancelToken, process_group_kwargs
+from frame_index import ExactCut, build_frame_index, verify_frame_count
+from media_info import prepare_segments
+from scratch import create_scratch_dir, ensure_free_space, estimate_intermediate_size
+from video_cutter import (
+    build_segment_command, build_concat_command, check_ffmpeg, write_concat_list, format_duration
+)
+
+
+# Thời gian chờ ffmpeg tự thoát sau SIGTERM trước khi SIGKILL
+TERMINATE_GRACE_SECONDS = 3.0
+
+# ffmpeg in tiến trình dạng "time=00:01:02.50" trên stderr
+FFMPEG_TIME_RE = re.compile(r"time=\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+
+class ProcessResult:
+    """Kết quả chạy một tiến trình con"""
+
+    def __init__(self, cmd: List[str], returncode: int, stderr_tail: str):
+        self.cmd = cmd
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+
+
+async def _terminate_async(process):
+    """Kết thúc tiến trình con và process group của nó (SIGTERM → SIGKILL)"""
+    if process.returncode is not None:
+        return
+
+    try:
+        if sys.platform == "win32":
+            process.terminate()
+        else:
+            os.killpg(process.pid, signal.SIGTERM)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+    try:
+        await asyncio.wait_for(process.wait(), TERMINATE_GRACE_SECONDS)
+        return
+    except asyncio.TimeoutError:
+        pass
+
+    try:
+        if sys.platform == "win32":
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+    await process.wait()
+
+
+async def run_process_async(cmd: List[str], timeout: Optional[float] = None,
+                            line_callback: Optional[Callable[[str], None]] = None,
+                            tail_lines: int = 50, merge_stdout: bool = False) -> ProcessResult:
+    """
+    Chạy lệnh bằng asyncio, đọc stderr theo luồng
+
+    Args:
+        cmd: Danh sách tham số lệnh
+        timeout: Thời gian tối đa (giây), None = không giới hạn
+        line_callback: Hàm gọi với mỗi dòng stderr (ffmpeg dùng cả '\\r' để xuống dòng)
+        tail_lines: Số dòng stderr cuối cùng giữ lại để báo lỗi
+        merge_stdout: Đọc cả stdout cùng stderr (vd: rclone --progress in ra stdout)
+
+    Returns:
+        ProcessResult
+
+    Raises:
+        asyncio.TimeoutError: Nếu quá timeout (tiến trình đã bị kết thúc)
+        asyncio.CancelledError: Nếu task bị hủy (tiến trình đã bị kết thúc)
+    """
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE if merge_stdout else asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.STDOUT if merge_stdout else asyncio.subprocess.PIPE,
+        **process_group_kwargs()
+    )
+
+    tail = []
+
+    # Khi gộp, stderr được chuyển vào pipe của stdout
+    stream = process.stdout if merge_stdout else process.stderr
+
+    async def read_stderr():
+        buffer = b""
+        while True:
+            chunk = await stream.read(4096)
+            if not chunk:
+                break
+            buffer += chunk
+            parts = re.split(rb"[\r\n]", buffer)
+            buffer = parts.pop()
+            for part in parts:
+                if not part:
+                    continue
+                line = part.decode('utf-8', errors='replace')
+                tail.append(line)
+                if len(tail) > tail_lines:
+                    del tail[0]
+                if line_callback:
+                    line_callback(line)
+        if buffer:
+            tail.append(buffer.decode('utf-8', errors='replace'))
+        await process.wait()
+
+    try:
+        await asyncio.wait_for(read_stderr(), timeout)
+    except BaseException:
+        # Timeout, task bị hủy hoặc Ctrl+C: không để ffmpeg chạy mồ côi
+        await asyncio.shield(_terminate_async(process))
+        raise
+
+    return ProcessResult(cmd, process.returncode, "\n".join(tail[-tail_lines:]))
+
+
+def _parse_ffmpeg_time(line: str) -> Optional[float]:
+    """Lấy số giây đã xử lý từ dòng tiến trình của ffmpeg"""
+    match = FFMPEG_TIME_RE.search(line)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+async def cut_single_segment_async(input_video: str, start_time: float, end_time: float,
+                                   output_file: str, mode: str = "balanced", volume: int = 100,
+                                   preset: str = "medium", crf: int = 23,
+                                   timeout: Optional[float] = None,
+                                   progress: Optional[Callable[[float], None]] = None,
+                                   plan: Optional[dict] = None,
+                                   exact: Optional[ExactCut] = None) -> ProcessResult:
+    """
+    Cắt một đoạn video (async)
+
+    Args:
+        input_video, start_time, end_time, output_file, mode, volume, preset, crf, plan, exact:
+            Như video_cutter.cut_single_segment
+        timeout: Thời gian tối đa cho đoạn này (giây)
+        progress: Hàm progress(seconds_done) gọi khi ffmpeg báo tiến trình
+
+    Returns:
+        ProcessResult (returncode != 0 nếu lỗi)
+    """
+    cmd = build_segment_command(input_video, start_time, end_time, output_file,
+                                mode, volume, preset, crf, plan, exact=exact)
+
+    def on_line(line):
+        seconds = _parse_ffmpeg_time(line)
+        if seconds is not None and progress:
+            progress(seconds)
+
+    return await run_process_async(cmd, timeout=timeout, line_callback=on_line)
+
+
+async def cut_video_segments_async(input_video: str, segments: List[Tuple[float, float]],
+                                   output_video: str, temp_dir: Optional[str] = None,
+                                   mode: str = "balanced", max_workers: Optional[int] = None,
+                                   volume: int = 100, progress_callback=None,
+                                   preset: str = "medium", crf: int = 23,
+                                   segment_timeout: Optional[float] = None,
+                                   percent_callback: Optional[Callable[[float], None]] = None,
+                                   fast_scratch: bool = True):
+    """
+    Cắt và ghép các đoạn video (async) - tương đương video_cutter.cut_video_segments
+
+    Hủy bằng cách cancel task đang chạy hàm này: mọi ffmpeg đang chạy bị kết
+    thúc, file tạm và file đầu ra dở dang bị xóa.
+
+    Args:
+        input_video, segments, output_video, temp_dir, mode, volume, preset, crf, fast_scratch:
+            Như video_cutter.cut_video_segments
+        max_workers: Số ffmpeg chạy đồng thời (None = auto; 'fast' chạy tuần tự). 'accurate'
+            cắt chính xác từng frame theo chỉ mục frame như bản sync, song song như 'balanced'
+        progress_callback: Hàm callback nhận message string
+        segment_timeout: Thời gian tối đa cho mỗi đoạn (giây)
+        percent_callback: Hàm callback nhận phần trăm hoàn thành (0-100) khi cắt
+    """
+    def log(message):
+        print(message)
+        if progress_callback:
+            progress_callback(message)
+
+    if not check_ffmpeg():
+        raise RuntimeError("ffmpeg chưa được cài đặt. Vui lòng cài đặt ffmpeg trước.")
+    if not os.path.exists(input_video):
+        raise FileNotFoundError(f"Không tìm thấy file video: {input_video}")
+
+    # ffprobe chạy trong executor (kết quả được cache cho các lần sau)
+    loop = asyncio.get_running_loop()
+    info, segments, segment_warnings, plan = await loop.run_in_executor(
+        None, prepare_segments, input_video, segments, mode, volume)
+
+    # Accurate: seek keyframe + trim theo pts từ chỉ mục frame (như cut_video_segments)
+    exact_cuts = {}
+    if mode == "accurate" and plan and plan['video'] == 'encode':
+        index_token = CancelToken()
+        try:
+            index = await loop.run_in_executor(None, build_frame_index, input_video, info, index_token, log)
+        except asyncio.CancelledError:
+            index_token.cancel()
+            raise
+        if index is None:
+            segment_warnings.append("Không đọc được chỉ mục frame: cắt theo thời gian (có thể lệch 1 frame)")
+        else:
+            exact_cuts = index.exact_cuts(segments, info.sample_rate)
+            if plan['audio'] == 'copy':
+                plan = dict(plan, audio='encode')
+
+    if mode in ("balanced", "accurate"):
+        concurrency = max(1, max_workers or min(4, len(segments)))
+    else:
+        concurrency = 1
+
+    # Thư mục tạm riêng cho công việc này (kiểm tra dung lượng trống trước)
+    estimate = estimate_intermediate_size(input_video, segments, info)
+    ensure_free_space(os.path.dirname(os.path.abspath(output_video)), estimate)
+    temp_dir = create_scratch_dir(estimate, root=temp_dir, prefer_fast=fast_scratch)
+
+    log(f"\n🎬 Bắt đầu cắt video từ: {input_video}")
+    log(f"📊 Tổng số đoạn cần cắt: {len(segments)} ({concurrency} ffmpeg đồng thời)")
+    for warning in segment_warnings:
+        log(f"⚠️  {warning}")
+
+    total_duration = sum(end - start for start, end in segments)
+    done_seconds = [0.0] * len(segments)
+    last_percent = [-1.0]
+    start_overall = time.time()
+    semaphore = asyncio.Semaphore(concurrency)
+    segment_files = [os.path.join(temp_dir, f"segment_{idx:03d}.mp4") for idx in range(1, len(segments) + 1)]
+
+    def report_progress(index, seconds):
+        done_seconds[index] = min(seconds, segments[index][1] - segments[index][0])
+        percent = 100.0 * sum(done_seconds) / total_duration if total_duration else 100.0
+        # Chỉ báo khi tăng ít nhất 1% để không làm ngập callback
+        if percent_callback and percent - last_percent[0] >= 1.0:
+            last_percent[0] = percent
+            percent_callback(percent)
+
+    async def cut_one(index):
+        start, end = segments[index]
+        exact = exact_cuts.get(segments[index])
+        async with semaphore:
+            result = await cut_single_segment_async(
+                input_video, start, end, segment_files[index], mode, volume, preset, crf,
+                timeout=segment_timeout,
+                progress=lambda seconds: report_progress(index, seconds),
+                plan=plan,
+                exact=exact
+            )
+            if result.returncode == 0 and exact is not None:
+                await loop.run_in_executor(None, verify_frame_count, segment_files[index], exact.frames)
+        if result.returncode != 0:
+            raise RuntimeError(f"Lỗi khi cắt đoạn {index + 1}: {result.stderr_tail[-500:]}")
+        report_progress(index, end - start)
+        log(f"✅ Đoạn {index + 1}: {format_duration(start)} → {format_duration(end)}")
+
+    tasks = [asyncio.ensure_future(cut_one(index)) for index in range(len(segments))]
+
+    try:
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # Một đoạn lỗi hoặc bị hủy: dừng các đoạn còn lại
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        cutting_time = time.time() - start_overall
+        log(f"\n✅ Đã cắt xong {len(segments)} đoạn ({cutting_time:.1f}s)")
+        log("🔗 Đang ghép các đoạn lại với nhau...")
+
+        concat_file = os.path.join(temp_dir, "concat_list.txt")
+        write_concat_list(segment_files, concat_file)
+        result = await run_process_async(build_concat_command(concat_file, output_video))
+        if result.returncode != 0:
+            raise RuntimeError(f"Lỗi khi ghép video: {result.stderr_tail}")
+
+        total_time = time.time() - start_overall
+        log(f"✨ Hoàn thành! Video đã được lưu tại: {output_video}")
+        log(f"   - Tổng thời gian: {total_time:.1f}s")
+        if total_time > 0:
+            log(f"   - Tốc độ xử lý: {total_duration/total_time:.1f}x realtime\n")
+
+    except (asyncio.CancelledError, KeyboardInterrupt):
+        if os.path.exists(output_video):
+            try:
+                os.remove(output_video)
+            except OSError:
+                pass
+        log("❌ Đã hủy xử lý")
+        raise
+
+    finally:
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+async def upload_file_async(uploader, file_path: str, remote_name: str, remote_path: str = '',
+                            progress_callback=None, timeout: Optional[float] = None) -> bool:
+    """
+    Upload file bằng rclone trên event loop (không tốn luồng OS)
+
+    Args:
+        uploader: RcloneUploader đã được khởi tạo với config
+        file_path: File cần upload
+        remote_name: Tên remote
+        remote_path: Thư mục trên remote
+        progress_callback: Hàm callback nhận từng dòng tiến trình của rclone
+        timeout: Thời gian tối đa (giây)
+
+    Returns:
+        True nếu thành công
+    """
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(f"Không tìm thấy file: {file_path}")
+
+    cmd = uploader.build_copy_command(file_path, f"{remote_name}:{remote_path}")
+    result = await run_process_async(cmd, timeout=timeout, line_callback=progress_callback,
+                                     merge_stdout=True)
+    return result.returncode == 0
+
+
+async def download_video_async(downloader, url: str, output_filename: Optional[str] = None,
+                               progress_callback=None, cancel_token=None):
+    """
+    Tải video YouTube từ event loop
+
+    yt-dlp là thư viện chạy trong tiến trình (không có API async), nên được chạy
+    trong executor mặc định; hủy task sẽ kích hoạt cancel_token để dừng tải.
+
+    Returns:
+        (success, file_path) như YouTubeDownloader.download_video
+    """
+    cancel_token = cancel_token or CancelToken()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(None, lambda: downloader.download_video(
+        url, output_filename, progress_callback=progress_callback, cancel_token=cancel_token
+    ))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancel_token.cancel()
+        raise
+
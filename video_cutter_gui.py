@@ -6,6 +6,7 @@ GUI Application for Video Cutting Tool
 
 import os
 import sys
+import argparse
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import threading
@@ -14,16 +15,23 @@ from pathlib import Path
 # Import functions từ video_cutter
 from video_cutter import (
     parse_segments, parse_time_to_seconds, format_duration,
-    check_ffmpeg, cut_video_segments
+    check_ffmpeg, cut_video_segments, add_audio_to_video
+)
+from cancellation import CancelToken, JobCancelledError
+from media_info import check_segments, probe_media
+from journal import JobJournal
+from metrics import JobMetrics
+from tracing import Tracer
+from thumbnails import ThumbnailStrip
+from proxy import build_proxy, draft_render
+from job_queue import (
+    Job, JobQueue, JobStage, RESOURCE_ENCODE, RESOURCE_NETWORK,
+    STATUS_QUEUED, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED
 )
 import subprocess
 
-# Import YouTube downloader (optional)
-try:
-    from youtube_downloader import YouTubeDownloader
-    YOUTUBE_AVAILABLE = True
-except ImportError:
-    YOUTUBE_AVAILABLE = False
+# Import YouTube downloader (optional) - yt-dlp chỉ được import khi tải lần đầu
+from youtube_downloader import YouTubeDownloader, YT_DLP_AVAILABLE as YOUTUBE_AVAILABLE
 
 # Import Rclone uploader (optional)
 try:
@@ -34,7 +42,12 @@ except ImportError:
 
 
 class VideoCutterGUI:
-    def __init__(self, root):
+    # Kích thước timeline thumbnail
+    THUMB_WIDTH = 112
+    THUMB_SLOT = 116
+    TIMELINE_HEIGHT = 72
+
+    def __init__(self, root, trace_path=None, trace_python=False):
         self.root = root
         self.root.title("🎬 Video Cutter Tool - Công cụ Cắt Video")
 
@@ -42,9 +55,9 @@ class VideoCutterGUI:
         screen_width = self.root.winfo_screenwidth()
         screen_height = self.root.winfo_screenheight()
 
-        # Set window size to 80% of screen, max 1000x700 (optimized)
+        # Set window size to 80% of screen, max 1000x790 (optimized)
         window_width = min(1000, int(screen_width * 0.8))
-        window_height = min(700, int(screen_height * 0.8))
+        window_height = min(790, int(screen_height * 0.8))
 
         # Center window
         x = (screen_width - window_width) // 2
@@ -54,7 +67,7 @@ class VideoCutterGUI:
         self.root.resizable(True, True)
 
         # Set minimum size
-        self.root.minsize(900, 650)
+        self.root.minsize(900, 720)
 
         # Variables
         self.input_video_path = tk.StringVar()
@@ -64,11 +77,31 @@ class VideoCutterGUI:
         self.volume = tk.IntVar(value=100)  # Default: 100% (original volume)
         self.audio_file_path = tk.StringVar()  # Audio file to add
         self.audio_volume = tk.IntVar(value=100)  # Audio volume (0-200%)
-        self.is_processing = False
+
+        # Timeline Chrome trace của mọi công việc trong phiên (--trace)
+        self.trace_path = trace_path
+        self.tracer = Tracer(profile_python=trace_python) if trace_path else None
+        if self.tracer:
+            # Trước khi tạo luồng của job queue để cProfile theo dõi cả các luồng đó
+            self.tracer.start_profile()
+
+        # Job queue: nhiều công việc chạy nền với worker và CPU budget dùng chung
+        self.job_queue = JobQueue(listener=self.on_job_changed, tracer=self.tracer)
+        self._jobs_refresh_pending = False
+        self._reported_jobs = set()
+        self.queue_window = None
+        self.queue_tree = None
+
+        # Timeline thumbnail (keyframe) để chọn đoạn cắt
+        self.timeline_items = []  # List (time, path, image_item_id)
+        self.timeline_images = {}  # idx -> PhotoImage đang hiển thị (lazy load)
+        self.timeline_cancel_token = None
+        self.timeline_mark_start = None
 
         # YouTube downloader variables
         self.youtube_url = tk.StringVar()
         self.is_downloading = False
+        self.download_cancel_token = None
         self.youtube_downloader = YouTubeDownloader(output_path="downloads") if YOUTUBE_AVAILABLE else None
 
         # Rclone variables
@@ -83,6 +116,9 @@ class VideoCutterGUI:
         # Check ffmpeg on startup
         self.root.after(500, self.check_ffmpeg_installed)
 
+        # Hủy các công việc khi đóng cửa sổ
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
     def setup_ui(self):
         """Tạo giao diện người dùng"""
 
@@ -175,10 +211,38 @@ class VideoCutterGUI:
         example_btn.pack(side=tk.LEFT, padx=(0, 5))
 
         validate_btn = ttk.Button(btn_frame, text="✓ Kiểm tra", command=self.validate_segments)
-        validate_btn.pack(side=tk.LEFT)
+        validate_btn.pack(side=tk.LEFT, padx=(0, 5))
+
+        draft_btn = ttk.Button(btn_frame, text="👁️ Xem nháp", command=self.start_draft_render)
+        draft_btn.pack(side=tk.LEFT)
+
+        self.timeline_status = tk.StringVar(value="🎞️ Chọn video để xem timeline")
+        ttk.Label(btn_frame, textvariable=self.timeline_status, font=("Arial", 8), foreground="gray").pack(
+            side=tk.LEFT, padx=(10, 0)
+        )
+
+        # ===== TIMELINE (thumbnail keyframe) =====
+        timeline_frame = ttk.Frame(main_frame)
+        timeline_frame.grid(row=row+2, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
+        timeline_frame.columnconfigure(0, weight=1)
+
+        self.timeline_canvas = tk.Canvas(
+            timeline_frame,
+            height=self.TIMELINE_HEIGHT,
+            background="#202020",
+            highlightthickness=0,
+            cursor="hand2"
+        )
+        self.timeline_canvas.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        self.timeline_scroll = ttk.Scrollbar(timeline_frame, orient=tk.HORIZONTAL,
+                                             command=self.timeline_canvas.xview)
+        self.timeline_scroll.grid(row=1, column=0, sticky=(tk.W, tk.E))
+        self.timeline_canvas.configure(xscrollcommand=self.on_timeline_scroll)
+        self.timeline_canvas.bind("<Button-1>", self.on_timeline_click)
+        self.timeline_canvas.bind("<Configure>", lambda e: self.refresh_timeline_images())
 
         # ===== OUTPUT VIDEO =====
-        row += 2
+        row += 3
         ttk.Label(main_frame, text="💾 Video đầu ra:", font=("Arial", 9, "bold")).grid(
             row=row, column=0, sticky=tk.W, pady=(5, 2)
         )
@@ -262,7 +326,7 @@ class VideoCutterGUI:
 
         ttk.Radiobutton(
             mode_frame,
-            text="🎯 Accurate (chính xác 100%)",
+            text="🎯 Accurate (chính xác từng frame)",
             variable=self.processing_mode,
             value="accurate"
         ).pack(anchor=tk.W, pady=1)
@@ -389,6 +453,13 @@ class VideoCutterGUI:
         )
         self.cancel_btn.pack(side=tk.LEFT, padx=3)
 
+        queue_btn = ttk.Button(
+            button_frame,
+            text="📋 Hàng đợi",
+            command=self.show_job_queue
+        )
+        queue_btn.pack(side=tk.LEFT, padx=3)
+
         clear_btn = ttk.Button(
             button_frame,
             text="🗑️ Xóa",
@@ -406,16 +477,23 @@ class VideoCutterGUI:
                              "💡 Nhấn 'Kiểm tra' để xem trước | Dùng 'Ví dụ' nếu chưa rõ định dạng")
 
     def check_ffmpeg_installed(self):
-        """Kiểm tra xem ffmpeg đã được cài đặt chưa"""
-        if not check_ffmpeg():
-            messagebox.showwarning(
-                "Thiếu ffmpeg",
-                "⚠️ Không tìm thấy ffmpeg!\n\n"
-                "Vui lòng cài đặt ffmpeg trước khi sử dụng:\n\n"
-                "• Windows: Tải từ https://ffmpeg.org/download.html\n"
-                "• Ubuntu: sudo apt-get install ffmpeg\n"
-                "• macOS: brew install ffmpeg"
-            )
+        """Kiểm tra xem ffmpeg đã được cài đặt chưa (chạy nền, lần đầu phải gọi ffmpeg)"""
+        def worker():
+            if not check_ffmpeg():
+                self.root.after(0, self.show_ffmpeg_missing)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def show_ffmpeg_missing(self):
+        """Cảnh báo thiếu ffmpeg"""
+        messagebox.showwarning(
+            "Thiếu ffmpeg",
+            "⚠️ Không tìm thấy ffmpeg!\n\n"
+            "Vui lòng cài đặt ffmpeg trước khi sử dụng:\n\n"
+            "• Windows: Tải từ https://ffmpeg.org/download.html\n"
+            "• Ubuntu: sudo apt-get install ffmpeg\n"
+            "• macOS: brew install ffmpeg"
+        )
 
     def browse_input_video(self):
         """Chọn video đầu vào"""
@@ -435,6 +513,9 @@ class VideoCutterGUI:
                 output_path = input_path.parent / output_name
                 self.output_video_path.set(str(output_path))
 
+            self.load_timeline(filename)
+            self.start_proxy_build(filename)
+
     def browse_output_video(self):
         """Chọn nơi lưu video đầu ra"""
         filename = filedialog.asksaveasfilename(
@@ -465,9 +546,18 @@ class VideoCutterGUI:
         try:
             segments = parse_segments(segments_str)
 
+            # Kiểm tra với thời lượng thật nếu đã chọn video
+            input_path = self.input_video_path.get()
+            media = probe_media(input_path) if input_path else None
+            segments, warnings = check_segments(segments, media)
+
             # Build info message
             info = "✅ Định dạng hợp lệ!\n\n"
+            if media:
+                info += f"🎞️ Video: {media.summary()}\n"
             info += f"📊 Tổng số đoạn: {len(segments)}\n"
+            for warning in warnings:
+                info += f"⚠️ {warning}\n"
             info += "━" * 50 + "\n\n"
 
             total_duration = 0
@@ -500,8 +590,140 @@ class VideoCutterGUI:
             self.output_video_path.set("")
             self.segments_entry.delete("1.0", tk.END)
             self.audio_file_path.set("")
+            self.clear_timeline()
             self.update_info_text("Đã xóa tất cả. Sẵn sàng bắt đầu mới!")
 
+    # ===== TIMELINE METHODS =====
+
+    def clear_timeline(self):
+        """Xóa timeline và dừng việc tạo thumbnail đang chạy"""
+        if self.timeline_cancel_token:
+            self.timeline_cancel_token.cancel()
+            self.timeline_cancel_token = None
+        self.timeline_canvas.delete("all")
+        self.timeline_items = []
+        self.timeline_images = {}
+        self.timeline_mark_start = None
+        self.timeline_canvas.configure(scrollregion=(0, 0, 0, 0))
+        self.timeline_status.set("🎞️ Chọn video để xem timeline")
+
+    def load_timeline(self, video_path):
+        """Tạo (hoặc đọc từ cache) dải thumbnail cho video ở luồng nền"""
+        self.clear_timeline()
+        self.timeline_status.set("⏳ Đang tạo timeline...")
+        token = CancelToken()
+        self.timeline_cancel_token = token
+
+        def on_thumbnail(idx, time_sec, path):
+            self.root.after(0, lambda: self.add_timeline_thumbnail(token, time_sec, path))
+
+        def worker():
+            try:
+                strip = ThumbnailStrip(video_path, width=self.THUMB_WIDTH)
+                thumbnails = strip.generate(callback=on_thumbnail, cancel_token=token)
+                message = f"🎞️ {len(thumbnails)} thumbnail - nhấn để chọn điểm bắt đầu/kết thúc"
+            except JobCancelledError:
+                return
+            except Exception as e:
+                message = f"⚠️ Không tạo được timeline: {e}"
+            self.root.after(0, lambda: self.set_timeline_status(token, message))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def set_timeline_status(self, token, message):
+        """Cập nhật trạng thái timeline (bỏ qua nếu là của video cũ)"""
+        if token is self.timeline_cancel_token:
+            self.timeline_status.set(message)
+
+    def add_timeline_thumbnail(self, token, time_sec, path):
+        """Thêm chỗ cho một thumbnail mới (ảnh chỉ được nạp khi hiển thị)"""
+        if token is not self.timeline_cancel_token:
+            return  # Thumbnail của video cũ
+
+        idx = len(self.timeline_items)
+        x = idx * self.THUMB_SLOT
+        self.timeline_canvas.create_rectangle(x + 2, 2, x + self.THUMB_SLOT - 2, self.TIMELINE_HEIGHT - 14,
+                                              outline="#444444")
+        image_id = self.timeline_canvas.create_image(x + 2, 2, anchor=tk.NW)
+        self.timeline_canvas.create_text(x + 4, self.TIMELINE_HEIGHT - 2, anchor=tk.SW,
+                                         text=format_duration(time_sec), fill="#cccccc",
+                                         font=("Arial", 7))
+        self.timeline_items.append((time_sec, path, image_id))
+        self.timeline_canvas.configure(scrollregion=(0, 0, (idx + 1) * self.THUMB_SLOT, self.TIMELINE_HEIGHT))
+        self.refresh_timeline_images()
+
+    def on_timeline_scroll(self, first, last):
+        """Cập nhật thanh cuộn và nạp các thumbnail vừa hiện ra"""
+        self.timeline_scroll.set(first, last)
+        self.refresh_timeline_images()
+
+    def refresh_timeline_images(self):
+        """Lazy load: chỉ giữ ảnh của các thumbnail đang hiển thị (và vài ảnh lân cận)"""
+        if not self.timeline_items:
+            return
+
+        left = self.timeline_canvas.canvasx(0)
+        right = left + self.timeline_canvas.winfo_width()
+        first = max(0, int(left // self.THUMB_SLOT) - 3)
+        last = min(len(self.timeline_items) - 1, int(right // self.THUMB_SLOT) + 3)
+
+        # Giải phóng ảnh ở xa
+        for idx in list(self.timeline_images):
+            if idx < first or idx > last:
+                self.timeline_canvas.itemconfig(self.timeline_items[idx][2], image="")
+                del self.timeline_images[idx]
+
+        for idx in range(first, last + 1):
+            if idx in self.timeline_images:
+                continue
+            _, path, image_id = self.timeline_items[idx]
+            try:
+                photo = tk.PhotoImage(file=path)
+            except tk.TclError:
+                continue
+            self.timeline_images[idx] = photo
+            self.timeline_canvas.itemconfig(image_id, image=photo)
+
+    def timeline_time_at(self, x):
+        """Đổi tọa độ x trên timeline sang thời gian (nội suy giữa 2 thumbnail)"""
+        idx = min(len(self.timeline_items) - 1, max(0, int(x // self.THUMB_SLOT)))
+        time_sec = self.timeline_items[idx][0]
+        if idx + 1 < len(self.timeline_items):
+            next_time = self.timeline_items[idx + 1][0]
+            fraction = (x - idx * self.THUMB_SLOT) / self.THUMB_SLOT
+            time_sec += max(0.0, min(1.0, fraction)) * (next_time - time_sec)
+        return round(time_sec, 1)
+
+    def on_timeline_click(self, event):
+        """Nhấn lần 1 chọn điểm bắt đầu, lần 2 chọn điểm kết thúc và thêm đoạn vào ô đoạn cắt"""
+        if not self.timeline_items:
+            return
+
+        x = self.timeline_canvas.canvasx(event.x)
+        time_sec = self.timeline_time_at(x)
+
+        if self.timeline_mark_start is None:
+            self.timeline_mark_start = time_sec
+            self.timeline_canvas.delete("marker")
+            self.timeline_canvas.create_line(x, 0, x, self.TIMELINE_HEIGHT, fill="#ff4040", width=2, tags="marker")
+            self.timeline_status.set(f"▶️ Bắt đầu: {format_duration(time_sec)} - nhấn tiếp để chọn điểm kết thúc")
+            return
+
+        start, end = sorted((self.timeline_mark_start, time_sec))
+        self.timeline_mark_start = None
+        self.timeline_canvas.delete("marker")
+        if end <= start:
+            self.timeline_status.set("⚠️ Điểm kết thúc phải khác điểm bắt đầu")
+            return
+
+        segment = f"{format_duration(start)}-{format_duration(end)}"
+        current = self.segments_entry.get("1.0", tk.END).strip()
+        if current and not current.endswith('|'):
+            current += '|'
+        self.segments_entry.delete("1.0", tk.END)
+        self.segments_entry.insert("1.0", current + segment)
+        self.timeline_status.set(f"✅ Đã thêm đoạn {format_duration(start)} → {format_duration(end)}")
+
     # ===== VOLUME CONTROL METHODS =====
 
     def update_volume_label(self, value):
@@ -538,72 +760,9 @@ class VideoCutterGUI:
         self.audio_volume.set(value)
         self.audio_volume_label.config(text=f"{value}%")
 
-    def add_audio_to_video(self, video_path, audio_path, audio_volume, output_path):
-        """Thêm audio vào video với điều chỉnh âm lượng"""
-        try:
-            # Calculate audio volume filter
-            # volume=1.0 = 100%, volume=0.5 = 50%, volume=2.0 = 200%
-            volume_filter = audio_volume / 100.0
-
-            # Build ffmpeg command
-            # -i video_path: input video
-            # -i audio_path: input audio
-            # -filter_complex: mix audio from video (if any) with new audio
-            # -c:v copy: copy video codec (no re-encoding)
-            # -shortest: match shortest stream duration
-            cmd = [
-                'ffmpeg',
-                '-i', video_path,
-                '-i', audio_path,
-                '-filter_complex',
-                f'[1:a]volume={volume_filter}[a1];[0:a][a1]amix=inputs=2:duration=first[aout]',
-                '-map', '0:v',
-                '-map', '[aout]',
-                '-c:v', 'copy',
-                '-c:a', 'aac',
-                '-b:a', '192k',
-                '-shortest',
-                '-y',  # Overwrite output
-                output_path
-            ]
-
-            # Run command
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-
-            if result.returncode != 0:
-                # If video has no audio, use simpler command
-                cmd_no_video_audio = [
-                    'ffmpeg',
-                    '-i', video_path,
-                    '-i', audio_path,
-                    '-filter:a', f'volume={volume_filter}',
-                    '-map', '0:v',
-                    '-map', '1:a',
-                    '-c:v', 'copy',
-                    '-c:a', 'aac',
-                    '-b:a', '192k',
-                    '-shortest',
-                    '-y',
-                    output_path
-                ]
-
-                result = subprocess.run(
-                    cmd_no_video_audio,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-
-                if result.returncode != 0:
-                    raise Exception(f"ffmpeg error: {result.stderr}")
-
-        except Exception as e:
-            raise Exception(f"Không thể thêm audio: {str(e)}")
+    def add_audio_to_video(self, video_path, audio_path, audio_volume, output_path, cancel_token=None):
+        """Thêm audio vào video với điều chỉnh âm lượng (có thể hủy qua cancel_token)"""
+        add_audio_to_video(video_path, audio_path, audio_volume, output_path, cancel_token)
 
     # ===== RCLONE METHODS =====
 
@@ -765,6 +924,18 @@ team_drive = """
             messagebox.showerror("Lỗi định dạng", f"Định dạng đoạn cắt không hợp lệ:\n\n{str(e)}")
             return
 
+        # Kiểm tra với thời lượng thật của video trước khi xếp hàng
+        try:
+            segments, warnings = check_segments(segments, probe_media(input_path))
+        except ValueError as e:
+            messagebox.showerror("Đoạn cắt ngoài video", f"❌ Có đoạn nằm ngoài video:\n\n{str(e)}")
+            return
+        if warnings and not messagebox.askyesno(
+            "Đoạn vượt quá cuối video",
+            "⚠️ " + "\n⚠️ ".join(warnings) + "\n\nTiếp tục với các đoạn đã cắt gọn?"
+        ):
+            return
+
         # Get processing mode and volume
         mode = self.processing_mode.get()
         volume = self.volume.get()
@@ -776,10 +947,18 @@ team_drive = """
             messagebox.showerror("Lỗi", f"Không tìm thấy file audio:\n{audio_file}")
             return
 
-        # Start processing in background thread
-        self.is_processing = True
-        self.process_btn.config(state="disabled")
-        self.process_upload_btn.config(state="disabled")
+        # Add job to the background queue
+        job = self.create_job(input_path, segments, output_path, mode, volume,
+                              audio_file, audio_volume, upload_to_drive)
+
+        # Công việc giống hệt từng bị lỗi/dừng giữa chừng: hỏi có tiếp tục không
+        if JobJournal.find(self.job_journal_params(job.context)):
+            job.context['resume'] = messagebox.askyesno(
+                "Tiếp tục công việc",
+                "Công việc này đã chạy dở ở lần trước.\n\n"
+                "Tiếp tục từ bước đã xong cuối cùng?\n(Chọn 'No' để làm lại từ đầu)"
+            )
+        self.job_queue.submit(job)
         self.cancel_btn.config(state="normal")
         self.progress_bar.start(10)
 
@@ -791,96 +970,236 @@ team_drive = """
         volume_status = f"🔊 {volume}%"
         audio_status = f" + 🎵 {audio_volume}%" if audio_file else ""
         upload_status = " → 📤 Upload" if upload_to_drive else ""
-        self.progress_label.config(text=f"⏳ Đang xử lý ({mode_names.get(mode, mode)} - {volume_status}{audio_status}{upload_status})...")
+        self.progress_label.config(text=f"📋 Đã thêm công việc #{job.id} vào hàng đợi "
+                                        f"({mode_names.get(mode, mode)} - {volume_status}{audio_status}{upload_status})")
+
+    def create_job(self, input_path, segments, output_path, mode, volume, audio_file, audio_volume, upload_to_drive):
+        """Tạo công việc gồm các bước: cắt → thêm audio (tùy chọn) → upload (tùy chọn)"""
+        context = {
+            'kind': 'cut',
+            'input_path': input_path,
+            'segments': segments,
+            'output_path': output_path,
+            'mode': mode,
+            'volume': volume,
+            'audio_file': audio_file,
+            'audio_volume': audio_volume,
+            'upload_to_drive': upload_to_drive,
+            'remote_path': self.remote_path.get(),
+        }
 
-        # Run in thread
-        thread = threading.Thread(
-            target=self.process_video,
-            args=(input_path, segments, output_path, mode, volume, audio_file, audio_volume, upload_to_drive),
-            daemon=True
-        )
-        thread.start()
+        stages = [JobStage("✂️ Cắt video", RESOURCE_ENCODE, self.stage_cut)]
+        if audio_file:
+            stages.append(JobStage("🎵 Thêm audio", RESOURCE_ENCODE, self.stage_mix))
+        if upload_to_drive:
+            stages.append(JobStage("📤 Upload", RESOURCE_NETWORK, self.stage_upload))
+
+        return Job(Path(output_path).name, stages, context=context)
+
+    def job_journal_params(self, ctx):
+        """Tham số xác định công việc cắt trong nhật ký checkpoint"""
+        return {
+            'input': os.path.abspath(ctx['input_path']),
+            'segments': ctx['segments'],
+            'output': os.path.abspath(ctx['output_path']),
+            'mode': ctx['mode'],
+            'volume': ctx['volume'],
+            'audio': ctx['audio_file'],
+            'audio_volume': ctx['audio_volume'],
+            'upload': ctx['upload_to_drive'],
+            'remote_path': ctx['remote_path'],
+        }
 
-    def process_video(self, input_path, segments, output_path, mode, volume, audio_file, audio_volume, upload_to_drive):
-        """Xử lý video (chạy trong thread riêng)"""
-        try:
-            # Progress callback để cập nhật UI
-            def progress_callback(message):
-                if self.is_processing:  # Chỉ update nếu chưa bị hủy
-                    self.update_progress(message)
-
-            # Nếu có audio file, tạo output tạm thời
-            temp_output = None
-            if audio_file:
-                from pathlib import Path
-                output_path_obj = Path(output_path)
-                temp_output = str(output_path_obj.parent / f"{output_path_obj.stem}_temp{output_path_obj.suffix}")
-                final_output = output_path
-                current_output = temp_output
-            else:
-                current_output = output_path
-
-            # Sử dụng hàm cut_video_segments đã được tối ưu
-            cut_video_segments(
-                input_video=input_path,
-                segments=segments,
-                output_video=current_output,
-                temp_dir="temp_segments_gui",
-                mode=mode,
-                max_workers=None,  # Auto-detect
-                volume=volume,
-                progress_callback=progress_callback
-            )
+    def stage_cut(self, job):
+        """Bước cắt video (chạy trong worker của hàng đợi)"""
+        ctx = job.context
+        journal = JobJournal.open(self.job_journal_params(ctx), resume=ctx.get('resume', False))
+        ctx['journal'] = journal
 
-            # Add audio if provided
-            if audio_file and self.is_processing:
-                self.update_progress("🎵 Đang thêm audio vào video...")
-                self.add_audio_to_video(temp_output, audio_file, audio_volume, output_path)
-                # Xóa file tạm
-                if os.path.exists(temp_output):
-                    os.remove(temp_output)
+        # Lần trước đã thêm audio xong: không cần cắt lại
+        if ctx['audio_file'] and journal.stage_done('mix', os.path.abspath(ctx['output_path'])):
+            job.report("⏭️ Đã cắt và thêm audio ở lần chạy trước")
+            return
 
-            # Upload to Drive if requested
-            if upload_to_drive and self.rclone_config_content:
-                self.update_progress("📤 Đang upload lên Google Drive...")
+        # Nếu có audio file, tạo output tạm thời
+        if ctx['audio_file']:
+            output_path_obj = Path(ctx['output_path'])
+            current_output = str(output_path_obj.parent / f"{output_path_obj.stem}_temp{output_path_obj.suffix}")
+            job.cancel_token.add_cleanup_path(current_output)
+            journal.add_intermediate(current_output)
+        else:
+            current_output = ctx['output_path']
+
+        # Mỗi công việc có thư mục tạm riêng để chạy song song an toàn
+        cut_video_segments(
+            input_video=ctx['input_path'],
+            segments=ctx['segments'],
+            output_video=current_output,
+            mode=ctx['mode'],
+            cpu_threads=job.cpu_share,
+            volume=ctx['volume'],
+            progress_callback=job.report,
+            cancel_token=job.cancel_token,
+            journal=journal
+        )
+        ctx['cut_output'] = current_output
 
-                uploader = RcloneUploader(self.rclone_config_content)
-                remotes = uploader.list_remotes()
+    def stage_mix(self, job):
+        """Bước thêm audio vào video"""
+        ctx = job.context
+        journal = ctx['journal']
+        if journal.stage_done('mix', os.path.abspath(ctx['output_path'])):
+            return
 
-                if remotes:
-                    remote_name = remotes[0]
-                    remote_path = self.remote_path.get()
+        job.report("🎵 Đang thêm audio vào video...")
+        self.add_audio_to_video(ctx['cut_output'], ctx['audio_file'], ctx['audio_volume'],
+                                ctx['output_path'], job.cancel_token)
+        journal.record_stage('mix', os.path.abspath(ctx['output_path']))
+        # Xóa file tạm
+        if os.path.exists(ctx['cut_output']):
+            os.remove(ctx['cut_output'])
 
-                    success = uploader.upload_file(output_path, remote_name, remote_path)
+    def stage_upload(self, job):
+        """Bước upload lên Google Drive"""
+        ctx = job.context
+        job.report("📤 Đang upload lên Google Drive...")
 
-                    if success:
-                        self.update_progress("✅ Upload hoàn thành!")
-                    else:
-                        self.update_progress("⚠️ Upload thất bại")
-                else:
-                    self.update_progress("⚠️ Không tìm thấy remote trong config")
+        uploader = RcloneUploader(self.rclone_config_content)
+        try:
+            remotes = uploader.list_remotes()
+            if not remotes:
+                raise RuntimeError("Không tìm thấy remote trong config")
+
+            # Đã upload đúng file này lên cùng nơi ở lần chạy trước
+            journal = ctx['journal']
+            destination = f"{remotes[0]}:{ctx['remote_path']}"
+            if journal.stage_done('upload', os.path.abspath(ctx['output_path']), destination=destination):
+                job.report("⏭️ Đã upload ở lần chạy trước")
+                return
 
-            # Success
-            self.root.after(0, lambda path=output_path, uploaded=upload_to_drive: self.processing_complete(path, uploaded))
+            success = uploader.upload_file(ctx['output_path'], remotes[0], ctx['remote_path'],
+                                           progress_callback=job.report,
+                                           cancel_token=job.cancel_token)
+            if not success:
+                raise RuntimeError("Upload thất bại")
+            journal.record_stage('upload', os.path.abspath(ctx['output_path']), destination=destination)
+            job.report("✅ Upload hoàn thành!")
+        finally:
+            # File config tạm chứa token rclone → xóa ngay, không chờ __del__
+            uploader.cleanup()
+
+    def start_proxy_build(self, video_path):
+        """Tạo proxy ở nền (độ ưu tiên thấp) để 'Xem nháp' chạy ngay"""
+        def stage_proxy(job):
+            build_proxy(video_path, progress_callback=job.report, cancel_token=job.cancel_token)
+
+        job = Job(f"🎞️ Proxy: {Path(video_path).name}",
+                  [JobStage("🎞️ Tạo proxy", RESOURCE_ENCODE, stage_proxy)],
+                  priority=-10, context={'kind': 'proxy'})
+        self.job_queue.submit(job)
+
+    def start_draft_render(self):
+        """Render nháp các đoạn cắt từ proxy rồi mở bằng trình phát mặc định"""
+        input_path = self.input_video_path.get()
+        segments_str = self.segments_entry.get("1.0", tk.END).strip()
 
+        if not input_path or not os.path.exists(input_path):
+            messagebox.showwarning("Thiếu thông tin", "Vui lòng chọn video đầu vào!")
+            return
+
+        try:
+            segments = parse_segments(segments_str)
         except Exception as e:
-            error_msg = str(e)
-            self.root.after(0, lambda msg=error_msg: self.processing_error(msg))
+            messagebox.showerror("Lỗi định dạng", f"Định dạng đoạn cắt không hợp lệ:\n\n{str(e)}")
+            return
+        if not segments:
+            messagebox.showwarning("Thiếu thông tin", "Vui lòng nhập các đoạn cần cắt!")
+            return
+
+        volume = self.volume.get()
 
-    def update_progress(self, message):
-        """Cập nhật progress label"""
-        self.root.after(0, lambda msg=message: self.progress_label.config(text=msg))
+        def stage_draft(job):
+            job.context['output_path'] = draft_render(
+                input_path, segments, volume=volume, cpu_threads=job.cpu_share,
+                progress_callback=job.report, cancel_token=job.cancel_token
+            )
+
+        # Ưu tiên cao: người dùng đang chờ xem
+        job = Job(f"👁️ Nháp: {Path(input_path).name}",
+                  [JobStage("👁️ Render nháp", RESOURCE_ENCODE, stage_draft)],
+                  priority=10, context={'kind': 'draft'})
+        self.job_queue.submit(job)
+        self.cancel_btn.config(state="normal")
+        self.progress_bar.start(10)
+        self.progress_label.config(text=f"👁️ Đang render nháp (công việc #{job.id})...")
+
+    def open_path(self, path):
+        """Mở file/thư mục bằng ứng dụng mặc định của hệ điều hành"""
+        if sys.platform == "win32":
+            os.startfile(path)
+        elif sys.platform == "darwin":
+            subprocess.run(["open", path])
+        else:
+            subprocess.run(["xdg-open", path])
+
+    def on_job_changed(self, job):
+        """Listener của hàng đợi (gọi từ luồng worker) - gom cập nhật về luồng GUI"""
+        if job is not None and job.finished:
+            self.save_trace()
+        if not self._jobs_refresh_pending:
+            self._jobs_refresh_pending = True
+            self.root.after(100, self.refresh_jobs)
+
+    def refresh_jobs(self):
+        """Cập nhật trạng thái các công việc trên giao diện"""
+        self._jobs_refresh_pending = False
+        jobs = list(self.job_queue.jobs)
+
+        running = [job for job in jobs if job.status == STATUS_RUNNING]
+        if running:
+            job = running[-1]
+            self.progress_label.config(text=f"[#{job.id}] {job.progress}")
+
+        if self.queue_window is not None:
+            self.update_queue_view(jobs)
+
+        # Thông báo các công việc vừa kết thúc
+        for job in jobs:
+            if not job.finished or job.id in self._reported_jobs:
+                continue
+            self._reported_jobs.add(job.id)
+            kind = job.context.get('kind')
+            if job.status == STATUS_DONE and kind == 'proxy':
+                self.progress_label.config(text=f"✅ {job.progress}")
+            elif job.status == STATUS_DONE and kind == 'draft':
+                self.progress_label.config(text="👁️ Đã render nháp")
+                self.open_path(job.context['output_path'])
+            elif job.status == STATUS_DONE:
+                if job.context.get('journal'):
+                    job.context['journal'].finish()
+                self.processing_complete(job.context['output_path'], job.context['upload_to_drive'])
+            elif job.status == STATUS_FAILED:
+                self.processing_error(f"[#{job.id}] {job.name}: {job.error}")
+            else:
+                self.progress_label.config(text=f"🚫 Đã hủy công việc #{job.id}")
+
+        if not self.user_jobs_active():
+            self.progress_bar.stop()
+            self.cancel_btn.config(state="disabled")
 
     def processing_complete(self, output_path, uploaded=False):
         """Xử lý hoàn thành"""
-        self.is_processing = False
+        upload_msg = "\n✅ Video đã được upload lên Google Drive!" if uploaded else ""
+
+        # Vẫn còn công việc trong hàng đợi: chỉ báo trên thanh trạng thái
+        if self.user_jobs_active():
+            self.progress_label.config(text=f"✅ Hoàn thành: {Path(output_path).name}")
+            return
+
         self.progress_bar.stop()
         self.progress_label.config(text="✅ Hoàn thành!")
-        self.process_btn.config(state="normal")
-        self.process_upload_btn.config(state="normal")
         self.cancel_btn.config(state="disabled")
 
-        upload_msg = "\n✅ Video đã được upload lên Google Drive!" if uploaded else ""
         result = messagebox.showinfo(
             "Thành công",
             f"✨ Video đã được cắt và lưu thành công!{upload_msg}\n\n"
@@ -890,39 +1209,194 @@ team_drive = """
 
         # Open folder
         if messagebox.askyesno("Mở thư mục", "Mở thư mục chứa file?"):
-            folder = os.path.dirname(output_path)
-            if sys.platform == "win32":
-                os.startfile(folder)
-            elif sys.platform == "darwin":
-                subprocess.run(["open", folder])
-            else:
-                subprocess.run(["xdg-open", folder])
+            self.open_path(os.path.dirname(output_path))
 
     def processing_error(self, error_message):
         """Xử lý lỗi"""
-        self.is_processing = False
-        self.progress_bar.stop()
         self.progress_label.config(text="❌ Lỗi!")
-        self.process_btn.config(state="normal")
-        self.process_upload_btn.config(state="normal")
-        self.cancel_btn.config(state="disabled")
+        if not self.user_jobs_active():
+            self.progress_bar.stop()
+            self.cancel_btn.config(state="disabled")
 
         messagebox.showerror("Lỗi", f"❌ Có lỗi xảy ra:\n\n{error_message}")
 
     def cancel_processing(self):
-        """Hủy xử lý"""
-        if messagebox.askyesno("Xác nhận", "Bạn có chắc muốn hủy?"):
-            self.is_processing = False
+        """Hủy tất cả công việc đang chờ/đang chạy"""
+        if messagebox.askyesno("Xác nhận", "Bạn có chắc muốn hủy tất cả công việc?"):
+            # Dừng ffmpeg/rclone đang chạy và các công việc đang chờ
+            self.job_queue.cancel_all()
             self.progress_bar.stop()
             self.progress_label.config(text="❌ Đã hủy")
-            self.process_btn.config(state="normal")
-            self.process_upload_btn.config(state="normal")
             self.cancel_btn.config(state="disabled")
 
+    # ===== JOB QUEUE PANEL =====
+
+    def show_job_queue(self):
+        """Mở cửa sổ hàng đợi công việc"""
+        if self.queue_window is not None:
+            self.queue_window.lift()
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("📋 Hàng đợi công việc")
+        window.geometry("760x360")
+        window.transient(self.root)
+        self.queue_window = window
+
+        def on_close():
+            self.queue_window = None
+            self.queue_tree = None
+            window.destroy()
+
+        window.protocol("WM_DELETE_WINDOW", on_close)
+
+        # Job list
+        tree_frame = ttk.Frame(window, padding="5")
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+
+        columns = ("id", "name", "status", "priority", "stage", "progress")
+        self.queue_tree = ttk.Treeview(tree_frame, columns=columns, show="headings", selectmode="browse")
+        headings = {
+            "id": ("#", 40),
+            "name": ("Công việc", 160),
+            "status": ("Trạng thái", 100),
+            "priority": ("Ưu tiên", 60),
+            "stage": ("Bước", 110),
+            "progress": ("Tiến trình", 260),
+        }
+        for column, (text, width) in headings.items():
+            self.queue_tree.heading(column, text=text)
+            self.queue_tree.column(column, width=width, anchor=tk.W)
+
+        tree_scroll = ttk.Scrollbar(tree_frame, command=self.queue_tree.yview)
+        self.queue_tree.configure(yscrollcommand=tree_scroll.set)
+        tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.queue_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        # Buttons
+        button_frame = ttk.Frame(window, padding="5")
+        button_frame.pack(fill=tk.X)
+
+        ttk.Button(button_frame, text="⬆️ Lên", command=lambda: self.move_selected_job(-1)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_frame, text="⬇️ Xuống", command=lambda: self.move_selected_job(1)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_frame, text="➕ Ưu tiên", command=lambda: self.change_selected_priority(1)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_frame, text="➖ Ưu tiên", command=lambda: self.change_selected_priority(-1)).pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_frame, text="❌ Hủy công việc", command=self.cancel_selected_job).pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_frame, text="▶️ Tiếp tục", command=self.resume_selected_job).pack(side=tk.LEFT, padx=2)
+        ttk.Button(button_frame, text="🧹 Xóa đã xong", command=self.job_queue.clear_finished).pack(side=tk.RIGHT, padx=2)
+
+        self.update_queue_view(list(self.job_queue.jobs))
+
+    def update_queue_view(self, jobs):
+        """Vẽ lại danh sách công việc trong cửa sổ hàng đợi"""
+        if self.queue_tree is None:
+            return
+
+        status_names = {
+            STATUS_QUEUED: "⏳ Đang chờ",
+            STATUS_RUNNING: "▶️ Đang chạy",
+            STATUS_DONE: "✅ Xong",
+            STATUS_FAILED: "❌ Lỗi",
+            STATUS_CANCELLED: "🚫 Đã hủy",
+        }
+
+        selected = self.queue_tree.selection()
+        self.queue_tree.delete(*self.queue_tree.get_children())
+
+        # Công việc chưa xong theo thứ tự chạy, công việc đã xong ở cuối
+        ordered = sorted(jobs, key=lambda j: (j.finished, -j.priority, j.position))
+        for job in ordered:
+            stage = job.current_stage
+            progress = job.error if job.status == STATUS_FAILED else job.progress
+            self.queue_tree.insert("", tk.END, iid=str(job.id), values=(
+                job.id,
+                job.name,
+                status_names.get(job.status, job.status),
+                job.priority,
+                stage.name if stage else "",
+                progress,
+            ))
+
+        for iid in selected:
+            if self.queue_tree.exists(iid):
+                self.queue_tree.selection_set(iid)
+
+    def selected_job_id(self):
+        """ID công việc đang chọn trong cửa sổ hàng đợi"""
+        if self.queue_tree is None:
+            return None
+        selection = self.queue_tree.selection()
+        return int(selection[0]) if selection else None
+
+    def move_selected_job(self, offset):
+        job_id = self.selected_job_id()
+        if job_id is not None:
+            self.job_queue.move(job_id, offset)
+
+    def change_selected_priority(self, delta):
+        job_id = self.selected_job_id()
+        job = self.job_queue.get(job_id) if job_id is not None else None
+        if job:
+            self.job_queue.set_priority(job_id, job.priority + delta)
+
+    def cancel_selected_job(self):
+        job_id = self.selected_job_id()
+        if job_id is not None:
+            self.job_queue.cancel(job_id)
+
+    def resume_selected_job(self):
+        """Chạy lại công việc cắt bị lỗi/hủy, tiếp tục từ bước đã xong cuối cùng"""
+        job_id = self.selected_job_id()
+        job = self.job_queue.get(job_id) if job_id is not None else None
+        if not job or job.context.get('kind') != 'cut' or job.status not in (STATUS_FAILED, STATUS_CANCELLED):
+            messagebox.showinfo("Tiếp tục", "Chọn một công việc cắt video bị lỗi hoặc đã hủy.")
+            return
+
+        ctx = job.context
+        new_job = self.create_job(ctx['input_path'], ctx['segments'], ctx['output_path'], ctx['mode'],
+                                  ctx['volume'], ctx['audio_file'], ctx['audio_volume'],
+                                  ctx['upload_to_drive'])
+        new_job.context['remote_path'] = ctx['remote_path']
+        new_job.context['resume'] = True
+        self.job_queue.submit(new_job)
+        self.cancel_btn.config(state="normal")
+        self.progress_bar.start(10)
+        self.progress_label.config(text=f"▶️ Tiếp tục công việc #{job.id} (công việc mới #{new_job.id})")
+
+    def user_jobs_active(self):
+        """Các công việc của người dùng chưa xong (không tính việc tạo proxy chạy nền)"""
+        return [job for job in self.job_queue.active_jobs() if job.context.get('kind') != 'proxy']
+
+    def on_close(self):
+        """Đóng ứng dụng: hủy các công việc đang chạy để không để lại ffmpeg chạy ngầm"""
+        if self.user_jobs_active():
+            if not messagebox.askyesno("Xác nhận", "Vẫn còn công việc đang chạy. Hủy tất cả và thoát?"):
+                return
+        self.job_queue.shutdown()
+        if self.tracer:
+            self.tracer.stop_profile()
+            self.save_trace()
+        self.root.destroy()
+
+    def save_trace(self):
+        """Ghi lại file trace (--trace) với các span đến thời điểm hiện tại"""
+        if not self.tracer:
+            return
+        try:
+            self.tracer.write(self.trace_path)
+        except Exception as e:
+            print(f"⚠️  Không thể ghi file trace: {e}")
+
     # ===== YOUTUBE DOWNLOAD METHODS =====
 
     def start_youtube_download(self):
-        """Bắt đầu tải video từ YouTube"""
+        """Bắt đầu tải video từ YouTube (nhấn lần nữa khi đang tải để hủy)"""
+        if self.is_downloading:
+            if self.download_cancel_token:
+                self.download_cancel_token.cancel()
+            self.youtube_status.set("⏳ Đang hủy tải xuống...")
+            return
+
         if not YOUTUBE_AVAILABLE:
             messagebox.showerror(
                 "Thiếu thư viện",
@@ -943,41 +1417,66 @@ team_drive = """
 
         # Start download in background
         self.is_downloading = True
-        self.download_btn.config(state="disabled")
+        self.download_cancel_token = CancelToken()
+        self.download_btn.config(text="⏹ Hủy")
         self.youtube_status.set("⏳ Đang tải xuống...")
 
         thread = threading.Thread(
             target=self.download_youtube_video,
-            args=(url,),
+            args=(url, self.download_cancel_token),
             daemon=True
         )
         thread.start()
 
-    def download_youtube_video(self, url):
+    def download_youtube_video(self, url, cancel_token):
         """Tải video YouTube (chạy trong thread riêng)"""
+        job_metrics = JobMetrics(f"download {url}", tracer=self.tracer).attach(cancel_token)
+        status = "failed"
         try:
             def progress_callback(message):
                 if self.is_downloading:
                     self.root.after(0, lambda msg=message: self.youtube_status.set(msg))
 
-            success, file_path = self.youtube_downloader.download_video(
-                url,
-                progress_callback=progress_callback
-            )
+            with job_metrics.stage("download"):
+                success, file_path = self.youtube_downloader.download_video(
+                    url,
+                    progress_callback=progress_callback,
+                    cancel_token=cancel_token
+                )
 
             if success and file_path:
+                status = "done"
+                job_metrics.add_file(file_path)
                 self.root.after(0, lambda path=file_path: self.youtube_download_complete(path))
             else:
                 self.root.after(0, lambda: self.youtube_download_error("Tải xuống thất bại"))
 
+        except JobCancelledError:
+            status = "cancelled"
+            self.root.after(0, self.youtube_download_cancelled)
+
         except Exception as e:
             error_msg = str(e)
             self.root.after(0, lambda msg=error_msg: self.youtube_download_error(msg))
 
+        finally:
+            job_metrics.finish(status)
+            try:
+                job_metrics.write_reports()
+            except Exception as e:
+                print(f"⚠️  Không thể ghi báo cáo số liệu: {e}")
+            self.save_trace()
+
+    def youtube_download_cancelled(self):
+        """Xử lý khi người dùng hủy tải YouTube"""
+        self.is_downloading = False
+        self.download_btn.config(text="⬇️ Tải")
+        self.youtube_status.set("❌ Đã hủy tải xuống")
+
     def youtube_download_complete(self, file_path):
         """Xử lý khi tải YouTube hoàn thành"""
         self.is_downloading = False
-        self.download_btn.config(state="normal")
+        self.download_btn.config(text="⬇️ Tải")
         self.youtube_status.set(f"✅ Đã tải xong: {Path(file_path).name}")
 
         # Auto-fill input video path
@@ -990,6 +1489,9 @@ team_drive = """
             output_path = input_path.parent / output_name
             self.output_video_path.set(str(output_path))
 
+        self.load_timeline(file_path)
+        self.start_proxy_build(file_path)
+
         messagebox.showinfo(
             "Thành công",
             f"✅ Video đã được tải xuống!\n\n"
@@ -1001,7 +1503,7 @@ team_drive = """
     def youtube_download_error(self, error_message):
         """Xử lý lỗi khi tải YouTube"""
         self.is_downloading = False
-        self.download_btn.config(state="normal")
+        self.download_btn.config(text="⬇️ Tải")
         self.youtube_status.set(f"❌ Lỗi: {error_message}")
 
         messagebox.showerror(
@@ -1016,8 +1518,17 @@ team_drive = """
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description='Video Cutter Tool - giao diện đồ họa')
+    parser.add_argument('--trace', default=None, metavar='FILE',
+                        help='Ghi timeline các công việc (Chrome trace-event, mở bằng Perfetto) vào FILE')
+    parser.add_argument('--trace-python', action='store_true',
+                        help='Ghi thêm cProfile của luồng giao diện và các luồng công việc (cần --trace)')
+    args = parser.parse_args()
+    if args.trace_python and not args.trace:
+        parser.error("--trace-python cần --trace")
+
     root = tk.Tk()
-    app = VideoCutterGUI(root)
+    app = VideoCutterGUI(root, trace_path=args.trace, trace_python=args.trace_python)
     root.mainloop()
 
 
@@ -12,8 +12,9 @@ from pathlib import Path
 # Import our modules
 try:
     from video_cutter import cut_video_segments, parse_segments, check_ffmpeg
-    from youtube_downloader import YouTubeDownloader
-    YOUTUBE_AVAILABLE = True
+    from media_info import check_segments, probe_media
+    # yt-dlp itself is only imported when a download starts
+    from youtube_downloader import YouTubeDownloader, YT_DLP_AVAILABLE as YOUTUBE_AVAILABLE
 except ImportError as e:
     print(f"Warning: Some modules not available: {e}")
     YOUTUBE_AVAILABLE = False
@@ -118,11 +119,22 @@ def download_youtube_video(url, output_path="downloads"):
         return None
 
 
-def validate_segments(segments_str):
-    """Validate segment format"""
+def validate_segments(segments_str, input_video=None):
+    """
+    Validate segment format and check segments against the real video duration
+
+    Returns:
+        List of (start, end) segments (clamped to the video end), or None if invalid
+    """
     try:
         segments = parse_segments(segments_str)
+        media = probe_media(input_video) if input_video else None
+        segments, warnings = check_segments(segments, media)
         print(f"\n✅ Valid format! Found {len(segments)} segments:")
+        if media:
+            print(f"🎞️  Video: {media.summary()}")
+        for warning in warnings:
+            print(f"⚠️  {warning}")
 
         total_duration = 0
         for idx, (start, end) in enumerate(segments, 1):
@@ -131,12 +143,12 @@ def validate_segments(segments_str):
             print(f"  Segment {idx}: {start}s - {end}s ({duration}s)")
 
         print(f"\nTotal output duration: {total_duration}s ({total_duration/60:.2f} minutes)")
-        return True
+        return segments
     except Exception as e:
-        print(f"\n❌ Invalid format: {e}")
+        print(f"\n❌ Invalid segments: {e}")
         print("\nExpected format: MM:SS-MM:SS|MM:SS-MM:SS")
         print("Example: 03:05-03:10|40:05-40:10|1:03:05-1:04:05")
-        return False
+        return None
 
 
 def get_rclone_config():
@@ -284,11 +296,10 @@ def main():
 
     while True:
         segments_str = get_input("✂️  Segments")
-        if validate_segments(segments_str):
+        segments = validate_segments(segments_str, input_video)
+        if segments:
             break
 
-    segments = parse_segments(segments_str)
-
     # Step 4: Output Video
     print()
     print_separator()
@@ -303,7 +314,7 @@ def main():
     modes = [
         "🚀 Fast - Rất nhanh (10-20x, có thể sai lệch ±1-2s)",
         "⚡ Balanced - Cân bằng (3-4x, chính xác 100%)",
-        "🎯 Accurate - Chính xác tuyệt đối (chậm nhất)"
+        "🎯 Accurate - Chính xác từng frame (song song, kiểm tra số frame)"
     ]
     mode_map = {1: 'fast', 2: 'balanced', 3: 'accurate'}
 
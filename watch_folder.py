@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+"""
+Watch Folder - Tự động cắt các video được thả vào một thư mục
+Mỗi video đi kèm một file đoạn cắt cùng tên (sidecar), ví dụ:
+    clip.mp4 + clip.segments   (mỗi dòng một đoạn "start-end", như segment_sources)
+    clip.mp4 + clip.json       (danh sách đoạn, hoặc một job: {"segments": [...], "mode": ...})
+Cũng nhận clip.mp4.segments / clip.mp4.json, và .csv / .edl như --segments-file.
+
+Một file được coi là đã chép xong khi:
+- inotify báo writer đã đóng file (IN_CLOSE_WRITE) hoặc file được rename vào
+  thư mục (IN_MOVED_TO, kiểu rsync / "chép ra file tạm rồi đổi tên"), hoặc
+- kích thước và mtime không đổi trong --stable giây (quét định kỳ; dùng khi
+  không có inotify, và cho thư mục mạng SMB/NFS nơi inotify không thấy các
+  thay đổi từ máy khác)
+File ẩn (bắt đầu bằng ".") và file tạm (.part, .tmp, .crdownload...) bị bỏ qua.
+
+Cặp video + sidecar đầy đủ được "nhận" bằng cách rename vào .processing/<host>/
+(rename là nguyên tử nên nhiều máy render có thể cùng theo dõi một thư mục
+chia sẻ mà không cắt trùng), rồi đưa vào JobQueue có giới hạn slot encode/upload.
+File kết quả được ghi ra file tạm trong thư mục đầu ra và chỉ đổi tên thành
+tên thật khi đã xong. Sau đó video + sidecar được chuyển vào done/ hoặc
+failed/ (kèm <tên>.error.txt).
+"""
+
+import os
+import sys
+import json
+import time
+import select
+import signal
+import socket
+import struct
+import argparse
+import threading
+from typing import Optional
+
+from job_queue import (
+    Job, JobQueue, JobStage, RESOURCE_ENCODE, RESOURCE_NETWORK,
+    STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED
+)
+from media_info import check_segments, probe_media
+from segment_sources import load_segments
+from video_cutter import cut_video_segments
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.m4v', '.mkv', '.avi', '.webm', '.ts', '.mts', '.flv', '.wmv')
+# Tên sidecar thử theo thứ tự, {name} = clip.mp4, {stem} = clip
+SIDECAR_PATTERNS = ('{name}.segments', '{stem}.segments', '{name}.json', '{stem}.json',
+                    '{stem}.csv', '{stem}.edl')
+# Đuôi file đang chép dở của các công cụ phổ biến
+TEMP_SUFFIXES = ('.part', '.partial', '.tmp', '.temp', '.crdownload', '.download', '.filepart', '.!qb')
+
+DEFAULT_STABLE_SECONDS = 5.0
+DEFAULT_POLL_INTERVAL = 2.0
+
+PROCESSING_DIR = ".processing"
+DONE_DIR = "done"
+FAILED_DIR = "failed"
+DEFAULT_OUTPUT_DIR = "output"
+
+# Thời gian chờ các công việc đang chạy dừng hẳn khi tắt
+SHUTDOWN_GRACE_SECONDS = 10.0
+
+MODES = ('fast', 'balanced', 'accurate')
+
+# Các tùy chọn được đọc từ sidecar JSON dạng job
+JOB_OPTIONS = ('mode', 'volume', 'output', 'upload', 'priority')
+
+# inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def open_inotify(directory: str) -> Optional[int]:
+    """
+    Mở inotify theo dõi file được đóng sau khi ghi / được rename vào thư mục
+
+    Returns:
+        File descriptor (non-blocking), hoặc None nếu không dùng được inotify
+        (không phải Linux, libc không có hàm, hết giới hạn watch...)
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def read_inotify_events(fd: int, timeout: float):
+    """
+    Chờ tối đa timeout giây và đọc các sự kiện inotify
+
+    Returns:
+        (danh sách tên file đã hoàn tất, overflow) - overflow = True nếu kernel
+        đã bỏ sự kiện (khi đó chỉ còn dựa vào việc quét định kỳ)
+    """
+    names = []
+    overflow = False
+    readable, _, _ = select.select([fd], [], [], timeout)
+    if not readable:
+        return names, overflow
+    while True:
+        try:
+            data = os.read(fd, 64 * 1024)
+        except BlockingIOError:
+            break
+        if not data:
+            break
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            _, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = data[offset:offset + length].split(b'\0', 1)[0]
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+            elif name:
+                names.append(os.fsdecode(name))
+    return names, overflow
+
+
+def is_candidate(name: str) -> bool:
+    """File có thể là video/sidecar (không phải file ẩn hay file đang chép dở)"""
+    lowered = name.lower()
+    return not name.startswith('.') and not lowered.endswith(TEMP_SUFFIXES)
+
+
+def find_sidecar(name: str, names) -> Optional[str]:
+    """Tên sidecar của video name (names = tập tên file hiện có trong thư mục)"""
+    stem = os.path.splitext(name)[0]
+    for pattern in SIDECAR_PATTERNS:
+        candidate = pattern.format(name=name, stem=stem)
+        if candidate in names and candidate != name:
+            return candidate
+    return None
+
+
+def load_sidecar(path: str, fps: Optional[float] = None) -> tuple:
+    """
+    Đọc sidecar: danh sách đoạn cắt và các tùy chọn của job
+
+    Args:
+        path: Đường dẫn sidecar
+        fps: Frame rate của video để đổi timecode EDL (None = DEFAULT_EDL_FPS)
+
+    Returns:
+        (segments, options) - options chỉ có khi sidecar là JSON dạng object
+
+    Raises:
+        ValueError: Nếu sidecar không hợp lệ hoặc không có đoạn nào
+    """
+    options = {}
+    if path.lower().endswith('.json'):
+        try:
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"File đoạn cắt không hợp lệ ({os.path.basename(path)}): {e}")
+        if isinstance(data, dict):
+            options = {key: data[key] for key in JOB_OPTIONS if key in data}
+    segments = load_segments(path, fps=fps)
+    if not segments:
+        raise ValueError(f"{os.path.basename(path)}: không có đoạn cắt nào")
+    return segments, options
+
+
+def _free_path(directory: str, name: str) -> str:
+    """Đường dẫn chưa tồn tại trong thư mục (thêm hậu tố -1, -2... nếu trùng tên)"""
+    stem, ext = os.path.splitext(name)
+    target = os.path.join(directory, name)
+    counter = 1
+    while os.path.exists(target):
+        target = os.path.join(directory, f"{stem}-{counter}{ext}")
+        counter += 1
+    return target
+
+
+def _move(path: str, directory: str) -> str:
+    """Chuyển file vào thư mục (thêm hậu tố -1, -2... nếu trùng tên), trả về đường dẫn mới"""
+    os.makedirs(directory, exist_ok=True)
+    target = _free_path(directory, os.path.basename(path))
+    os.replace(path, target)
+    return target
+
+
+class WatchFolder:
+    """Theo dõi thư mục và đưa các cặp video + sidecar vào hàng đợi cắt"""
+
+    def __init__(self, watch_dir: str, output_dir: Optional[str] = None, mode: str = "balanced",
+                 encode_slots: int = 1, network_slots: int = 1, cpu_budget: Optional[int] = None,
+                 upload: Optional[str] = None, rclone_config: Optional[str] = None,
+                 stable_seconds: float = DEFAULT_STABLE_SECONDS,
+                 interval: float = DEFAULT_POLL_INTERVAL, use_inotify: bool = True,
+                 max_queued: Optional[int] = None, temp_root: Optional[str] = None):
+        """
+        Args:
+            watch_dir: Thư mục được theo dõi
+            output_dir: Thư mục chứa video kết quả (mặc định: <watch_dir>/output)
+            mode: Chế độ cắt mặc định ('fast', 'balanced', 'accurate')
+            encode_slots: Số video được cắt đồng thời
+            network_slots: Số upload chạy đồng thời
+            cpu_budget: Tổng số luồng CPU cho các bước encode (None = số CPU)
+            upload: "remote:path" để upload kết quả bằng rclone (None = không upload)
+            rclone_config: Đường dẫn rclone.conf (mặc định: ~/.config/rclone/rclone.conf)
+            stable_seconds: Số giây kích thước file phải không đổi khi không có sự kiện inotify
+            interval: Chu kỳ quét thư mục (giây)
+            use_inotify: Dùng inotify nếu có (False = chỉ quét định kỳ)
+            max_queued: Số cặp tối đa được nhận vào hàng đợi cùng lúc (mặc định:
+                2 × encode_slots); phần còn lại nằm nguyên trong thư mục cho máy khác
+            temp_root: Thư mục gốc cho file tạm khi cắt
+        """
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.output_dir = os.path.abspath(output_dir or os.path.join(self.watch_dir, DEFAULT_OUTPUT_DIR))
+        self.processing_dir = os.path.join(self.watch_dir, PROCESSING_DIR, socket.gethostname())
+        self.mode = mode
+        self.upload = upload
+        self.rclone_config = rclone_config
+        self.stable_seconds = stable_seconds
+        self.interval = interval
+        self.max_queued = max_queued or 2 * encode_slots
+        self.temp_root = temp_root
+        self.queue = JobQueue(encode_slots=encode_slots, network_slots=network_slots,
+                              cpu_budget=cpu_budget, listener=self._on_job_changed)
+        self._inotify = open_inotify(self.watch_dir) if use_inotify else None
+        # name → (size, mtime_ns, thời điểm bắt đầu không đổi)
+        self._seen = {}
+        # Các file inotify báo đã đóng / được rename vào
+        self._closed = set()
+        self._waiting_sidecar = set()
+        self._reported = {}
+        self._lock = threading.Lock()
+        # Chọn tên file kết quả + rename phải nguyên tử giữa các job chạy song song
+        self._output_lock = threading.Lock()
+        self._stop = threading.Event()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._recover()
+
+    # ===== PUBLIC API =====
+
+    def run(self, once: bool = False):
+        """
+        Theo dõi cho tới khi stop() (hoặc, với once=True, tới khi không còn việc)
+
+        Args:
+            once: Xử lý các file đang có rồi thoát khi hàng đợi rỗng và không
+                còn file nào đang chép dở
+        """
+        watcher = "inotify + quét định kỳ" if self._inotify is not None else "quét định kỳ"
+        print(f"👀 Đang theo dõi {self.watch_dir} ({watcher}), kết quả → {self.output_dir}")
+        try:
+            while not self._stop.is_set():
+                stabilizing = self.scan()
+                if once and not stabilizing and not self.queue.active_jobs():
+                    break
+                self._wait()
+        finally:
+            self.shutdown()
+
+    def stop(self):
+        """Dừng vòng theo dõi (gọi được từ signal handler / luồng khác)"""
+        self._stop.set()
+
+    def shutdown(self):
+        """Hủy công việc đang chạy; video của chúng được trả lại thư mục theo dõi"""
+        self.queue.shutdown()
+        # Chờ các bước đang chạy dừng hẳn để kịp trả file về (phần còn lại: _recover lần sau)
+        deadline = time.monotonic() + SHUTDOWN_GRACE_SECONDS
+        while self.queue.active_jobs() and time.monotonic() < deadline:
+            time.sleep(0.1)
+        if self._inotify is not None:
+            os.close(self._inotify)
+            self._inotify = None
+
+    def scan(self) -> int:
+        """
+        Quét thư mục một lần và nhận các cặp video + sidecar đã hoàn tất
+
+        Returns:
+            Số file còn đang chờ ổn định (chưa coi là chép xong)
+        """
+        now = time.monotonic()
+        files = {}
+        with os.scandir(self.watch_dir) as entries:
+            for entry in entries:
+                if is_candidate(entry.name) and entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+
+        complete = set()
+        stabilizing = 0
+        for name, signature in files.items():
+            previous = self._seen.get(name)
+            # Đã đóng (inotify) cũng phải giữ nguyên qua một lần quét: writer có thể mở lại để ghi tiếp
+            unchanged = previous is not None and previous[:2] == signature
+            if not unchanged:
+                previous = self._seen[name] = (*signature, now)
+            if signature[0] > 0 and ((unchanged and name in self._closed)
+                                     or now - previous[2] >= self.stable_seconds):
+                complete.add(name)
+            else:
+                stabilizing += 1
+        for name in set(self._seen) - set(files):
+            del self._seen[name]
+        self._closed &= set(files)
+
+        for name in sorted(complete):
+            if not name.lower().endswith(VIDEO_EXTENSIONS):
+                continue
+            sidecar = find_sidecar(name, files)
+            if sidecar is None:
+                if name not in self._waiting_sidecar:
+                    self._waiting_sidecar.add(name)
+                    print(f"⏳ {name}: đang chờ file đoạn cắt (.segments / .json)")
+                continue
+            if sidecar not in complete:
+                stabilizing += 1
+                continue
+            if len(self.queue.active_jobs()) >= self.max_queued:
+                break
+            self._waiting_sidecar.discard(name)
+            self._claim(name, sidecar)
+        return stabilizing
+
+    # ===== INTERNAL =====
+
+    def _wait(self):
+        if self._inotify is None:
+            self._stop.wait(self.interval)
+            return
+        names, overflow = read_inotify_events(self._inotify, self.interval)
+        if overflow:
+            print("⚠️  inotify bị tràn sự kiện, dựa vào kiểm tra kích thước ổn định")
+        self._closed.update(name for name in names if is_candidate(name))
+
+    def _recover(self):
+        """Trả lại thư mục theo dõi các file máy này đã nhận nhưng chưa xử lý xong (lần chạy trước)"""
+        if not os.path.isdir(self.processing_dir):
+            return
+        for name in sorted(os.listdir(self.processing_dir)):
+            path = os.path.join(self.processing_dir, name)
+            if os.path.isfile(path) and not os.path.exists(os.path.join(self.watch_dir, name)):
+                os.replace(path, os.path.join(self.watch_dir, name))
+                print(f"🔁 Trả lại {name} từ lần chạy trước")
+
+    def _claim(self, name: str, sidecar: str):
+        """Rename video + sidecar vào thư mục processing rồi tạo công việc"""
+        os.makedirs(self.processing_dir, exist_ok=True)
+        video_path = os.path.join(self.processing_dir, name)
+        sidecar_path = os.path.join(self.processing_dir, sidecar)
+        try:
+            os.rename(os.path.join(self.watch_dir, name), video_path)
+        except FileNotFoundError:
+            # Máy khác đã nhận trước
+            return
+        try:
+            os.rename(os.path.join(self.watch_dir, sidecar), sidecar_path)
+        except FileNotFoundError:
+            os.rename(video_path, os.path.join(self.watch_dir, name))
+            return
+        for claimed in (name, sidecar):
+            self._seen.pop(claimed, None)
+            self._closed.discard(claimed)
+
+        context = {'input': video_path, 'sidecar': sidecar_path}
+        try:
+            # Timecode EDL tính theo frame → cần frame rate thật của video
+            info = probe_media(video_path) if sidecar.lower().endswith('.edl') else None
+            segments, options = load_sidecar(sidecar_path, fps=info.fps if info else None)
+            stem = os.path.splitext(name)[0]
+            output_name = os.path.basename(str(options.get('output') or f"{stem}.mp4"))
+            upload = options.get('upload', self.upload)
+            context.update({
+                'segments': segments,
+                'mode': options.get('mode', self.mode),
+                'volume': int(options.get('volume', 100)),
+                'output': os.path.join(self.output_dir, output_name),
+                'upload': upload if isinstance(upload, str) and upload else None,
+            })
+            priority = int(options.get('priority', 0))
+            if context['mode'] not in MODES:
+                raise ValueError(f"Chế độ không hợp lệ: {context['mode']}")
+        except (OSError, ValueError, TypeError) as e:
+            self._finish_inputs(context, FAILED_DIR, str(e))
+            print(f"❌ {name}: {e}")
+            return
+
+        stages = [JobStage("✂️ Cắt video", RESOURCE_ENCODE, self._stage_cut)]
+        if context['upload']:
+            stages.append(JobStage("📤 Upload", RESOURCE_NETWORK, self._stage_upload))
+        job = Job(name, stages, priority=priority, context=context)
+        self.queue.submit(job)
+        print(f"📥 {name}: {len(segments)} đoạn ({context['mode']}) → {output_name}")
+
+    def _stage_cut(self, job):
+        context = job.context
+        segments, warnings = check_segments(context['segments'], probe_media(context['input']))
+        for warning in warnings:
+            job.report(f"⚠️  {warning}")
+
+        # Ghi ra file tạm cạnh file kết quả (cùng filesystem) rồi đổi tên khi xong
+        directory, output_name = os.path.split(context['output'])
+        root, ext = os.path.splitext(output_name)
+        partial = os.path.join(directory, f".{root}.{os.getpid()}.{job.id}.partial{ext}")
+        job.cancel_token.add_cleanup_path(partial)
+        try:
+            cut_video_segments(
+                input_video=context['input'],
+                segments=segments,
+                output_video=partial,
+                temp_dir=self.temp_root,
+                mode=context['mode'],
+                cpu_threads=job.cpu_share,
+                volume=context['volume'],
+                progress_callback=job.report,
+                cancel_token=job.cancel_token
+            )
+            # clip.mp4 + clip.mov hoặc hai sidecar cùng "output" không được ghi đè nhau
+            with self._output_lock:
+                context['output'] = _free_path(directory, output_name)
+                os.replace(partial, context['output'])
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+        context['result'] = context['output']
+
+    def _stage_upload(self, job):
+        from rclone_uploader import RcloneUploader
+
+        config_path = self.rclone_config or os.path.expanduser("~/.config/rclone/rclone.conf")
+        with open(config_path, 'r') as f:
+            uploader = RcloneUploader(f.read())
+        remote, _, remote_path = job.context['upload'].partition(':')
+        try:
+            if not uploader.upload_file(job.context['result'], remote, remote_path,
+                                        progress_callback=job.report, cancel_token=job.cancel_token):
+                raise RuntimeError("Upload thất bại")
+        finally:
+            uploader.cleanup()
+
+    def _finish_inputs(self, context: dict, folder: Optional[str], error: Optional[str] = None):
+        """Chuyển video + sidecar vào done/ hoặc failed/ (None = trả lại thư mục theo dõi)"""
+        directory = os.path.join(self.watch_dir, folder) if folder else self.watch_dir
+        for key in ('input', 'sidecar'):
+            if os.path.exists(context[key]):
+                context[key] = _move(context[key], directory)
+        if error:
+            with open(os.path.splitext(context['input'])[0] + ".error.txt", 'w', encoding='utf-8') as f:
+                f.write(error + "\n")
+
+    def _on_job_changed(self, job):
+        if job is None:
+            return
+        with self._lock:
+            key = (job.status, job.stage_index)
+            if self._reported.get(job.id) == key:
+                return
+            self._reported[job.id] = key
+
+            if job.status == STATUS_DONE:
+                self._finish_inputs(job.context, DONE_DIR)
+                print(f"✅ {job.name} → {job.context['output']}")
+            elif job.status == STATUS_FAILED:
+                self._finish_inputs(job.context, FAILED_DIR, job.error)
+                print(f"❌ {job.name}: {job.error}")
+            elif job.status == STATUS_CANCELLED:
+                self._finish_inputs(job.context, None)
+                print(f"⏹️  {job.name}: đã hủy, trả lại thư mục theo dõi")
+            elif job.current_stage:
+                print(f"▶️ {job.name}: {job.current_stage.name} ({job.status})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Watch folder - tự động cắt video được thả vào thư mục')
+    parser.add_argument('directory', help='Thư mục theo dõi')
+    parser.add_argument('-o', '--output-dir', default=None,
+                        help=f'Thư mục kết quả (mặc định: <thư mục>/{DEFAULT_OUTPUT_DIR})')
+    parser.add_argument('-m', '--mode', default='balanced', choices=MODES,
+                        help='Chế độ cắt mặc định (sidecar JSON có thể ghi đè)')
+    parser.add_argument('--workers', type=int, default=1, help='Số video được cắt đồng thời')
+    parser.add_argument('--upload-slots', type=int, default=1, help='Số upload chạy đồng thời')
+    parser.add_argument('--cpu-budget', type=int, default=None, help='Tổng số luồng CPU cho các bước encode, chia cho các slot encode (mặc định: số CPU)')
+    parser.add_argument('--upload', default=None, metavar='REMOTE:PATH',
+                        help='Upload kết quả bằng rclone (vd: gdrive:renders)')
+    parser.add_argument('--rclone-config', default=None,
+                        help='Đường dẫn rclone.conf (mặc định: ~/.config/rclone/rclone.conf)')
+    parser.add_argument('--stable', type=float, default=DEFAULT_STABLE_SECONDS,
+                        help=f'Số giây kích thước file không đổi thì coi là chép xong (mặc định: {DEFAULT_STABLE_SECONDS:g})')
+    parser.add_argument('--interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f'Chu kỳ quét thư mục, giây (mặc định: {DEFAULT_POLL_INTERVAL:g})')
+    parser.add_argument('--poll', action='store_true', help='Không dùng inotify, chỉ quét định kỳ')
+    parser.add_argument('--once', action='store_true', help='Xử lý các file đang có rồi thoát')
+    parser.add_argument('--scratch', default=None,
+                        help='Thư mục gốc cho file tạm (mặc định: $VIDEO_CUTTER_SCRATCH hoặc <tmp>/video_cutter)')
+
+    args = parser.parse_args()
+    if not os.path.isdir(args.directory):
+        parser.error(f"Không tìm thấy thư mục: {args.directory}")
+
+    watcher = WatchFolder(
+        args.directory,
+        output_dir=args.output_dir,
+        mode=args.mode,
+        encode_slots=args.workers,
+        network_slots=args.upload_slots,
+        cpu_budget=args.cpu_budget,
+        upload=args.upload,
+        rclone_config=args.rclone_config,
+        stable_seconds=args.stable,
+        interval=args.interval,
+        use_inotify=not args.poll,
+        temp_root=args.scratch
+    )
+    signal.signal(signal.SIGTERM, lambda *_: watcher.stop())
+    try:
+        watcher.run(once=args.once)
+    except KeyboardInterrupt:
+        print("\n⏹️  Đang dừng...")
+
+
+if __name__ == '__main__':
+    main()
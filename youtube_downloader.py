@@ -7,14 +7,20 @@ Downloads YouTube videos in the highest available resolution.
 import os
 import sys
 import argparse
+import importlib.util
 from pathlib import Path
 
-try:
+from cancellation import JobCancelledError
+
+# yt-dlp takes a noticeable time to import, so it is only loaded on first use.
+# find_spec() checks that it is installed without importing it.
+YT_DLP_AVAILABLE = importlib.util.find_spec("yt_dlp") is not None
+
+
+def _import_yt_dlp():
+    """Import yt-dlp on first use."""
     import yt_dlp
-except ImportError:
-    print("Error: yt-dlp is not installed.")
-    print("Please install it using: pip install yt-dlp")
-    sys.exit(1)
+    return yt_dlp
 
 
 class YouTubeDownloader:
@@ -29,8 +35,11 @@ class YouTubeDownloader:
         """
         self.output_path = Path(output_path)
         self.output_path.mkdir(parents=True, exist_ok=True)
+        self.progress_callback = None
+        self.cancel_token = None
+        self._partial_files = set()
 
-    def download_video(self, url, output_filename=None, progress_callback=None):
+    def download_video(self, url, output_filename=None, progress_callback=None, cancel_token=None):
         """
         Download a YouTube video in the highest available resolution.
 
@@ -38,13 +47,22 @@ class YouTubeDownloader:
             url (str): YouTube video URL
             output_filename (str, optional): Custom output filename
             progress_callback (callable, optional): Callback for progress updates
+            cancel_token (CancelToken, optional): Token to stop the download
 
         Returns:
             tuple: (success: bool, file_path: str or None)
+
+        Raises:
+            JobCancelledError: If cancel_token is cancelled during the download.
+                Partial files of this download are removed first.
         """
+        yt_dlp = _import_yt_dlp()
+
         try:
-            # Store callback for use in hook
+            # Store callback and token for use in hooks
             self.progress_callback = progress_callback
+            self.cancel_token = cancel_token
+            self._partial_files = set()
 
             # Configure yt-dlp options for highest quality
             ydl_opts = {
@@ -52,6 +70,7 @@ class YouTubeDownloader:
                 'outtmpl': str(self.output_path / (output_filename or '%(title)s.%(ext)s')),
                 'merge_output_format': 'mp4',
                 'progress_hooks': [self._progress_hook],
+                'postprocessor_hooks': [self._postprocessor_hook],
                 'postprocessors': [{
                     'key': 'FFmpegVideoConvertor',
                     'preferedformat': 'mp4',
@@ -65,6 +84,7 @@ class YouTubeDownloader:
                     progress_callback("📥 Đang lấy thông tin video...")
 
                 info = ydl.extract_info(url, download=False)
+                self._check_cancelled()
 
                 # Display video information
                 title = info.get('title', 'Unknown')
@@ -105,14 +125,18 @@ class YouTubeDownloader:
 
                 return True, downloaded_file
 
-        except yt_dlp.utils.DownloadError as e:
-            error_msg = f"Download error: {e}"
-            print(f"\n❌ {error_msg}")
-            if progress_callback:
-                progress_callback(f"❌ Lỗi: {error_msg}")
-            return False, None
         except Exception as e:
-            error_msg = f"Unexpected error: {e}"
+            if cancel_token and cancel_token.cancelled:
+                self._remove_partial_files()
+                print("\n❌ Download cancelled")
+                if progress_callback:
+                    progress_callback("❌ Đã hủy tải xuống")
+                raise JobCancelledError("Download cancelled") from e
+
+            if isinstance(e, yt_dlp.utils.DownloadError):
+                error_msg = f"Download error: {e}"
+            else:
+                error_msg = f"Unexpected error: {e}"
             print(f"\n❌ {error_msg}")
             if progress_callback:
                 progress_callback(f"❌ Lỗi: {error_msg}")
@@ -129,6 +153,7 @@ class YouTubeDownloader:
             dict: Video information or None if error
         """
         try:
+            yt_dlp = _import_yt_dlp()
             ydl_opts = {
                 'quiet': True,
                 'no_warnings': True,
@@ -147,8 +172,32 @@ class YouTubeDownloader:
             print(f"Error getting video info: {e}")
             return None
 
+    def _check_cancelled(self):
+        """Abort the running download if its cancel token was triggered."""
+        if self.cancel_token and self.cancel_token.cancelled:
+            raise JobCancelledError("Download cancelled")
+
+    def _remove_partial_files(self):
+        """Delete files written by a cancelled download (.part, .ytdl, format files)."""
+        for filename in self._partial_files:
+            for path in (filename, filename + '.part', filename + '.ytdl'):
+                try:
+                    if os.path.exists(path):
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def _postprocessor_hook(self, d):
+        """Hook to stop before merging/converting when cancelled."""
+        self._check_cancelled()
+
     def _progress_hook(self, d):
         """Hook to display download progress."""
+        for key in ('filename', 'tmpfilename'):
+            if d.get(key):
+                self._partial_files.add(d[key])
+        self._check_cancelled()
+
         if d['status'] == 'downloading':
             # Calculate progress
             downloaded = d.get('downloaded_bytes', 0)
@@ -215,6 +264,11 @@ Examples:
 
     args = parser.parse_args()
 
+    if not YT_DLP_AVAILABLE:
+        print("Error: yt-dlp is not installed.")
+        print("Please install it using: pip install yt-dlp")
+        sys.exit(1)
+
     # Create downloader instance
     downloader = YouTubeDownloader(output_path=args.directory)
 